@@ -0,0 +1,1060 @@
+#!/usr/bin/python
+"""Reference model of the CANopen node generated by eds2vhdl.py
+
+Models the NMT state machine, SYNC producer/consumer, TPDO triggering, EMCY,
+heartbeat producer/consumer, the SDO server (including program download) and the LSS slave of the generated entity at
+Clock-tick granularity, using the same object model as eds2vhdl.py.  Frames
+on the bus are bit-exact (including stuff bits), so the model can be used to
+predict bus load and response latency, and as a golden model for
+cosimulation.  Idle time between events is skipped rather than simulated
+clock by clock.
+
+Run canopenmodel.py -h for usage
+"""
+import argparse
+import binascii
+import math
+
+from objectdictionary import default_value, make_objects, make_od, read_eds
+
+NMT_STATE_INITIALISATION = 0x00
+NMT_STATE_STOPPED = 0x04
+NMT_STATE_OPERATIONAL = 0x05
+NMT_STATE_PREOPERATIONAL = 0x7F
+
+NMT_NODE_CONTROL_OPERATIONAL = 0x01
+NMT_NODE_CONTROL_STOPPED = 0x02
+NMT_NODE_CONTROL_PREOPERATIONAL = 0x80
+NMT_NODE_CONTROL_RESET_APP = 0x81
+NMT_NODE_CONTROL_RESET_COMM = 0x82
+
+SDO_CS_ABORT = 0b100
+SDO_CCS_IDR = 0b001
+SDO_CCS_IUR = 0b010
+SDO_CCS_USR = 0b011
+SDO_CCS_BUR = 0b101
+SDO_CCS_BDR = 0b110
+SDO_BLOCK_SUBCOMMAND_INITIATE = 0b00
+SDO_BLOCK_SUBCOMMAND_END = 0b01
+SDO_BLOCK_SUBCOMMAND_RESPONSE = 0b10
+SDO_BLOCK_SUBCOMMAND_START = 0b11
+
+SDO_ABORT_TOGGLE = 0x05030000
+SDO_ABORT_CS = 0x05040001
+SDO_ABORT_BLKSIZE = 0x05040002
+SDO_ABORT_SEQNO = 0x05040003
+SDO_ABORT_CRC = 0x05040004
+SDO_ABORT_ACCESS = 0x06010000
+SDO_ABORT_WO = 0x06010001
+SDO_ABORT_RO = 0x06010002
+SDO_ABORT_DNE = 0x06020000
+SDO_ABORT_PARAM_LENGTH = 0x06070010
+SDO_ABORT_PARAM_INVALID = 0x06090030
+SDO_ABORT_NO_DATA = 0x08000024
+
+LSS_MASTER_COB_ID = 0x7E5
+LSS_SLAVE_COB_ID = 0x7E4
+LSS_CS_SWITCH_STATE_GLOBAL = 0x04
+LSS_CS_CONFIGURE_NODE_ID = 0x11
+LSS_CS_CONFIGURE_BIT_TIMING = 0x13
+LSS_CS_STORE_CONFIGURATION = 0x17
+LSS_CS_SWITCH_STATE_SELECTIVE_VENDOR = 0x40
+LSS_CS_SWITCH_STATE_SELECTIVE_SERIAL = 0x43
+LSS_CS_SWITCH_STATE_SELECTIVE = 0x44
+LSS_CS_IDENTIFY_NON_CONFIGURED = 0x4C
+LSS_CS_IDENTIFY_SLAVE = 0x4F
+LSS_CS_IDENTIFY_NON_CONFIGURED_SLAVE = 0x50
+LSS_CS_FASTSCAN = 0x51
+LSS_CS_INQUIRE_VENDOR = 0x5A
+LSS_CS_INQUIRE_SERIAL = 0x5D
+LSS_CS_INQUIRE_NODE_ID = 0x5E
+
+EMCY_EEC_NO_ERROR = 0x0000
+EMCY_EEC_GENERIC = 0x1000
+EMCY_EEC_CURRENT = 0x2000
+EMCY_EEC_VOLTAGE = 0x3000
+EMCY_EEC_TEMPERATURE = 0x4000
+EMCY_EEC_COMMUNICATION = 0x8100
+EMCY_EEC_HEARTBEAT = 0x8130
+EMCY_EEC_DEVICE_SPECIFIC = 0xFF00
+
+# Primary state machine states of the generated entity
+STATE_RESET = "STATE_RESET"
+STATE_RESET_APP = "STATE_RESET_APP"
+STATE_RESET_COMM = "STATE_RESET_COMM"
+STATE_BOOTUP = "STATE_BOOTUP"
+STATE_BOOTUP_WAIT = "STATE_BOOTUP_WAIT"
+STATE_IDLE = "STATE_IDLE"
+STATE_SYNC = "STATE_SYNC"
+STATE_EMCY = "STATE_EMCY"
+STATE_TPDO = ["STATE_TPDO1", "STATE_TPDO2", "STATE_TPDO3", "STATE_TPDO4"]
+STATE_SDO_TX = "STATE_SDO_TX"
+STATE_HEARTBEAT = "STATE_HEARTBEAT"
+STATE_CAN_TX_STROBE = "STATE_CAN_TX_STROBE"
+STATE_CAN_TX_WAIT = "STATE_CAN_TX_WAIT"
+STATE_CAN_RX_STROBE = "STATE_CAN_RX_STROBE"
+STATE_CAN_RX_READ = "STATE_CAN_RX_READ"
+STATE_SDO_RX = "STATE_SDO_RX"
+STATE_LSS_RX = "STATE_LSS_RX"
+STATE_LSS_TX = "STATE_LSS_TX"
+
+
+class Frame:
+    """CAN frame as seen by CanLite"""
+
+    def __init__(self, id, data=b"", rtr=False, ide=False, dlc=None):
+        self.id = id
+        self.data = bytes(data)
+        self.rtr = rtr
+        self.ide = ide
+        self.dlc = len(self.data) if dlc is None else dlc
+
+    def __eq__(self, other):
+        return (self.id, self.data, self.rtr, self.ide, self.dlc) == (other.id, other.data, other.rtr, other.ide, other.dlc)
+
+    def __repr__(self):
+        s = ("{:08X}" if self.ide else "{:03X}").format(self.id) + " [{:d}]".format(self.dlc)
+        if self.rtr:
+            return s + " RTR"
+        return s + "".join(map(" {:02X}".format, self.data))
+
+    def arbitration_field(self):
+        """Returns a key that sorts frames by bus priority (lowest wins)"""
+        if self.ide:
+            return (self.id >> 18, 1, 1, self.id & 0x3FFFF, int(self.rtr))
+        return (self.id, int(self.rtr), 0, 0, 0)
+
+
+def matches(frame, cob_id):
+    """Equivalent of CanOpen.is_match()"""
+    if frame.ide != bool(cob_id & (1 << 29)):
+        return False
+    if frame.ide:
+        return frame.id == cob_id & 0x1FFFFFFF
+    return frame.id == cob_id & 0x7FF
+
+
+def _bits(value, length):
+    return [(value >> i) & 1 for i in range(length - 1, -1, -1)]
+
+
+def frame_bits(frame):
+    """Returns the bits from SOF through the CRC sequence, before stuffing"""
+    bits = [0] # SOF
+    if frame.ide:
+        bits += _bits(frame.id >> 18, 11) + [1, 1] + _bits(frame.id & 0x3FFFF, 18) + [int(frame.rtr), 0, 0]
+    else:
+        bits += _bits(frame.id, 11) + [int(frame.rtr), 0, 0]
+    bits += _bits(frame.dlc, 4)
+    if not frame.rtr:
+        for byte in frame.data[:8]:
+            bits += _bits(byte, 8)
+    crc = 0
+    for bit in bits:
+        feedback = bit ^ ((crc >> 14) & 1)
+        crc = (crc << 1) & 0x7FFF
+        if feedback:
+            crc ^= 0x4599
+    return bits + _bits(crc, 15)
+
+
+def frame_length(frame):
+    """Returns the number of bit times a frame occupies the bus, including stuff bits and intermission"""
+    bits = frame_bits(frame)
+    stuff = 0
+    run = 0
+    previous = None
+    for bit in bits:
+        if bit == previous:
+            run += 1
+        else:
+            run = 1
+            previous = bit
+        if run == 5:
+            stuff += 1
+            previous = 1 - bit # Stuff bit starts a new run
+            run = 1
+    return len(bits) + stuff + 1 + 2 + 7 + 3 # CRC delimiter, ACK slot and delimiter, EOF, intermission
+
+
+class Node:
+    """Models one instance of the generated entity; time is counted in Clock ticks"""
+
+    def __init__(self, objects, node_id, clock_frequency=24000000, segmented_sdo_latency=2, lss=False):
+        self.objects = objects
+        self.lss = lss # eds2vhdl.py --lss
+        self.lss_node_id = node_id # LssNodeId output port, initially the NodeId input port; 0 waits for LSS
+        self.lss_configuration = False
+        self.lss_interrupt = False
+        self.lss_response = bytes(8)
+        self.lss_fastscan_sub = 0
+        self.lss_selective_sub = 0
+        self.lss_stored = None # LssNodeId at the last LssStore pulse
+        self.node_id = 0 if lss else node_id # NodeId_q, latched from lss_node_id in STATE_RESET_COMM
+        self.clock_frequency = clock_frequency
+        self.segmented_sdo_latency = segmented_sdo_latency # Clocks from SegmentedSdoReadDataEnable to SegmentedSdoDataValid
+        self.domains = {} # DOMAIN contents served by the Segmented SDO interface, by mux
+        self.error_register = 0 # ErrorRegister input port, bits 4 and 6 are overwritten
+        self.program_download = 0x1F5001 in objects and 0x120001 in objects
+        self.program_block_size = 127 # eds2vhdl.py --program-block-size
+        self.program_data_ready = True # ProgramDataReady input port
+        self.program_data = bytearray() # Written through the program download interface since ProgramStart
+        self.program = None # Program data of the last download ended, as ProgramEnd
+        self.tpdo_mapping = [self._make_tpdo_mapping(i) for i in range(4)]
+        self.tick = 0
+        self.rx_frame = None # Single depth RX FIFO
+        self.rx_frame_q = None
+        self.tx_frame_q = None
+        self.rx_overruns = 0
+        self.tx_fifo = None # Single depth TX FIFO
+        self.tx_frame = None # Frame held by CanLite until TxAck
+        self.tx_ack = False
+        self.events = [False] * 4 # TpdoEvent input ports, for one clock
+        self.state = STATE_RESET
+        self.nmt_state = NMT_STATE_INITIALISATION
+        self.values = {}
+        self._reset_values(0x000000, 0xFFFFFF)
+        self._reset_communication()
+
+    def _make_tpdo_mapping(self, i):
+        mapping = []
+        length = 0
+        for sub in range(1, 0x41):
+            obj = self.objects.get(((0x1A00 + i) << 8) + sub)
+            if obj is None: break
+            entry = default_value(obj, self.node_id)
+            mapping.append((entry >> 8, entry & 0xFF))
+            length += entry & 0xFF
+        if length > 64:
+            raise ValueError("TPDO{:d} Mapping is greater than 64 bits".format(i + 1))
+        return mapping
+
+    def _reset_values(self, first, last):
+        for mux in self.objects:
+            if self.objects.get(mux).get("access_type") == "ro" and mux in self.values: continue # In port, driven by set()
+            if first <= mux <= last:
+                value = default_value(self.objects.get(mux), self.node_id)
+                self.values[mux] = 0 if value is None else value
+
+    def _reset_communication(self):
+        self.sync_deadline = None
+        self.sync_ack = False
+        self.sync_pending = False
+        self.sync_producer_interrupt = False
+        self.synchronous_counter = 1
+        self.heartbeat_deadline = None
+        self.heartbeat_interrupt = False
+        self.heartbeat_consumers = {} # Sub-index: deadline, or None until first heartbeat
+        self.heartbeat_consumer_errors = set()
+        self.emcy_interrupt = False
+        self.emcy_pending = []
+        self.emcy_eec = EMCY_EEC_NO_ERROR
+        self.error_register_q = 0
+        self.tpdos = [{
+            "interrupt": False,
+            "event_interrupt": False,
+            "rtr_interrupt": False,
+            "sync_counter": 0,
+            "event_deadline": None, # EventTimer = Event timer object
+            "inhibit_deadline": None, # InhibitTimer = Inhibit time object
+            "window_deadline": None # SynchronousWindowTimer = Synchronous window length object
+        } for i in range(4)]
+        self.sdo_interrupt = False
+        self.sdo_response = None
+        self.sdo_write = None
+        self.sdo_active = False
+        self.sdo_block_mode = False
+        self.sdo_pending = None # Tick at which segment data becomes valid
+        self.sdo_data = b""
+        self.sdo_mux = 0
+        self.sdo_toggle = 0
+        self.sdo_sequence_number = 0
+        self.sdo_block_size = 0
+        self.sdo_crc = 0
+        self.sdo_read_bytes = 0
+        self.sdo_block_download = False
+        self.sdo_program_ack = False # Response held until program_data_ready
+        self.sdo_program_active = False
+        self.sdo_program_crc = False
+        self.sdo_program_last = b""
+
+    # Application interface
+
+    def value(self, mux):
+        if mux == 0x100100: # Error register
+            return (self.error_register & 0xAF) | (0x10 if self.communication_error() else 0)
+        return self.values.get(mux, 0)
+
+    def set(self, mux, value):
+        """Drives an in port (ro object) of the entity"""
+        self.values[mux] = value
+
+    def tpdo_event(self, n):
+        """Pulses TpdoNEvent for one clock at the next edge"""
+        self.events[n - 1] = True
+
+    def communication_error(self):
+        return len(self.heartbeat_consumer_errors) > 0
+
+    # CanLite interface
+
+    def receive(self, frame):
+        """RxFifoWriteEnable, RxFifoFull is never asserted so an unread frame is overwritten"""
+        if self.rx_frame is not None:
+            self.rx_overruns += 1
+        self.rx_frame = frame
+
+    def acknowledge(self):
+        """TxAck, the frame held by CanLite was transmitted"""
+        self.tx_frame = None
+        self.tx_ack = True
+
+    # Timing
+
+    def _grid(self, period_us, count):
+        """Returns the tick of the count-th enable pulse of a period_us timer after the current tick"""
+        period = self.clock_frequency * period_us // 1000000
+        return (self.tick // period + count) * period
+
+    def _deadlines(self):
+        deadlines = [self.sync_deadline, self.heartbeat_deadline, self.sdo_pending]
+        deadlines += list(self.heartbeat_consumers.values())
+        for tpdo in self.tpdos:
+            deadlines += [tpdo["event_deadline"], tpdo["inhibit_deadline"], tpdo["window_deadline"]]
+        return [deadline for deadline in deadlines if deadline is not None and deadline > self.tick]
+
+    def _busy(self):
+        if self.tx_ack or any(self.events) or self.value(0x100100) != self.error_register_q or (self.emcy_pending and not self.emcy_interrupt):
+            return True
+        if self.sdo_program_ack and self.program_data_ready:
+            return True
+        if self.communication_error() and self.nmt_state == NMT_STATE_OPERATIONAL:
+            return True
+        if any(not self.tpdos[i]["interrupt"] and self._tpdo_interrupt_enable(i, False) for i in range(4)):
+            return True
+        if self.state == STATE_IDLE:
+            return self.rx_frame is not None or self._next_state() != STATE_IDLE or self.sdo_pending == self.tick + 1
+        if self.state == STATE_CAN_TX_WAIT:
+            return self.tx_fifo is None
+        if self.state == STATE_RESET_COMM and self.lss:
+            return self._next_state() != STATE_RESET_COMM or (not self.lss_configuration and self.node_id != self.lss_node_id)
+        return self.state not in [STATE_BOOTUP_WAIT]
+
+    def next_event(self):
+        """Returns the next tick at which the state of the node can change without bus activity"""
+        if self._busy():
+            return self.tick + 1
+        deadlines = self._deadlines()
+        return min(deadlines) if deadlines else None
+
+    def advance(self, tick):
+        """Processes all clock edges up to and including tick"""
+        while self.tick < tick:
+            next_tick = self.next_event()
+            if next_tick is None or next_tick > tick:
+                self.tick = tick
+                return
+            self.tick = next_tick - 1
+            self.tick += 1
+            self._edge()
+
+    # Generated entity
+
+    def _tpdo_parameter(self, i, sub):
+        return self.value(((0x1800 + i) << 8) + sub)
+
+    def _tpdo_interrupt_enable(self, i, sync):
+        if self.nmt_state != NMT_STATE_OPERATIONAL or ((0x1800 + i) << 8) + 1 not in self.objects:
+            return False
+        tpdo = self.tpdos[i]
+        cob_id = self._tpdo_parameter(i, 1)
+        transmission_type = self._tpdo_parameter(i, 2)
+        sync_start_value = self._tpdo_parameter(i, 6)
+        if cob_id & (1 << 31):
+            return False
+        if not cob_id & (1 << 30) and self.state == STATE_CAN_RX_READ and matches(self.rx_frame_q, cob_id) and self.rx_frame_q.rtr:
+            return True
+        if sync:
+            if transmission_type == 0 and tpdo["event_interrupt"]:
+                return True
+            if transmission_type == 0xFC and tpdo["rtr_interrupt"]:
+                return True
+            if 0 < transmission_type <= 240:
+                if sync_start_value == 0 and tpdo["sync_counter"] == transmission_type:
+                    return True
+                if sync_start_value > 0 and self.value(0x101900) > 1 and self.state == STATE_CAN_RX_READ and self.rx_frame_q.dlc == 1 and self.rx_frame_q.data[0] == sync_start_value:
+                    return True
+        if tpdo["event_interrupt"]:
+            if transmission_type == 0xFD and tpdo["rtr_interrupt"]:
+                return True
+            if transmission_type >= 0xFE:
+                return True
+        return False
+
+    def _rx_is_sdo(self):
+        cob_id = self.value(0x120001)
+        return 0x120001 in self.objects and not cob_id & (1 << 31) and matches(self.rx_frame_q, cob_id) and self.rx_frame_q.dlc >= 8
+
+    def _rx_is_node_control(self):
+        frame = self.rx_frame_q
+        return frame.id == 0 and not frame.ide and len(frame.data) >= 2 and frame.data[1] in [0, self.node_id]
+
+    def _next_state(self):
+        state = self.state
+        if state == STATE_RESET:
+            return STATE_RESET_APP
+        if state == STATE_RESET_APP:
+            return STATE_RESET_COMM
+        if state == STATE_RESET_COMM:
+            if not self.lss:
+                return STATE_BOOTUP
+            if not self.lss_configuration and self.node_id != 0 and self.node_id == self.lss_node_id:
+                return STATE_BOOTUP
+            if self.rx_frame is not None: # Unconfigured, only LSS is served
+                return STATE_CAN_RX_STROBE
+            if self.lss_interrupt and self.tx_fifo is None:
+                return STATE_LSS_TX
+            return STATE_RESET_COMM
+        if state == STATE_BOOTUP_WAIT:
+            return STATE_IDLE if self.tx_ack else STATE_BOOTUP_WAIT
+        if state == STATE_IDLE:
+            if self.rx_frame is not None:
+                return STATE_CAN_RX_STROBE
+            if self.tx_fifo is None:
+                communicating = self.nmt_state in [NMT_STATE_PREOPERATIONAL, NMT_STATE_OPERATIONAL]
+                if self.sync_producer_interrupt and communicating:
+                    return STATE_SYNC
+                if self.emcy_interrupt and communicating:
+                    return STATE_EMCY
+                for i in range(4):
+                    if self.tpdos[i]["interrupt"]:
+                        return STATE_TPDO[i]
+                if self.sdo_interrupt:
+                    return STATE_SDO_TX
+                if self.heartbeat_interrupt:
+                    return STATE_HEARTBEAT
+                if self.lss_interrupt:
+                    return STATE_LSS_TX
+            return STATE_IDLE
+        if state in [STATE_SYNC, STATE_EMCY, STATE_SDO_TX, STATE_HEARTBEAT, STATE_BOOTUP, STATE_LSS_TX] + STATE_TPDO:
+            return STATE_CAN_TX_STROBE
+        if state == STATE_CAN_TX_STROBE:
+            return STATE_CAN_TX_WAIT
+        if state == STATE_CAN_TX_WAIT:
+            if self.nmt_state == NMT_STATE_INITIALISATION and self.lss and self.tx_frame_q.id == LSS_SLAVE_COB_ID:
+                return STATE_RESET_COMM if self.tx_fifo is None else STATE_CAN_TX_WAIT
+            if self.nmt_state == NMT_STATE_INITIALISATION:
+                return STATE_BOOTUP_WAIT
+            return STATE_IDLE if self.tx_fifo is None else STATE_CAN_TX_WAIT
+        if state == STATE_CAN_RX_STROBE:
+            if self.lss and self.nmt_state == NMT_STATE_INITIALISATION:
+                return STATE_LSS_RX
+            return STATE_CAN_RX_READ
+        if state == STATE_LSS_RX:
+            return STATE_RESET_COMM
+        if state == STATE_CAN_RX_READ:
+            if self._rx_is_node_control():
+                if self.rx_frame_q.data[0] == NMT_NODE_CONTROL_RESET_APP:
+                    return STATE_RESET_APP
+                if self.rx_frame_q.data[0] == NMT_NODE_CONTROL_RESET_COMM:
+                    return STATE_RESET_COMM
+                return STATE_IDLE
+            if self._rx_is_sdo():
+                return STATE_SDO_RX
+            return STATE_IDLE
+        return STATE_IDLE
+
+    def _edge(self):
+        state = self.state
+        next_state = self._next_state()
+        sync = self.sync_ack or (state == STATE_CAN_RX_READ and matches(self.rx_frame_q, self.value(0x100500)))
+        written = self.sdo_write if state == STATE_SDO_TX else None
+        node_id = self.lss_node_id if state == STATE_RESET_COMM and self.lss and not self.lss_configuration else self.node_id
+        if state == STATE_CAN_RX_STROBE:
+            self.rx_frame_q = self.rx_frame
+            self.rx_frame = None
+        if state == STATE_CAN_TX_STROBE:
+            self.tx_fifo = self.tx_frame_q
+        if self.tx_frame is None and self.tx_fifo is not None: # CanLite reads TX FIFO
+            self.tx_frame = self.tx_fifo
+            self.tx_fifo = None
+        self._edge_nmt(state)
+        self._edge_sync(state, written)
+        self._edge_emcy(state)
+        self._edge_heartbeat(state, written)
+        for i in range(4):
+            self._edge_tpdo(i, state, sync, written)
+        self._edge_sdo(state)
+        self._edge_lss(state)
+        self._edge_tx_frame(state)
+        if written is not None:
+            self.values[written[0]] = written[1]
+        if state == STATE_RESET_APP:
+            self._reset_values(0x200000, 0xFFFFFF)
+        if state == STATE_RESET_COMM:
+            self._reset_values(0x100000, 0x1FFFFF)
+            self._reset_communication()
+        self.node_id = node_id
+        self.tx_ack = False
+        self.events = [False] * 4
+        self.state = next_state
+
+    def _edge_nmt(self, state):
+        if self.communication_error() and self.nmt_state == NMT_STATE_OPERATIONAL:
+            self.nmt_state = NMT_STATE_PREOPERATIONAL
+        elif state in [STATE_RESET, STATE_RESET_APP, STATE_RESET_COMM, STATE_BOOTUP]:
+            self.nmt_state = NMT_STATE_INITIALISATION
+        elif state == STATE_BOOTUP_WAIT and self.tx_ack:
+            self.nmt_state = NMT_STATE_OPERATIONAL if self.value(0x1F8000) & 0x08 else NMT_STATE_PREOPERATIONAL
+        elif state == STATE_CAN_RX_READ and self._rx_is_node_control():
+            self.nmt_state = {
+                NMT_NODE_CONTROL_OPERATIONAL: NMT_STATE_OPERATIONAL,
+                NMT_NODE_CONTROL_PREOPERATIONAL: NMT_STATE_PREOPERATIONAL,
+                NMT_NODE_CONTROL_STOPPED: NMT_STATE_STOPPED
+            }.get(self.rx_frame_q.data[0], self.nmt_state)
+
+    def _edge_sync(self, state, written):
+        cob_id = self.value(0x100500)
+        period = self.value(0x100600)
+        sync_received = state == STATE_CAN_RX_READ and matches(self.rx_frame_q, cob_id)
+        if (
+            self.nmt_state in [NMT_STATE_INITIALISATION, NMT_STATE_STOPPED]
+            or period == 0
+            or state == STATE_RESET_COMM
+            or (written is not None and written[0] == 0x100600)
+            or (not cob_id & 0x1 and (self.sync_ack or sync_received))
+        ):
+            self.sync_deadline = None
+        if self.sync_deadline is None and period > 0 and self.nmt_state not in [NMT_STATE_INITIALISATION, NMT_STATE_STOPPED]:
+            self.sync_deadline = self._grid(1, period)
+        elif self.sync_deadline == self.tick:
+            self.sync_deadline = self._grid(1, period)
+            if cob_id & (1 << 30):
+                self.sync_producer_interrupt = True
+        if not cob_id & (1 << 30):
+            self.sync_producer_interrupt = False
+        elif state == STATE_SYNC:
+            self.sync_pending = True
+            self.sync_producer_interrupt = False
+        sync_ack = self.sync_pending and self.tx_ack
+        overflow = self.value(0x101900)
+        if (
+            self.nmt_state in [NMT_STATE_INITIALISATION, NMT_STATE_STOPPED]
+            or state == STATE_RESET_COMM
+            or (written is not None and written[0] == 0x101900)
+            or overflow < 2 or overflow > 240
+        ):
+            self.synchronous_counter = 1
+        elif self.sync_ack:
+            self.synchronous_counter = self.synchronous_counter + 1 if self.synchronous_counter < overflow else 1
+        self.sync_ack = sync_ack
+
+    def _edge_emcy(self, state):
+        error_register = self.value(0x100100)
+        for bit in [0, 1, 2, 3, 4, 5, 7]:
+            if error_register & (1 << bit) and not self.error_register_q & (1 << bit) and bit not in self.emcy_pending:
+                self.emcy_pending.append(bit)
+        if not self.emcy_interrupt and (self.emcy_pending or (error_register == 0 and self.error_register_q != 0)):
+            self.emcy_interrupt = True
+            if self.emcy_pending:
+                bit = min(self.emcy_pending)
+                self.emcy_pending.remove(bit)
+                if bit == 4:
+                    self.emcy_eec = EMCY_EEC_HEARTBEAT if self.communication_error() else EMCY_EEC_COMMUNICATION
+                else:
+                    self.emcy_eec = {
+                        0: EMCY_EEC_GENERIC,
+                        1: EMCY_EEC_CURRENT,
+                        2: EMCY_EEC_VOLTAGE,
+                        3: EMCY_EEC_TEMPERATURE
+                    }.get(bit, EMCY_EEC_DEVICE_SPECIFIC)
+            else:
+                self.emcy_eec = EMCY_EEC_NO_ERROR
+        elif state == STATE_EMCY:
+            self.emcy_interrupt = False
+        self.error_register_q = error_register
+
+    def _edge_heartbeat(self, state, written):
+        # Producer
+        time = self.value(0x101700)
+        if (
+            self.nmt_state == NMT_STATE_INITIALISATION
+            or time == 0
+            or state == STATE_RESET_COMM
+            or (written is not None and written[0] == 0x101700)
+        ):
+            self.heartbeat_deadline = None
+        elif self.heartbeat_deadline is None:
+            self.heartbeat_deadline = self._grid(1000, time)
+        elif self.heartbeat_deadline == self.tick:
+            self.heartbeat_deadline = self._grid(1000, time)
+            self.heartbeat_interrupt = True
+        if state == STATE_HEARTBEAT and self.heartbeat_deadline != self.tick:
+            self.heartbeat_interrupt = False
+        # Consumers
+        for sub in range(1, 0x80):
+            mux = 0x101600 + sub
+            if mux not in self.objects: break
+            entry = self.value(mux)
+            node_id = (entry >> 16) & 0xFF
+            time = entry & 0xFFFF
+            reset = (
+                (state == STATE_CAN_RX_READ and not self.rx_frame_q.ide and self.rx_frame_q.id >> 7 == 0xE and self.rx_frame_q.id & 0x7F == node_id & 0x7F)
+                or (written is not None and written[0] == mux)
+            )
+            if node_id == 0 or node_id > 127 or time == 0:
+                self.heartbeat_consumers.pop(sub, None)
+                self.heartbeat_consumer_errors.discard(sub)
+            elif reset:
+                self.heartbeat_consumers[sub] = self._grid(1000, time) + 1
+                self.heartbeat_consumer_errors.discard(sub)
+            elif self.heartbeat_consumers.get(sub) == self.tick:
+                self.heartbeat_consumer_errors.add(sub)
+
+    def _edge_tpdo(self, i, state, sync, written):
+        if ((0x1800 + i) << 8) + 1 not in self.objects:
+            return
+        tpdo = self.tpdos[i]
+        transmission_type = self._tpdo_parameter(i, 2)
+        inhibit_time = self._tpdo_parameter(i, 3)
+        event_timer = self._tpdo_parameter(i, 5)
+        window_length = self.value(0x100700)
+        written_mux = None if written is None else written[0]
+        inhibited = tpdo["inhibit_deadline"] is not None and tpdo["inhibit_deadline"] > self.tick
+        event_timer_expired = tpdo["event_deadline"] is not None and tpdo["event_deadline"] <= self.tick
+        window_expired = tpdo["window_deadline"] is not None and tpdo["window_deadline"] <= self.tick
+        interrupt_enable = self._tpdo_interrupt_enable(i, sync)
+        if state == STATE_TPDO[i] or ((transmission_type <= 240 or transmission_type == 0xFC) and window_length > 0 and window_expired):
+            tpdo["event_interrupt"] = False
+        elif not inhibited and (self.events[i] or (transmission_type >= 0xFE and event_timer > 0 and event_timer_expired)):
+            tpdo["event_interrupt"] = True
+        if self.events[i] or state == STATE_TPDO[i] or transmission_type == 0 or written_mux == ((0x1800 + i) << 8) + 5 or (tpdo["event_deadline"] is None and event_timer > 0):
+            tpdo["event_deadline"] = self._grid(1000, event_timer) if event_timer > 0 else None
+        if state == STATE_TPDO[i] or inhibit_time == 0 or written_mux == ((0x1800 + i) << 8) + 3:
+            tpdo["inhibit_deadline"] = self._grid(100, inhibit_time) if inhibit_time > 0 and state == STATE_TPDO[i] else None
+        if state == STATE_TPDO[i]:
+            tpdo["interrupt"] = False
+        elif interrupt_enable:
+            tpdo["interrupt"] = True
+        cob_id = self._tpdo_parameter(i, 1)
+        if state == STATE_TPDO[i]:
+            tpdo["rtr_interrupt"] = False
+        elif not cob_id & (1 << 30) and state == STATE_CAN_RX_READ and matches(self.rx_frame_q, cob_id) and self.rx_frame_q.rtr:
+            tpdo["rtr_interrupt"] = True
+        if sync:
+            tpdo["sync_counter"] = tpdo["sync_counter"] + 1 if tpdo["sync_counter"] < transmission_type else 1
+        if sync or window_length == 0 or written_mux == 0x100700:
+            tpdo["window_deadline"] = self._grid(1, window_length) if window_length > 0 else None
+
+    def _tpdo_data(self, i):
+        data = 0
+        length = 0
+        for mux, bit_length in self.tpdo_mapping[i]:
+            data |= (self.value(mux) & ((1 << bit_length) - 1)) << length
+            length += bit_length
+        return data.to_bytes(math.ceil(length / 8), "little")
+
+    def _edge_tx_frame(self, state):
+        if state in [STATE_BOOTUP, STATE_HEARTBEAT]:
+            nmt_state = 0 if state == STATE_BOOTUP else self.nmt_state
+            self.tx_frame_q = Frame(0x700 + self.node_id, bytes([nmt_state]))
+        elif state == STATE_SYNC:
+            cob_id = self.value(0x100500)
+            overflow = self.value(0x101900)
+            data = b"" if overflow < 2 or overflow > 240 else bytes([self.synchronous_counter])
+            self.tx_frame_q = Frame(cob_id & 0x1FFFFFFF, data, ide=bool(cob_id & (1 << 29)))
+        elif state == STATE_EMCY:
+            cob_id = self.value(0x101400)
+            data = self.emcy_eec.to_bytes(2, "little") + bytes([self.value(0x100100)]) + bytes(5)
+            self.tx_frame_q = Frame(cob_id & 0x1FFFFFFF, data, ide=bool(cob_id & (1 << 29)))
+        elif state in STATE_TPDO:
+            i = STATE_TPDO.index(state)
+            cob_id = self._tpdo_parameter(i, 1)
+            self.tx_frame_q = Frame(cob_id & 0x1FFFFFFF, self._tpdo_data(i), ide=bool(cob_id & (1 << 29)))
+        elif state == STATE_SDO_TX:
+            cob_id = self.value(0x120002)
+            self.tx_frame_q = Frame(cob_id & 0x1FFFFFFF, self.sdo_response, ide=bool(cob_id & (1 << 29)))
+        elif state == STATE_LSS_TX:
+            self.tx_frame_q = Frame(LSS_SLAVE_COB_ID, self.lss_response)
+
+    # LSS slave
+
+    def _edge_lss(self, state):
+        if state == STATE_LSS_TX:
+            self.lss_interrupt = False
+            return
+        frame = self.rx_frame_q
+        if not self.lss or state not in [STATE_CAN_RX_READ, STATE_LSS_RX] or frame.id != LSS_MASTER_COB_ID or frame.ide or frame.rtr or frame.dlc != 8:
+            return
+        cs = frame.data[0]
+        id_number = int.from_bytes(frame.data[1:5], "little")
+        bit_checked, lss_sub, lss_next = frame.data[5:8]
+        identity = [self.value(0x101801 + sub) for sub in range(4)]
+        response = bytearray([cs]) + bytes(7)
+        respond = False
+        if cs == LSS_CS_SWITCH_STATE_GLOBAL:
+            if frame.data[1] in [0, 1]:
+                self.lss_configuration = frame.data[1] == 1
+            self.lss_selective_sub = 0
+        elif LSS_CS_SWITCH_STATE_SELECTIVE_VENDOR <= cs <= LSS_CS_SWITCH_STATE_SELECTIVE_SERIAL:
+            sub = cs - LSS_CS_SWITCH_STATE_SELECTIVE_VENDOR
+            matched = (sub == 0 or self.lss_selective_sub == sub) and id_number == identity[sub]
+            self.lss_selective_sub = sub + 1 if matched and sub < 3 else 0
+            if matched and sub == 3:
+                self.lss_configuration = True
+                response[0] = LSS_CS_SWITCH_STATE_SELECTIVE
+                respond = True
+        elif cs == LSS_CS_CONFIGURE_NODE_ID and self.lss_configuration:
+            if frame.data[1] == 0xFF: # Unconfigured
+                self.lss_node_id = 0
+            elif 0 < frame.data[1] < 0x80:
+                self.lss_node_id = frame.data[1]
+            else:
+                response[1] = 1 # Node-ID out of range
+            respond = True
+        elif cs == LSS_CS_CONFIGURE_BIT_TIMING and self.lss_configuration:
+            response[1] = 1 # Bit timing is set by the CanLite generics
+            respond = True
+        elif cs == LSS_CS_STORE_CONFIGURATION and self.lss_configuration:
+            self.lss_stored = self.lss_node_id
+            respond = True
+        elif LSS_CS_INQUIRE_VENDOR <= cs <= LSS_CS_INQUIRE_SERIAL and self.lss_configuration:
+            response[1:5] = identity[cs - LSS_CS_INQUIRE_VENDOR].to_bytes(4, "little")
+            respond = True
+        elif cs == LSS_CS_INQUIRE_NODE_ID and self.lss_configuration:
+            response[1] = 0xFF if self.node_id == 0 else self.node_id
+            respond = True
+        elif cs == LSS_CS_IDENTIFY_NON_CONFIGURED and self.node_id == 0:
+            response[0] = LSS_CS_IDENTIFY_NON_CONFIGURED_SLAVE
+            respond = True
+        elif cs == LSS_CS_FASTSCAN and not self.lss_configuration and self.node_id == 0:
+            if bit_checked == 0x80: # Reset
+                self.lss_fastscan_sub = 0
+                response[0] = LSS_CS_IDENTIFY_SLAVE
+                respond = True
+            elif bit_checked < 32 and lss_sub == self.lss_fastscan_sub and lss_next < 4 and (id_number ^ identity[lss_sub]) >> bit_checked == 0:
+                if bit_checked == 0:
+                    if lss_next < lss_sub: # Last entry matched
+                        self.lss_configuration = True
+                    self.lss_fastscan_sub = lss_next
+                response[0] = LSS_CS_IDENTIFY_SLAVE
+                respond = True
+        self.lss_response = bytes(response)
+        if respond:
+            self.lss_interrupt = True
+
+    # SDO server
+
+    def _sdo_abort(self, mux, code):
+        self.sdo_response = bytes([SDO_CS_ABORT << 5]) + (mux >> 8).to_bytes(2, "little") + bytes([mux & 0xFF]) + code.to_bytes(4, "little")
+        self.sdo_active = False
+        self.sdo_block_mode = False
+        self.sdo_pending = None
+        self.sdo_interrupt = True
+
+    def _sdo_object_bytes(self, mux):
+        obj = self.objects.get(mux)
+        if obj.get("bit_length") == 0:
+            return self.domains.get(mux, b"")
+        return (self.value(mux) & ((1 << obj.get("bit_length")) - 1)).to_bytes(math.ceil(obj.get("bit_length") / 8), "little")
+
+    def _edge_sdo(self, state):
+        if state == STATE_SDO_RX:
+            self._sdo_request(self.rx_frame_q.data)
+        elif state == STATE_SDO_TX:
+            self.sdo_interrupt = False
+            self.sdo_write = None
+            if self.sdo_pending is not None and self.sdo_pending <= self.tick:
+                self.sdo_pending = self.tick + self.segmented_sdo_latency
+        elif self.sdo_program_ack and self.program_data_ready:
+            self.sdo_program_ack = False
+            self.sdo_interrupt = True
+        elif self.sdo_pending == self.tick and not self.sdo_interrupt:
+            self._sdo_segment()
+
+    def _program_abort(self):
+        self.sdo_program_active = False
+        self.sdo_program_ack = False
+        self.program_data = bytearray()
+
+    def _sdo_request(self, request):
+        cs = request[0] >> 5
+        mux = (int.from_bytes(request[1:3], "little") << 8) + request[3]
+        data = int.from_bytes(request[4:8], "little")
+        obj = self.objects.get(mux)
+        if self.sdo_program_active and not self.sdo_block_download and not (cs == SDO_CCS_BDR and request[0] & 0x01): # Abandoned for another request
+            self._program_abort()
+        if self.sdo_block_download: # Sub-block segment of program data
+            if request[0] == SDO_CS_ABORT << 5:
+                self.sdo_block_download = False
+                self._program_abort()
+                return
+            sequence_number = request[0] & 0x7F
+            complete = bool(request[0] & 0x80)
+            if sequence_number == self.sdo_sequence_number + 1: # Segments out of sequence are ignored
+                self.sdo_sequence_number += 1
+                if complete:
+                    self.sdo_program_last = request[1:8]
+                    self.sdo_block_download = False
+                else:
+                    self.sdo_crc = binascii.crc_hqx(request[1:8], self.sdo_crc)
+                    self.program_data += request[1:8]
+            if complete or sequence_number == self.program_block_size:
+                self.sdo_response = bytes([0xA2, self.sdo_sequence_number, self.program_block_size]) + bytes(5)
+                self.sdo_sequence_number = 0
+                self.sdo_program_ack = True
+        elif cs == SDO_CCS_BDR and self.program_download:
+            if not request[0] & 0x01: # Initiate
+                if mux == 0x1F5001:
+                    self.sdo_response = bytes([0xA4]) + request[1:4] + bytes([self.program_block_size]) + bytes(3)
+                    self.sdo_crc = 0
+                    self.sdo_program_crc = bool(request[0] & 0x04)
+                    self.sdo_sequence_number = 0
+                    self.sdo_block_download = True
+                    self.sdo_program_active = True
+                    self.sdo_program_ack = True
+                    self.program_data = bytearray() # ProgramStart
+                else: # Block download is supported for program data only
+                    self._sdo_abort(mux, SDO_ABORT_ACCESS)
+            elif self.sdo_program_active: # End
+                last = self.sdo_program_last[:7 - ((request[0] >> 2) & 0x7)]
+                self.sdo_program_active = False
+                if self.sdo_program_crc and binascii.crc_hqx(last, self.sdo_crc) != int.from_bytes(request[1:3], "little"):
+                    self._sdo_abort(0x1F5001, SDO_ABORT_CRC)
+                    self.program_data = bytearray()
+                else:
+                    self.sdo_response = bytes([0xA1]) + bytes(7)
+                    self.program_data += last
+                    self.program = bytes(self.program_data) # ProgramEnd
+                    self.sdo_interrupt = True
+            else: # Block download was not initiated
+                self._sdo_abort(0, SDO_ABORT_CS)
+        elif cs == SDO_CS_ABORT:
+            self.sdo_active = False
+            self.sdo_block_mode = False
+            self.sdo_pending = None
+        elif cs == SDO_CCS_IDR:
+            self.sdo_active = False
+            self.sdo_block_mode = False
+            self.sdo_pending = None
+            if not request[0] & 0x02: # Expedited only
+                self._sdo_abort(mux, SDO_ABORT_ACCESS)
+            elif obj is None:
+                self._sdo_abort(mux, SDO_ABORT_DNE)
+            elif obj.get("access_type") in ["const", "ro"]:
+                self._sdo_abort(mux, SDO_ABORT_RO)
+            elif obj.get("bit_length") == 0 or obj.get("bit_length") > 32:
+                self._sdo_abort(mux, SDO_ABORT_ACCESS)
+            elif request[0] & 0x01 and (request[0] >> 2) & 0x3 != 4 - math.ceil(obj.get("bit_length") / 8):
+                self._sdo_abort(mux, SDO_ABORT_PARAM_LENGTH)
+            else:
+                bit_length = obj.get("bit_length")
+                value = data & ((1 << bit_length) - 1)
+                signed = value - (1 << bit_length) if obj.get("data_type").startswith("signed") and value >> (bit_length - 1) else value
+                if (obj.get("low_limit_value") is not None and signed < obj.get("low_limit_value")) or (obj.get("high_limit_value") is not None and signed > obj.get("high_limit_value")):
+                    self._sdo_abort(mux, SDO_ABORT_PARAM_INVALID)
+                else:
+                    self.sdo_response = bytes([0x60]) + request[1:4] + bytes(4)
+                    self.sdo_write = (mux, signed)
+                    self.sdo_interrupt = True
+        elif cs == SDO_CCS_IUR:
+            self.sdo_toggle = 0
+            if obj is None:
+                self._sdo_abort(mux, SDO_ABORT_DNE)
+            elif obj.get("access_type") == "wo":
+                self._sdo_abort(mux, SDO_ABORT_WO)
+            else:
+                self.sdo_mux = mux
+                self.sdo_data = self._sdo_object_bytes(mux)
+                if obj.get("bit_length") == 0 or obj.get("bit_length") > 32:
+                    self.sdo_response = bytes([0x41]) + request[1:4] + len(self.sdo_data).to_bytes(4, "little")
+                    self.sdo_read_bytes = len(self.sdo_data)
+                    self.sdo_active = True
+                else:
+                    n = 4 - len(self.sdo_data)
+                    self.sdo_response = bytes([0x43 | (n << 2)]) + request[1:4] + self.sdo_data + bytes(n)
+                    self.sdo_active = False
+                self.sdo_interrupt = True
+        elif cs == SDO_CCS_USR:
+            if (request[0] >> 4) & 0x1 != self.sdo_toggle:
+                self._sdo_abort(self.sdo_mux, SDO_ABORT_TOGGLE)
+            else:
+                self.sdo_pending = self.tick + self.segmented_sdo_latency
+        elif cs == SDO_CCS_BUR:
+            subcommand = request[0] & 0x3
+            if subcommand == SDO_BLOCK_SUBCOMMAND_INITIATE:
+                block_size = request[4]
+                pst = request[5]
+                if self.sdo_active:
+                    self._sdo_abort(mux, SDO_ABORT_CS)
+                elif block_size & 0x80 or block_size == 0:
+                    self._sdo_abort(mux, SDO_ABORT_BLKSIZE)
+                elif obj is None:
+                    self._sdo_abort(mux, SDO_ABORT_DNE)
+                elif obj.get("access_type") == "wo":
+                    self._sdo_abort(mux, SDO_ABORT_WO)
+                else:
+                    self.sdo_mux = mux
+                    self.sdo_data = self._sdo_object_bytes(mux)
+                    if obj.get("bit_length") == 0 and len(self.sdo_data) == 0:
+                        self._sdo_abort(mux, SDO_ABORT_NO_DATA)
+                    elif 0 < obj.get("bit_length") <= 32 and 0 < pst <= 4:
+                        n = 4 - len(self.sdo_data)
+                        self.sdo_response = bytes([0x43 | (n << 2)]) + request[1:4] + self.sdo_data + bytes(n)
+                        self.sdo_interrupt = True
+                    else:
+                        self.sdo_response = bytes([0xC6]) + request[1:4] + len(self.sdo_data).to_bytes(4, "little")
+                        self.sdo_read_bytes = len(self.sdo_data)
+                        self.sdo_active = True
+                        self.sdo_block_size = block_size
+                        self.sdo_sequence_number = 0
+                        self.sdo_interrupt = True
+            elif not self.sdo_active:
+                self._sdo_abort(0, SDO_ABORT_CS)
+            elif subcommand == SDO_BLOCK_SUBCOMMAND_START:
+                self.sdo_crc = 0
+                self.sdo_block_mode = True
+                self.sdo_pending = self.tick + self.segmented_sdo_latency
+            elif subcommand == SDO_BLOCK_SUBCOMMAND_RESPONSE:
+                if request[1] & 0x7F != self.sdo_sequence_number:
+                    self._sdo_abort(self.sdo_mux, SDO_ABORT_SEQNO)
+                elif self.sdo_read_bytes == 0: # Complete
+                    n = (7 - self.sdo_last_bytes) & 0x7
+                    self.sdo_response = bytes([0xC1 | (n << 2)]) + self.sdo_crc.to_bytes(2, "little") + bytes(5)
+                    self.sdo_interrupt = True
+                elif request[2] & 0x80 or request[2] == 0:
+                    self._sdo_abort(self.sdo_mux, SDO_ABORT_BLKSIZE)
+                else:
+                    self.sdo_block_size = request[2] & 0x7F
+                    self.sdo_block_mode = True
+                    self.sdo_sequence_number = 0
+                    self.sdo_pending = self.tick + self.segmented_sdo_latency
+            elif subcommand == SDO_BLOCK_SUBCOMMAND_END:
+                self.sdo_active = False
+        else:
+            self._sdo_abort(0, SDO_ABORT_CS)
+
+    def _sdo_segment(self):
+        self.sdo_pending = None
+        offset = len(self.sdo_data) - self.sdo_read_bytes
+        segment = self.sdo_data[offset:offset + 7]
+        self.sdo_last_bytes = len(segment)
+        self.sdo_read_bytes -= len(segment)
+        if self.sdo_block_mode:
+            self.sdo_sequence_number += 1
+            self.sdo_crc = binascii.crc_hqx(segment, self.sdo_crc)
+            complete = self.sdo_read_bytes == 0
+            if complete or self.sdo_sequence_number == self.sdo_block_size:
+                self.sdo_block_mode = False
+            else:
+                self.sdo_pending = self.tick + self.segmented_sdo_latency
+            self.sdo_response = bytes([(0x80 if complete else 0x00) | self.sdo_sequence_number]) + segment + bytes(7 - len(segment))
+        else:
+            complete = self.sdo_read_bytes == 0
+            n = 7 - len(segment) if complete else 0
+            self.sdo_response = bytes([(self.sdo_toggle << 4) | (n << 1) | int(complete)]) + segment + bytes(7 - len(segment))
+            if complete:
+                self.sdo_active = False
+            else:
+                self.sdo_toggle ^= 1
+        self.sdo_interrupt = True
+
+
+class Bus:
+    """Single CAN bus connecting Node models and an external client"""
+
+    def __init__(self, nodes, bitrate, clock_frequency=24000000):
+        self.nodes = nodes
+        self.bitrate = bitrate
+        self.clock_frequency = clock_frequency
+        self.tick = 0
+        self.queue = [] # External frames, as (tick, frame)
+        self.current = None # (start, end, frame, sender)
+        self.senders = [] # Nodes transmitting the current frame, identical frames started together share the bus
+        self.log = [] # Transmitted frames, as (start, end, frame, sender)
+        self.listeners = [] # Called with each transmitted frame
+
+    def ticks(self, bits):
+        return round(bits * self.clock_frequency / self.bitrate)
+
+    def send(self, frame, tick=None):
+        """Queues a frame from the external client, to be transmitted no earlier than tick"""
+        self.queue.append((self.tick if tick is None else tick, frame))
+        self.queue.sort(key=lambda entry: entry[0])
+
+    def _arbitrate(self):
+        candidates = [(node.tx_frame, node) for node in self.nodes if node.tx_frame is not None]
+        if self.queue and self.queue[0][0] <= self.tick:
+            candidates.append((self.queue[0][1], None))
+        if not candidates:
+            return
+        frame, sender = min(candidates, key=lambda candidate: candidate[0].arbitration_field())
+        if sender is None:
+            self.queue.pop(0)
+        self.senders = [node for node in self.nodes if node.tx_frame is not None and node.tx_frame == frame]
+        self.current = (self.tick, self.tick + self.ticks(frame_length(frame)), frame, sender)
+
+    def run(self, until):
+        """Advances the bus and all nodes to tick until"""
+        while self.tick < until:
+            if self.current is None:
+                self._arbitrate()
+            events = [until] + [node.next_event() for node in self.nodes]
+            if self.current is not None:
+                events.append(self.current[1])
+            elif self.queue:
+                events.append(max(self.queue[0][0], self.tick + 1))
+            tick = min(event for event in events if event is not None and event > self.tick)
+            for node in self.nodes:
+                node.advance(tick)
+            self.tick = tick
+            if self.current is not None and self.current[1] == tick:
+                start, end, frame, sender = self.current
+                self.current = None
+                self.log.append((start, end, frame, sender))
+                for node in self.nodes:
+                    if node in self.senders:
+                        node.acknowledge()
+                    else:
+                        node.receive(frame)
+                for listener in self.listeners:
+                    listener(frame, end)
+
+
+def load(filename, node_id, **kwargs):
+    """Returns a Node modelling the entity generated from an EDS file"""
+    return Node(make_objects(make_od(read_eds(filename))), node_id, **kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("eds", type=str, help="EDS file")
+    parser.add_argument("--node-id", type=lambda x: int(x, 0), default=1, help="Node-ID (default: 1)")
+    parser.add_argument("--bitrate", type=int, default=500000, help="Bit rate in bit/s (default: 500000)")
+    parser.add_argument("--clock", type=int, default=24000000, help="Clock frequency in Hz (default: 24000000)")
+    parser.add_argument("--duration", type=float, default=1.0, help="Simulated time in seconds (default: 1.0)")
+    parser.add_argument("--start", nargs="?", const=True, default=False, type=bool, help="Sends NMT start remote node on boot-up")
+    parser.add_argument("--sync", type=int, default=0, help="Sends SYNC (0x080) from the external client with this period in microseconds")
+    parser.add_argument("--quiet", nargs="?", const=True, default=False, type=bool, help="Only prints the summary")
+    args = parser.parse_args()
+
+    node = load(args.eds, args.node_id, clock_frequency=args.clock)
+    bus = Bus([node], args.bitrate, args.clock)
+    if args.start:
+        bus.listeners.append(lambda frame, tick: bus.send(Frame(0x000, bytes([NMT_NODE_CONTROL_OPERATIONAL, args.node_id]))) if frame == Frame(0x700 + args.node_id, b"\x00") else None)
+    if args.sync > 0:
+        for tick in range(args.clock * args.sync // 1000000, int(args.duration * args.clock), args.clock * args.sync // 1000000):
+            bus.send(Frame(0x080), tick)
+    bus.run(int(args.duration * args.clock))
+
+    counts = {}
+    busy = 0
+    for start, end, frame, sender in bus.log:
+        if not args.quiet:
+            print("{:12.6f} {:12.6f} {} {}".format(start / args.clock, (end - start) / args.clock, "<" if sender is None else ">", frame))
+        counts[frame.id] = counts.get(frame.id, 0) + 1
+        busy += end - start
+    print("COB-ID   Frames   Frames/s")
+    for cob_id in sorted(counts):
+        print("{:03X}    {:7d} {:10.1f}".format(cob_id, counts.get(cob_id), counts.get(cob_id) / args.duration))
+    print("Bus load: {:.2f}%".format(100 * busy / (args.duration * args.clock)))
@@ -0,0 +1,154 @@
+#!/usr/bin/python3
+"""CRC-16-CCITT (XMODEM) of SDO block transfer, as computed by CanOpen.Crc16
+
+crc16() uses binascii.crc_hqx, crc16_table() is a slice-by-8 table
+implementation for reference, and check() cross-checks both against the
+per-byte-count equations of CanOpen.Crc16 parsed from src/CanOpen_pkg.vhd.
+
+Run crc16.py -h for usage
+"""
+import argparse
+import binascii
+import os
+import random
+import re
+import sys
+
+POLYNOMIAL = 0x1021
+
+
+def _make_tables():
+    tables = [[0] * 256 for i in range(8)]
+    for i in range(256):
+        crc = i << 8
+        for j in range(8):
+            crc = ((crc << 1) ^ POLYNOMIAL if crc & 0x8000 else crc << 1) & 0xFFFF
+        tables[0][i] = crc
+    for k in range(1, 8):
+        for i in range(256):
+            crc = tables[k - 1][i]
+            tables[k][i] = ((crc << 8) & 0xFFFF) ^ tables[0][crc >> 8]
+    return tables
+
+
+TABLES = _make_tables() # TABLES[k][i]: CRC of byte i followed by k zero bytes
+
+
+def crc16(data, crc=0):
+    """Returns the CRC of data, continuing from crc"""
+    return binascii.crc_hqx(data, crc)
+
+
+def crc16_table(data, crc=0):
+    """Returns the CRC of data, continuing from crc, eight bytes at a time"""
+    t0, t1, t2, t3, t4, t5, t6, t7 = TABLES
+    view = memoryview(bytes(data))
+    end = len(view) - len(view) % 8
+    for i in range(0, end, 8):
+        b = view[i:i + 8]
+        crc = (
+            t7[b[0] ^ (crc >> 8)] ^ t6[b[1] ^ (crc & 0xFF)] ^ t5[b[2]] ^ t4[b[3]] ^
+            t3[b[4]] ^ t2[b[5]] ^ t1[b[6]] ^ t0[b[7]]
+        )
+    for byte in view[end:]:
+        crc = ((crc << 8) & 0xFFFF) ^ t0[(crc >> 8) ^ byte]
+    return crc
+
+
+def crc16_file(filename, crc=0, chunk_size=1 << 20):
+    """Returns the CRC of the contents of a file, continuing from crc"""
+    with open(filename, "rb") as fp:
+        while True:
+            chunk = fp.read(chunk_size)
+            if not chunk:
+                return crc
+            crc = crc16(chunk, crc)
+
+
+def vhdl_equations(filename):
+    """Returns the equations of CanOpen.Crc16, by byte count, as (d, next_crc)
+
+    d is a list of (width, high, low) terms, MSB first, where high is None for
+    a constant zero; next_crc is a list of (d bits, c bits) per CRC bit.
+    """
+    with open(filename) as fp:
+        vhdl = fp.read()
+    body = vhdl[vhdl.index("function Crc16", vhdl.index("package body")):]
+    body = body[:body.index("end case;")]
+    equations = {}
+    for match in re.finditer(r"when (\d+) =>(.*?)(?=when )", body, re.S):
+        terms = []
+        d = re.search(r"d := (.*?);", match.group(2)).group(1)
+        for term in d.split("&"):
+            term = term.strip()
+            if term == "Data":
+                terms.append((56, 55, 0))
+            elif term.startswith('x"'):
+                terms.append((4 * len(term[2:-1]), None, None))
+            else:
+                high, low = map(int, re.fullmatch(r"Data\((\d+) downto (\d+)\)", term).groups())
+                terms.append((high - low + 1, high, low))
+        next_crc = [None] * 16
+        for bit, expression in re.findall(r"NextCrc\((\d+)\) := (.*?);", match.group(2)):
+            operands = expression.split(" xor ")
+            next_crc[int(bit)] = (
+                [int(operand[2:-1]) for operand in operands if operand.startswith("d(")],
+                [int(operand[2:-1]) for operand in operands if operand.startswith("c(")]
+            )
+        equations[int(match.group(1))] = (terms, next_crc)
+    return equations
+
+
+def vhdl_crc16(equations, data, crc):
+    """Evaluates CanOpen.Crc16 for up to 7 bytes of data, first byte in Data(7 downto 0)"""
+    if len(data) not in equations:
+        return crc
+    value = int.from_bytes(data, "little")
+    terms, next_crc = equations.get(len(data))
+    d = 0
+    for width, high, low in terms:
+        d = (d << width) | (0 if high is None else (value >> low) & ((1 << width) - 1))
+    result = 0
+    for bit, (d_bits, c_bits) in enumerate(next_crc):
+        x = 0
+        for i in d_bits:
+            x ^= (d >> i) & 1
+        for i in c_bits:
+            x ^= (crc >> i) & 1
+        result |= x << bit
+    return result
+
+
+def check(filename, iterations=1000, seed=0):
+    """Cross-checks crc16() and crc16_table() against CanOpen.Crc16, returns the number of mismatches"""
+    equations = vhdl_equations(filename)
+    if sorted(equations) != list(range(1, 8)):
+        raise ValueError("Expected equations for 1 to 7 bytes, found {}".format(sorted(equations)))
+    rng = random.Random(seed)
+    errors = 0
+    for i in range(iterations):
+        crc = rng.randrange(1 << 16)
+        segments = [bytes(rng.randrange(256) for j in range(rng.randrange(1, 8))) for k in range(rng.randrange(1, 20))]
+        vhdl = crc
+        for segment in segments:
+            vhdl = vhdl_crc16(equations, segment, vhdl)
+        data = b"".join(segments)
+        if not vhdl == crc16(data, crc) == crc16_table(data, crc):
+            print("Mismatch for {} from 0x{:04X}: CanOpen.Crc16 0x{:04X}, crc16 0x{:04X}, crc16_table 0x{:04X}".format(data.hex(), crc, vhdl, crc16(data, crc), crc16_table(data, crc)))
+            errors += 1
+    return errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", type=str, nargs="*", help="Files to compute the CRC of")
+    parser.add_argument("--check", nargs="?", const=os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "CanOpen_pkg.vhd"), default=None, type=str, help="Cross-checks against CanOpen.Crc16 in the given VHDL file (default: src/CanOpen_pkg.vhd)")
+    args = parser.parse_args()
+
+    if args.check:
+        errors = check(args.check)
+        print("CanOpen.Crc16 cross-check: {}".format("{:d} mismatches".format(errors) if errors else "passed"))
+        if errors:
+            sys.exit(1)
+    for filename in args.files:
+        print("0x{:04X} {}".format(crc16_file(filename), filename))
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+"""Estimates the bus load and worst-case response times of the periodic
+messages produced by the node generated from an EDS
+
+Run eds2load.py -h for usage
+"""
+import argparse
+import math
+import sys
+
+from canopenmodel import Frame, frame_length
+from objectdictionary import default_value, make_objects, make_od, read_eds
+
+parser = argparse.ArgumentParser()
+parser.add_argument("eds", type=str, help="EDS file")
+parser.add_argument("--node-id", type=lambda x: int(x, 0), default=1, help="Node-ID (default: 1)")
+parser.add_argument("--bitrate", type=int, default=500000, help="Bit rate in bit/s (default: 500000)")
+parser.add_argument("--target", type=float, default=50.0, help="Maximum worst-case bus load in percent (default: 50)")
+parser.add_argument("--event-interval", type=float, default=0.0, help="Minimum interval between application events in ms, for event-driven TPDOs without inhibit time (default: event timer)")
+args = parser.parse_args()
+
+objects = make_objects(make_od(read_eds(args.eds)))
+
+
+def value(mux):
+    obj = objects.get(mux)
+    if obj is None:
+        return 0
+    v = default_value(obj, args.node_id)
+    return 0 if v is None else v
+
+
+def worst_case_length(frame):
+    """Returns the bit times of a frame with the maximum number of stuff bits, including intermission"""
+    stuffed = (54 if frame.ide else 34) + 8 * frame.dlc
+    return stuffed + (stuffed - 1) // 4 + 13
+
+
+messages = [] # (frame, name, worst-case period in us, average period in us)
+notes = []
+
+cob_id = value(0x100500)
+period = value(0x100600)
+overflow = value(0x101900)
+if cob_id & (1 << 30) and period > 0:
+    frame = Frame(cob_id & 0x1FFFFFFF, bytes(1 if 2 <= overflow <= 240 else 0), ide=bool(cob_id & (1 << 29)))
+    messages.append((frame, "SYNC", period, period))
+
+for i in range(4):
+    if ((0x1800 + i) << 8) + 1 not in objects: continue
+    cob_id = value(((0x1800 + i) << 8) + 1)
+    if cob_id & (1 << 31): continue
+    name = "TPDO{:d}".format(i + 1)
+    transmission_type = value(((0x1800 + i) << 8) + 2)
+    inhibit_time = value(((0x1800 + i) << 8) + 3) * 100 # us
+    event_timer = value(((0x1800 + i) << 8) + 5) * 1000 # us
+    length = 0
+    for sub in range(1, 0x41):
+        if ((0x1A00 + i) << 8) + sub not in objects: break
+        length += value(((0x1A00 + i) << 8) + sub) & 0xFF
+    frame = Frame(cob_id & 0x1FFFFFFF, bytes(math.ceil(length / 8)), ide=bool(cob_id & (1 << 29)))
+    if transmission_type <= 240:
+        if period == 0:
+            notes.append("{}: synchronous, but Communication cycle period is 0".format(name))
+            continue
+        n = max(transmission_type, 1)
+        if transmission_type == 0:
+            notes.append("{}: acyclic synchronous, assumed to be transmitted every SYNC".format(name))
+        messages.append((frame, name, n * period, n * period))
+    elif transmission_type in [0xFC, 0xFD]:
+        notes.append("{}: RTR-only, not included".format(name))
+    else:
+        if inhibit_time > 0:
+            worst_case = inhibit_time
+        elif args.event_interval > 0:
+            worst_case = args.event_interval * 1000
+        elif event_timer > 0:
+            worst_case = event_timer
+            notes.append("{}: no inhibit time, application events assumed no more frequent than the event timer".format(name))
+        else:
+            notes.append("{}: no inhibit time or event timer, rate is unbounded and not included".format(name))
+            continue
+        average = event_timer if event_timer > 0 else worst_case
+        messages.append((frame, name, min(worst_case, average), average))
+
+heartbeat = value(0x101700) * 1000
+if heartbeat > 0:
+    messages.append((Frame(0x700 + args.node_id, bytes(1)), "Heartbeat", heartbeat, heartbeat))
+
+notes.append("EMCY and SDO traffic is sporadic and not included")
+
+# Response-time analysis (Davis et al., "Controller Area Network (CAN) schedulability analysis: Refuted, revisited and revised", sufficient test with jitter of zero)
+bit_time = 1e6 / args.bitrate # us
+messages.sort(key=lambda message: message[0].arbitration_field())
+costs = [worst_case_length(message[0]) * bit_time for message in messages]
+schedulable = True
+print("COB-ID     Name       DLC Bits    Min (ms)   Avg (ms)  Frames/s  Load (%)  Response (us)")
+worst_case_load = 0
+average_load = 0
+for m, (frame, name, worst_case, average) in enumerate(messages):
+    blocking = max(costs[m:])
+    w = blocking
+    while True:
+        w_next = blocking + sum(math.ceil((w + bit_time) / messages[k][2]) * costs[k] for k in range(m))
+        if w_next == w or w_next + costs[m] > worst_case:
+            break
+        w = w_next
+    response = w_next + costs[m]
+    worst_case_load += costs[m] / worst_case
+    average_load += frame_length(frame) * bit_time / average
+    flag = ""
+    if response > worst_case:
+        schedulable = False
+        flag = " missed"
+    print("{:<10} {:<10} {:3d} {:3d}-{:3d} {:9.3f} {:10.3f} {:9.1f} {:9.2f} {:14.1f}{}".format(
+        ("{:08X}" if frame.ide else "{:03X}").format(frame.id),
+        name,
+        frame.dlc,
+        frame_length(frame),
+        worst_case_length(frame),
+        worst_case / 1000,
+        average / 1000,
+        1e6 / average,
+        100 * costs[m] / worst_case,
+        response,
+        flag
+    ))
+for note in notes:
+    print("Note: " + note)
+print("Average bus load: {:.2f}%".format(100 * average_load))
+print("Worst-case bus load: {:.2f}%".format(100 * worst_case_load))
+if not schedulable:
+    print("Error: response time exceeds period")
+if 100 * worst_case_load > args.target:
+    print("Error: worst-case bus load exceeds target of {:.1f}%".format(args.target))
+if not schedulable or 100 * worst_case_load > args.target:
+    sys.exit(1)
@@ -2,43 +2,67 @@
 """Generates a MEM file
 
 Can be used as a generic memory generator, but targeted for CANopen EDS files
-to be sent via SDO
+to be sent via SDO.  write_mem() is also used by eds2vhdl.py --eds-mem.
 
 Run eds2mem.py -h for usage"""
 import argparse
 import math
 from sys import argv
 
-parser = argparse.ArgumentParser()
-parser.add_argument("input_file", type=str, help="input file")
-parser.add_argument("mem_file", type=str, help="output MEM file")
-parser.add_argument("--word", nargs="?", const=True, default=7, type=int, help="Word size, in bytes")
-parser.add_argument("--zlib", nargs="?", const=True, default=0, type=int, help="Compresses input_file using zlib with given level (0-9)")
-args = parser.parse_args()
-
-with open(args.input_file, "rb") as fp:
-    data = fp.read()
-
-if args.zlib > 0:
-    import zlib
-    before = len(data)
-    data = zlib.compress(data, args.zlib)
-    print("Compressed to {:.1f}%".format(len(data) / before * 100))
-
-addr_format = "@{:0" + "{}".format(math.ceil(math.ceil(math.log(len(data), 2)) / 4)) + "X} "
-data_format = "{:0{" + "{}".format(args.word * 2) + "}X}\n"
-
-with open(args.mem_file, "w") as fp:
-    fp.write("// Generated with " + " ".join(argv) + "\n")
-    fp.write("// {} bytes valid\n".format(len(data)))
-    for i in range(0, len(data), args.word):
-        fp.write(addr_format.format(int(i / args.word)))
-        for j in reversed(range(args.word)):
-            if i+j >= len(data):
-                b = 0
-            else:
-                b = data[i + j]
-            fp.write("{:02X}".format(b))
-        fp.write("\n")
-
-print("{} written with {} bytes".format(args.mem_file, len(data)))
+from crc16 import crc16
+
+
+def write_mem(data, mem_file, word=7, crc=False, page_size=0):
+    """Writes data to a MEM file of word-byte words, first byte in the lowest byte of a word
+
+    With crc, the CRC-16 of data (as in SDO block transfer) is added to the header.
+    With a page_size, data is padded to whole pages with 0xFF (erased flash).
+    Returns the number of bytes written, padding included.
+    """
+    valid = len(data)
+    if page_size > 0:
+        pages = math.ceil(len(data) / page_size)
+        data += b"\xFF" * (pages * page_size - len(data)) # Erased flash
+        print("Padded to {} pages of {} bytes".format(pages, page_size))
+
+    addr_format = "@{:0" + "{}".format(math.ceil(math.ceil(math.log(len(data), 2)) / 4)) + "X} "
+
+    with open(mem_file, "w") as fp:
+        fp.write("// Generated with " + " ".join(argv) + "\n")
+        fp.write("// {} bytes valid\n".format(valid))
+        if crc:
+            fp.write("// CRC-16 0x{:04X}\n".format(crc16(data[:valid])))
+        for i in range(0, len(data), word):
+            fp.write(addr_format.format(int(i / word)))
+            for j in reversed(range(word)):
+                if i+j >= len(data):
+                    b = 0
+                else:
+                    b = data[i + j]
+                fp.write("{:02X}".format(b))
+            fp.write("\n")
+    return len(data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_file", type=str, help="input file")
+    parser.add_argument("mem_file", type=str, help="output MEM file")
+    parser.add_argument("--word", nargs="?", const=True, default=7, type=int, help="Word size, in bytes (1 to 64; 7 for SDO segments, up to 64 for CAN FD USDO segments)")
+    parser.add_argument("--zlib", nargs="?", const=True, default=0, type=int, help="Compresses input_file using zlib with given level (0-9)")
+    parser.add_argument("--crc", nargs="?", const=True, default=False, type=bool, help="Adds the CRC-16 of the valid bytes (as in SDO block transfer) to the header")
+    parser.add_argument("--page-size", type=int, default=0, help="Pads to whole flash pages of this many bytes with 0xFF, as for 0x1F50 program download")
+    args = parser.parse_args()
+    if not 1 <= args.word <= 64:
+        parser.error("--word must be in the range 1 to 64")
+
+    with open(args.input_file, "rb") as fp:
+        data = fp.read()
+
+    if args.zlib > 0:
+        import zlib
+        before = len(data)
+        data = zlib.compress(data, args.zlib)
+        print("Compressed to {:.1f}%".format(len(data) / before * 100))
+
+    print("{} written with {} bytes".format(args.mem_file, write_mem(data, args.mem_file, args.word, args.crc, args.page_size)))
@@ -0,0 +1,217 @@
+#!/usr/bin/python
+"""Estimates the flip-flops, LUTs and block RAMs of the entity generated from
+an EDS, and the logic levels of its SDO object multiplexer, before synthesis
+
+Estimates assume 6-input LUTs and 18 Kb block RAMs, and are meant to catch
+object dictionary changes that exceed a budget, not to replace synthesis.
+
+Run eds2resources.py -h for usage
+"""
+import argparse
+import math
+import os
+import sys
+
+from objectdictionary import make_objects, make_od, parse_cob_id, read_eds
+
+parser = argparse.ArgumentParser()
+parser.add_argument("eds", type=str, help="EDS file")
+parser.add_argument("--sdo-table", nargs="?", const=True, default=False, type=bool, help="Estimates the entity generated with --sdo-table")
+parser.add_argument("--register-file", nargs="?", const=True, default=False, type=bool, help="Estimates the entity generated with --register-file (implies --sdo-table)")
+parser.add_argument("--heartbeat-engine", nargs="?", const=True, default=False, type=bool, help="Estimates the entity generated with --heartbeat-engine")
+parser.add_argument("--timer-service", nargs="?", const=True, default=False, type=bool, help="Estimates the entity generated with --timer-service")
+parser.add_argument("--channels", type=int, default=1, help="Estimates the entity generated with --channels (default: 1)")
+parser.add_argument("--port", nargs="+", action="extend", type=lambda x: int(x, 0), default=[], help="Object dictionary multiplexers exposed as in ports, as passed to eds2vhdl.py")
+parser.add_argument("--clock-frequency", type=float, default=50e6, help="Frequency of Clock in Hz, for the timer prescalers (default: 50e6)")
+parser.add_argument("--domain-size", type=int, default=0, help="Bytes of each DOMAIN object other than 0x1021, held in a SegmentedSdo ROM (default: 0, not counted)")
+parser.add_argument("--luts", type=int, default=0, help="LUT budget (default: none)")
+parser.add_argument("--ffs", type=int, default=0, help="Flip-flop budget (default: none)")
+parser.add_argument("--brams", type=int, default=0, help="18 Kb block RAM budget (default: none)")
+parser.add_argument("--levels", type=int, default=8, help="Maximum logic levels of the SDO object multiplexer (default: 8)")
+parser.add_argument("--warn", type=float, default=80.0, help="Warns when an estimate exceeds this percentage of its budget (default: 80)")
+args = parser.parse_args()
+if args.register_file:
+    args.sdo_table = True
+
+od = make_od(read_eds(args.eds))
+objects = make_objects(od)
+
+# Same object placement as eds2vhdl.py
+tpdo_mapped = []
+for i in range(4):
+    if 0x1A00 + i not in od: continue
+    subs = od.get(0x1A00 + i).get("subs")
+    for odsi in subs:
+        if odsi == 0: continue
+        tpdo_mapped.append(parse_cob_id(subs.get(odsi).get("defaultvalue")) >> 8)
+if 0x100200 not in args.port:
+    args.port.append(0x100200)
+application_registers = set()
+if args.register_file and 0x120001 in objects:
+    application_registers = {mux for mux in objects if mux >= 0x200000 and objects.get(mux).get("access_type") in ["rw", "wo"] and 0 < objects.get(mux).get("bit_length") <= 32 and mux not in tpdo_mapped}
+
+
+def mux_luts(n, width):
+    """LUTs of an n:1 multiplexer of width bits (a LUT6 and the slice muxes select 1 of 4)"""
+    return width * math.ceil((n - 1) / 3) if n > 1 else 0
+
+
+def mux_levels(n):
+    return max(math.ceil(math.log(n, 4)), 1) if n > 1 else 0
+
+
+def compare_luts(bits):
+    """LUTs of an equality or magnitude comparator"""
+    return math.ceil(bits / 3)
+
+
+def bram18(depth, width):
+    """18 Kb block RAMs of a depth x width memory, in the aspect ratio needing the fewest"""
+    if depth == 0 or width == 0:
+        return 0
+    return min(math.ceil(width / w) * math.ceil(depth / d) for d, w in [(16384, 1), (8192, 2), (4096, 4), (2048, 9), (1024, 18), (512, 36)])
+
+
+sections = [] # (name, flip-flops, LUTs, block RAMs)
+notes = []
+
+# CanLite, state machine, frame buffers, NMT, EMCY and SDO protocol logic, independent of the object dictionary
+sections.append(("Fixed logic", 1000, 1500, 0))
+
+# Timers
+tpdos = len([i for i in range(4) if ((0x1800 + i) << 8) + 0x01 in objects])
+prescaler = math.ceil(math.log2(max(args.clock_frequency / 1e6, 2))) + 7 + 4 # Microsecond, 100 us and millisecond counters
+ffs = prescaler + 48 # and Timestamp
+luts = prescaler + 48
+service_timers = 0
+if 0x101700 in objects:
+    if args.timer_service:
+        service_timers += 1
+    else:
+        ffs += 16
+        luts += 16 + compare_luts(16)
+if 0x100500 in objects and 0x100600 in objects:
+    if args.timer_service:
+        service_timers += 1
+    else:
+        ffs += 32 # SYNC producer counter
+        luts += 32 + compare_luts(32)
+    ffs += 8 # Synchronous counter
+    luts += 8
+sections.append(("Timers", ffs, luts, 0))
+tpdo_timer_ffs = 16 + 16 + 32 # Event, inhibit and synchronous window timers of each TPDO
+tpdo_timer_luts = 3 * 16 + 32 + 3 * compare_luts(16) + compare_luts(32)
+if args.timer_service:
+    tpdo_timer_ffs = 0
+    tpdo_timer_luts = 0
+    service_timers += (1 if 0x100700 in objects else 0) + len([mux for mux in objects if (mux >> 8) in range(0x1800, 0x1804) and mux & 0xFF in [0x03, 0x05] and ((mux & 0xFFFF00) | 0x02) in objects])
+if service_timers:
+    # Free-running timestamp, deadline RAM, shared period multiplexer, adders and compare, and the arm, expired and event bits
+    sections.append(("Timer service ({:d})".format(service_timers), 32 + 3 * service_timers + math.ceil(math.log2(service_timers + 1)), 32 + 2 * 33 * math.ceil(service_timers / 64) + mux_luts(service_timers, 32) + 3 * 32 + 2 * 26 + 2 * service_timers, 0))
+
+# Heartbeat consumers: a timer per consumer, or a state RAM, the Node-ID flags and one shared update
+heartbeat_consumers = len([mux for mux in objects if mux >> 8 == 0x1016 and mux & 0xFF > 0])
+if heartbeat_consumers > 0 and args.heartbeat_engine:
+    sections.append(("Heartbeat consumer engine ({:d})".format(heartbeat_consumers), 128 + 2 * 7 + 32 + 18 + 5, 128 + mux_luts(heartbeat_consumers, 24) + 16 + 2 * compare_luts(16) + compare_luts(8) + 2 * 18 * math.ceil(heartbeat_consumers / 64), 0))
+elif heartbeat_consumers > 0:
+    sections.append(("Heartbeat consumers ({:d})".format(heartbeat_consumers), heartbeat_consumers * (16 + 3), heartbeat_consumers * (16 + 2 * compare_luts(16) + compare_luts(8) + compare_luts(7)), 0))
+
+# RPDO deadline monitoring: a state RAM, one shared update and the timeout bits
+rpdo_timers = [i for i in range(1, 0x201) if ((0x1400 + i - 1) << 8) + 0x01 in objects and ((0x1400 + i - 1) << 8) + 0x05 in objects]
+if rpdo_timers:
+    n = len(rpdo_timers)
+    index_bits = math.ceil(math.log2(n + 2))
+    ffs = rpdo_timers[-1] + 3 * index_bits + 32 + 16 + 18 + 29 + 2 + 5
+    luts = mux_luts(n, 48) + compare_luts(29) + 2 * compare_luts(16) + 16 + rpdo_timers[-1] // 2
+    if n <= 64:
+        sections.append(("RPDO deadline monitoring ({:d})".format(n), ffs, luts + 2 * 18 * math.ceil(n / 64), 0))
+    else:
+        sections.append(("RPDO deadline monitoring ({:d})".format(n), ffs, luts, bram18(n, 18)))
+    notes.append("Received frames are held for up to {:d} Clock cycles by RPDO matching".format(n + 2))
+
+# CAN channels: a CanLite (about 300 FFs and 450 LUTs), RX and TX frame registers and FIFO flags per additional channel, the RX arbiter and TX channel mask
+if args.channels > 1:
+    sections.append(("CAN channels ({:d})".format(args.channels), (args.channels - 1) * (300 + 2 * 76 + 2) + 76 + 2 * args.channels + 6, (args.channels - 1) * (450 + 76 // 2) + 76 * math.ceil(args.channels / 4) + 4 * args.channels, 0))
+
+# TPDOs: data register, sync counter, and event, inhibit and synchronous window timers unless in the timer service
+sections.append(("TPDOs", tpdos * (64 + 8 + tpdo_timer_ffs), tpdos * (tpdo_timer_luts + 64 // 2), 0))
+
+# Object registers: communication objects and _q buffers of rw application objects are registers, wo application objects add a strobe
+ffs = 0
+luts = 0
+writable = 0
+for mux, obj in objects.items():
+    bit_length = obj.get("bit_length")
+    if mux in application_registers or bit_length == 0: continue
+    if bit_length > 32: # Upload only, so only the _q buffer of an rw application object is a register
+        ffs += bit_length if obj.get("access_type") == "rw" and mux >= 0x200000 else 0
+        continue
+    if obj.get("access_type") in ["rw", "wo"] and mux not in args.port:
+        ffs += bit_length + (1 if obj.get("access_type") == "wo" and mux >= 0x200000 else 0)
+        writable += 1
+        for key in ["low_limit_value", "high_limit_value"]:
+            if obj.get(key) is not None:
+                luts += 2 * compare_luts(bit_length) # In the SDO server and the register process
+sections.append(("Object registers ({:d})".format(writable), ffs, luts, 0))
+
+# SDO object decoding
+if 0x120001 in objects:
+    n = len(objects)
+    if args.sdo_table:
+        values = len([mux for mux, obj in objects.items() if 0 < obj.get("bit_length") <= 32 and mux not in application_registers])
+        address_width = max(math.ceil(math.log2(max(values + len(application_registers), 2))), 1)
+        width = 24 + 2 + 3 + 6 + 3 + 32 + 32 + address_width # SdoObjectDescriptor
+        search = math.ceil(math.log2(n + 1))
+        rom = width * math.ceil(n / 64) + mux_luts(math.ceil(n / 64), width)
+        sections.append(("SDO descriptor ROM ({:d} x {:d})".format(n, width), 0, rom, 0))
+        sections.append(("SDO lookup and values", width + 3 * math.ceil(math.log2(n + 1)) + 32, compare_luts(24) + 3 * (math.ceil(math.log2(n + 1)) + 1) + mux_luts(values, 32) + writable * compare_luts(address_width), 0))
+        levels = math.ceil(math.log(max(n, 2), 64)) + mux_levels(math.ceil(n / 64)) + 2 # Address decode, ROM, compare
+        latency = search + 2
+    else:
+        sections.append(("SDO case decode ({:d} arms)".format(n), 0, n * compare_luts(24) + writable * compare_luts(24), 0))
+        sections.append(("SDO upload multiplexer", 0, mux_luts(n, 32), 0))
+        levels = 2 + mux_levels(n) # Mux decode, then multiplexer tree
+        latency = 1
+else:
+    levels = 0
+    latency = 0
+    notes.append("No SDO server (0x1200 sub-index 1)")
+
+if application_registers:
+    n = len(application_registers)
+    if n <= 64:
+        sections.append(("Register file ({:d} x 32, distributed)".format(n), 32, 2 * 32 * math.ceil(n / 64), 0))
+    else:
+        sections.append(("Register file ({:d} x 32)".format(n), 32, 0, bram18(n, 32)))
+
+# Segmented SDO adapters (SegmentedSdoXpmRom) of DOMAIN objects
+for mux, obj in objects.items():
+    if obj.get("bit_length") != 0: continue
+    size = os.path.getsize(args.eds) if mux == 0x102100 else args.domain_size
+    if size == 0:
+        notes.append("DOMAIN 0x{:06X} {}: no --domain-size, not counted".format(mux, obj.get("parameter_name")))
+        continue
+    words = math.ceil(size / 7)
+    sections.append(("DOMAIN 0x{:06X} ROM ({:d} x 56)".format(mux, words), 100, 60, bram18(words, 56)))
+
+print("Section                                  FFs     LUTs  BRAM18")
+for name, ffs, luts, brams in sections:
+    print("{:<36} {:8d} {:8d} {:7d}".format(name, ffs, luts, brams))
+totals = [sum(section[i] for section in sections) for i in range(1, 4)]
+print("{:<36} {:8d} {:8d} {:7d}".format("Total", *totals))
+print("SDO object multiplexer: {:d} logic levels, response {:d} Clock cycles after the request is read".format(levels, latency))
+for note in notes:
+    print("Note: " + note)
+
+errors = False
+for name, total, budget in zip(["Flip-flop", "LUT", "Block RAM"], totals, [args.ffs, args.luts, args.brams]):
+    if budget <= 0: continue
+    if total > budget:
+        print("Error: {} estimate {:d} exceeds budget of {:d}".format(name, total, budget))
+        errors = True
+    elif 100 * total > args.warn * budget:
+        print("Warning: {} estimate {:d} is {:.0f}% of budget of {:d}".format(name, total, 100 * total / budget, budget))
+if levels > args.levels:
+    print("Warning: SDO object multiplexer has {:d} logic levels, more than {:d}{}".format(levels, args.levels, "" if args.sdo_table else "; consider --sdo-table"))
+if errors:
+    sys.exit(1)
@@ -0,0 +1,202 @@
+#!/usr/bin/python
+"""Generates the entities for a set of CANopen nodes and a VHDL top-level
+wrapper connecting them to a shared CAN bus or to separate CAN ports
+
+Each distinct EDS is parsed here for the entity name and the COB-ID collision
+check, and generated once by running eds2vhdl.py, which parses it again.
+
+Run eds2system.py -h for usage; unrecognized arguments are passed to eds2vhdl.py
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from sys import argv
+
+from objectdictionary import default_value, make_entity_name, make_objects, make_od, read_eds
+
+parser = argparse.ArgumentParser(epilog="Unrecognized arguments are passed to eds2vhdl.py")
+parser.add_argument("nodes", type=str, nargs="+", help="EDS file and Node-ID of each node, separated by a colon (sample.eds:0x10, e.g.)")
+parser.add_argument("--name", type=str, default="CanOpenSystem", help="Top-level entity name (default: CanOpenSystem)")
+parser.add_argument("--separate", nargs="?", const=True, default=False, type=bool, help="Connects each node to its own CanRx/CanTx port pair instead of a shared CAN bus")
+args, eds2vhdl_args = parser.parse_known_args()
+if any(arg.startswith("--channels") or arg.startswith("--tpdo-channels") for arg in eds2vhdl_args):
+    parser.error("--channels and --tpdo-channels are not supported; use --separate to give each node its own CAN port")
+
+name = args.name
+if re.fullmatch(r"[A-Za-z](_?[A-Za-z0-9])*", name) is None:
+    raise ValueError("{} is not a VHDL identifier".format(name))
+
+nodes = []
+for node in args.nodes:
+    eds, sep, node_id = node.rpartition(":")
+    if sep == "":
+        raise ValueError("Node {} must be an EDS file and Node-ID separated by a colon".format(node))
+    node_id = int(node_id, 0)
+    if node_id < 1 or node_id > 127:
+        raise ValueError("Node-ID {} must be in the range 1 to 127".format(node_id))
+    if node_id in [n.get("node_id") for n in nodes]:
+        raise ValueError("Node-ID {:d} is used by more than one node".format(node_id))
+    nodes.append({"eds": eds, "node_id": node_id, "instance": "Node{:d}".format(node_id)})
+
+# Parse each distinct EDS once for the checks below; eds2vhdl.py parses it again to generate it
+models = {}
+for node in nodes:
+    path = os.path.realpath(node.get("eds"))
+    if path not in models:
+        eds = read_eds(node.get("eds"))
+        models[path] = {
+            "eds": node.get("eds"),
+            "entity_name": make_entity_name(eds),
+            "objects": make_objects(make_od(eds))
+        }
+    node["model"] = models.get(path)
+
+entity_names = {}
+for model in models.values():
+    if model.get("entity_name") in entity_names:
+        raise ValueError("{} and {} would both generate entity {}".format(entity_names.get(model.get("entity_name")), model.get("eds"), model.get("entity_name")))
+    entity_names[model.get("entity_name")] = model.get("eds")
+
+# COB-ID collision check
+def cob_ids(node):
+    objects = node.get("model").get("objects")
+    channels = []
+    def add(mux, channel):
+        if mux not in objects: return
+        cob_id = default_value(objects.get(mux), node.get("node_id"))
+        if cob_id & (1 << 31): return
+        channels.append((cob_id & 0x3FFFFFFF, channel))
+    if 0x100500 in objects and default_value(objects.get(0x100500), node.get("node_id")) & (1 << 30):
+        add(0x100500, "SYNC")
+    add(0x101400, "EMCY")
+    for i in range(4):
+        add(((0x1800 + i) << 8) + 1, "TPDO{:d}".format(i + 1))
+    add(0x120001, "SDO (rx)")
+    add(0x120002, "SDO (tx)")
+    channels.append((0x700 + node.get("node_id"), "NMT error control"))
+    return channels
+
+used = {}
+collisions = []
+for node in nodes:
+    for cob_id, channel in cob_ids(node):
+        key = (cob_id & ~(1 << 30), bool(cob_id & (1 << 29))) # RTR-allowed bit does not affect the identifier
+        owner = "{} {}".format(node.get("instance"), channel)
+        if key in used:
+            collisions.append("COB-ID 0x{:X} is used by {} and {}".format(key[0] & 0x1FFFFFFF, used.get(key), owner))
+        else:
+            used[key] = owner
+if collisions:
+    for collision in collisions:
+        print("Error: " + collision)
+    sys.exit(1)
+
+# Generate each entity once, in an eds2vhdl.py process
+ports = {}
+port_re = re.compile(r"^\s*(\\[^\\]+\\|\w+)\s*:\s*(in|out)\s+([^;]+?)\s*;?\s*(--.*)?$")
+for model in models.values():
+    subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "eds2vhdl.py"), model.get("eds")] + eds2vhdl_args, check=True)
+    with open(model.get("entity_name") + ".vhd") as fp:
+        vhdl = fp.read()
+    entity = vhdl[vhdl.index("entity " + model.get("entity_name") + " is"):vhdl.index("end entity " + model.get("entity_name") + ";")]
+    entity = entity[entity.index("port ("):]
+    ports[model.get("entity_name")] = []
+    for line in entity.splitlines():
+        m = port_re.match(line)
+        if m is not None:
+            ports.get(model.get("entity_name")).append({"name": m.group(1), "direction": m.group(2), "data_type": m.group(3)})
+
+def prefixed(instance, port_name):
+    if port_name.startswith("\\"):
+        return "\\" + instance + "_" + port_name[1:]
+    return instance + "_" + port_name
+
+shared_ports = ["Clock", "Reset_n", "CanRx", "CanTx", "NodeId"]
+
+fp = open(name + ".vhd", "w")
+fp.write("-- Generated with " + " ".join(argv) + "\n")
+fp.write("""library ieee;
+    use ieee.std_logic_1164.all;
+    use ieee.std_logic_misc.all;
+    use ieee.numeric_std.all;
+
+use work.CanBus;
+use work.CanOpen;
+
+entity {0} is
+    generic (
+        CLOCK_FREQUENCY : positive -- Frequency of Clock in Hz
+    );
+    port (
+        -- Common signals
+        Clock       : in  std_logic;
+        Reset_n     : in  std_logic;
+""".format(name))
+if args.separate:
+    for node in nodes:
+        fp.write("""
+        {0}_CanRx : in std_logic;
+        {0}_CanTx : out std_logic;""".format(node.get("instance")))
+    fp.write("\n")
+else:
+    fp.write("""
+        CanRx       : in std_logic;
+        CanTx       : out std_logic;
+""")
+lines = []
+for node in nodes:
+    lines.append("")
+    lines.append("        -- {} ({}, Node-ID {:d})".format(node.get("instance"), node.get("model").get("entity_name"), node.get("node_id")))
+    for port in ports.get(node.get("model").get("entity_name")):
+        if port.get("name") in shared_ports: continue
+        lines.append("        {} : {} {};".format(prefixed(node.get("instance"), port.get("name")), port.get("direction"), port.get("data_type")))
+lines[-1] = lines[-1].rstrip(";")
+fp.write("\n".join(lines) + """
+    );
+end entity {0};
+
+architecture Structural of {0} is
+""".format(name))
+if not args.separate:
+    fp.write("""    signal CanTxs   : std_logic_vector(0 to {:d}); -- CanTx of each node
+    signal CanBusLevel : std_logic; -- Wired-AND of CanRx and the CanTx of each node
+""".format(len(nodes) - 1))
+for node in nodes:
+    fp.write("    signal {}_NodeId : std_logic_vector(6 downto 0);\n".format(node.get("instance")))
+fp.write("begin\n")
+if not args.separate:
+    fp.write("""    CanBusLevel <= CanRx and and_reduce(CanTxs);
+    CanTx <= and_reduce(CanTxs);
+""")
+for node in nodes:
+    fp.write("    {}_NodeId <= std_logic_vector(to_unsigned({:d}, 7));\n".format(node.get("instance"), node.get("node_id")))
+for i, node in enumerate(nodes):
+    instance = node.get("instance")
+    fp.write("""
+    {0} : entity work.{1}
+        generic map (
+            CLOCK_FREQUENCY => CLOCK_FREQUENCY
+        )
+        port map (
+            Clock => Clock,
+            Reset_n => Reset_n,
+            CanRx => {2},
+            CanTx => {3},
+            NodeId => {0}_NodeId""".format(
+        instance,
+        node.get("model").get("entity_name"),
+        instance + "_CanRx" if args.separate else "CanBusLevel",
+        instance + "_CanTx" if args.separate else "CanTxs({:d})".format(i)
+    ))
+    for port in ports.get(node.get("model").get("entity_name")):
+        if port.get("name") in shared_ports: continue
+        fp.write(",\n            {} => {}".format(port.get("name"), prefixed(instance, port.get("name"))))
+    fp.write("""
+        );
+""")
+fp.write("end architecture Structural;\n")
+fp.close()
+
+print("{} written with {:d} nodes of {:d} entities".format(name + ".vhd", len(nodes), len(models)))
@@ -4,146 +4,155 @@
 Run eds2vhdl.py -h for usage
 """
 import argparse
-from configparser import ConfigParser
+import io
 import math
 import re
 from sys import argv
 
+from eds2mem import write_mem
+from objectdictionary import default_value, format_constant, format_signal, format_value, make_entity_name, make_objects, make_od, parse_cob_id, read_eds, write_eds
+
+CAN_CONTROLLER_DATA_BYTES = {"CanLite": 8} # Most data bytes of a frame; 64 for a CAN FD controller
+
 parser = argparse.ArgumentParser()
 parser.add_argument("eds", type=str, help="EDS file")
 parser.add_argument("--sync", nargs="?", const=True, default=False, type=bool, help="Adds output signal for single-clock pulse when SYNC is received")
 parser.add_argument("--gfc", nargs="?", const=True, default=False, type=bool, help="Adds output signal for single-clock pulse when GFC is received")
 parser.add_argument("--timestamp", nargs="?", const=True, default=False, type=bool, help="Adds output signal for TIME object")
+parser.add_argument("--sdo-stream", nargs="?", const=True, default=False, type=bool, help="Transfers a segment on each Clock with SegmentedSdoReadDataEnable and SegmentedSdoDataValid high, and prefetches the next segment while one is sent")
+parser.add_argument("--program-block-size", type=int, default=127, help="Sub-block size, in segments, of 0x1F50 program download, at most BLOCK_SIZE of the flash writer (default: 127)")
+parser.add_argument("--lss", nargs="?", const=True, default=False, type=bool, help="Adds an LSS slave (CiA 305) with Fastscan; a NodeId of 0 waits for a node-ID to be configured by LSS")
+parser.add_argument("--sdo-table", nargs="?", const=True, default=False, type=bool, help="Uses a descriptor ROM with a pipelined lookup in the SDO server instead of a case statement per object")
+parser.add_argument("--register-file", nargs="?", const=True, default=False, type=bool, help="Packs rw and wo application objects into a dual-port register file with an address/data port (implies --sdo-table)")
+parser.add_argument("--arrays", nargs="?", const=True, default=False, type=bool, help="Emits ARRAY objects at 0x2000 and above, with sub-indices of one data type and access type, as one port indexed by sub-index")
+parser.add_argument("--heartbeat-engine", nargs="?", const=True, default=False, type=bool, help="Updates heartbeat consumers round-robin from a state RAM instead of with a timer per consumer")
+parser.add_argument("--can-controller", choices=["CanLite"], default="CanLite", help="CAN controller instantiated by the entity (default: CanLite, classic CAN)")
+parser.add_argument("--pdo-bytes", type=int, choices=[8, 12, 16, 20, 24, 32, 48, 64], default=8, help="Data bytes of a PDO, above 8 for CANopen FD (CiA 1301), which requires a CAN FD --can-controller (default: 8)")
+parser.add_argument("--bitrate", type=float, help="CAN bit rate in bit/s; sets the CanLite timing generics for --clock-frequency (1e6, e.g.)")
+parser.add_argument("--clock-frequency", type=float, help="With --bitrate, frequency of Clock in Hz, which CLOCK_FREQUENCY must match")
+parser.add_argument("--sample-point", type=float, default=87.5, help="With --bitrate, sample point in percent of the bit time (default: 87.5, per CiA 301)")
+parser.add_argument("--bitrate-tolerance", type=float, default=0.5, help="With --bitrate, maximum bit rate error in percent (default: 0.5)")
+parser.add_argument("--channels", type=int, default=1, help="Number of CAN channels (CanRx/CanTx pairs) sharing the object dictionary (default: 1)")
+parser.add_argument("--tpdo-channels", nargs="+", type=int, default=[], help="With --channels, CAN channel of TPDO1, TPDO2, ... (default: 0)")
+parser.add_argument("--timer-service", nargs="?", const=True, default=False, type=bool, help="Replaces the SYNC, heartbeat producer, TPDO and synchronous window counters with deadlines in a RAM compared against one free-running microsecond timestamp")
+parser.add_argument("--rpdo-timeouts", type=lambda x: int(x, 0), help="Index of a ro UNSIGNED object, or an array of them, reporting the RPDO deadline monitoring timeouts, bit 0 for RPDO1 (0x2100, e.g.)")
+parser.add_argument("--keep-unused", nargs="?", const=True, default=False, type=bool, help="Keeps the signals of the architecture that are never read, which are otherwise removed with their assignments")
+parser.add_argument("--testbench", nargs="?", const=True, default=False, type=bool, help="Also generates a testbench (<entity>_tb.vhd) reporting SDO and TPDO latencies in Clock cycles")
+parser.add_argument("--eds-out", type=str, help="Also writes the implemented object dictionary, with effective access types, to this EDS file (for 0x1021 Store EDS, e.g.)")
+parser.add_argument("--eds-mem", type=str, help="With --eds-out, also writes the exported EDS as a MEM file for SegmentedSdoXpmRom (0x1021 Store EDS, e.g.), as eds2mem.py does")
 parser.add_argument("--port", nargs="+", action="extend", type=lambda x: int(x, 0), default=[], help="Object dictionary multiplexers to expose as in ports (0x101804, e.g.)")
 args = parser.parse_args()
+if args.register_file:
+    args.sdo_table = True
+if not 1 <= args.program_block_size <= 127:
+    parser.error("--program-block-size must be in the range 1 to 127")
+if not 1 <= args.channels <= 8:
+    parser.error("--channels must be in the range 1 to 8")
+if len(args.tpdo_channels) > 4 or any(channel not in range(args.channels) for channel in args.tpdo_channels):
+    parser.error("--tpdo-channels takes up to 4 channels in the range 0 to {:d}".format(args.channels - 1))
+args.tpdo_channels += [0] * (4 - len(args.tpdo_channels))
+if args.pdo_bytes > CAN_CONTROLLER_DATA_BYTES.get(args.can_controller):
+    parser.error("--pdo-bytes {:d} requires a CAN FD --can-controller; {} sends classic CAN frames of up to {:d} data bytes".format(args.pdo_bytes, args.can_controller, CAN_CONTROLLER_DATA_BYTES.get(args.can_controller)))
+if args.eds_mem and not args.eds_out:
+    parser.error("--eds-mem requires --eds-out")
 
-def format_constant(name, **kwargs):
-    name = name.upper()
-    name = name.replace(" ", "_")
-    name = re.sub(r"\b-\b", "_", name) # Replace hyphenated words with underscore
-    name = re.sub(r"[^\w]", "", name) # Remove illegal characters
-    name = re.sub(r"_{1,}", "_", name) # Remove multiple underscores
-    if re.match(r"[\d_]", name) is not None:
-        raise ValueException("Invalid object name '" + name + "'. Must start with a letter.")
-    if "prefix" in kwargs:
-        prefix = kwargs["prefix"]
-    else:
-        prefix = "\\"
-    if "suffix" in kwargs:
-        suffix = kwargs["suffix"]
-    else:
-        suffix = "\\"
-    return prefix + name + suffix
-
-
-def make_object_from_data_type(odi):
-    odi = int(odi, 0)
-    o = {}
-    if odi == 0x0001: # BOOLEAN
-        o["bit_length"] = 1
-        o["data_type"] = "std_logic"
-    elif odi in [
-        0x0002, # INTEGER8
-        0x0003, # INTEGER16
-        0x0004, # INTEGER32
-        ]:
-        o["bit_length"] = 2 ** (odi + 1)
-        o["data_type"] = "signed({:d} downto 0)".format(o.get("bit_length") - 1)
-    elif odi in [
-        0x0005, # UNSIGNED8
-        0x0006, # UNSIGNED16
-        0x0007  # UNSIGNED32
-        ]:
-        o["bit_length"] = 2 ** (odi - 2)
-        o["data_type"] = "unsigned({:d} downto 0)".format(o.get("bit_length") - 1)
-    elif odi in [
-        0x000C, # TIME_OF_DAY
-        0x000D  # TIME_DIFFERENCE
-        ]:
-        o["bit_length"] = 48
-        o["data_type"] = "CanOpen.TimeOfDay"
-    elif odi == 0x000F: # DOMAIN
-        o["bit_length"] = 0 # variable, per CiA 301 section 7.4.7.1
-        o["data_type"] = "unsigned(31 downto 0)" # placeholder
-    else:
-        raise TypeError("Unsupported data type with index 0x{:04X}".format(odi))
-    return o
+def can_bit_timing(clock_frequency, bitrate, sample_point, tolerance):
+    """CanLite timing generics for bitrate, a time quantum being 2 * BAUD_RATE_PRESCALAR Clock periods
 
+    Returns the prescaler and segment split with the smallest bit rate error, then the closest sample point,
+    then the most time quanta per bit, or raises ValueError if no split is within tolerance (percent)"""
+    best = None
+    for prescaler in range(1, 65):
+        for tseg1 in range(1, 17):
+            for tseg2 in range(2, 9): # Phase segment 2 of at least the 2 quanta of information processing time
+                quanta = 1 + tseg1 + tseg2
+                error = abs(clock_frequency / (2 * prescaler * quanta) - bitrate) / bitrate * 100
+                if error > tolerance:
+                    continue
+                key = (round(error, 6), abs((1 + tseg1) / quanta * 100 - sample_point), -quanta)
+                if best is None or key < best[0]:
+                    best = (key, prescaler, tseg1, tseg2)
+    if best is None:
+        raise ValueError("No CanLite bit timing for {:g} bit/s within {:g}% at a {:g} Hz Clock".format(bitrate, tolerance, clock_frequency))
+    key, prescaler, tseg1, tseg2 = best
+    return {
+        "BAUD_RATE_PRESCALAR": prescaler,
+        "SYNCHRONIZATION_JUMP_WIDTH": min(4, tseg2),
+        "TIME_SEGMENT_1": tseg1,
+        "TIME_SEGMENT_2": tseg2,
+        "TRIPLE_SAMPLING": bitrate <= 125000 # Recommended for low and medium bit rates only
+    }
 
-def format_signal(name, **kwargs):
-    name = format_constant(name, **{"prefix": "", "suffix": ""})
-    if "prefix" in kwargs:
-        prefix = kwargs["prefix"]
-    else:
-        prefix = "\\"
-    if "suffix" in kwargs:
-        suffix = kwargs["suffix"]
-    else:
-        suffix = "\\"
-    name = "".join(map(str.capitalize, name.split("_")))
-    return prefix + name + suffix
+can_generics = {}
+if args.bitrate is not None:
+    if args.clock_frequency is None:
+        parser.error("--bitrate requires --clock-frequency")
+    can_generics = can_bit_timing(args.clock_frequency, args.bitrate, args.sample_point, args.bitrate_tolerance)
 
+def can_generic_map(indent):
+    """generic map of the CanLite instances, if --bitrate"""
+    if not can_generics:
+        return ""
+    return indent + "generic map (\n" + ",\n".join(indent + "    {} => {}".format(name, str(value).lower() if isinstance(value, bool) else value) for name, value in can_generics.items()) + "\n" + indent + ")\n"
 
-def format_value(value, bit_length):
-    s = ""
-    x = bit_length // 4
-    b = bit_length - (x * 4)
-    if b > 0:
-        s += ('b"{:0' + "{}".format(b) + 'b}"').format(value >> (x * 4)) # Will not truncate if value >= 2**bit_length
-        if x > 0:
-            s += " & "
-    if x > 0:
-        s += ('x"{:0' + "{}".format(x) + 'X}"').format(value & (2**(x * 4) - 1))
-    return s
+def sdo_download_match(mux):
+    if mux in sdo_slots:
+        return "SdoWriteAddress = {:d}".format(sdo_slots.get(mux))
+    return 'TxSdoInitiateMuxIndex = x"{:04X}" and TxSdoInitiateMuxSubIndex = x"{:02X}"'.format(mux >> 8, mux & 0xFF)
 
+def array_download_match(index):
+    """Returns the condition of an SDO download to an element of array index, and the sub-index of the element"""
+    mux = (index << 8) + 1
+    if mux in sdo_slots:
+        return "SdoWriteAddress >= {:d} and SdoWriteAddress <= {:d}".format(sdo_slots.get(mux), sdo_slots.get(mux) + arrays.get(index).get("length") - 1), "SdoWriteAddress - {:d}".format(sdo_slots.get(mux) - 1)
+    return array_match(index, "TxSdoInitiateMuxIndex", "TxSdoInitiateMuxSubIndex"), "to_integer(unsigned(TxSdoInitiateMuxSubIndex))"
+
+
+def sdo_value(mux, obj, sub_index):
+    """Returns the value of obj uploaded by SDO, its sub_index element if it is in an array"""
+    if mux in array_elements:
+        array = arrays.get(array_elements.get(mux))
+        return "{}({})".format(array.get("buffer") if obj.get("access_type") == "rw" else array.get("name"), sub_index)
+    if mux >= 0x200000 and obj.get("access_type") == "rw":
+        return format_signal(obj.get("parameter_name"), suffix="_q\\")
+    return obj.get("name")
 
-def make_object(o):
-    obj = make_object_from_data_type(o.get("datatype"))
-    obj["parameter_name"] = o.get("parametername")
-    obj["access_type"] = o.get("accesstype")
-    name = obj.get("parameter_name")
-    default_value = o.get("defaultvalue")
-    bit_length = obj.get("bit_length")
-    if obj.get("access_type") =="const":
-        obj["name"] = format_constant(name)
-        default_value = int(default_value, 0)
-        obj["default_value"] = format_value(default_value, bit_length)
-    elif default_value is not None:
-        obj["name"] = format_signal(name)
-        if default_value.startswith("$NODEID"):
-            obj["default_value"] = "NodeId_q"
-            if len(default_value) > 7:
-                if default_value[7] != "+":
-                    raise Exception(f"Invalid value syntax: {default_value}")
-                default_value = int(default_value[8:], 0)
-                if default_value < 0:
-                    raise Exception(f"Negative $NODEID offsets are not allowed")
-            else:
-                default_value = 0
-            obj["default_value"] = f"{obj.get("data_type")[:obj.get("data_type").index("(")]}(resize(unsigned(NodeId_q), {bit_length}) + to_unsigned({default_value}, {bit_length}))"
-        else:
-            default_value = int(default_value, 0)
-            obj["default_value"] = format_value(default_value, bit_length)
-    else:
-        obj["name"] = format_signal(name)
-    obj["pdo_mapping"] = o.get("pdomapping", "0") == "1"
-    obj["direction"] = "in" if obj.get("access_type") == "ro" else "out"
-    if obj.get("access_type") in ["rw", "wo"]:
-        if o.get("lowlimit") is not None:
-            obj["low_limit"] = format_value(int(o.get("lowlimit"), 0), bit_length)
-        if o.get("highlimit") is not None:
-            obj["high_limit"] = format_value(int(o.get("highlimit"), 0), bit_length)
-    obj.update(make_object_from_data_type(o.get("datatype")))
-    print(o.get("parametername") + " => " + obj.get("name"))
-    return obj
+
+def to_vector(obj, value):
+    """Returns value, of the data type of obj, as a std_logic_vector (or std_logic)"""
+    if obj.get("data_type").startswith("std_logic"):
+        return value
+    if obj.get("data_type") == "CanOpen.TimeOfDay":
+        return "CanOpen.to_std_logic_vector({})".format(value)
+    return "std_logic_vector({})".format(value)
+
+
+def indent_lines(text, spaces):
+    """Returns text with each non-empty line indented by spaces"""
+    return re.sub(r"(?m)^(?=.)", " " * spaces, text)
 
 
-def parse_cob_id(s):
-    if s.startswith("$NODEID+"):
-         s = s[8:]
-    return int(s, 0)
+def write_array_arms(out, write_arm, mux_index, mux_sub_index, otherwise):
+    """Writes the statements of the when others arm of an SDO case statement on the mux: the arm of each array, written by
+    write_arm(out, mux, obj, sub_index) for its elements, selected by mux_index and mux_sub_index, else otherwise"""
+    if not arrays:
+        out.write(otherwise)
+        return
+    spaces = otherwise[:len(otherwise) - len(otherwise.lstrip(" "))]
+    for i, index in enumerate(arrays):
+        out.write("{}{}if {} then\n".format(spaces, "els" if i > 0 else "", array_match(index, mux_index, mux_sub_index)))
+        arm = io.StringIO()
+        write_arm(arm, (index << 8) + 1, arrays.get(index).get("element"), "to_integer(unsigned({}))".format(mux_sub_index))
+        out.write(re.sub(r"(?m)^(?=.)", "    ", arm.getvalue()))
+    out.write(spaces + "else\n" + re.sub(r"(?m)^(?=.)", "    ", otherwise) + spaces + "end if;\n")
 
 
+def fd_dlc(data_bytes):
+    """Smallest DLC holding data_bytes, as CanOpen.to_FdDlc; the classic CAN DLC up to 8 bytes"""
+    if data_bytes <= 8:
+        return data_bytes
+    return next(dlc for dlc, length in enumerate([12, 16, 20, 24, 32, 48, 64], 9) if data_bytes <= length)
+
 def zero_fill(l):
     s = format_value(0, l)
     if s != "":
@@ -159,90 +168,348 @@ def zero_fill(l):
     return s
 
 
-eds = ConfigParser(comment_prefixes=["#"])
-eds.read(args.eds) # Loads in the EDS
-
-#entity_name = "".join(map(str.capitalize, map(str.lower, eds["DeviceInfo"]["ProductName"].split(" ")))) + "CanOpen"
-entity_name = format_signal(eds["DeviceInfo"]["ProductName"], prefix="", suffix="") + "CanOpen"
-assert entity_name != ""
-
-# Create pseudo-ObjectDictionary as a nested dict
-indices = []
-for section in ["MandatoryObjects", "OptionalObjects", "ManufacturerObjects"]:
-    if not eds.has_section(section): continue
-    n = int(eds[section]["SupportedObjects"], 0)
-    for i in range(1, n + 1):
-        indices.append(int(eds[section][str(i)], 0))
-od = {}
-for i in indices:
-    oc = eds["{:04X}".format(i)]
-    o = dict(oc)
-    sub_number = oc.get("SubNumber")
-    if sub_number is not None:
-        sub_number = int(sub_number, 0)
-        subs = {}
-        si = 0
-        while len(subs) <= sub_number and si <= 0xFF:
-            section = "{:04X}sub{:X}".format(i, si)
-            if eds.has_section(section):
-                 subs.update({si: eds[section]})
-            si += 1
-        o['subs'] = subs
-    od.update({i: o})
+eds = read_eds(args.eds)
+entity_name = make_entity_name(eds)
+od = make_od(eds)
 
 if 0x100200 not in args.port:
     args.port.append(0x100200)
 
+# Objects mapped to TPDOs must remain signals
+tpdo_mapped = []
+for i in range(4):
+    if 0x1A00 + i not in od: continue
+    subs = od.get(0x1A00 + i).get("subs")
+    for odsi in subs:
+        if odsi == 0: continue
+        tpdo_mapped.append(parse_cob_id(subs.get(odsi).get("defaultvalue")) >> 8)
+
+def is_application_register(mux, obj):
+    return args.register_file and mux >= 0x200000 and obj.get("access_type") in ["rw", "wo"] and 0 < obj.get("bit_length") <= 32 and mux not in tpdo_mapped
+
+# Partial evaluation of conditions on const objects, whose values are known at generation time
+
+
+def const_value(mux):
+    """Returns the value of a const object, or None if it is not known at generation time"""
+    obj = objects.get(mux)
+    if obj is None or obj.get("access_type") != "const" or mux in args.port:
+        return None
+    return obj.get("default_integer")
+
+
+def fold(mux, predicate, condition):
+    """Returns predicate of the value of a const object, or condition, a VHDL condition on the object, if not const"""
+    value = const_value(mux)
+    return condition if value is None else predicate(value)
+
+
+def fold_and(*conditions):
+    """Returns the conjunction of VHDL conditions, True or False if it is known"""
+    if False in conditions:
+        return False
+    conditions = [condition for condition in conditions if condition is not True]
+    if not conditions:
+        return True
+    if len(conditions) == 1:
+        return conditions[0]
+    return " and ".join("(" + condition + ")" if " or " in condition else condition for condition in conditions)
+
+
+def fold_or(*conditions):
+    """Returns the disjunction of VHDL conditions, True or False if it is known"""
+    if True in conditions:
+        return True
+    conditions = [condition for condition in conditions if condition is not False]
+    if not conditions:
+        return False
+    if len(conditions) == 1:
+        return conditions[0]
+    return " or ".join("(" + condition + ")" if " and " in condition else condition for condition in conditions)
+
+
+def vhdl_disjunction(alternatives):
+    """Returns the lines of a multi-line disjunction of (condition or lines, comment) alternatives, skipping False ones"""
+    lines = []
+    for condition, comment in alternatives:
+        if condition is False: continue
+        if isinstance(condition, str):
+            condition = ["(" + condition + ")" if " and " in condition or " or " in condition else condition]
+        if comment is not None:
+            condition = [condition[0] + " -- " + comment] + condition[1:]
+        lines += [("or " if lines else "") + condition[0]] + condition[1:]
+    return lines
+
+
+def vhdl_group(head, alternatives, comment):
+    """Returns the lines of head and (alternatives), True or False if it is known"""
+    if head is False or all(condition is False for condition, _ in alternatives):
+        return False
+    if any(condition is True for condition, _ in alternatives):
+        return True if head is True else [head + " -- " + comment]
+    lines = vhdl_disjunction(alternatives)
+    if head is True:
+        return ["( -- " + comment] + ["    " + line for line in lines] + [")"]
+    if " and " in head: # On its own line
+        return ["(", "    (" + head + ") -- " + comment, "    and ("] + ["        " + line for line in lines] + ["    )", ")"]
+    return ["(", "    " + head + " and ( -- " + comment] + ["        " + line for line in lines] + ["    )", ")"]
+
+
+def tpdo_event_timer_used(i):
+    """Whether the event timer of TPDO i + 1 can trigger it"""
+    mux = (0x1800 + i) << 8
+    return mux + 0x05 in objects and fold(mux + 0x02, lambda v: v >= 0xFE, True) and fold(mux + 0x05, lambda v: v > 0, True)
+
+
+def tpdo_inhibit_time_used(i):
+    """Whether the inhibit time of TPDO i + 1 can delay it"""
+    mux = (0x1800 + i) << 8
+    return mux + 0x03 in objects and fold(mux + 0x03, lambda v: v > 0, True)
+
+
+def tpdo_window_used(i):
+    """Whether the synchronous window length can clear the event interrupt of TPDO i + 1"""
+    mux = (0x1800 + i) << 8
+    return 0x100700 in objects and fold(mux + 0x02, lambda v: v <= 240 or v == 0xFC, True) and fold(0x100700, lambda v: v > 0, True)
+
+
+def sync_producer_used():
+    """Whether 0x1005 can enable the SYNC producer"""
+    return 0x100500 in objects and fold(0x100500, lambda v: v & 0x40000000 != 0, True)
+
+
+def sync_counter_used():
+    """Whether the SYNC message can carry the counter of 0x1019"""
+    return 0x100600 in objects and 0x101900 in objects and fold(0x101900, lambda v: 1 < v <= 240, True)
+
 port_signals = []
+application_registers = [] # Muxes of objects stored in the register file
 segmented_sdo = False;
-# Create a flat, VHDL-friendly version of the object dictionary
-objects = {}
-for odi in od:
-    obj = od.get(odi)
-    if "subs" in obj:
-        subs = obj.get("subs")
-        for odsi in subs:
-            #if odsi == 0: continue
-            so = subs.get(odsi)
-            if odsi == 0:
-                so["parametername"] = obj.get("parametername") + " Length"
-            o = make_object(so)
-            objects.update({(odi << 8) + odsi: o})
-            if o.get("bit_length") == 0:
-                segmented_sdo = True
-                continue
-            if odi >= 0x2000 or ((odi << 8) + odsi) in args.port:
-                if o.get("access_type") in ["ro", "rw", "wo"]:
-                    port_signals.append(o)
-                if o.get("access_type") == "wo":
-                    port_signals.append({
-                        "name": format_signal(so.get("parametername"), suffix="_strb\\"),
-                        "direction": "out",
-                        "data_type": "std_logic"
-                    })
-    else:
-        try:
-            o = make_object(obj)
-        except Exception as e:
-            raise Exception("Error processing object 0x{:04X}".format(odi)) from e
-        objects.update({odi << 8: o})
-        if o.get("bit_length") == 0:
+objects = make_objects(od)
+
+# Program download (CiA 302-3): 0x1F50 by SDO block download into the program download interface
+program_download = 0x1F5001 in objects and 0x120001 in objects
+if program_download:
+    if objects.get(0x1F5001).get("bit_length") != 0 or objects.get(0x1F5001).get("access_type") != "wo":
+        raise ValueError("Program data 0x1F5001 must be a wo DOMAIN")
+    if any(mux >> 8 == 0x1F50 and mux & 0xFF > 1 for mux in objects):
+        raise ValueError("Only program number 1 (0x1F5001) is supported")
+    for mux in objects: # Program software identification and flash status are in ports
+        if mux >> 8 in [0x1F56, 0x1F57] and mux & 0xFF > 0 and mux not in args.port:
+            args.port.append(mux)
+program_control = program_download and 0x1F5101 in objects and objects.get(0x1F5101).get("access_type") == "rw"
+
+# RPDOs with deadline monitoring (event timer)
+rpdo_timers = []
+for i in range(1, 0x201):
+    index = 0x1400 + i - 1
+    if ((index << 8) + 0x01) in objects and ((index << 8) + 0x05) in objects:
+        rpdo_timers.append(i)
+
+# Timers of the timer service: (constant name, period object, microseconds per unit, periodic)
+service_timers = []
+if args.timer_service:
+    if 0x100500 in objects and 0x100600 in objects:
+        service_timers.append(("TIMER_SYNC", objects.get(0x100600), 1, True))
+    if 0x101700 in objects:
+        service_timers.append(("TIMER_HEARTBEAT_PRODUCER", objects.get(0x101700), 1000, True))
+    tpdos = [i for i in range(4) if ((0x1800 + i) << 8) + 0x01 in objects and ((0x1800 + i) << 8) + 0x02 in objects]
+    if any(tpdo_window_used(i) for i in tpdos):
+        service_timers.append(("TIMER_SYNCHRONOUS_WINDOW", objects.get(0x100700), 1, False))
+    for i in tpdos:
+        mux = (0x1800 + i) << 8
+        if tpdo_inhibit_time_used(i):
+            service_timers.append((f"TIMER_TPDO{i + 1}_INHIBIT", objects.get(mux + 0x03), 100, False))
+        if tpdo_event_timer_used(i):
+            service_timers.append((f"TIMER_TPDO{i + 1}_EVENT", objects.get(mux + 0x05), 1000, False))
+service_timer_names = [timer[0] for timer in service_timers]
+
+# Objects driven by the RPDO timeout bits, with the bit offset of their LSB
+rpdo_timeout_muxes = {}
+if args.rpdo_timeouts is not None:
+    if args.rpdo_timeouts < 0x2000 or args.rpdo_timeouts not in od:
+        raise ValueError("RPDO timeouts index 0x{:04X} must be an object of the EDS at 0x2000 or above".format(args.rpdo_timeouts))
+    offset = 0
+    for mux in sorted(objects):
+        if mux >> 8 != args.rpdo_timeouts or ("subs" in od.get(args.rpdo_timeouts) and mux & 0xFF == 0): continue
+        obj = objects.get(mux)
+        if obj.get("access_type") != "ro" or not obj.get("data_type").startswith("unsigned") or obj.get("bit_length") == 0:
+            raise ValueError("RPDO timeouts object 0x{:06X} must be a ro UNSIGNED object".format(mux))
+        rpdo_timeout_muxes.update({mux: offset})
+        offset += obj.get("bit_length")
+    if rpdo_timers and offset < rpdo_timers[-1]:
+        raise ValueError("RPDO timeouts object 0x{:04X} has {:d} bits, RPDO{:d} requires {:d}".format(args.rpdo_timeouts, offset, rpdo_timers[-1], rpdo_timers[-1]))
+rpdo_timeout_bits = max([offset + objects.get(mux).get("bit_length") for mux, offset in rpdo_timeout_muxes.items()] + rpdo_timers + [1])
+
+# Homogeneous ARRAY objects: one port, buffer and process each, with the sub-index decoded arithmetically by the SDO server
+ARRAY_TYPES = {
+    "std_logic": "std_logic_vector",
+    "signed(7 downto 0)": "CanOpen.Signed8Array",
+    "signed(15 downto 0)": "CanOpen.Signed16Array",
+    "signed(31 downto 0)": "CanOpen.Signed32Array",
+    "unsigned(7 downto 0)": "CanOpen.Unsigned8Array",
+    "unsigned(15 downto 0)": "CanOpen.Unsigned16Array",
+    "unsigned(31 downto 0)": "CanOpen.Unsigned32Array"
+}
+arrays = {} # Index: {"name", "buffer", "strobe", "data_type", "length", "element", "default_value", "defaults"}
+array_elements = {} # Mux: index
+if args.arrays:
+    for index in od:
+        if index < 0x2000 or int(od.get(index).get("objecttype", "0x7"), 0) != 0x8: continue # ARRAY
+        muxes = [mux for mux in objects if mux >> 8 == index and mux & 0xFF > 0]
+        elements = [objects.get(mux) for mux in muxes]
+        if not elements or [mux & 0xFF for mux in muxes] != list(range(1, len(muxes) + 1)): continue
+        element = elements[0]
+        if element.get("data_type") not in ARRAY_TYPES or element.get("access_type") not in ["ro", "rw", "wo"]: continue
+        if any(obj.get(key) != element.get(key) for obj in elements for key in ["data_type", "access_type", "low_limit_value", "high_limit_value"]): continue
+        if any(mux in tpdo_mapped or mux in rpdo_timeout_muxes or is_application_register(mux, obj) for mux, obj in zip(muxes, elements)): continue
+        defaults = []
+        if element.get("access_type") in ["rw", "wo"]:
+            if any(obj.get("default_integer") is None for obj in elements): continue # $NODEID or missing DefaultValue
+            for obj in elements:
+                defaults.append("'{:d}'".format(obj.get("default_integer") & 1) if element.get("data_type") == "std_logic" else obj.get("default_value"))
+        name = format_signal(od.get(index).get("parametername"))
+        arrays.update({index: {
+            "name": name,
+            "buffer": format_signal(od.get(index).get("parametername"), suffix="_q\\"),
+            "strobe": format_signal(od.get(index).get("parametername"), suffix="_strb\\"),
+            "data_type": "{}(1 to {:d})".format(ARRAY_TYPES.get(element.get("data_type")), len(elements)),
+            "length": len(elements),
+            "element": element,
+            "default_value": format_constant(od.get(index).get("parametername"), suffix="_DEFAULT\\"), # Constant of defaults
+            "defaults": None if not defaults else "(others => {})".format(defaults[0]) if len(set(defaults)) == 1 else "(\n" + ",\n".join("        {:d} => {}".format(i + 1, value) for i, value in enumerate(defaults)) + "\n    )"
+        }})
+        for mux, obj in zip(muxes, elements):
+            array_elements.update({mux: index})
+            obj["name"] = "{}({:d})".format(name, mux & 0xFF)
+
+def array_match(index, mux_index, mux_sub_index):
+    """Condition of the signals mux_index and mux_sub_index addressing an element of array index"""
+    return '{1} = x"{0:04X}" and {2} /= x"00" and unsigned({2}) <= {3:d}'.format(index, mux_index, mux_sub_index, arrays.get(index).get("length"))
+
+for mux in objects:
+    o = objects.get(mux)
+    print(o.get("parameter_name") + " => " + o.get("name"))
+    if o.get("bit_length") == 0:
+        if not (program_download and mux == 0x1F5001): # Program data is download only
             segmented_sdo = True
-            continue
-        if odi >= 0x2000 or (odi << 8) in args.port:
-            if o.get("access_type") in ["ro", "rw", "wo"]:
-                port_signals.append(o)
+        continue
+    if mux in rpdo_timeout_muxes: # Driven internally
+        continue
+    if mux in array_elements:
+        array = arrays.get(array_elements.get(mux))
+        if mux & 0xFF == 1:
+            port_signals.append({
+                "name": array.get("name"),
+                "direction": o.get("direction"),
+                "data_type": array.get("data_type")
+            })
             if o.get("access_type") == "wo":
                 port_signals.append({
-                    "name": format_signal(o.get("parameter_name"), suffix="_strb\\"),
+                    "name": array.get("strobe"),
                     "direction": "out",
-                    "data_type": "std_logic"
+                    "data_type": "std_logic_vector(1 to {:d})".format(array.get("length"))
                 })
+        continue
+    if is_application_register(mux, o):
+        application_registers.append(mux)
+        continue
+    if mux >= 0x200000 or mux in args.port:
+        if o.get("access_type") in ["ro", "rw", "wo"]:
+            port_signals.append(o)
+        if o.get("access_type") == "wo":
+            port_signals.append({
+                "name": format_signal(o.get("parameter_name"), suffix="_strb\\"),
+                "direction": "out",
+                "data_type": "std_logic"
+            })
 
 if 0x120001 not in objects:
     segmented_sdo = False;
+    application_registers = []
 
 # Prepend optional port signals
+if application_registers:
+    register_address_width = max(math.ceil(math.log2(len(application_registers))), 1)
+    port_signals.insert(0, {
+        "name": "ApplicationRegisterChangedAddress",
+        "direction": "out",
+        "data_type": "unsigned({:d} downto 0)".format(register_address_width - 1)
+    })
+    port_signals.insert(0, {
+        "name": "ApplicationRegisterChanged",
+        "direction": "out",
+        "data_type": "std_logic"
+    })
+    port_signals.insert(0, {
+        "name": "ApplicationRegisterData",
+        "direction": "out",
+        "data_type": "std_logic_vector(31 downto 0)"
+    })
+    port_signals.insert(0, {
+        "name": "ApplicationRegisterAddress",
+        "direction": "in",
+        "data_type": "unsigned({:d} downto 0)".format(register_address_width - 1)
+    })
+
+if args.lss:
+    port_signals.insert(0, {
+        "name": "LssStore",
+        "direction": "out",
+        "data_type": "std_logic"
+    })
+    port_signals.insert(0, {
+        "name": "LssNodeId",
+        "direction": "out",
+        "data_type": "std_logic_vector(6 downto 0)"
+    })
+if program_control:
+    port_signals.insert(0, {
+        "name": "ProgramControlChanged",
+        "direction": "out",
+        "data_type": "std_logic"
+    })
+    port_signals.insert(0, {
+        "name": "ProgramControl",
+        "direction": "out",
+        "data_type": objects.get(0x1F5101).get("data_type")
+    })
+if program_download:
+    port_signals.insert(0, {
+        "name": "ProgramDataReady",
+        "direction": "in",
+        "data_type": "std_logic"
+    })
+    port_signals.insert(0, {
+        "name": "ProgramAbort",
+        "direction": "out",
+        "data_type": "std_logic"
+    })
+    port_signals.insert(0, {
+        "name": "ProgramEnd",
+        "direction": "out",
+        "data_type": "std_logic"
+    })
+    port_signals.insert(0, {
+        "name": "ProgramDataValid",
+        "direction": "out",
+        "data_type": "std_logic"
+    })
+    port_signals.insert(0, {
+        "name": "ProgramDataBytes",
+        "direction": "out",
+        "data_type": "unsigned(2 downto 0)"
+    })
+    port_signals.insert(0, {
+        "name": "ProgramData",
+        "direction": "out",
+        "data_type": "std_logic_vector(55 downto 0)"
+    })
+    port_signals.insert(0, {
+        "name": "ProgramStart",
+        "direction": "out",
+        "data_type": "std_logic"
+    })
 if segmented_sdo:
     port_signals.insert(0, {
         "name": "SegmentedSdoDataValid",
@@ -316,6 +583,9 @@ for mux in objects:
     if name in names:
         raise ValueError("Parameter names must be unique")
     names.append(name)
+for array in arrays.values():
+    if array.get("name") in names:
+        raise ValueError("Parameter names must be unique")
 
 template = """{0} {1} is
     generic (
@@ -326,8 +596,8 @@ template = """{0} {1} is
         Clock       : in  std_logic;
         Reset_n     : in  std_logic;
 
-        CanRx       : in std_logic;
-        CanTx       : out std_logic;
+        CanRx       : in {2};
+        CanTx       : out {2};
 
         NodeId          : in std_logic_vector(6 downto 0);
         ErrorRegister   : in unsigned(7 downto 0);
@@ -341,7 +611,35 @@ template += """
     );
 end {0} {1};"""
 
-fp = open(entity_name + ".vhd", "w")
+can_port_type = "std_logic" if args.channels == 1 else "std_logic_vector(0 to {:d})".format(args.channels - 1)
+
+states = [
+    "STATE_RESET",
+    "STATE_RESET_APP",
+    "STATE_RESET_COMM",
+    "STATE_BOOTUP",
+    "STATE_BOOTUP_WAIT",
+    "STATE_IDLE",
+    "STATE_CAN_RX_STROBE",
+    "STATE_CAN_RX_READ",
+    "STATE_CAN_TX_STROBE",
+    "STATE_CAN_TX_WAIT",
+    "STATE_SYNC",
+    "STATE_EMCY",
+    "STATE_TPDO1",
+    "STATE_TPDO2",
+    "STATE_TPDO3",
+    "STATE_TPDO4",
+    "STATE_SDO_RX",
+    "STATE_SDO_TX",
+    "STATE_HEARTBEAT"
+]
+if args.sdo_table and 0x120001 in objects:
+    states.insert(states.index("STATE_SDO_RX"), "STATE_SDO_LOOKUP")
+if args.lss:
+    states += ["STATE_LSS_RX", "STATE_LSS_TX"]
+
+fp = io.StringIO() # Written to <entity>.vhd after dead-signal elimination
 fp.write("-- Generated with " + " ".join(argv) + "\n")
 fp.write("""library ieee;
     use ieee.std_logic_1164.all;
@@ -351,29 +649,11 @@ fp.write("""library ieee;
 use work.CanBus;
 use work.CanOpen;
 
-""" + template.format("entity", entity_name, "" if len(port_signals) == 0 else ";") + """
+""" + template.format("entity", entity_name, can_port_type) + """
 
 architecture Behavioral of """ + entity_name + """ is
     type State is (
-        STATE_RESET,
-        STATE_RESET_APP,
-        STATE_RESET_COMM,
-        STATE_BOOTUP,
-        STATE_BOOTUP_WAIT,
-        STATE_IDLE,
-        STATE_CAN_RX_STROBE,
-        STATE_CAN_RX_READ,
-        STATE_CAN_TX_STROBE,
-        STATE_CAN_TX_WAIT,
-        STATE_SYNC,
-        STATE_EMCY,
-        STATE_TPDO1,
-        STATE_TPDO2,
-        STATE_TPDO3,
-        STATE_TPDO4,
-        STATE_SDO_RX,
-        STATE_SDO_TX,
-        STATE_HEARTBEAT
+""" + ",\n".join(map(lambda state: "        " + state, states)) + """
     );
 
     component CanLite is
@@ -422,7 +702,29 @@ architecture Behavioral of """ + entity_name + """ is
     signal SyncAck,
            TxAck            : std_logic; -- CanLite successful transmission
     signal CanStatus        : CanBus.Status; -- CanLite status
-    signal MicrosecondEnable,
+""")
+if args.channels > 1:
+    fp.write(f"""
+    -- CAN channels
+    type CanFrameArray is array (0 to {args.channels - 1:d}) of CanBus.Frame;
+    type CanStatusArray is array (0 to {args.channels - 1:d}) of CanBus.Status;
+    signal ChannelRxFrame,
+           ChannelRxFrame_q,
+           ChannelTxFrame_q         : CanFrameArray;
+    signal ChannelRxFifoWriteEnable,
+           ChannelRxFifoEmpty,
+           ChannelTxFifoReadEnable,
+           ChannelTxFifoEmpty,
+           ChannelTxAck,
+           TxChannels               : std_logic_vector(0 to {args.channels - 1:d}); -- TxChannels: channels of the next frame transmitted
+    signal ChannelStatus            : CanStatusArray;
+    signal RxChannel,
+           SdoChannel               : natural range 0 to {args.channels - 1:d}; -- Channel of RxFrame_q, and of the last SDO request
+""")
+    if args.lss:
+        fp.write(f"""    signal LssChannel               : natural range 0 to {args.channels - 1:d}; -- Channel of the last LSS request
+""")
+fp.write("""    signal MicrosecondEnable,
            HundredMicrosecondEnable,
            MillisecondEnable    : std_logic; -- Single-clock pulses
     signal Sync_ob              : std_logic; -- Sync pulse output buffer
@@ -438,6 +740,22 @@ architecture Behavioral of """ + entity_name + """ is
 if 0x100500 in objects and 0x100600 in objects and 0x101900 in objects:
     fp.write("""    signal SynchronousCounter       : unsigned(7 downto 0);
 """)
+if service_timers:
+    fp.write("""
+    -- Timer service
+""")
+    for k, timer in enumerate(service_timers):
+        fp.write("    constant {} : natural := {:d};\n".format(timer[0].ljust(24), k))
+    fp.write(f"""    constant TIMER_PERIODIC           : std_logic_vector(0 to {len(service_timers) - 1:d}) := "{"".join("1" if timer[3] else "0" for timer in service_timers)}";
+    signal TimerNow         : unsigned(31 downto 0); -- Free-running, in microseconds
+    signal TimerArm,
+           TimerExpired,
+           TimerEvent       : std_logic_vector(0 to {len(service_timers) - 1:d});
+""")
+if rpdo_timers:
+    fp.write(f"""    signal RpdoMatchBusy    : std_logic; -- Last frame read is being matched against the RPDO COB-IDs
+    signal RpdoTimeoutBits  : std_logic_vector({rpdo_timeout_bits - 1:d} downto 0); -- Bit i - 1 for RPDOi
+""")
 fp.write("""
     -- Internal SDO signals
     signal RxSdo,
@@ -448,6 +766,20 @@ fp.write("""
            Tpdo3Data,
            Tpdo4Data        : std_logic_vector(63 downto 0);
 """)
+if args.lss:
+    fp.write("""
+    -- LSS slave
+    signal LssNodeId_ob     : std_logic_vector(6 downto 0); -- Pending node-ID, activated by reset communication
+    signal LssConfiguration : std_logic; -- LSS configuration state, else LSS waiting state
+    signal LssInterrupt     : std_logic;
+    signal LssResponse      : CanBus.DataBytes;
+""")
+if program_download:
+    fp.write(f"""
+    -- Program download
+    constant PROGRAM_BLOCK_SIZE : positive := {args.program_block_size:d}; -- Segments per sub-block, at most BLOCK_SIZE of the flash writer
+    signal ProgramDownloadActive : std_logic;
+""")
 if not segmented_sdo:
     fp.write("""    signal SegmentedSdoMux         : std_logic_vector(23 downto 0);
     signal SegmentedSdoReadEnable  : std_logic;
@@ -499,7 +831,20 @@ fp.write("""
     alias  TxSdoBlockUploadSubBlockSegData  : std_logic_vector(55 downto 0) is TxSdo(63 downto 8);
     alias  TxSdoBlockUploadEndN             : std_logic_vector(2 downto 0) is TxSdo(4 downto 2);
     alias  TxSdoBlockUploadEndCrc           : std_logic_vector(15 downto 0) is TxSdo(23 downto 8);
-
+""")
+if program_download:
+    fp.write("""    alias  RxSdoBlockDownloadCs             : std_logic is RxSdo(0);
+    alias  RxSdoBlockDownloadInitiateCc     : std_logic is RxSdo(2);
+    alias  RxSdoBlockDownloadSubBlockC      : std_logic is RxSdo(7);
+    alias  RxSdoBlockDownloadSubBlockSeqno  : std_logic_vector(6 downto 0) is RxSdo(6 downto 0);
+    alias  RxSdoBlockDownloadSubBlockSegData : std_logic_vector(55 downto 0) is RxSdo(63 downto 8);
+    alias  RxSdoBlockDownloadEndN           : std_logic_vector(2 downto 0) is RxSdo(4 downto 2);
+    alias  RxSdoBlockDownloadEndCrc         : std_logic_vector(15 downto 0) is RxSdo(23 downto 8);
+    alias  TxSdoBlockDownloadInitiateBlksize : std_logic_vector(7 downto 0) is TxSdo(39 downto 32);
+    alias  TxSdoBlockDownloadSubBlockAckseq : std_logic_vector(7 downto 0) is TxSdo(15 downto 8);
+    alias  TxSdoBlockDownloadSubBlockBlksize : std_logic_vector(7 downto 0) is TxSdo(23 downto 16);
+""")
+fp.write("""
     -- Event triggers (unused)
 """)
 
@@ -567,16 +912,155 @@ for mux in objects:
     obj = objects.get(mux)
     if obj.get("access_type") == "const":
         fp.write("    constant " + obj.get("name").ljust(26) + " : " + obj.get("data_type") + " := " + obj.get("default_value") + ";\n")
-    elif mux < 0x200000 and obj not in port_signals:
+    elif mux < 0x200000 and obj not in port_signals and not (program_download and mux == 0x1F5001):
+        fp.write("    signal " + obj.get("name").ljust(28) + " : " + obj.get("data_type") + ";\n")
+    elif mux in rpdo_timeout_muxes:
         fp.write("    signal " + obj.get("name").ljust(28) + " : " + obj.get("data_type") + ";\n")
-    elif mux >= 0x200000 and obj.get("access_type") == "rw": # No additional declarations needed for mux >= 0x200000 and obj.get("access_type") in ["ro", "wo"]
+    elif mux in array_elements:
+        array = arrays.get(array_elements.get(mux))
+        if mux & 0xFF == 1 and array.get("defaults") is not None:
+            fp.write("    constant " + array.get("default_value").ljust(26) + " : " + array.get("data_type") + " := " + array.get("defaults") + ";\n")
+        if mux & 0xFF == 1 and obj.get("access_type") == "rw":
+            fp.write("    signal " + array.get("buffer").ljust(28) + " : " + array.get("data_type") + ";\n")
+    elif mux >= 0x200000 and obj.get("access_type") == "rw" and mux not in application_registers: # No additional declarations needed for mux >= 0x200000 and obj.get("access_type") in ["ro", "wo"]
         fp.write("    signal " + format_signal(obj.get("parameter_name"), suffix="_q\\").ljust(28) + " : " + obj.get("data_type") + ";\n")
 
+# Descriptor table for the table-driven SDO server, sorted by mux for binary search
+sdo_slots = {}
+if args.sdo_table and 0x120001 in objects:
+    for mux in sorted(objects):
+        bit_length = objects.get(mux).get("bit_length")
+        if bit_length > 0 and bit_length <= 32 and mux not in application_registers:
+            sdo_slots.update({mux: len(sdo_slots)})
+    sdo_value_count = len(sdo_slots)
+    for mux in application_registers: # Addresses above SdoObjectValues select the register file
+        sdo_slots.update({mux: len(sdo_slots)})
+    fp.write("""
+    -- SDO object descriptor table
+    type SdoAccessType is (
+        SDO_ACCESS_NONE,
+        SDO_ACCESS_RO,
+        SDO_ACCESS_WO,
+        SDO_ACCESS_RW
+    );
+    type SdoObjectDescriptor is record
+        Mux             : std_logic_vector(23 downto 0);
+        AccessType      : SdoAccessType;
+        Length          : natural range 0 to 4; -- In bytes, 0 for Segmented SDO interface and objects wider than 32 bits
+        Bits            : natural range 0 to 32;
+        IsSigned        : boolean;
+        HasLowLimit     : boolean;
+        HasHighLimit    : boolean;
+        LowLimit        : std_logic_vector(31 downto 0); -- Sign-extended if IsSigned
+        HighLimit       : std_logic_vector(31 downto 0); -- Sign-extended if IsSigned
+        Address         : natural range 0 to {0}; -- Index of SdoObjectValues{2}
+    end record SdoObjectDescriptor;
+    type SdoObjectDescriptors is array (natural range <>) of SdoObjectDescriptor;
+    type SdoObjectValueArray is array (natural range <>) of std_logic_vector(31 downto 0);
+
+    constant SDO_DESCRIPTOR_NONE : SdoObjectDescriptor := (
+        Mux => (others => '1'),
+        AccessType => SDO_ACCESS_NONE,
+        Length => 0,
+        Bits => 0,
+        IsSigned => false,
+        HasLowLimit => false,
+        HasHighLimit => false,
+        LowLimit => (others => '0'),
+        HighLimit => (others => '0'),
+        Address => 0
+    );
+    -- (Mux, AccessType, Length, Bits, IsSigned, HasLowLimit, HasHighLimit, LowLimit, HighLimit, Address), sorted by Mux
+    constant SDO_DESCRIPTORS : SdoObjectDescriptors(0 to {1}) := (
+""".format(max(len(sdo_slots) - 1, 0), len(objects) - 1, ", then of ApplicationRegisters" if application_registers else ""))
+    descriptors = []
+    for mux in sorted(objects):
+        obj = objects.get(mux)
+        bit_length = obj.get("bit_length")
+        access_type = {"const": "RO", "ro": "RO", "rw": "RW", "wo": "WO"}.get(obj.get("access_type"))
+        length = 0 if bit_length == 0 or bit_length > 32 else math.ceil(bit_length / 8)
+        is_signed = obj.get("data_type").startswith("signed")
+        limits = []
+        for key in ["low_limit_value", "high_limit_value"]:
+            limit = obj.get(key)
+            limits.append("x\"{:08X}\"".format((limit if limit is not None else 0) & 0xFFFFFFFF)) # Limits of signed objects are negative if below 0, so this sign-extends them
+        descriptors.append("""        {0:d} => (x"{1:06X}", SDO_ACCESS_{2}, {3:d}, {4:d}, {5}, {6}, {7}, {8}, {9}, {10:d})""".format(
+            len(descriptors),
+            mux,
+            access_type,
+            length,
+            bit_length if length > 0 else 0,
+            str(is_signed).lower(),
+            str(obj.get("low_limit_value") is not None).lower(),
+            str(obj.get("high_limit_value") is not None).lower(),
+            limits[0],
+            limits[1],
+            sdo_slots.get(mux, 0)
+        ))
+    fp.write(",\n".join(descriptors))
+    fp.write("""
+    );
+
+    signal SdoDescriptor    : SdoObjectDescriptor; -- Result of lookup
+    signal SdoLookupDone    : std_logic;
+    signal SdoObjectValues  : SdoObjectValueArray(0 to {1});
+    signal SdoObjectValue   : std_logic_vector(31 downto 0); -- SdoObjectValues(SdoDescriptor.Address), registered
+    signal SdoWriteAddress  : natural range 0 to {0}; -- Address of last successful SDO download
+
+    -- Checks expedited download data against limits of descriptor
+    function is_within_limits(
+        constant DATA : std_logic_vector(31 downto 0);
+        constant DESCRIPTOR : SdoObjectDescriptor
+    ) return boolean is
+        variable Shift : natural range 0 to 32;
+    begin
+        Shift := 32 - DESCRIPTOR.Bits;
+        if DESCRIPTOR.IsSigned then
+            return
+                (not DESCRIPTOR.HasLowLimit or shift_right(shift_left(signed(DATA), Shift), Shift) >= signed(DESCRIPTOR.LowLimit))
+                and (not DESCRIPTOR.HasHighLimit or shift_right(shift_left(signed(DATA), Shift), Shift) <= signed(DESCRIPTOR.HighLimit));
+        else
+            return
+                (not DESCRIPTOR.HasLowLimit or shift_right(shift_left(unsigned(DATA), Shift), Shift) >= unsigned(DESCRIPTOR.LowLimit))
+                and (not DESCRIPTOR.HasHighLimit or shift_right(shift_left(unsigned(DATA), Shift), Shift) <= unsigned(DESCRIPTOR.HighLimit));
+        end if;
+    end function is_within_limits;
+""".format(max(len(sdo_slots) - 1, 0), max(sdo_value_count - 1, 0)))
+    if application_registers:
+        fp.write("""
+    -- Application register file, addressed by SdoObjectDescriptor.Address - APPLICATION_REGISTER_OFFSET
+    constant APPLICATION_REGISTER_OFFSET : natural := {0:d};
+    constant APPLICATION_REGISTER_DEFAULTS : SdoObjectValueArray(0 to {1:d}) := (
+""".format(sdo_value_count, 2 ** register_address_width - 1))
+        for i, mux in enumerate(application_registers):
+            obj = objects.get(mux)
+            if obj.get("default_integer") is None:
+                raise ValueError("Integer DefaultValue is required for register file object 0x{:06X}".format(mux))
+            fp.write('        {0:d} => x"{1:08X}", -- 0x{2:06X} {3}\n'.format(i, obj.get("default_integer") & (2 ** obj.get("bit_length") - 1), mux, obj.get("parameter_name")))
+        fp.write("""        others => (others => '0')
+    );
+
+    signal ApplicationRegisters             : SdoObjectValueArray(APPLICATION_REGISTER_DEFAULTS'range) := APPLICATION_REGISTER_DEFAULTS;
+    signal ApplicationRegisterAddressA      : natural range APPLICATION_REGISTER_DEFAULTS'range;
+    signal ApplicationRegisterWriteEnableA  : std_logic;
+    signal ApplicationRegisterWriteDataA    : std_logic_vector(31 downto 0);
+    signal ApplicationRegisterReadDataA     : std_logic_vector(31 downto 0);
+    signal ApplicationRegisterInitAddress   : natural range APPLICATION_REGISTER_DEFAULTS'range;
+    signal ApplicationRegisterInitDone      : std_logic;
+    signal SdoWriteData                     : std_logic_vector(31 downto 0); -- Download data masked to SdoDescriptor.Bits
+""")
+
 fp.write("""
 begin
-
+""")
+if can_generics:
+    fp.write("""
+    assert CLOCK_FREQUENCY = {:d} report "CanLite bit timing was generated for a {:d} Hz Clock" severity failure;
+""".format(round(args.clock_frequency), round(args.clock_frequency)))
+if args.channels == 1:
+    fp.write("""
     CanController : CanLite
-        port map (
+""" + can_generic_map("        ") + """        port map (
             Clock => Clock,
             Reset_n => Reset_n,
             CanRx => CanRx,
@@ -591,26 +1075,53 @@ begin
             Status => CanStatus
         );
 
-    -- Output signals
-    InvalidConfiguration <= '1' when NodeId = CanOpen.BROADCAST_NODE_ID else '0';
+""")
+else:
+    fp.write(f"""
+    CanChannels : for i in 0 to {args.channels - 1:d} generate
+        CanController : CanLite
+{can_generic_map("            ")}            port map (
+                Clock => Clock,
+                Reset_n => Reset_n,
+                CanRx => CanRx(i),
+                CanTx => CanTx(i),
+                RxFrame => ChannelRxFrame(i),
+                RxFifoWriteEnable => ChannelRxFifoWriteEnable(i),
+                RxFifoFull => RxFifoFull,
+                TxFrame => ChannelTxFrame_q(i),
+                TxFifoReadEnable => ChannelTxFifoReadEnable(i),
+                TxFifoEmpty => ChannelTxFifoEmpty(i),
+                TxAck => ChannelTxAck(i),
+                Status => ChannelStatus(i)
+            );
+    end generate CanChannels;
+    CanStatus <= ChannelStatus(0); -- Channel 0 governs boot-up and the NMT state machine
+    RxFrame <= RxFrame_q;
+    RxFifoWriteEnable <= or_reduce(ChannelRxFifoWriteEnable);
+    TxAck <= or_reduce(ChannelTxAck);
+
+""")
+fp.write("""    -- Output signals
+    InvalidConfiguration <= '1' when {} = CanOpen.BROADCAST_NODE_ID else '0';
     Status <= (
         NmtState => NmtState,
         CanStatus => CanStatus,
-        AutoBitrateOrLss => '0', -- TODO per CiA 801 and CiA 305
+        AutoBitrateOrLss => {}
         InvalidConfiguration => InvalidConfiguration,
         ErrorControlEvent => HeartbeatConsumerError,
         SyncError => SyncError,
         EventTimerError => RpdoTimeout,
-        ProgramDownload => '0' -- TODO
+        ProgramDownload => {}
     );
-""")
+""".format("LssNodeId_ob" if args.lss else "NodeId", "LssConfiguration," if args.lss else "'0', -- TODO per CiA 801 and CiA 305", "ProgramDownloadActive" if program_download else "'0' -- TODO"))
 if args.sync:
     fp.write("""    Sync <= Sync_ob; -- Buffered
 """)
 if args.gfc:
     fp.write("""    Gfc <= '1' when CurrentState = STATE_CAN_RX_READ and RxCobIdFunctionCode = CanOpen.FUNCTION_CODE_NMT and RxCobIdNodeId = CanOpen.NMT_GFC else '0';
 """)
-fp.write("""
+if args.channels == 1:
+    fp.write("""
     -- Single depth FIFO emulator for CanLite interface
     RxFifoReadEnable <= '1' when CurrentState = STATE_CAN_RX_STROBE else '0';
     RxFifoFull <= '0';
@@ -657,7 +1168,115 @@ fp.write("""
         end if;
     end process;
 
-    -- Primary state machine
+""")
+else:
+    fp.write(f"""
+    -- Single depth FIFO emulator for each CanLite, and round-robin arbitration of the RX path
+    RxFifoReadEnable <= '1' when CurrentState = STATE_CAN_RX_STROBE else '0';
+    RxFifoFull <= '0';
+    RxFifoEmpty <= and_reduce(ChannelRxFifoEmpty);
+    TxFifoEmpty <= and_reduce(ChannelTxFifoEmpty);
+    TxFifoReadEnable <= '1' when CurrentState = STATE_CAN_TX_WAIT and and_reduce(ChannelTxFifoEmpty or ChannelTxFifoReadEnable) = '1' else '0'; -- Loaded into every channel
+    process (Reset_n, Clock)
+        variable Channel : natural range 0 to {args.channels - 1:d};
+    begin
+        if Reset_n = '0' then
+            RxFrame_q <= (
+                Id => (others => '0'),
+                Rtr => '0',
+                Ide => '0',
+                Dlc => (others => '0'),
+                Data => (others => (others => '0'))
+            );
+            for i in 0 to {args.channels - 1:d} loop
+                ChannelRxFrame_q(i) <= (
+                    Id => (others => '0'),
+                    Rtr => '0',
+                    Ide => '0',
+                    Dlc => (others => '0'),
+                    Data => (others => (others => '0'))
+                );
+                ChannelTxFrame_q(i) <= (
+                    Id => (others => '0'),
+                    Rtr => '0',
+                    Ide => '0',
+                    Dlc => (others => '0'),
+                    Data => (others => (others => '0'))
+                );
+            end loop;
+            ChannelRxFifoEmpty <= (others => '1');
+            ChannelTxFifoEmpty <= (others => '1');
+            TxChannels <= (others => '0');
+            RxChannel <= 0;
+            SdoChannel <= 0;
+""")
+    if args.lss:
+        fp.write("""            LssChannel <= 0;
+""")
+    fp.write(f"""        elsif rising_edge(Clock) then
+            for i in 0 to {args.channels - 1:d} loop
+                if ChannelRxFifoWriteEnable(i) = '1' then
+                    ChannelRxFrame_q(i) <= ChannelRxFrame(i);
+                end if;
+                if CanBus."="(ChannelStatus(i).State, CanBus.STATE_RESET) or CanBus."="(ChannelStatus(i).State, CanBus.STATE_BUS_OFF) then
+                    ChannelRxFifoEmpty(i) <= '1';
+                elsif ChannelRxFifoWriteEnable(i) = '1' then
+                    ChannelRxFifoEmpty(i) <= '0';
+                elsif RxFifoReadEnable = '1' and RxChannel = i then
+                    ChannelRxFifoEmpty(i) <= '1';
+                end if;
+                if ChannelTxFifoReadEnable(i) = '1' then
+                    ChannelTxFrame_q(i) <= TxFrame;
+                end if;
+                if CanBus."="(ChannelStatus(i).State, CanBus.STATE_RESET) or CanBus."="(ChannelStatus(i).State, CanBus.STATE_BUS_OFF) then
+                    ChannelTxFifoEmpty(i) <= '1';
+                elsif ChannelTxFifoReadEnable(i) = '1' then
+                    ChannelTxFifoEmpty(i) <= '1';
+                elsif CurrentState = STATE_CAN_TX_STROBE and TxChannels(i) = '1' then
+                    ChannelTxFifoEmpty(i) <= '0';
+                end if;
+            end loop;
+            if RxFifoReadEnable = '1' then
+                RxFrame_q <= ChannelRxFrame_q(RxChannel);
+            end if;
+            if CurrentState = STATE_IDLE{" or CurrentState = STATE_RESET_COMM" if args.lss else ""} then -- Next channel holding a frame, after the last one read
+                Channel := RxChannel;
+                for i in 1 to {args.channels:d} loop
+                    if ChannelRxFifoEmpty((RxChannel + i) mod {args.channels:d}) = '0' then
+                        Channel := (RxChannel + i) mod {args.channels:d};
+                        exit;
+                    end if;
+                end loop;
+                RxChannel <= Channel;
+            end if;
+            case CurrentState is
+""")
+    for i in range(4):
+        fp.write("""                when STATE_TPDO{:d} =>
+                    TxChannels <= "{}";
+""".format(i + 1, "".join("1" if channel == args.tpdo_channels[i] else "0" for channel in range(args.channels))))
+    fp.write("""                when STATE_SDO_TX =>
+                    TxChannels <= (others => '0');
+                    TxChannels(SdoChannel) <= '1';
+                when STATE_BOOTUP | STATE_SYNC | STATE_EMCY | STATE_HEARTBEAT =>
+                    TxChannels <= (others => '1');
+                when {} =>
+                    SdoChannel <= RxChannel;
+{}                when others =>
+                    null;
+            end case;
+        end if;
+    end process;
+
+""".format("STATE_SDO_LOOKUP" if "STATE_SDO_LOOKUP" in states else "STATE_SDO_RX", """                when STATE_LSS_TX =>
+                    TxChannels <= (others => '0');
+                    TxChannels(LssChannel) <= '1';
+                when STATE_CAN_RX_READ | STATE_LSS_RX =>
+                    if RxFrame_q.Id(10 downto 0) = CanOpen.LSS_MASTER_COB_ID then
+                        LssChannel <= RxChannel;
+                    end if;
+""" if args.lss else ""))
+fp.write("""    -- Primary state machine
     process (Reset_n, Clock)
     begin
         if Reset_n = '0' then
@@ -694,10 +1313,25 @@ fp.write("""        CurrentState,
         RxNmtNodeControlNodeId,
         NodeId_q,
 """)
+if args.lss:
+    fp.write("""        LssNodeId_ob,
+        LssConfiguration,
+        LssInterrupt,
+        TxFrame.Id,
+""")
 if 0x120001 in objects:
     obj = objects.get(0x120001)
     fp.write("        " + obj.get("name") + """,
 """)
+if "STATE_SDO_LOOKUP" in states:
+    fp.write("""        SdoLookupDone,
+""")
+if application_registers:
+    fp.write("""        ApplicationRegisterInitDone,
+""")
+if rpdo_timers:
+    fp.write("""        RpdoMatchBusy,
+""")
 fp.write("""        RxNmtNodeControlCommand
     )
     begin
@@ -705,14 +1339,40 @@ fp.write("""        RxNmtNodeControlCommand
             when STATE_RESET => -- Power-on reset
                 NextState <= STATE_RESET_APP;
             when STATE_RESET_APP => -- Service reset node
+""")
+if application_registers:
+    fp.write("""                if ApplicationRegisterInitDone = '1' then -- Wait for register file defaults
+                    NextState <= STATE_RESET_COMM;
+                else
+                    NextState <= STATE_RESET_APP;
+                end if;
+""")
+else:
+    fp.write("""                    NextState <= STATE_RESET_COMM;
+""")
+if args.lss:
+    fp.write("""            when STATE_RESET_COMM => -- Service reset communication
+                if CanBus."="(CanStatus.State, CanBus.STATE_RESET) or CanBus."="(CanStatus.State, CanBus.STATE_BUS_OFF) then
+                    NextState <= STATE_RESET_COMM;
+                elsif LssConfiguration = '0' and NodeId_q /= CanOpen.BROADCAST_NODE_ID and NodeId_q = LssNodeId_ob then -- Only boot once the node-ID configured by LSS is latched
+                    NextState <= STATE_BOOTUP;
+                elsif RxFifoEmpty = '0' then -- Unconfigured, only LSS is served
+                    NextState <= STATE_CAN_RX_STROBE;
+                elsif LssInterrupt = '1' and TxFifoEmpty = '1' then
+                    NextState <= STATE_LSS_TX;
+                else
                     NextState <= STATE_RESET_COMM;
-            when STATE_RESET_COMM => -- Service reset communication
+                end if;
+""")
+else:
+    fp.write("""            when STATE_RESET_COMM => -- Service reset communication
                 if CanBus."/="(CanStatus.State, CanBus.STATE_RESET) and CanBus."/="(CanStatus.State, CanBus.STATE_BUS_OFF) and NodeId /= CanOpen.BROADCAST_NODE_ID then -- Only boot if CAN bus is up and node-ID is valid
                     NextState <= STATE_BOOTUP;
                 else
                     NextState <= STATE_RESET_COMM;
                 end if;
-            when STATE_BOOTUP => -- Service boot-up Event
+""")
+fp.write("""            when STATE_BOOTUP => -- Service boot-up Event
                 NextState <= STATE_CAN_TX_STROBE;
             when STATE_BOOTUP_WAIT =>
                 if TxAck = '1' then -- Wait until boot-up message has been sent
@@ -723,8 +1383,14 @@ fp.write("""        RxNmtNodeControlCommand
             when STATE_IDLE => -- Wait for interrupt or reception of message from CanLite
                 if CanBus."="(CanStatus.State, CanBus.STATE_RESET) or CanBus."="(CanStatus.State, CanBus.STATE_BUS_OFF) then
                     NextState <= STATE_IDLE;
-                elsif RxFifoEmpty = '0' then
-                    NextState <= STATE_CAN_RX_STROBE;
+""")
+if rpdo_timers:
+    fp.write("""                elsif RxFifoEmpty = '0' and RpdoMatchBusy = '0' then -- Hold the next frame until the last one is matched
+""")
+else:
+    fp.write("""                elsif RxFifoEmpty = '0' then
+""")
+fp.write("""                    NextState <= STATE_CAN_RX_STROBE;
                 elsif TxFifoEmpty = '1' then
                     -- Transmit priority based on CiA 301 function codes
                     if SyncProducerInterrupt = '1' and (NmtState = CanOpen.NMT_STATE_PREOPERATIONAL or NmtState = CanOpen.NMT_STATE_OPERATIONAL) then
@@ -743,7 +1409,12 @@ fp.write("""        RxNmtNodeControlCommand
                         NextState <= STATE_SDO_TX;
                     elsif HeartbeatProducerInterrupt = '1' then
                         NextState <= STATE_HEARTBEAT;
-                    else
+""")
+if args.lss:
+    fp.write("""                    elsif LssInterrupt = '1' then
+                        NextState <= STATE_LSS_TX;
+""")
+fp.write("""                    else
                         NextState <= STATE_IDLE;
                     end if;
                 else
@@ -765,8 +1436,37 @@ fp.write("""        RxNmtNodeControlCommand
                 NextState <= STATE_CAN_TX_STROBE;
             when STATE_HEARTBEAT =>
                 NextState <= STATE_CAN_TX_STROBE;
+""")
+if args.lss:
+    fp.write("""            when STATE_LSS_TX =>
+                NextState <= STATE_CAN_TX_STROBE;
             when STATE_CAN_TX_STROBE =>
                 NextState <= STATE_CAN_TX_WAIT;
+            when STATE_CAN_TX_WAIT => -- Wait until message has been loaded into CanLite
+                if NmtState = CanOpen.NMT_STATE_INITIALISATION and TxFrame.Id(10 downto 0) = CanOpen.LSS_SLAVE_COB_ID then -- LSS response of an unconfigured node
+                    if TxFifoReadEnable = '1' then
+                        NextState <= STATE_RESET_COMM;
+                    else
+                        NextState <= STATE_CAN_TX_WAIT;
+                    end if;
+                elsif NmtState = CanOpen.NMT_STATE_INITIALISATION then
+                    NextState <= STATE_BOOTUP_WAIT;
+                elsif TxFifoReadEnable = '1' then
+                    NextState <= STATE_IDLE;
+                else
+                    NextState <= STATE_CAN_TX_WAIT;
+                end if;
+            when STATE_CAN_RX_STROBE => -- Load message from CanLite
+                if NmtState = CanOpen.NMT_STATE_INITIALISATION then -- Unconfigured
+                    NextState <= STATE_LSS_RX;
+                else
+                    NextState <= STATE_CAN_RX_READ;
+                end if;
+            when STATE_LSS_RX =>
+                NextState <= STATE_RESET_COMM;""")
+else:
+    fp.write("""            when STATE_CAN_TX_STROBE =>
+                NextState <= STATE_CAN_TX_WAIT;
             when STATE_CAN_TX_WAIT => -- Wait until message has been loaded into CanLite
                 if NmtState = CanOpen.NMT_STATE_INITIALISATION then
                     NextState <= STATE_BOOTUP_WAIT;
@@ -776,7 +1476,8 @@ fp.write("""        RxNmtNodeControlCommand
                     NextState <= STATE_CAN_TX_WAIT;
                 end if;
             when STATE_CAN_RX_STROBE => -- Load message from CanLite
-                NextState <= STATE_CAN_RX_READ;
+                NextState <= STATE_CAN_RX_READ;""")
+fp.write("""
             when STATE_CAN_RX_READ => -- Process message
                 if RxCobIdFunctionCode = CanOpen.FUNCTION_CODE_NMT and RxCobIdNodeId = CanOpen.NMT_NODE_CONTROL and (RxNmtNodeControlNodeId = CanOpen.BROADCAST_NODE_ID or RxNmtNodeControlNodeId = NodeId_q) then
                     if RxNmtNodeControlCommand = CanOpen.NMT_NODE_CONTROL_RESET_APP then
@@ -790,11 +1491,20 @@ if 0x120001 in objects:
     obj = objects.get(0x120001)
     fp.write("""
                 elsif {0}(31) = '0' and CanOpen.is_match(RxFrame_q, {0}) and RxFrame_q.Dlc(3) = '1' then -- SDO Request, ignore if not 8 data bytes
-                    NextState <= STATE_SDO_RX;""".format(obj.get("name")))
+                    NextState <= {1};""".format(obj.get("name"), "STATE_SDO_LOOKUP" if "STATE_SDO_LOOKUP" in states else "STATE_SDO_RX"))
 fp.write("""
                 else
                     NextState <= STATE_IDLE;
-                end if;
+                end if;""")
+if "STATE_SDO_LOOKUP" in states:
+    fp.write("""
+            when STATE_SDO_LOOKUP => -- Wait for object descriptor
+                if SdoLookupDone = '1' then
+                    NextState <= STATE_SDO_RX;
+                else
+                    NextState <= STATE_SDO_LOOKUP;
+                end if;""")
+fp.write("""
             when STATE_SDO_RX =>
                 NextState <= STATE_IDLE;
             when others =>
@@ -869,19 +1579,20 @@ fp.write("""            else
         end if;
     end process;
 
-    -- Latch node-ID
+""")
+fp.write("""    -- Latch node-ID
     process (Reset_n, Clock)
     begin
         if Reset_n = '0' then
             NodeId_q <= CanOpen.BROADCAST_NODE_ID;
         elsif rising_edge(Clock) then
-            if CurrentState = STATE_RESET_COMM then
-                NodeId_q <= NodeId;
+            if CurrentState = STATE_RESET_COMM{} then
+                NodeId_q <= {};
             end if;
         end if;
     end process;
 
-    -- TIME handling""")
+    -- TIME handling""".format(" and LssConfiguration = '0'" if args.lss else "", "LssNodeId_ob" if args.lss else "NodeId"))
 if args.timestamp:
     fp.write("""
     Timestamp <= Timestamp_ob;""")
@@ -917,8 +1628,60 @@ fp.write("""if MillisecondEnable = '1' then
 
     -- Sync producer timer""")
 
+def sync_producer_interrupt(event):
+    """Returns the statements setting SyncProducerInterrupt on event, folded if 0x1005 is const"""
+    if not sync_producer_used():
+        return """            SyncProducerInterrupt <= '0';
+"""
+    enable = fold(0x100500, lambda v: True, "{}(30) = '0'".format(objects.get(0x100500).get("name")))
+    return """            {0}{1} then
+                SyncProducerInterrupt <= '1';
+            elsif CurrentState = STATE_SYNC then
+                SyncPending := true;
+                SyncProducerInterrupt <= '0';
+            end if;
+""".format("" if enable is True else "if " + enable + " then\n                SyncProducerInterrupt <= '0';\n            els", "if " + event)
+
 if 0x100500 in objects and 0x100600 in objects:
-    fp.write("""
+    if "TIMER_SYNC" in service_timer_names:
+        fp.write("""
+    TimerArm(TIMER_SYNC) <=
+        '1' when
+            NmtState = CanOpen.NMT_STATE_INITIALISATION
+            or NmtState = CanOpen.NMT_STATE_STOPPED
+            or {1} = 0
+            or CurrentState = STATE_RESET_COMM
+            or (CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and TxSdoInitiateMuxIndex = x"1006" and TxSdoInitiateMuxSubIndex = x"00") -- Successful SDO Download
+            or ({0}(0) = '0' and Sync_ob = '1')
+        else '0';
+    process (Reset_n, Clock)
+        variable SyncPending : boolean;
+    begin
+        if Reset_n = '0' then
+            SyncPending := false;
+            SyncProducerInterrupt <= '0';
+            SyncAck <= '0';
+            SyncError <= '0';
+        elsif rising_edge(Clock) then
+            if TimerArm(TIMER_SYNC) = '1' then
+                SyncError <= '0';
+            elsif TimerEvent(TIMER_SYNC) = '1' then
+                if {0}(0) = '0' then
+                    SyncError <= '1';
+                else
+                    SyncError <= '0';
+                end if;
+            end if;
+{2}            if SyncPending and TxAck = '1' then
+                SyncAck <= '1';
+            else
+                SyncAck <= '0';
+            end if;
+        end if;
+    end process;
+""".format(objects.get(0x100500).get("name"), objects.get(0x100600).get("name"), sync_producer_interrupt("TimerEvent(TIMER_SYNC) = '1'")))
+    else:
+        fp.write("""
     process (Reset_n, Clock)
         variable SyncPending : boolean;
         variable SyncCounter   : unsigned(31 downto 0);
@@ -954,24 +1717,16 @@ if 0x100500 in objects and 0x100600 in objects:
                     end if;
                 end if;
             end if;
-            if {0}(30) = '0' then
-                SyncProducerInterrupt <= '0';
-            elsif MicrosecondEnable = '1' and SyncCounter = {1} - 1 then
-                SyncProducerInterrupt <= '1';
-            elsif CurrentState = STATE_SYNC then
-                SyncPending := true;
-                SyncProducerInterrupt <= '0';
-            end if;
-            if SyncPending and TxAck = '1' then
+{2}            if SyncPending and TxAck = '1' then
                 SyncAck <= '1';
             else
                 SyncAck <= '0';
             end if;
         end if;
     end process;
-""".format(objects.get(0x100500).get("name"), objects.get(0x100600).get("name")))
+""".format(objects.get(0x100500).get("name"), objects.get(0x100600).get("name"), sync_producer_interrupt("MicrosecondEnable = '1' and SyncCounter = {} - 1".format(objects.get(0x100600).get("name")))))
 
-    if 0x101900 in objects:
+    if sync_counter_used():
         fp.write("""
     -- NOTE: CiA 301 requires an SDO abort to a change of 0x1019 if 0x1006 is not zero (TODO). Instead, a change will reset the counter to zero.
     process (Reset_n, Clock)
@@ -984,8 +1739,7 @@ if 0x100500 in objects and 0x100600 in objects:
                 or NmtState = CanOpen.NMT_STATE_STOPPED
                 or CurrentState = STATE_RESET_COMM
                 or (CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and TxSdoInitiateMuxIndex = x"1019" and TxSdoInitiateMuxSubIndex = x"00") -- Successful SDO Download
-                or {0} < 2 or {0} > 240
-            ) then
+{1}            ) then
                 SynchronousCounter <= to_unsigned(1, SynchronousCounter'length);
             elsif SyncAck = '1' then
                  if SynchronousCounter < {0} then
@@ -996,7 +1750,7 @@ if 0x100500 in objects and 0x100600 in objects:
             end if;
         end if;
     end process;
-""".format(objects.get(0x101900).get("name")))
+""".format(objects.get(0x101900).get("name"), "" if const_value(0x101900) is not None else "                or {0} < 2 or {0} > 240\n".format(objects.get(0x101900).get("name"))))
 
 else:
     fp.write("""
@@ -1052,7 +1806,7 @@ fp.write("""            if
                         EmcyEec <= CanOpen.EMCY_EEC_CAN_ERROR_PASSIVE;
                     elsif HeartbeatConsumerError = '1' then
                         EmcyEec <= CanOpen.EMCY_EEC_HEARTBEAT;
-                    elsif WasBusOff then
+{1}                    elsif WasBusOff then
                         EmcyEec <= CanOpen.EMCY_EEC_BUS_OFF_RECOVERY;
                     else
                         EmcyEec <= CanOpen.EMCY_EEC_COMMUNICATION;
@@ -1079,7 +1833,9 @@ fp.write("""            if
         end if;
     end process;
     EmcyMsef <= (others => '0'); -- Manufacturer-specific error code not implemented
-""".format(objects.get(0x100100).get("name")))
+""".format(objects.get(0x100100).get("name"), """                    elsif RpdoTimeout = '1' then
+                        EmcyEec <= CanOpen.EMCY_EEC_RPDO_TIMEOUT;
+""" if rpdo_timers else ""))
 
 fp.write("""
      -- Timers
@@ -1129,13 +1885,201 @@ fp.write("""
     end process;
 """)
 
+if service_timers:
+    n = len(service_timers)
+    fp.write(f"""
+    -- Timer service
+    -- Deadlines are kept in a RAM and compared with TimerNow round-robin, one timer per clock, in sweeps of {n:d} timers.
+    -- TimerArm clears TimerExpired at once, and the deadline is set to TimerNow plus the period at the next visit of the timer.
+    -- A one-shot timer then sets TimerExpired until armed again, a periodic timer pulses TimerEvent and advances its deadline by its period.
+    process (Reset_n, Clock)
+        type TimerDeadlineArray is array (0 to {n - 1:d}) of std_logic_vector(32 downto 0); -- Armed & Deadline
+        variable TimerDeadlines     : TimerDeadlineArray;
+        variable TimerIndex         : natural range 0 to {n - 1:d};
+        variable TimerEntry         : std_logic_vector(32 downto 0);
+        variable TimerDeadline      : unsigned(31 downto 0);
+        variable TimerPeriod        : unsigned(31 downto 0); -- In microseconds
+        variable TimerPending       : std_logic_vector(0 to {n - 1:d}); -- Armed, but deadline not set yet
+    begin
+        if Reset_n = '0' then
+            TimerIndex := 0;
+            TimerPending := (others => '1');
+            TimerNow <= (others => '0');
+            TimerExpired <= (others => '0');
+            TimerEvent <= (others => '0');
+        elsif rising_edge(Clock) then
+            TimerEvent <= (others => '0');
+            TimerEntry := TimerDeadlines(TimerIndex);
+            TimerDeadline := unsigned(TimerEntry(31 downto 0));
+            case TimerIndex is
+""")
+    for name, obj, scale, periodic in service_timers:
+        if scale == 1:
+            period = "resize({}, 32)".format(obj.get("name"))
+        else:
+            period = "resize({} * to_unsigned({:d}, {:d}), 32)".format(obj.get("name"), scale, scale.bit_length())
+        fp.write(f"""                when {name} => TimerPeriod := {period};
+""")
+    fp.write(f"""                when others => TimerPeriod := (others => '0');
+            end case;
+            if TimerPending(TimerIndex) = '1' then
+                TimerDeadlines(TimerIndex) := '1' & std_logic_vector(TimerNow + TimerPeriod);
+                TimerPending(TimerIndex) := '0';
+            elsif TimerEntry(32) = '1' and signed(TimerNow - TimerDeadline) >= 0 then -- Deadline reached, periods up to 2^31 microseconds
+                if TIMER_PERIODIC(TimerIndex) = '1' then
+                    TimerDeadlines(TimerIndex) := '1' & std_logic_vector(TimerDeadline + TimerPeriod);
+                    TimerEvent(TimerIndex) <= '1';
+                else
+                    TimerDeadlines(TimerIndex) := '0' & TimerEntry(31 downto 0);
+                    TimerExpired(TimerIndex) <= '1';
+                end if;
+            end if;
+            for i in TimerArm'range loop
+                if TimerArm(i) = '1' then
+                    TimerPending(i) := '1';
+                    TimerExpired(i) <= '0';
+                end if;
+            end loop;
+            if TimerIndex = {n - 1:d} then
+                TimerIndex := 0;
+            else
+                TimerIndex := TimerIndex + 1;
+            end if;
+            if MicrosecondEnable = '1' then
+                TimerNow <= TimerNow + 1;
+            end if;
+        end if;
+    end process;
+""")
+    if "TIMER_SYNCHRONOUS_WINDOW" in service_timer_names:
+        fp.write("""    TimerArm(TIMER_SYNCHRONOUS_WINDOW) <=
+        '1' when
+            Sync_ob = '1'
+            or {0} = 0 -- Synchronous window length disabled
+            or (CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and TxSdoInitiateMuxIndex = x"1007" and TxSdoInitiateMuxSubIndex = x"00") -- Successful SDO Download
+        else '0';
+""".format(objects.get(0x100700).get("name")))
+
 # TODO: Check for duplicate node-IDs and abort SDO
 heartbeat_consumers = 0
 if 0x1016 in od:
     heartbeat_consumer_object = od.get(0x1016)
     if "subs" in heartbeat_consumer_object and 0x00 in heartbeat_consumer_object.get("subs"):
         heartbeat_consumers = int(heartbeat_consumer_object.get("subs").get(0x00).get("defaultvalue"), 0)
-if heartbeat_consumers > 0:
+if heartbeat_consumers > 0 and args.heartbeat_engine:
+    consumers = []
+    node_ids = []
+    for sub_index in range(1, heartbeat_consumers + 1):
+        if sub_index not in heartbeat_consumer_object.get("subs"):
+            continue
+        node_id = (int(heartbeat_consumer_object.get("subs").get(sub_index).get("defaultvalue"), 0) >> 16) & 0xFF
+        if node_id in node_ids:
+            raise Exception(f"Duplicate heartbeat consumer Node-ID {node_id}")
+        node_ids.append(node_id)
+        consumers.append(sub_index)
+    n = len(consumers)
+    fp.write(f"""
+    -- Heartbeat consumer engine
+    -- Consumer states are kept in a RAM and updated round-robin, one consumer per clock, in sweeps of {n:d} consumers and an idle slot.
+    -- Heartbeats, and successful SDO downloads of 0x1016, are flagged by Node-ID until the sweep reaches the consumer of that Node-ID.
+    process (Reset_n, Clock)
+        type HeartbeatConsumerStateArray is array (0 to {n - 1:d}) of std_logic_vector(17 downto 0); -- Error & Enable & Counter
+        variable HeartbeatConsumerStates        : HeartbeatConsumerStateArray;
+        variable HeartbeatConsumerIndex         : natural range 0 to {n:d}; -- Consumer to read, {n:d} is the idle slot
+        variable HeartbeatConsumerWriteIndex    : natural range 0 to {n - 1:d}; -- Consumer read in the previous clock
+        variable HeartbeatConsumerValid         : boolean; -- A consumer was read in the previous clock
+        variable HeartbeatConsumerEntry         : unsigned(31 downto 0);
+        variable HeartbeatConsumerState         : std_logic_vector(17 downto 0);
+        variable HeartbeatConsumerNodeId        : natural range 0 to 127;
+        variable HeartbeatConsumerCounter       : unsigned(15 downto 0);
+        variable HeartbeatConsumerEnable        : std_logic;
+        variable HeartbeatConsumerReset         : std_logic;
+        variable HeartbeatConsumerErrors        : std_logic; -- Errors of the current sweep
+        variable HeartbeatConsumerClear         : boolean; -- Clears the states during the current sweep
+        variable HeartbeatReceived              : std_logic_vector(0 to 127); -- By Node-ID
+        variable MillisecondPending             : std_logic; -- Millisecond elapsed during the current sweep
+        variable MillisecondSweep               : std_logic; -- Millisecond elapsed during the previous sweep
+    begin
+        if Reset_n = '0' then
+            HeartbeatConsumerIndex := 0;
+            HeartbeatConsumerWriteIndex := 0;
+            HeartbeatConsumerValid := false;
+            HeartbeatConsumerEntry := (others => '0');
+            HeartbeatConsumerState := (others => '0');
+            HeartbeatConsumerErrors := '0';
+            HeartbeatConsumerClear := true;
+            HeartbeatReceived := (others => '0');
+            MillisecondPending := '0';
+            MillisecondSweep := '0';
+            HeartbeatConsumerError <= '0';
+        elsif rising_edge(Clock) then
+            -- Update the consumer read in the previous clock
+            if HeartbeatConsumerValid then
+                HeartbeatConsumerNodeId := to_integer(HeartbeatConsumerEntry(22 downto 16));
+                HeartbeatConsumerReset := HeartbeatReceived(HeartbeatConsumerNodeId);
+                HeartbeatReceived(HeartbeatConsumerNodeId) := '0';
+                HeartbeatConsumerEnable := HeartbeatConsumerState(16);
+                HeartbeatConsumerCounter := unsigned(HeartbeatConsumerState(15 downto 0));
+                if HeartbeatConsumerClear or HeartbeatConsumerEntry(23 downto 16) = 0 or HeartbeatConsumerEntry(23 downto 16) > 127 or HeartbeatConsumerEntry(15 downto 0) = 0 then -- Check if entry is valid
+                    HeartbeatConsumerEnable := '0';
+                elsif HeartbeatConsumerReset = '1' then -- Enable heartbeat consumer after first heartbeat is received
+                    HeartbeatConsumerEnable := '1';
+                end if;
+                if HeartbeatConsumerEnable = '0' or HeartbeatConsumerReset = '1' then
+                    HeartbeatConsumerCounter := (others => '0');
+                    HeartbeatConsumerState(17) := '0';
+                else
+                    if MillisecondSweep = '1' and HeartbeatConsumerCounter < HeartbeatConsumerEntry(15 downto 0) then
+                        HeartbeatConsumerCounter := HeartbeatConsumerCounter + 1;
+                    end if;
+                    if HeartbeatConsumerCounter = HeartbeatConsumerEntry(15 downto 0) then
+                        HeartbeatConsumerState(17) := '1';
+                    end if;
+                end if;
+                HeartbeatConsumerStates(HeartbeatConsumerWriteIndex) := HeartbeatConsumerState(17) & HeartbeatConsumerEnable & std_logic_vector(HeartbeatConsumerCounter);
+                HeartbeatConsumerErrors := HeartbeatConsumerErrors or HeartbeatConsumerState(17);
+            end if;
+            -- Flag heartbeats and downloaded entries by Node-ID
+            if CurrentState = STATE_RESET_COMM then
+                HeartbeatReceived := (others => '0');
+            elsif CurrentState = STATE_CAN_RX_READ and RxCobIdFunctionCode = CanOpen.FUNCTION_CODE_NMT_ERROR_CONTROL then
+                HeartbeatReceived(to_integer(unsigned(RxCobIdNodeId))) := '1';
+            elsif CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and TxSdoInitiateMuxIndex = x"1016" and TxSdoInitiateMuxSubIndex /= x"00" then -- Successful SDO Download
+                HeartbeatReceived(to_integer(unsigned(RxSdoDownloadInitiateData(22 downto 16)))) := '1';
+            end if;
+            -- Read the next consumer
+            HeartbeatConsumerValid := HeartbeatConsumerIndex < {n:d};
+            if HeartbeatConsumerIndex < {n:d} then
+                HeartbeatConsumerState := HeartbeatConsumerStates(HeartbeatConsumerIndex);
+                HeartbeatConsumerWriteIndex := HeartbeatConsumerIndex;
+            end if;
+            case HeartbeatConsumerIndex is
+""")
+    for i, sub_index in enumerate(consumers):
+        fp.write(f"""                when {i:d} => HeartbeatConsumerEntry := {objects.get((0x1016 << 8) + sub_index).get("name")};
+""")
+    fp.write(f"""                when others => HeartbeatConsumerEntry := (others => '0');
+            end case;
+            if CurrentState = STATE_RESET_COMM then
+                HeartbeatConsumerIndex := 0;
+                HeartbeatConsumerClear := true;
+            elsif HeartbeatConsumerIndex = {n:d} then -- End of sweep
+                HeartbeatConsumerError <= HeartbeatConsumerErrors;
+                HeartbeatConsumerErrors := '0';
+                HeartbeatConsumerClear := false;
+                MillisecondSweep := MillisecondPending;
+                MillisecondPending := '0';
+                HeartbeatConsumerIndex := 0;
+            else
+                HeartbeatConsumerIndex := HeartbeatConsumerIndex + 1;
+            end if;
+            if MillisecondEnable = '1' then
+                MillisecondPending := '1';
+            end if;
+        end if;
+    end process;
+""")
+elif heartbeat_consumers > 0:
     fp.write("""
     -- Heartbeat consumer timers
     process (
@@ -1200,7 +2144,30 @@ else:
     HeartbeatConsumerError <= '0';
 """)
 
-if 0x101700 in objects:
+if "TIMER_HEARTBEAT_PRODUCER" in service_timer_names:
+    fp.write("""
+    -- Heartbeat producer timer
+    TimerArm(TIMER_HEARTBEAT_PRODUCER) <=
+        '1' when
+            NmtState = CanOpen.NMT_STATE_INITIALISATION
+            or {0} = 0
+            or CurrentState = STATE_RESET_COMM
+            or (CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and TxSdoInitiateMuxIndex = x"1017" and TxSdoInitiateMuxSubIndex = x"00") -- Successful SDO Download
+        else '0';
+    process (Reset_n, Clock)
+    begin
+        if Reset_n = '0' then
+            HeartbeatProducerInterrupt <= '0';
+        elsif rising_edge(Clock) then
+            if TimerEvent(TIMER_HEARTBEAT_PRODUCER) = '1' then
+                HeartbeatProducerInterrupt <= '1';
+            elsif CurrentState = STATE_HEARTBEAT then
+                HeartbeatProducerInterrupt <= '0';
+            end if;
+        end if;
+    end process;
+""".format(objects.get(0x101700).get("name")))
+elif 0x101700 in objects:
     fp.write("""
     -- Heartbeat producer timer
     process (Reset_n, Clock)
@@ -1238,72 +2205,152 @@ else:
     HeartbeatProducerInterrupt <= '0';
 """)
 
-rpdo_timers = []
-for i in range(1, 0x201):
-    index = 0x1400 + i - 1
-    if index not in od:
-        continue
-    rpdo_object = od.get(index)
-    if "subs" in rpdo_object and 0x05 in rpdo_object.get("subs"):
-        rpdo_timers.append(i)
-
 fp.write("""
     -----------------------------------------------------------
     -- RPDOs
     -----------------------------------------------------------
 """);
-if len(rpdo_timers):
-    fp.write("""
+if rpdo_timers:
+    n = len(rpdo_timers)
+    fp.write(f"""
+    -- RPDO deadline monitoring
+    -- RPDO states are kept in a RAM and updated round-robin, one RPDO per clock, in sweeps of {n:d} RPDOs and an idle slot.
+    -- Each frame read is matched against the COB-ID of every RPDO during the next {n + 1:d} clocks, while reception of the next frame is held off.
     process (Reset_n, Clock)
-""")
-    for i in rpdo_timers:
-        fp.write(f"""        variable Rpdo{i}Counter : unsigned(15 downto 0);
-        variable Rpdo{i}Timeout : std_logic;
-""")
-    fp.write("""    begin
+        type RpdoStateArray is array (0 to {n - 1:d}) of std_logic_vector(17 downto 0); -- Timeout & Enable & Counter
+        variable RpdoStates             : RpdoStateArray;
+        variable RpdoIndex              : natural range 0 to {n:d}; -- RPDO to read, {n:d} is the idle slot
+        variable RpdoWriteIndex         : natural range 0 to {n - 1:d}; -- RPDO read in the previous clock
+        variable RpdoValid              : boolean; -- An RPDO was read in the previous clock
+        variable RpdoMatch              : boolean; -- The RPDO read in the previous clock is matched against RpdoFrame
+        variable RpdoBit                : natural range 0 to {rpdo_timeout_bits - 1:d}; -- RpdoTimeoutBits index of the RPDO read
+        variable RpdoCobId              : unsigned(31 downto 0);
+        variable RpdoEventTimer         : unsigned(15 downto 0);
+        variable RpdoState              : std_logic_vector(17 downto 0);
+        variable RpdoCounter            : unsigned(15 downto 0);
+        variable RpdoEnable             : std_logic;
+        variable RpdoReceived           : boolean;
+        variable RpdoFrame              : CanBus.Frame; -- Last frame read
+        variable RpdoMatchRemaining     : natural range 0 to {n + 1:d}; -- Reads left to match RpdoFrame
+        variable RpdoTimeouts           : std_logic; -- Timeouts of the current sweep
+        variable RpdoClear              : boolean; -- Clears the states during the current sweep
+        variable MillisecondPending     : std_logic; -- Millisecond elapsed during the current sweep
+        variable MillisecondSweep       : std_logic; -- Millisecond elapsed during the previous sweep
+    begin
         if Reset_n = '0' then
-""")
-    for i in rpdo_timers:
-        fp.write(f"""            Rpdo{i}Counter := (others => '0');
-            Rdpo{i}Timeout := '0';
-""")
-    fp.write("""        elsif rising_edge(Clock) then
-""")
-    for i in rpdo_timers:
-        cob_id_mux = ((0x1400 + (i - 1)) << 8) + 0x01
-        rpdo_id = object.get(cob_id_mux)
-        rpdo_timeout = object.get(cob_id_mux)
-        fp.write(f"""            if
-                {rpdo_id.get("name")}(31) = '1' or
-                {rpdo_timeout.get("name")} = 0 or
-                (
-                    CurrentState = STATE_CAN_RX_READ and
-                    RxFrame_q.Ide = {rpdo_id.get("name")}(29) and
-                    unsigned(RxFrame_q.Id) = {rpdo_id.get("name")}(28 downto 0)
-                )
-            then
-                Rpdo{i}Counter := (others => '0');
-                Rpdo{i}Timeout := '0';
-            elsif MillisecondEnable = '1' then
-                if Rpdo{i}Counter < {rpdo_timeout.get("name")} - 1 then
-                    Rpdo{i}Counter := Rpdo{i}Counter + 1;
+            RpdoIndex := 0;
+            RpdoWriteIndex := 0;
+            RpdoValid := false;
+            RpdoMatch := false;
+            RpdoBit := 0;
+            RpdoCobId := (others => '0');
+            RpdoEventTimer := (others => '0');
+            RpdoState := (others => '0');
+            RpdoFrame := (
+                Id => (others => '0'),
+                Rtr => '0',
+                Ide => '0',
+                Dlc => (others => '0'),
+                Data => (others => (others => '0'))
+            );
+            RpdoMatchRemaining := 0;
+            RpdoTimeouts := '0';
+            RpdoClear := true;
+            MillisecondPending := '0';
+            MillisecondSweep := '0';
+            RpdoMatchBusy <= '0';
+            RpdoTimeoutBits <= (others => '0');
+            RpdoTimeout <= '0';
+        elsif rising_edge(Clock) then
+            -- Update the RPDO read in the previous clock
+            if RpdoValid then
+                RpdoReceived := RpdoMatch and RpdoFrame.Rtr = '0' and CanOpen.is_match(RpdoFrame, RpdoCobId);
+                RpdoEnable := RpdoState(16);
+                RpdoCounter := unsigned(RpdoState(15 downto 0));
+                if RpdoClear or RpdoCobId(31) = '1' or RpdoEventTimer = 0 then -- Check if RPDO and its event timer are valid
+                    RpdoEnable := '0';
+                elsif RpdoReceived then -- Enable deadline monitoring after first RPDO is received
+                    RpdoEnable := '1';
+                end if;
+                if RpdoEnable = '0' or RpdoReceived then
+                    RpdoCounter := (others => '0');
+                    RpdoState(17) := '0';
                 else
-                    Rpdo{i}Counter := 0;
-                    Rpdo{i}Timeout := '1';
+                    if MillisecondSweep = '1' and RpdoCounter < RpdoEventTimer then
+                        RpdoCounter := RpdoCounter + 1;
+                    end if;
+                    if RpdoCounter = RpdoEventTimer then
+                        RpdoState(17) := '1';
+                    end if;
                 end if;
+                RpdoStates(RpdoWriteIndex) := RpdoState(17) & RpdoEnable & std_logic_vector(RpdoCounter);
+                RpdoTimeoutBits(RpdoBit) <= RpdoState(17);
+                RpdoTimeouts := RpdoTimeouts or RpdoState(17);
+            end if;
+            -- Match each frame read in Operational against every RPDO, starting with the next read
+            if CurrentState = STATE_CAN_RX_READ and NmtState = CanOpen.NMT_STATE_OPERATIONAL then
+                RpdoFrame := RxFrame_q;
+                RpdoMatchRemaining := {n + 1:d};
             end if;
+            -- Read the next RPDO
+            RpdoValid := RpdoIndex < {n:d};
+            RpdoMatch := RpdoMatchRemaining > 0;
+            if RpdoMatchRemaining > 0 then
+                RpdoMatchRemaining := RpdoMatchRemaining - 1;
+            end if;
+            if RpdoIndex < {n:d} then
+                RpdoState := RpdoStates(RpdoIndex);
+                RpdoWriteIndex := RpdoIndex;
+            end if;
+            case RpdoIndex is
 """)
-    fp.write("""
+    for index, i in enumerate(rpdo_timers):
+        mux = (0x1400 + i - 1) << 8
+        fp.write(f"""                when {index:d} =>
+                    RpdoCobId := {objects.get(mux + 0x01).get("name")};
+                    RpdoEventTimer := {objects.get(mux + 0x05).get("name")};
+                    RpdoBit := {i - 1:d};
+""")
+    fp.write(f"""                when others =>
+                    RpdoCobId := (others => '0');
+                    RpdoEventTimer := (others => '0');
+                    RpdoBit := 0;
+            end case;
+            if CurrentState = STATE_RESET_COMM then
+                RpdoIndex := 0;
+                RpdoClear := true;
+            elsif RpdoIndex = {n:d} then -- End of sweep
+                RpdoTimeout <= RpdoTimeouts;
+                RpdoTimeouts := '0';
+                RpdoClear := false;
+                MillisecondSweep := MillisecondPending;
+                MillisecondPending := '0';
+                RpdoIndex := 0;
+            else
+                RpdoIndex := RpdoIndex + 1;
+            end if;
+            if MillisecondEnable = '1' then
+                MillisecondPending := '1';
+            end if;
+            if RpdoMatchRemaining > 0 then
+                RpdoMatchBusy <= '1';
+            else
+                RpdoMatchBusy <= '0';
+            end if;
         end if;
-        RpdoTimeout <= """)
-    fp.write(""" and
-                       """.join(map(lambda i: f"Rpdo{i}Timeout", rpdo_timers)))
-    fp.write(""";
     end process;
 """)
 else:
     fp.write("""    RpdoTimeout <= '0';
 """);
+for mux, offset in rpdo_timeout_muxes.items():
+    obj = objects.get(mux)
+    if rpdo_timers:
+        fp.write(f"""    {obj.get("name")} <= unsigned(RpdoTimeoutBits({offset + obj.get("bit_length") - 1:d} downto {offset:d}));
+""")
+    else:
+        fp.write(f"""    {obj.get("name")} <= (others => '0'); -- No RPDO deadline monitoring
+""")
 
 fp.write("""
     -----------------------------------------------------------
@@ -1328,168 +2375,190 @@ for i in range(4):
     Tpdo{0}RtrInterrupt <= '0';
 """.format(i + 1))
         continue
-    cob_id = objects.get(cob_id_mux)
-    xtype = objects.get(xtype_mux)
-    fp.write("""    Tpdo{0}InterruptEnable <=
+    cob_id = objects.get(cob_id_mux).get("name")
+    xtype = objects.get(xtype_mux).get("name")
+    n = i + 1
+
+    def xtype_is(predicate, condition):
+        return fold(xtype_mux, predicate, condition.format(xtype))
+
+    # Interrupt enable, without the alternatives impossible for const parameters
+    synchronous = [
+        (fold_and(xtype_is(lambda v: v == 0, "{} = 0"), f"Tpdo{n}EventInterrupt = '1'"), None),
+        (fold_and(xtype_is(lambda v: v == 0xFC, '{} = x"FC"'), f"Tpdo{n}RtrInterrupt = '1'"), None)
+    ]
+    cyclic = xtype_is(lambda v: 0 < v <= 240, "{0} > 0 and {0} <= 240")
+    if cyclic is not False:
+        if sync_start_mux in objects:
+            sync_start = objects.get(sync_start_mux).get("name")
+            counters = [(fold_and(fold(sync_start_mux, lambda v: v == 0, f"{sync_start} = 0"), f"Tpdo{n}SyncCounter = {xtype}"), "Internal SYNC counter")]
+            if 0x101900 in objects:
+                counters.append((fold_and(
+                    fold(sync_start_mux, lambda v: v > 0, f"{sync_start} > 0"),
+                    fold(0x101900, lambda v: v > 1, f"{objects.get(0x101900).get('name')} > 1"),
+                    'RxFrame.Dlc = b"0001"',
+                    f"RxFrame_q.Data(0) = std_logic_vector({sync_start})"
+                ), "Counter from SYNC message"))
+            synchronous.append((vhdl_group(cyclic, counters, "Cyclic"), None))
+        else:
+            synchronous.append((fold_and(cyclic, f"Tpdo{n}SyncCounter = {xtype}"), None))
+    asynchronous = [
+        (fold_and(xtype_is(lambda v: v == 0xFD, '{} = x"FD"'), f"Tpdo{n}RtrInterrupt = '1'"), None),
+        (xtype_is(lambda v: v >= 0xFE, '{} >= x"FE"'), None)
+    ]
+    alternatives = [
+        (f"{cob_id}(30) = '0' and CurrentState = STATE_CAN_RX_READ and CanOpen.is_match(RxFrame_q, {cob_id}) and RxFrame_q.Rtr = '1'", "RTR"),
+        (vhdl_group("Sync_ob = '1'", synchronous, "Synchronous"), None),
+        (vhdl_group(f"Tpdo{n}EventInterrupt = '1'", asynchronous, "Asynchronous (event-driven)"), None)
+    ]
+    fp.write(f"""    Tpdo{n}InterruptEnable <=
         '1' when
-            TpdoInterruptEnable = '1' and {1}(31) = '0' -- Valid TPDO
+            TpdoInterruptEnable = '1' and {cob_id}(31) = '0' -- Valid TPDO
             and (
-                ({1}(30) = '0' and CurrentState = STATE_CAN_RX_READ and CanOpen.is_match(RxFrame_q, {1}) and RxFrame_q.Rtr = '1') -- RTR
-                or (
-                    Sync_ob = '1' and ( -- Synchronous
-                        ({2} = 0 and Tpdo{0}EventInterrupt = '1')
-                        or ({2} = x"FC" and Tpdo{0}RtrInterrupt = '1')
-""".format(i + 1, cob_id.get("name"), xtype.get("name")))
-    if sync_start_mux in objects:
-        sync_start = objects.get(sync_start_mux)
-        fp.write("""                        or (
-                            ({2} > 0 and {2} <= 240) -- Cyclic
-                            and (
-                                ({1} = 0 and Tpdo{0}SyncCounter = {2}) -- Internal SYNC counter
-""".format(i + 1, sync_start.get("name"), xtype.get("name")))
-        if 0x101900 in objects:
-            fp.write("""                                or ({1} > 0 and {2} > 1 and RxFrame.Dlc = b"0001" and RxFrame_q.Data(0) = std_logic_vector({1})) -- Counter from SYNC message
-""".format(i + 1, sync_start.get("name"), objects.get(0x101900).get("name")))
-        fp.write("""                            )
-                        )
 """)
-    else:
-        fp.write("""
-                        or (({2} > 0 and {2} <= 240) and Tpdo{0}SyncCounter = {2})
-""".format(i + 1, None, xtype.get("name")))
-    fp.write("""                    )
-                )
-                or (
-                    Tpdo{0}EventInterrupt = '1' and ( -- Asynchronous (event-driven)
-                        ({2} = x"FD" and Tpdo{0}RtrInterrupt = '1')
-                        or {2} >= x"FE"
-                    )
-                )
-            )
+    for line in vhdl_disjunction(alternatives):
+        fp.write("                " + line + "\n")
+    fp.write("""            )
         else '0';
     process (Reset_n, Clock)
-        variable EventTimer : natural range 0 to 65535;
-        variable InhibitTimer : natural range 0 to 65535;
-        variable SynchronousWindowTimer : unsigned(31 downto 0);
-    begin
+{1}    begin
         if Reset_n = '0' then
-            EventTimer := 0;
-            InhibitTimer := 0;
-            SynchronousWindowTimer := (others => '0');
-            Tpdo{0}EventInterrupt <= '0';
+{2}            Tpdo{0}EventInterrupt <= '0';
             Tpdo{0}Interrupt <= '0';
             Tpdo{0}RtrInterrupt <= '0';
             Tpdo{0}SyncCounter <= (others => '0');
         elsif rising_edge(Clock) then
-""".format(i + 1, None, xtype.get("name")))
-    if 0x100700 in objects:
-        fp.write("""
-            if CurrentState = STATE_TPDO{0} or (({1} <= 240 or {1} = x"FC") and {2} > 0 and SynchronousWindowTimer = {2}) then
-""".format(i + 1, xtype.get("name"), objects.get(0x100700).get("name")))
-    else:
-        fp.write("""
-            if CurrentState = STATE_TPDO{0} then
-""".format(i + 1))
-    fp.write("""                Tpdo{0}EventInterrupt <= '0';
-""".format(i + 1))
-    if xtype_mux in objects:
-        if inhibit_time_mux in objects and event_timer_mux in objects:
-            inhibit_time = objects.get(inhibit_time_mux)
-            event_timer = objects.get(event_timer_mux)
-            fp.write("""            elsif InhibitTimer = {2} and (Tpdo{0}Event = '1' or ({1} >= x"FE" and {3} > 0 and EventTimer = {3})) then
-                Tpdo{0}EventInterrupt <= '1';
-            end if;
+""".format(n, "" if args.timer_service else """        variable EventTimer : natural range 0 to 65535;
+        variable InhibitTimer : natural range 0 to 65535;
+        variable SynchronousWindowTimer : unsigned(31 downto 0);
+""", "" if args.timer_service else """            EventTimer := 0;
+            InhibitTimer := 0;
+            SynchronousWindowTimer := (others => '0');
+"""))
 
+    # Event interrupt, cleared by the synchronous window
+    window = False
+    if tpdo_window_used(i):
+        window = fold_and(
+            xtype_is(lambda v: v <= 240 or v == 0xFC, '{0} <= 240 or {0} = x"FC"'),
+            fold(0x100700, lambda v: v > 0, f"{objects.get(0x100700).get('name')} > 0"),
+            "TimerExpired(TIMER_SYNCHRONOUS_WINDOW) = '1'" if args.timer_service else "SynchronousWindowTimer = " + objects.get(0x100700).get("name")
+        )
+    fp.write(f"""
+            if {fold_or(f"CurrentState = STATE_TPDO{n}", window)} then
+                Tpdo{n}EventInterrupt <= '0';
+""")
+    event_timer_used = tpdo_event_timer_used(i)
+    inhibit_time_used = tpdo_inhibit_time_used(i)
+    condition = f"Tpdo{n}Event = '1'"
+    if event_timer_used:
+        event_timer = objects.get(event_timer_mux).get("name")
+        condition = fold_or(condition, fold_and(
+            xtype_is(lambda v: v >= 0xFE, '{} >= x"FE"'),
+            fold(event_timer_mux, lambda v: v > 0, f"{event_timer} > 0"),
+            f"TimerExpired(TIMER_TPDO{n}_EVENT) = '1'" if args.timer_service else f"EventTimer = {event_timer}"
+        ))
+    elif inhibit_time_mux in objects and event_timer_mux not in objects:
+        condition = fold_and(condition, xtype_is(lambda v: v >= 0xFE, '{} >= x"FE"'))
+    if inhibit_time_used:
+        inhibit_time = objects.get(inhibit_time_mux).get("name")
+        if args.timer_service:
+            condition = fold_and(fold_or(fold(inhibit_time_mux, lambda v: v == 0, f"{inhibit_time} = 0"), f"TimerExpired(TIMER_TPDO{n}_INHIBIT) = '1'"), condition)
+        else:
+            condition = fold_and(f"InhibitTimer = {inhibit_time}", condition)
+    if condition is not False:
+        fp.write(f"""            elsif {condition} then
+                Tpdo{n}EventInterrupt <= '1';
+""")
+    fp.write("""            end if;
+""")
+    timer_arms = []
+    if event_timer_used:
+        disabled = "" if const_value(event_timer_mux) is not None else f"""
+            or {event_timer} = 0 -- Event timer disabled"""
+        if args.timer_service:
+            timer_arms.append(f"""    TimerArm(TIMER_TPDO{n}_EVENT) <=
+        '1' when
+            Tpdo{n}Event = '1'
+            or CurrentState = STATE_TPDO{n}{disabled}
+            or (CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and TxSdoInitiateMuxIndex = x"1800" and TxSdoInitiateMuxSubIndex = x"05") -- Successful SDO Download
+        else '0';
+""")
+        else:
+            fp.write(f"""
             if
-                Tpdo{0}Event = '1'
-                or CurrentState = STATE_TPDO{0}
-                or {1} = 0 -- Event timer disabled
+                Tpdo{n}Event = '1'
+                or CurrentState = STATE_TPDO{n}{disabled.replace(chr(10), chr(10) + "    ")}
                 or (CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and TxSdoInitiateMuxIndex = x"1800" and TxSdoInitiateMuxSubIndex = x"05") -- Successful SDO Download
             then
                 EventTimer := 0;
-            elsif EventTimer < {3} and MillisecondEnable = '1' then
+            elsif EventTimer < {event_timer} and MillisecondEnable = '1' then
                 EventTimer := EventTimer + 1;
             end if;
-
-            if
-                CurrentState = STATE_TPDO{0}
-                or {2} = 0 -- Inhibit time disabled
-                or (CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and TxSdoInitiateMuxIndex = x"1800" and TxSdoInitiateMuxSubIndex = x"03") -- Successful SDO Download
-            then
-                InhibitTimer := 0;
-            elsif InhibitTimer < {2} and HundredMicrosecondEnable = '1' then
-                InhibitTimer := InhibitTimer + 1;
-""".format(i + 1, xtype.get("name"), inhibit_time.get("name"), event_timer.get("name")))
-        elif inhibit_time_mux in objects:
-            inhibit_time = objects.get(inhibit_time_mux)
-            fp.write("""            elsif InhibitTimer = {2} and Tpdo{0}Event = '1' and {1} >= x"FE" then
-                Tpdo{0}EventInterrupt <= '1';
-            end if;
-
+""")
+    if inhibit_time_used:
+        disabled = "" if const_value(inhibit_time_mux) is not None else f"""
+            or {inhibit_time} = 0 -- Inhibit time disabled"""
+        if args.timer_service:
+            timer_arms.append(f"""    TimerArm(TIMER_TPDO{n}_INHIBIT) <=
+        '1' when
+            CurrentState = STATE_TPDO{n}{disabled}
+            or (CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and TxSdoInitiateMuxIndex = x"1800" and TxSdoInitiateMuxSubIndex = x"03") -- Successful SDO Download
+        else '0';
+""")
+        else:
+            fp.write(f"""
             if
-                CurrentState = STATE_TPDO{0}
-                or {2} = 0 -- Inhibit time disabled
+                CurrentState = STATE_TPDO{n}{disabled.replace(chr(10), chr(10) + "    ")}
                 or (CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and TxSdoInitiateMuxIndex = x"1800" and TxSdoInitiateMuxSubIndex = x"03") -- Successful SDO Download
             then
                 InhibitTimer := 0;
-            elsif InhibitTimer < {2} and HundredMicrosecondEnable = '1' then
+            elsif InhibitTimer < {inhibit_time} and HundredMicrosecondEnable = '1' then
                 InhibitTimer := InhibitTimer + 1;
-""".format(i + 1, xtype.get("name"), inhibit_time.get("name")))
-        elif event_timer_mux in objects:
-            event_timer = objects.get(event_timer_mux)
-            fp.write("""            elsif Tpdo{0}Event = '1' or ({1} >= x"FE" and {2} > 0 and EventTimer = {2}) then
-                Tpdo{0}EventInterrupt <= '1';
             end if;
-
-            if
-                Tpdo{0}Event = '1'
-                or CurrentState = STATE_TPDO{0}
-                or {1} = 0 -- Event timer disabled
-                or (CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and TxSdoInitiateMuxIndex = x"1800" and TxSdoInitiateMuxSubIndex = x"05") -- Successful SDO Download
-            then
-                EventTimer := 0;
-            elsif EventTimer < {2} and MillisecondEnable = '1' then
-                EventTimer := EventTimer + 1;
-""".format(i + 1, xtype.get("name"), event_timer.get("name")))
-        else:
-            fp.write("""            elsif Tpdo{0}Event = '1' then
-                Tpdo{0}EventInterrupt <= '1';
-""".format(i + 1))
-    fp.write("""            end if;
-
-            if CurrentState = STATE_TPDO{0} then
-                Tpdo{0}Interrupt <= '0';
-            elsif Tpdo{0}InterruptEnable = '1' then
-                Tpdo{0}Interrupt <= '1';
+""")
+    fp.write(f"""
+            if CurrentState = STATE_TPDO{n} then
+                Tpdo{n}Interrupt <= '0';
+            elsif Tpdo{n}InterruptEnable = '1' then
+                Tpdo{n}Interrupt <= '1';
             end if;
-
-            if CurrentState = STATE_TPDO{0} then
-                Tpdo{0}RtrInterrupt <= '0';
-            elsif {1}(30) = '0' and CurrentState = STATE_CAN_RX_READ and RxFrame_q.Ide = {1}(29) and unsigned(RxFrame_q.Id) = {1}(28 downto 0) and RxFrame_q.Rtr = '1' then
-                Tpdo{0}RtrInterrupt <= '1';
+""")
+    if fold(xtype_mux, lambda v: v in [0xFC, 0xFD], True): # RTR-only transmission types
+        fp.write(f"""
+            if CurrentState = STATE_TPDO{n} then
+                Tpdo{n}RtrInterrupt <= '0';
+            elsif {cob_id}(30) = '0' and CurrentState = STATE_CAN_RX_READ and RxFrame_q.Ide = {cob_id}(29) and unsigned(RxFrame_q.Id) = {cob_id}(28 downto 0) and RxFrame_q.Rtr = '1' then
+                Tpdo{n}RtrInterrupt <= '1';
             end if;
-
+""")
+    if cyclic is not False:
+        fp.write(f"""
             if Sync_ob = '1' then
                 if CurrentState = STATE_RESET_COMM then
-""".format(i + 1, cob_id.get("name"), xtype.get("name")))
-    if sync_start_mux in objects:
-        fp.write("""                    if {0} = 0 then
-                        Tpdo{0}SyncCounter <= to_unsigned(1, Tpdo{0}SyncCounter'length);
+""")
+        sync_start_zero = fold(sync_start_mux, lambda v: v == 0, f"{objects.get(sync_start_mux).get('name')} = 0") if sync_start_mux in objects else True
+        if sync_start_zero is False:
+            fp.write(f"""                    Tpdo{n}SyncCounter <= {objects.get(sync_start_mux).get("name")};
+""")
+        elif sync_start_zero is not True:
+            fp.write(f"""                    if {sync_start_zero} then
+                        Tpdo{n}SyncCounter <= to_unsigned(1, Tpdo{n}SyncCounter'length);
                     else
-                        Tpdo{0}SyncCounter <= {1};
+                        Tpdo{n}SyncCounter <= {objects.get(sync_start_mux).get("name")};
                     end if;
-""".format(i + 1, objects.get(sync_start_mux).get("name")))
-    else:
-        fp.write("""                    Tpdo{0}SyncCounter <= to_unsigned(1, Tpdo{0}SyncCounter'length);
-""".format(i + 1, cob_id.get("name")))
-    fp.write("""                elsif Tpdo{0}SyncCounter < {2} then
-                    Tpdo{0}SyncCounter <= Tpdo{0}SyncCounter + 1;
+""")
+        else:
+            fp.write(f"""                    Tpdo{n}SyncCounter <= to_unsigned(1, Tpdo{n}SyncCounter'length);
+""")
+        fp.write(f"""                elsif Tpdo{n}SyncCounter < {xtype} then
+                    Tpdo{n}SyncCounter <= Tpdo{n}SyncCounter + 1;
                 else
-                    Tpdo{0}SyncCounter <= to_unsigned(1, Tpdo{0}SyncCounter'length);
+                    Tpdo{n}SyncCounter <= to_unsigned(1, Tpdo{n}SyncCounter'length);
                 end if;
             end if;
-""".format(i + 1, cob_id.get("name"), xtype.get("name")))
-    if 0x100700 in objects:
+""")
+    if tpdo_window_used(i) and not args.timer_service and window is not False:
         fp.write("""
             if
                 Sync_ob = '1'
@@ -1500,11 +2569,13 @@ for i in range(4):
             elsif SynchronousWindowTimer < {1} and MicrosecondEnable = '1' then
                 SynchronousWindowTimer := SynchronousWindowTimer + 1;
             end if;
-""".format(i + 1, objects.get(0x100700).get("name")))
+""".format(n, objects.get(0x100700).get("name")))
     fp.write("""
         end if;
     end process;
 """)
+    for timer_arm in timer_arms:
+        fp.write(timer_arm)
 
 fp.write("""
     -- TPDO mappings
@@ -1533,13 +2604,10 @@ for i in range(4):
                 raise ValueError("TPDO{:d} Mapping {:d} (0x{:06X}) is not mappable".format(i + 1, odsi, mux))
             if bit_length != mappee.get("bit_length"):
                 raise ValueError("TPDO{:d} Mapping {:d} length mismatch".format(i + 1, odsi))
-            name = mappee.get("name")
-            if mappee.get("data_type") not in ["std_logic", "std_logic_vector"]:
-                 name = "std_logic_vector(" + name + ")"
-            tpdo.append(name)
+            tpdo.append(to_vector(mappee, mappee.get("name")))
             tpdo_length += bit_length;
-        if tpdo_length > 64:
-            raise ValueError("TPDO{:d} Mapping is greater than 64 bits".format(i + i))
+        if tpdo_length > 8 * args.pdo_bytes:
+            raise ValueError("TPDO{:d} Mapping is greater than {:d} bits".format(i + 1, 8 * args.pdo_bytes))
         tpdo.reverse()
         fp.write(zero_fill(64 - tpdo_length) + " & ".join(tpdo))
     else:
@@ -1569,12 +2637,16 @@ fp.write("""
                 TxFrame.Data <= (others => (others => '0'));
 """)
 
-if 0x100500 in objects:
+if sync_producer_used():
     fp.write(f"""            elsif CurrentState = STATE_SYNC then
                 TxFrame.Id <= std_logic_vector({objects.get(0x100500).get("name")}(28 downto 0));
                 TxFrame.Ide <= {objects.get(0x100500).get("name")}(29);
 """)
-    if 0x100600 in objects and 0x101900 in objects:
+    if sync_counter_used() and const_value(0x101900) is not None:
+        fp.write("""                TxFrame.Dlc <= b"0001";
+                TxFrame.Data(0) <= std_logic_vector(SynchronousCounter);
+""")
+    elif sync_counter_used():
         fp.write("""
                 if {0} < 2 or {0} > 240 then
                     TxFrame.Dlc <= b"0000";
@@ -1610,9 +2682,7 @@ for i in range(4):
     mux = ((0x1800 + i) << 8) + 0x01
     if mux not in objects: continue
     obj = objects.get(mux)
-    dlc, r = divmod(tpdo_lengths[i], 8)
-    if r > 0:
-        dlc += 1
+    dlc = fd_dlc(math.ceil(tpdo_lengths[i] / 8))
     fp.write("""            elsif CurrentState = STATE_TPDO{0} then
                 TxFrame.Id <= std_logic_vector({1}(28 downto 0));
                 TxFrame.Ide <= {1}(29);
@@ -1633,44 +2703,382 @@ fp.write("""            elsif CurrentState = STATE_HEARTBEAT then
                 TxFrame.Ide <= '0';
                 TxFrame.Dlc <= b"0001";
                 TxFrame.Data <= (0 => '0' & NmtState, others => (others => '0'));
-            end if;
+""")
+if args.lss:
+    fp.write("""            elsif CurrentState = STATE_LSS_TX then
+                TxFrame.Id(28 downto 11) <= (others => '0');
+                TxFrame.Id(10 downto 0) <= CanOpen.LSS_SLAVE_COB_ID;
+                TxFrame.Ide <= '0';
+                TxFrame.Dlc <= b"1000";
+                TxFrame.Data <= LssResponse;
+""")
+fp.write("""            end if;
         end if;
     end process;
 """)
 
-if 0x120001 in objects:
+if args.lss:
+    identity = []
+    for sub in range(1, 5):
+        obj = objects.get(0x101800 + sub)
+        identity.append("to_unsigned(0, 32)" if obj is None else obj.get("name"))
     fp.write("""
     -----------------------------------------------------------
-    -- SDO
+    -- LSS slave per CiA 305
     -----------------------------------------------------------
 
-    RxSdoInitiateMux <= RxSdoInitiateMuxIndex & RxSdoInitiateMuxSubIndex;
-    process (Clock, Reset_n, SegmentedSdoData, SegmentedSdoDataValid)
-        variable SegmentedSdoReadBytes : unsigned(31 downto 0);
-        variable SdoActive          : boolean; -- In non-expedited transaction
-        variable SdoBlockCrc        : std_logic_vector(15 downto 0);
-        variable SdoBlockMode       : boolean; -- Sending sub-blocks
-        variable SdoBlockSize       : unsigned(6 downto 0); -- From client
-        variable SdoExternal        : boolean;
-        variable SdoMux             : std_logic_vector(23 downto 0); -- Upload request mux
-        variable SdoPending         : boolean; -- Waiting for SegmentedSdoDataValid
-        variable SdoSegData         : std_logic_vector(55 downto 0);
-        variable SdoSegDataInternal : std_logic_vector(55 downto 0);
-        variable SdoSegDataValid    : std_logic;
-        variable SdoSequenceNumber  : unsigned(6 downto 0);
-        variable SdoToggle          : std_logic; -- Toggle bit for segmented transfer
+    LssNodeId <= LssNodeId_ob;
+
+    process (Reset_n, Clock)
+        variable IdNumber       : unsigned(31 downto 0);
+        variable Identity       : unsigned(31 downto 0); -- Identity object entry LSSSub
+        variable BitChecked,
+                 LssSub,
+                 LssNext        : natural range 0 to 255;
+        variable FastscanSub    : natural range 0 to 3; -- Identity object entry expected by Fastscan
+        variable SelectiveSub   : natural range 0 to 3; -- Identity object entries matched by Switch state selective
     begin
-        if SdoExternal then
-            SdoSegData := SegmentedSdoData;
-            SdoSegDataValid := SegmentedSdoDataValid;
-        else
-            SdoSegData := SdoSegDataInternal;
-            SdoSegDataValid := '1';
-        end if;
         if Reset_n = '0' then
-            TxSdo <= (others => '0');
-            SdoInterrupt <= '0';
-            SegmentedSdoReadBytes := (others => '0');
+            LssNodeId_ob <= CanOpen.BROADCAST_NODE_ID;
+            LssConfiguration <= '0';
+            LssInterrupt <= '0';
+            LssResponse <= (others => (others => '0'));
+            LssStore <= '0';
+            FastscanSub := 0;
+            SelectiveSub := 0;
+        elsif rising_edge(Clock) then
+            LssStore <= '0';
+            if CurrentState = STATE_RESET then -- Power-on node-ID
+                LssNodeId_ob <= NodeId;
+            elsif CurrentState = STATE_LSS_TX then
+                LssInterrupt <= '0';
+            elsif
+                (CurrentState = STATE_CAN_RX_READ or CurrentState = STATE_LSS_RX) and
+                RxFrame_q.Id(10 downto 0) = CanOpen.LSS_MASTER_COB_ID and
+                RxFrame_q.Ide = '0' and
+                RxFrame_q.Rtr = '0' and
+                RxFrame_q.Dlc = b"1000"
+            then
+                IdNumber := unsigned(RxFrame_q.Data(4) & RxFrame_q.Data(3) & RxFrame_q.Data(2) & RxFrame_q.Data(1));
+                BitChecked := to_integer(unsigned(RxFrame_q.Data(5)));
+                LssSub := to_integer(unsigned(RxFrame_q.Data(6)));
+                LssNext := to_integer(unsigned(RxFrame_q.Data(7)));
+                case LssSub is
+                    when 0 =>
+                        Identity := {0};
+                    when 1 =>
+                        Identity := {1};
+                    when 2 =>
+                        Identity := {2};
+                    when others =>
+                        Identity := {3};
+                end case;
+                LssResponse <= (0 => RxFrame_q.Data(0), others => (others => '0'));
+                case RxFrame_q.Data(0) is
+                    when CanOpen.LSS_CS_SWITCH_STATE_GLOBAL =>
+                        if RxFrame_q.Data(1) = x"00" then
+                            LssConfiguration <= '0';
+                        elsif RxFrame_q.Data(1) = x"01" then
+                            LssConfiguration <= '1';
+                        end if;
+                        SelectiveSub := 0;
+                    when CanOpen.LSS_CS_SWITCH_STATE_SELECTIVE_VENDOR =>
+                        if IdNumber = {0} then
+                            SelectiveSub := 1;
+                        else
+                            SelectiveSub := 0;
+                        end if;
+                    when CanOpen.LSS_CS_SWITCH_STATE_SELECTIVE_PRODUCT =>
+                        if SelectiveSub = 1 and IdNumber = {1} then
+                            SelectiveSub := 2;
+                        else
+                            SelectiveSub := 0;
+                        end if;
+                    when CanOpen.LSS_CS_SWITCH_STATE_SELECTIVE_REVISION =>
+                        if SelectiveSub = 2 and IdNumber = {2} then
+                            SelectiveSub := 3;
+                        else
+                            SelectiveSub := 0;
+                        end if;
+                    when CanOpen.LSS_CS_SWITCH_STATE_SELECTIVE_SERIAL =>
+                        if SelectiveSub = 3 and IdNumber = {3} then
+                            LssConfiguration <= '1';
+                            LssResponse(0) <= CanOpen.LSS_CS_SWITCH_STATE_SELECTIVE;
+                            LssInterrupt <= '1';
+                        end if;
+                        SelectiveSub := 0;
+                    when CanOpen.LSS_CS_CONFIGURE_NODE_ID =>
+                        if LssConfiguration = '1' then
+                            if RxFrame_q.Data(1) = x"FF" then -- Unconfigured
+                                LssNodeId_ob <= CanOpen.BROADCAST_NODE_ID;
+                            elsif RxFrame_q.Data(1)(7) = '0' and RxFrame_q.Data(1)(6 downto 0) /= CanOpen.BROADCAST_NODE_ID then
+                                LssNodeId_ob <= RxFrame_q.Data(1)(6 downto 0);
+                            else
+                                LssResponse(1) <= x"01"; -- Node-ID out of range
+                            end if;
+                            LssInterrupt <= '1';
+                        end if;
+                    when CanOpen.LSS_CS_CONFIGURE_BIT_TIMING =>
+                        if LssConfiguration = '1' then
+                            LssResponse(1) <= x"01"; -- Bit timing not supported, it is set by the CanLite generics
+                            LssInterrupt <= '1';
+                        end if;
+                    when CanOpen.LSS_CS_STORE_CONFIGURATION =>
+                        if LssConfiguration = '1' then
+                            LssStore <= '1'; -- LssNodeId is stored by the application, and given as NodeId after power-on
+                            LssInterrupt <= '1';
+                        end if;
+""".format(*identity))
+    for i, name in enumerate(["VENDOR", "PRODUCT", "REVISION", "SERIAL"]):
+        fp.write("""                    when CanOpen.LSS_CS_INQUIRE_{0} =>
+                        if LssConfiguration = '1' then
+                            LssResponse <= CanBus.to_DataBytes(x"000000" & std_logic_vector({1}) & CanOpen.LSS_CS_INQUIRE_{0});
+                            LssInterrupt <= '1';
+                        end if;
+""".format(name, identity[i]))
+    fp.write("""                    when CanOpen.LSS_CS_INQUIRE_NODE_ID =>
+                        if LssConfiguration = '1' then
+                            if NodeId_q = CanOpen.BROADCAST_NODE_ID then
+                                LssResponse(1) <= x"FF";
+                            else
+                                LssResponse(1) <= '0' & NodeId_q;
+                            end if;
+                            LssInterrupt <= '1';
+                        end if;
+                    when CanOpen.LSS_CS_IDENTIFY_NON_CONFIGURED =>
+                        if NodeId_q = CanOpen.BROADCAST_NODE_ID then
+                            LssResponse(0) <= CanOpen.LSS_CS_IDENTIFY_NON_CONFIGURED_SLAVE;
+                            LssInterrupt <= '1';
+                        end if;
+                    when CanOpen.LSS_CS_FASTSCAN =>
+                        if LssConfiguration = '0' and NodeId_q = CanOpen.BROADCAST_NODE_ID then -- Unconfigured slaves in LSS waiting state only
+                            if BitChecked = 16#80# then -- Reset
+                                FastscanSub := 0;
+                                LssResponse(0) <= CanOpen.LSS_CS_IDENTIFY_SLAVE;
+                                LssInterrupt <= '1';
+                            elsif BitChecked < 32 and LssSub = FastscanSub and LssNext < 4 and shift_right(IdNumber xor Identity, BitChecked) = 0 then -- Bits BitChecked to 31 match
+                                if BitChecked = 0 then
+                                    if LssNext < LssSub then -- Last entry matched
+                                        LssConfiguration <= '1';
+                                    end if;
+                                    FastscanSub := LssNext;
+                                end if;
+                                LssResponse(0) <= CanOpen.LSS_CS_IDENTIFY_SLAVE;
+                                LssInterrupt <= '1';
+                            end if;
+                        end if;
+                    when others =>
+                        null;
+                end case;
+            end if;
+        end if;
+    end process;
+""")
+
+if 0x120001 in objects:
+    fp.write("""
+    -----------------------------------------------------------
+    -- SDO
+    -----------------------------------------------------------
+
+    RxSdoInitiateMux <= RxSdoInitiateMuxIndex & RxSdoInitiateMuxSubIndex;
+""")
+    if sdo_slots:
+        fp.write("""
+    -- Object values for SDO upload, indexed by SdoObjectDescriptor.Address
+""")
+        for mux in sdo_slots:
+            if mux in application_registers: continue
+            obj = objects.get(mux)
+            if mux in array_elements and mux & 0xFF > 1: continue
+            if obj.get("access_type") == "wo":
+                data = "(others => '0')"
+            else:
+                data = zero_fill(32 - obj.get("bit_length")) + to_vector(obj, sdo_value(mux, obj, "i"))
+            if mux in array_elements:
+                fp.write("""    SdoArray{0:04X}Values : for i in 1 to {1:d} generate
+        SdoObjectValues({2:d} + i) <= {3};
+    end generate SdoArray{0:04X}Values;
+""".format(mux >> 8, arrays.get(mux >> 8).get("length"), sdo_slots.get(mux) - 1, data))
+                continue
+            fp.write("    SdoObjectValues({:d}) <= {};\n".format(sdo_slots.get(mux), data))
+        fp.write("""
+    -- Object descriptor lookup by binary search of SDO_DESCRIPTORS, one step per clock
+    process (Reset_n, Clock)
+        variable Low,
+                 High,
+                 Middle     : integer range -1 to SDO_DESCRIPTORS'length;
+        variable Match      : boolean;
+    begin
+        if Reset_n = '0' then
+            Low := 0;
+            High := SDO_DESCRIPTORS'length - 1;
+            Middle := 0;
+            Match := false;
+            SdoDescriptor <= SDO_DESCRIPTOR_NONE;
+            SdoLookupDone <= '0';
+            SdoObjectValue <= (others => '0');
+        elsif rising_edge(Clock) then
+            if CurrentState /= STATE_SDO_LOOKUP then
+                Low := 0;
+                High := SDO_DESCRIPTORS'length - 1;
+                Match := false;
+                SdoLookupDone <= '0';
+            elsif SdoLookupDone = '0' then
+                if Match then -- Wait for SdoObjectValue
+                    SdoLookupDone <= '1';
+                elsif Low > High then -- Not found
+                    SdoDescriptor <= SDO_DESCRIPTOR_NONE;
+                    SdoLookupDone <= '1';
+                else
+                    Middle := (Low + High) / 2;
+                    if SDO_DESCRIPTORS(Middle).Mux = RxSdoInitiateMux then
+                        SdoDescriptor <= SDO_DESCRIPTORS(Middle);
+                        Match := true;
+                    elsif unsigned(SDO_DESCRIPTORS(Middle).Mux) < unsigned(RxSdoInitiateMux) then
+                        Low := Middle + 1;
+                    else
+                        High := Middle - 1;
+                    end if;
+                end if;
+            end if;
+{0}        end if;
+    end process;
+
+""".format("""            if SdoDescriptor.Address >= APPLICATION_REGISTER_OFFSET then
+                SdoObjectValue <= ApplicationRegisterReadDataA;
+            else
+                SdoObjectValue <= SdoObjectValues(SdoDescriptor.Address);
+            end if;
+""" if application_registers else """            SdoObjectValue <= SdoObjectValues(SdoDescriptor.Address);
+"""))
+    if application_registers:
+        fp.write("""    -- Application register file port A: initialization in STATE_RESET_APP, SDO download, SDO upload
+    ApplicationRegisterAddressA <=
+        ApplicationRegisterInitAddress when CurrentState = STATE_RESET_APP else
+        SdoWriteAddress - APPLICATION_REGISTER_OFFSET when CurrentState = STATE_SDO_TX and SdoWriteAddress >= APPLICATION_REGISTER_OFFSET else
+        SdoDescriptor.Address - APPLICATION_REGISTER_OFFSET when SdoDescriptor.Address >= APPLICATION_REGISTER_OFFSET else
+        0;
+    ApplicationRegisterWriteEnableA <=
+        '1' when CurrentState = STATE_RESET_APP else
+        '1' when CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and SdoWriteAddress >= APPLICATION_REGISTER_OFFSET else
+        '0';
+    ApplicationRegisterWriteDataA <= APPLICATION_REGISTER_DEFAULTS(ApplicationRegisterInitAddress) when CurrentState = STATE_RESET_APP else SdoWriteData;
+
+    -- Application register file (dual-port RAM), port B is read-only for the application
+    process (Clock)
+    begin
+        if rising_edge(Clock) then
+            if ApplicationRegisterWriteEnableA = '1' then
+                ApplicationRegisters(ApplicationRegisterAddressA) <= ApplicationRegisterWriteDataA;
+            end if;
+            ApplicationRegisterReadDataA <= ApplicationRegisters(ApplicationRegisterAddressA);
+            ApplicationRegisterData <= ApplicationRegisters(to_integer(ApplicationRegisterAddress));
+        end if;
+    end process;
+
+    -- Restore default values, one register per clock
+    process (Reset_n, Clock)
+    begin
+        if Reset_n = '0' then
+            ApplicationRegisterInitAddress <= 0;
+            ApplicationRegisterInitDone <= '0';
+        elsif rising_edge(Clock) then
+            if CurrentState /= STATE_RESET_APP then
+                ApplicationRegisterInitAddress <= 0;
+                ApplicationRegisterInitDone <= '0';
+            elsif ApplicationRegisterInitAddress = ApplicationRegisters'high then
+                ApplicationRegisterInitDone <= '1';
+            else
+                ApplicationRegisterInitAddress <= ApplicationRegisterInitAddress + 1;
+            end if;
+        end if;
+    end process;
+
+    -- Single-clock pulse when a register is written by SDO download, coincident with new data in register file
+    process (Reset_n, Clock)
+    begin
+        if Reset_n = '0' then
+            ApplicationRegisterChanged <= '0';
+            ApplicationRegisterChangedAddress <= (others => '0');
+        elsif rising_edge(Clock) then
+            if CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and SdoWriteAddress >= APPLICATION_REGISTER_OFFSET then
+                ApplicationRegisterChanged <= '1';
+                ApplicationRegisterChangedAddress <= to_unsigned(SdoWriteAddress - APPLICATION_REGISTER_OFFSET, ApplicationRegisterChangedAddress'length);
+            else
+                ApplicationRegisterChanged <= '0';
+            end if;
+        end if;
+    end process;
+
+""")
+    sdo_stream = args.sdo_stream and segmented_sdo
+    # Objects wider than 32 bits are uploaded by segments of SdoSegDataInternal, shifted by 7 bytes per segment
+    wide_uploads = [mux for mux, obj in objects.items() if obj.get("bit_length") > 32 and obj.get("access_type") != "wo"]
+    sdo_segment_bits = 56 * max([math.ceil(objects.get(mux).get("bit_length") / 56) for mux in wide_uploads] + [1])
+
+    def segmented_upload(mux, obj, sub_index):
+        """Returns the statements of the segmented upload initiate response of obj, wider than 32 bits"""
+        return """TxSdoCs <= CanOpen.SDO_SCS_IUR;
+TxSdo(4) <= '0';
+TxSdoUploadInitiateN <= b"00";
+TxSdoUploadInitiateE <= '0';
+TxSdoUploadInitiateS <= '1';
+TxSdoUploadInitiateD <= x"{0:08X}";
+SdoActive := true;
+SegmentedSdoReadBytes := x"{0:08X}";
+SdoExternal := false;
+SdoSegDataInternal := {1};
+""".format(math.ceil(obj.get("bit_length") / 8), zero_fill(sdo_segment_bits - obj.get("bit_length")) + to_vector(obj, sdo_value(mux, obj, sub_index)))
+
+    def segmented_block_upload(mux, obj, sub_index):
+        """Returns the statements of the block upload initiate response of obj, wider than 32 bits"""
+        return """TxSdoCs <= CanOpen.SDO_SCS_BUR;
+TxSdo(4 downto 3) <= (others => '0');
+TxSdoBlockUploadInitiateSc <= '1'; -- Server CRC support
+TxSdoBlockUploadInitiateS <= '1'; -- Size indicator
+TxSdoBlockUploadSs <= CanOpen.SDO_BLOCK_SUBCOMMAND_INITIATE(0);
+TxSdoInitiateMuxIndex <= RxSdoInitiateMuxIndex;
+TxSdoInitiateMuxSubIndex <= RxSdoInitiateMuxSubIndex;
+TxSdoBlockUploadInitiateSize <= x"{0:08X}";
+SegmentedSdoReadBytes := x"{0:08X}";
+SdoActive := true;
+SdoBlockSize := unsigned(RxSdoBlockUploadInitiateBlksize(6 downto 0));
+SdoExternal := false;
+SdoSegDataInternal := {1};
+SdoSequenceNumber := (others => '0');
+""".format(math.ceil(obj.get("bit_length") / 8), zero_fill(sdo_segment_bits - obj.get("bit_length")) + to_vector(obj, sdo_value(mux, obj, sub_index)))
+
+    def write_wide_upload_arms(out, segmented_upload, spaces):
+        """Writes an elsif arm on SdoMux for each object wider than 32 bits, for the table-driven SDO server"""
+        for mux in wide_uploads:
+            out.write('{}elsif SdoMux = x"{:06X}" then\n'.format(" " * spaces, mux))
+            out.write(indent_lines(segmented_upload(mux, objects.get(mux), None), spaces + 4))
+
+    fp.write("""    process (Clock, Reset_n, SegmentedSdoData, SegmentedSdoDataValid)
+        variable SegmentedSdoReadBytes : unsigned(31 downto 0);{2}{5}
+        variable SdoActive          : boolean; -- In non-expedited transaction
+        variable SdoBlockCrc        : std_logic_vector(15 downto 0);
+        variable SdoBlockMode       : boolean; -- Sending sub-blocks
+        variable SdoBlockSize       : unsigned(6 downto 0); -- From client
+        variable SdoExternal        : boolean;
+        variable SdoMux             : std_logic_vector(23 downto 0); -- Upload request mux
+        variable SdoPending         : boolean; -- Waiting for SegmentedSdoDataValid
+        variable SdoSegData         : std_logic_vector(55 downto 0);
+        variable SdoSegDataInternal : std_logic_vector({10:d} downto 0);
+        variable SdoSegDataValid    : std_logic;
+        variable SdoSequenceNumber  : unsigned(6 downto 0);
+        variable SdoToggle          : std_logic; -- Toggle bit for segmented transfer
+    begin
+        if SdoExternal then
+{3}        else
+            SdoSegData := SdoSegDataInternal{11};
+            SdoSegDataValid := '1';
+        end if;
+        if Reset_n = '0' then
+            TxSdo <= (others => '0');
+            SdoInterrupt <= '0';
+{1}            SegmentedSdoReadBytes := (others => '0');
             SegmentedSdoReadDataEnable <= '0';
             SdoActive := false;
             SdoBlockMode := false;
@@ -1682,16 +3090,16 @@ if 0x120001 in objects:
             SdoSegDataInternal := (others => '0');
             SdoSequenceNumber := (others => '0');
             SdoToggle := '0';
-        elsif rising_edge(Clock) then
-            if CurrentState = STATE_CAN_RX_READ then
+{4}{6}        elsif rising_edge(Clock) then
+{7}            if CurrentState = STATE_CAN_RX_READ then
                 if {0}(31) = '0' and CanOpen.is_match(RxFrame_q, {0}) and RxFrame_q.Dlc(3) = '1' then -- Next state is STATE_SDO_TX
-                    if RxFrame_q.Data(0)(7 downto 5) = CanOpen.SDO_CCS_IUR or (RxFrame_q.Data(0)(7 downto 5) = CanOpen.SDO_CCS_BUR and RxFrame_q.Data(0)(1 downto 0) = CanOpen.SDO_BLOCK_SUBCOMMAND_INITIATE) then
+                    if {8}RxFrame_q.Data(0)(7 downto 5) = CanOpen.SDO_CCS_IUR or (RxFrame_q.Data(0)(7 downto 5) = CanOpen.SDO_CCS_BUR and RxFrame_q.Data(0)(1 downto 0) = CanOpen.SDO_BLOCK_SUBCOMMAND_INITIATE){9} then
                         SdoMux := RxFrame_q.Data(2) & RxFrame_q.Data(1) & RxFrame_q.Data(3);
                         SdoExternal := true; -- Note: this will be deasserted in STATE_CAN_RX if not internal mux is used
                     end if;
                 end if;
             elsif CurrentState = STATE_SDO_RX then
-                if RxSdoCs = CanOpen.SDO_CS_ABORT then
+                {12}if RxSdoCs = CanOpen.SDO_CS_ABORT then
                     SegmentedSdoReadBytes := (others => '0');
                     SdoActive := false;
                     SdoBlockMode := false;
@@ -1705,19 +3113,187 @@ if 0x120001 in objects:
                     if RxSdoDownloadInitiateE = '0' then
                         TxSdoCs <= CanOpen.SDO_CS_ABORT;
                         TxSdoAbortCode <= CanOpen.SDO_ABORT_ACCESS;
+""".format(
+        objects.get(0x120001).get("name"),
+        "            SdoWriteAddress <= 0;\n" + ("            SdoWriteData <= (others => '0');\n" if application_registers else "") if sdo_slots else "",
+        """
+        variable SdoStreamBytes     : unsigned(31 downto 0); -- Bytes left to transfer from the Segmented SDO interface
+        variable SdoStreamData      : std_logic_vector(55 downto 0); -- Prefetched segment
+        variable SdoStreamFull      : boolean;
+        variable SdoStreamStarted   : boolean; -- SdoStreamBytes is loaded with the size""" if sdo_stream else "",
+        """            SdoSegData := SdoStreamData;
+            if SdoStreamFull then
+                SdoSegDataValid := '1';
+            else
+                SdoSegDataValid := '0';
+            end if;
+""" if sdo_stream else """            SdoSegData := SegmentedSdoData;
+            SdoSegDataValid := SegmentedSdoDataValid;
+""",
+        """            SdoStreamBytes := (others => '0');
+            SdoStreamData := (others => '0');
+            SdoStreamFull := false;
+            SdoStreamStarted := false;
+""" if sdo_stream else "",
+        """
+        variable SdoBlockDownload   : boolean; -- Receiving sub-blocks of program data
+        variable SdoProgramAck      : boolean; -- Response held until ProgramDataReady
+        variable SdoProgramActive   : boolean; -- In program download
+        variable SdoProgramCrc      : boolean; -- Client CRC support
+        variable SdoProgramLast     : std_logic_vector(55 downto 0); -- Last segment, held until its size is given by the end request""" if program_download else "",
+        """            SdoBlockDownload := false;
+            SdoProgramAck := false;
+            SdoProgramActive := false;
+            SdoProgramCrc := false;
+            SdoProgramLast := (others => '0');
+            ProgramStart <= '0';
+            ProgramData <= (others => '0');
+            ProgramDataBytes <= (others => '0');
+            ProgramDataValid <= '0';
+            ProgramEnd <= '0';
+            ProgramAbort <= '0';
+""" if program_download else "",
+        """            ProgramStart <= '0';
+            ProgramDataValid <= '0';
+            ProgramEnd <= '0';
+            ProgramAbort <= '0';
+""" if program_download else "",
+        "not SdoBlockDownload and (" if program_download else "",
+        ")" if program_download else "",
+        sdo_segment_bits - 1,
+        "(55 downto 0)" if sdo_segment_bits > 56 else "",
+        """if SdoProgramActive and not SdoBlockDownload and not (RxSdoCs = CanOpen.SDO_CCS_BDR and RxSdoBlockDownloadCs = '1') then -- Program download abandoned for another request
+                    SdoProgramActive := false;
+                    SdoProgramAck := false;
+                    ProgramAbort <= '1';
+                end if;
+                if SdoBlockDownload then -- Sub-block segment of program data
+                    if RxSdo(7 downto 0) = CanOpen.SDO_CS_ABORT & b"00000" then -- Abort request, as sequence number 0 is not valid
+                        SdoBlockDownload := false;
+                        SdoProgramActive := false;
+                        SdoProgramAck := false;
+                        ProgramAbort <= '1';
                     else
+                        if unsigned(RxSdoBlockDownloadSubBlockSeqno) = SdoSequenceNumber + 1 then -- Segments out of sequence are ignored, and repeated by the client after the response
+                            SdoSequenceNumber := SdoSequenceNumber + 1;
+                            if RxSdoBlockDownloadSubBlockC = '1' then
+                                SdoProgramLast := RxSdoBlockDownloadSubBlockSegData;
+                                SdoBlockDownload := false;
+                            else
+                                SdoBlockCrc := CanOpen.Crc16(RxSdoBlockDownloadSubBlockSegData, SdoBlockCrc, 7);
+                                ProgramData <= RxSdoBlockDownloadSubBlockSegData;
+                                ProgramDataBytes <= to_unsigned(7, ProgramDataBytes'length);
+                                ProgramDataValid <= '1';
+                            end if;
+                        end if;
+                        if RxSdoBlockDownloadSubBlockC = '1' or unsigned(RxSdoBlockDownloadSubBlockSeqno) = PROGRAM_BLOCK_SIZE then -- End of sub-block
+                            TxSdoCs <= CanOpen.SDO_SCS_BDR;
+                            TxSdo(4 downto 2) <= (others => '0');
+                            TxSdo(1 downto 0) <= CanOpen.SDO_BLOCK_SUBCOMMAND_RESPONSE;
+                            TxSdoBlockDownloadSubBlockAckseq <= '0' & std_logic_vector(SdoSequenceNumber);
+                            TxSdoBlockDownloadSubBlockBlksize <= std_logic_vector(to_unsigned(PROGRAM_BLOCK_SIZE, 8));
+                            TxSdo(63 downto 24) <= (others => '0');
+                            SdoSequenceNumber := (others => '0');
+                            SdoProgramAck := true;
+                        end if;
+                    end if;
+                elsif RxSdoCs = CanOpen.SDO_CCS_BDR then
+                    if RxSdoBlockDownloadCs = '0' then -- Initiate
+                        TxSdoInitiateMuxIndex <= RxSdoInitiateMuxIndex;
+                        TxSdoInitiateMuxSubIndex <= RxSdoInitiateMuxSubIndex;
+                        if RxSdoInitiateMuxIndex = x"1F50" and RxSdoInitiateMuxSubIndex = x"01" then
+                            TxSdoCs <= CanOpen.SDO_SCS_BDR;
+                            TxSdo(4 downto 3) <= (others => '0');
+                            TxSdo(2) <= '1'; -- Server CRC support
+                            TxSdo(1 downto 0) <= CanOpen.SDO_BLOCK_SUBCOMMAND_INITIATE;
+                            TxSdoBlockDownloadInitiateBlksize <= std_logic_vector(to_unsigned(PROGRAM_BLOCK_SIZE, 8));
+                            TxSdo(63 downto 40) <= (others => '0');
+                            SdoBlockCrc := (others => '0');
+                            SdoProgramCrc := RxSdoBlockDownloadInitiateCc = '1';
+                            SdoSequenceNumber := (others => '0');
+                            SdoBlockDownload := true;
+                            SdoProgramActive := true;
+                            SdoProgramAck := true; -- Responds when the flash writer is ready
+                            ProgramStart <= '1';
+                        else -- Block download is supported for program data only
+                            TxSdoCs <= CanOpen.SDO_CS_ABORT;
+                            TxSdo(4 downto 0) <= (others => '0');
+                            TxSdoAbortCode <= CanOpen.SDO_ABORT_ACCESS;
+                            SdoInterrupt <= '1';
+                        end if;
+                    elsif SdoProgramActive then -- End
+                        if SdoProgramCrc and CanOpen.Crc16(SdoProgramLast, SdoBlockCrc, 7 - to_integer(unsigned(RxSdoBlockDownloadEndN))) /= RxSdoBlockDownloadEndCrc then
+                            TxSdoCs <= CanOpen.SDO_CS_ABORT;
+                            TxSdo(4 downto 0) <= (others => '0');
+                            TxSdoInitiateMuxIndex <= x"1F50";
+                            TxSdoInitiateMuxSubIndex <= x"01";
+                            TxSdoAbortCode <= CanOpen.SDO_ABORT_CRC;
+                            ProgramAbort <= '1';
+                        else
+                            TxSdoCs <= CanOpen.SDO_SCS_BDR;
+                            TxSdo(4 downto 2) <= (others => '0');
+                            TxSdo(1 downto 0) <= CanOpen.SDO_BLOCK_SUBCOMMAND_END;
+                            TxSdo(63 downto 8) <= (others => '0');
+                            ProgramData <= SdoProgramLast;
+                            ProgramDataBytes <= 7 - unsigned(RxSdoBlockDownloadEndN);
+                            ProgramDataValid <= '1';
+                            ProgramEnd <= '1';
+                        end if;
+                        SdoProgramActive := false;
+                        SdoInterrupt <= '1';
+                    else -- Block download was not initiated
+                        TxSdoCs <= CanOpen.SDO_CS_ABORT;
+                        TxSdo(4 downto 0) <= (others => '0');
+                        TxSdoInitiateMuxIndex <= (others => '0');
+                        TxSdoInitiateMuxSubIndex <= (others => '0');
+                        TxSdoAbortCode <= CanOpen.SDO_ABORT_CS;
+                        SdoInterrupt <= '1';
+                    end if;
+                els""" if program_download else ""
+    ))
+    if sdo_slots:
+        fp.write("""                    elsif SdoDescriptor.AccessType = SDO_ACCESS_NONE then
+                        TxSdoCs <= CanOpen.SDO_CS_ABORT;
+                        TxSdoAbortCode <= CanOpen.SDO_ABORT_DNE;
+                    elsif SdoDescriptor.AccessType = SDO_ACCESS_RO then
+                        TxSdoCs <= CanOpen.SDO_CS_ABORT;
+                        TxSdoAbortCode <= CanOpen.SDO_ABORT_RO;
+                    elsif SdoDescriptor.Length = 0 then -- Segmented SDO interface is upload only
+                        TxSdoCs <= CanOpen.SDO_CS_ABORT;
+                        TxSdoAbortCode <= CanOpen.SDO_ABORT_ACCESS;
+                    elsif RxSdoDownloadInitiateS = '1' and to_integer(unsigned(RxSdoDownloadInitiateN)) /= 4 - SdoDescriptor.Length then
+                        TxSdoCs <= CanOpen.SDO_CS_ABORT;
+                        TxSdoAbortCode <= CanOpen.SDO_ABORT_PARAM_LENGTH;
+                    elsif not is_within_limits(RxSdoDownloadInitiateData, SdoDescriptor) then
+                        TxSdoCs <= CanOpen.SDO_CS_ABORT;
+                        TxSdoAbortCode <= CanOpen.SDO_ABORT_PARAM_INVALID;
+                    else
+                        TxSdoCs <= CanOpen.SDO_SCS_IDR;
+                        TxSdo(63 downto 32) <= (others => '0');
+                        SdoWriteAddress <= SdoDescriptor.Address;
+""")
+        if application_registers:
+            fp.write("""                        SdoWriteData <= std_logic_vector(shift_right(shift_left(unsigned(RxSdoDownloadInitiateData), 32 - SdoDescriptor.Bits), 32 - SdoDescriptor.Bits));
+""")
+        fp.write("""                    end if;
+""")
+    else:
+        fp.write("""                    else
                         case RxSdoInitiateMux is
-""".format(objects.get(0x120001).get("name")))
-    for mux in objects:
-        obj = objects.get(mux)
-        fp.write(f"""                            when {format_constant(obj.get("parameter_name"), prefix="\\ODI_")} =>
 """)
+    def write_sdo_download_arm(out, mux, obj, sub_index):
+        """Writes the statements of the RxSdoInitiateMux case arm of the expedited download of obj"""
         if obj.get("access_type") in ["const", "ro"]:
-            fp.write("""                                TxSdoCs <= CanOpen.SDO_CS_ABORT;
+            out.write("""                                TxSdoCs <= CanOpen.SDO_CS_ABORT;
                                 TxSdoAbortCode <= CanOpen.SDO_ABORT_RO;
 """)
-            continue;
-        fp.write("""                                if RxSdoDownloadInitiateN = b"{:02b}" or RxSdoDownloadInitiateS = '0' then
+            return
+        if (program_download and mux == 0x1F5001) or obj.get("bit_length") > 32: # Block download only, or upload only
+            out.write("""                                TxSdoCs <= CanOpen.SDO_CS_ABORT;
+                                TxSdoAbortCode <= CanOpen.SDO_ABORT_ACCESS;
+""")
+            return
+        out.write("""                                if RxSdoDownloadInitiateN = b"{:02b}" or RxSdoDownloadInitiateS = '0' then
 """.format(4 - math.ceil(obj.get("bit_length") / 8)))
         if obj.get("low_limit") is not None or obj.get("high_limit") is not None:
             if obj.get("data_type").startswith("std_logic"):
@@ -1731,7 +3307,7 @@ if 0x120001 in objects:
                 conditionals.append(assignment + " >= " + obj.get("low_limit"))
             if obj.get("high_limit") is not None:
                 conditionals.append(assignment + " <= " + obj.get("high_limit"))
-            fp.write("                                      if " + " and ".join(conditionals) + """ then
+            out.write("                                      if " + " and ".join(conditionals) + """ then
                                             TxSdoCs <= CanOpen.SDO_SCS_IDR;
                                             TxSdo(63 downto 32) <= (others => '0');
                                         else
@@ -1740,20 +3316,31 @@ if 0x120001 in objects:
                                         end if;
 """)
         else:
-            fp.write("""                                    TxSdoCs <= CanOpen.SDO_SCS_IDR;
+            out.write("""                                    TxSdoCs <= CanOpen.SDO_SCS_IDR;
                                     TxSdo(63 downto 32) <= (others => '0');
 """)
-        fp.write("""                                else
+        out.write("""                                else
                                     TxSdoCs <= CanOpen.SDO_CS_ABORT;
                                     TxSdoAbortCode <= CanOpen.SDO_ABORT_PARAM_LENGTH;
                                 end if;
 """)
-    fp.write("""                            when others =>
-                                TxSdoCs <= CanOpen.SDO_CS_ABORT;
+
+    for mux in objects if not sdo_slots else []:
+        if mux in array_elements: continue
+        obj = objects.get(mux)
+        fp.write(f"""                            when {format_constant(obj.get("parameter_name"), prefix="\\ODI_")} =>
+""")
+        write_sdo_download_arm(fp, mux, obj, None)
+    if not sdo_slots:
+        fp.write("""                            when others =>
+""")
+        write_array_arms(fp, write_sdo_download_arm, "RxSdoInitiateMuxIndex", "RxSdoInitiateMuxSubIndex", """                                TxSdoCs <= CanOpen.SDO_CS_ABORT;
                                 TxSdoAbortCode <= CanOpen.SDO_ABORT_DNE;
-                        end case;
+""")
+        fp.write("""                        end case;
                     end if;
-                    SdoActive := false;
+""")
+    fp.write("""                    SdoActive := false;
                     SdoBlockMode := false;
                     SdoPending := false;
                     SdoExternal := false;
@@ -1763,14 +3350,55 @@ if 0x120001 in objects:
                     TxSdoInitiateMuxIndex <= RxSdoInitiateMuxIndex;
                     TxSdoInitiateMuxSubIndex <= RxSdoInitiateMuxSubIndex;
                     SdoToggle := '0';
-                    case RxSdoInitiateMux is
 """)
-    for mux in objects:
-        obj = objects.get(mux)
-        fp.write(f"""                        when {format_constant(obj.get("parameter_name"), prefix="\\ODI_")} =>
+    if sdo_slots:
+        fp.write("""                    if SdoDescriptor.AccessType = SDO_ACCESS_NONE then
+                        TxSdoCs <= CanOpen.SDO_CS_ABORT;
+                        TxSdo(4 downto 0) <= (others => '0');
+                        TxSdoAbortCode <= CanOpen.SDO_ABORT_DNE;
+                        SdoExternal := false;
+                        SegmentedSdoReadDataEnable <= '0';
+                        SdoActive := false;
+                        SdoBlockMode := false;
+                        SdoPending := false;
+                    elsif SdoDescriptor.AccessType = SDO_ACCESS_WO then
+                        TxSdoCs <= CanOpen.SDO_CS_ABORT;
+                        TxSdo(4 downto 0) <= (others => '0');
+                        TxSdoAbortCode <= CanOpen.SDO_ABORT_WO;
+                        SdoActive := false;
+                        SdoBlockMode := false;
+                        SdoPending := false;
+                        SdoExternal := false;
+                        SegmentedSdoReadDataEnable <= '0';
+""")
+        write_wide_upload_arms(fp, segmented_upload, 20)
+        fp.write("""                    elsif SdoDescriptor.Length = 0 then
+                        TxSdoCs <= CanOpen.SDO_SCS_IUR;
+                        TxSdo(4) <= '0';
+                        TxSdoUploadInitiateN <= b"00";
+                        TxSdoUploadInitiateE <= '0';
+                        TxSdoUploadInitiateS <= '1';
+                        TxSdoUploadInitiateD <= SegmentedSdoData(31 downto 0);
+                        SdoActive := true;
+                        SegmentedSdoReadBytes := unsigned(SegmentedSdoData(31 downto 0));
+                    else
+                        TxSdoCs <= CanOpen.SDO_SCS_IUR;
+                        TxSdo(4) <= '0';
+                        TxSdoUploadInitiateN <= std_logic_vector(to_unsigned(4 - SdoDescriptor.Length, TxSdoUploadInitiateN'length));
+                        TxSdoUploadInitiateE <= '1';
+                        TxSdoUploadInitiateS <= '1';
+                        TxSdoUploadInitiateD <= SdoObjectValue;
+                        SdoActive := false;
+                        SdoExternal := false;
+                    end if;
+""")
+    else:
+        fp.write("""                    case RxSdoInitiateMux is
 """)
+    def write_sdo_upload_arm(out, mux, obj, sub_index):
+        """Writes the statements of the RxSdoInitiateMux case arm of the upload of obj, element sub_index if it is in an array"""
         if obj.get("access_type") == "wo":
-            fp.write("""                            TxSdoCs <= CanOpen.SDO_CS_ABORT;
+            out.write("""                            TxSdoCs <= CanOpen.SDO_CS_ABORT;
                             TxSdo(4 downto 0) <= (others => '0');
                             TxSdoAbortCode <= CanOpen.SDO_ABORT_WO;
                             SdoActive := false;
@@ -1783,7 +3411,10 @@ if 0x120001 in objects:
             cs = "SCS_IUR"
             s = 1
             data = ""
-            if obj.get("bit_length") > 32 or obj.get("bit_length") == 0:
+            if obj.get("bit_length") > 32:
+                out.write(indent_lines(segmented_upload(mux, obj, sub_index), 28))
+                return
+            if obj.get("bit_length") == 0:
                 n = 0
                 e = 0
                 data = "SegmentedSdoData(31 downto 0)";
@@ -1793,16 +3424,8 @@ if 0x120001 in objects:
                     b += 1
                 n = 4 - b
                 e = 1
-                if not obj.get("data_type").startswith("std_logic"):
-                     data += "std_logic_vector("
-                if mux >= 0x200000 and obj.get("access_type") == "rw":
-                     data += format_signal(obj.get("parameter_name"), suffix="_q\\")
-                else:
-                    data += obj.get("name")
-                if not obj.get("data_type").startswith("std_logic"):
-                     data += ")"
-                data = zero_fill(32 - obj.get("bit_length")) + data
-            fp.write(f"""                            TxSdoCs <= CanOpen.SDO_{cs};
+                data = zero_fill(32 - obj.get("bit_length")) + to_vector(obj, sdo_value(mux, obj, sub_index))
+            out.write(f"""                            TxSdoCs <= CanOpen.SDO_{cs};
                             TxSdo(4) <= '0';
                             TxSdoUploadInitiateN <= b"{n:02b}";
                             TxSdoUploadInitiateE <= '{e:d}';
@@ -1810,15 +3433,24 @@ if 0x120001 in objects:
                             TxSdoUploadInitiateD <= {data};
 """)
             if e == 0:
-                fp.write("""                            SdoActive := true;
+                out.write("""                            SdoActive := true;
                             SegmentedSdoReadBytes := unsigned(SegmentedSdoData(31 downto 0));
 """)
             else:
-                fp.write("""                            SdoActive := false;
+                out.write("""                            SdoActive := false;
                             SdoExternal := false;
 """)
-    fp.write("""                        when others =>
-                            TxSdoCs <= CanOpen.SDO_CS_ABORT;
+
+    for mux in objects if not sdo_slots else []:
+        if mux in array_elements: continue
+        obj = objects.get(mux)
+        fp.write(f"""                        when {format_constant(obj.get("parameter_name"), prefix="\\ODI_")} =>
+""")
+        write_sdo_upload_arm(fp, mux, obj, None)
+    if not sdo_slots:
+        fp.write("""                        when others =>
+""")
+        write_array_arms(fp, write_sdo_upload_arm, "RxSdoInitiateMuxIndex", "RxSdoInitiateMuxSubIndex", """                            TxSdoCs <= CanOpen.SDO_CS_ABORT;
                             TxSdo(4 downto 0) <= (others => '0');
                             TxSdoAbortCode <= CanOpen.SDO_ABORT_DNE;
                             SdoExternal := false;
@@ -1826,8 +3458,10 @@ if 0x120001 in objects:
                             SdoActive := false;
                             SdoBlockMode := false;
                             SdoPending := false;
-                    end case;
-                    SdoInterrupt <= '1';
+""")
+        fp.write("""                    end case;
+""")
+    fp.write("""                    SdoInterrupt <= '1';
                 elsif RxSdoCs = CanOpen.SDO_CCS_USR then
                     if RxSdoUploadSegmentT /= SdoToggle then
                         TxSdoCs <= CanOpen.SDO_CS_ABORT;
@@ -1871,15 +3505,91 @@ if 0x120001 in objects:
                                 SdoActive := false;
                                 SdoBlockMode := false;
                                 SdoPending := false;
+""")
+    if sdo_slots:
+        fp.write("""                            elsif SdoDescriptor.AccessType = SDO_ACCESS_NONE then
+                                TxSdoCs <= CanOpen.SDO_CS_ABORT;
+                                TxSdo(4 downto 0) <= (others => '0');
+                                TxSdoInitiateMuxIndex <= RxSdoInitiateMuxIndex;
+                                TxSdoInitiateMuxSubIndex <= RxSdoInitiateMuxSubIndex;
+                                TxSdoAbortCode <= CanOpen.SDO_ABORT_DNE;
+                                SdoExternal := false;
+                                SegmentedSdoReadDataEnable <= '0';
+                                SdoActive := false;
+                                SdoBlockMode := false;
+                                SdoPending := false;
+                            elsif SdoDescriptor.AccessType = SDO_ACCESS_WO then
+                                TxSdoCs <= CanOpen.SDO_CS_ABORT;
+                                TxSdo(4 downto 0) <= (others => '0');
+                                TxSdoInitiateMuxIndex <= RxSdoInitiateMuxIndex;
+                                TxSdoInitiateMuxSubIndex <= RxSdoInitiateMuxSubIndex;
+                                TxSdoAbortCode <= CanOpen.SDO_ABORT_WO;
+                                SdoExternal := false;
+                                SegmentedSdoReadDataEnable <= '0';
+                                SdoActive := false;
+                                SdoBlockMode := false;
+                                SdoPending := false;
+""")
+        write_wide_upload_arms(fp, segmented_block_upload, 28)
+        fp.write("""                            elsif SdoDescriptor.Length = 0 then
+                                if SegmentedSdoData(31 downto 0) = x"00000000" then
+                                    TxSdoCs <= CanOpen.SDO_CS_ABORT;
+                                    TxSdo(4 downto 0) <= (others => '0');
+                                    TxSdoInitiateMuxIndex <= RxSdoInitiateMuxIndex;
+                                    TxSdoInitiateMuxSubIndex <= RxSdoInitiateMuxSubIndex;
+                                    TxSdoAbortCode <= CanOpen.SDO_ABORT_NO_DATA;
+                                    SdoExternal := false;
+                                    SegmentedSdoReadDataEnable <= '0';
+                                    SdoActive := false;
+                                    SdoBlockMode := false;
+                                    SdoPending := false;
+                                else
+                                    TxSdoCs <= CanOpen.SDO_SCS_BUR;
+                                    TxSdo(4 downto 3) <= (others => '0');
+                                    TxSdoBlockUploadInitiateSc <= '1'; -- Server CRC support
+                                    TxSdoBlockUploadInitiateS <= '1'; -- Size indicator
+                                    TxSdoBlockUploadSs <= CanOpen.SDO_BLOCK_SUBCOMMAND_INITIATE(0);
+                                    TxSdoInitiateMuxIndex <= RxSdoInitiateMuxIndex;
+                                    TxSdoInitiateMuxSubIndex <= RxSdoInitiateMuxSubIndex;
+                                    TxSdoBlockUploadInitiateSize <= SegmentedSdoData(31 downto 0);
+                                    SegmentedSdoReadBytes := unsigned(SegmentedSdoData(31 downto 0));
+                                    SdoActive := true;
+                                    SdoBlockSize := unsigned(RxSdoBlockUploadInitiateBlksize(6 downto 0));
+                                    SdoSequenceNumber := (others => '0');
+                                end if;
                             else
+                                TxSdoInitiateMuxIndex <= RxSdoInitiateMuxIndex;
+                                TxSdoInitiateMuxSubIndex <= RxSdoInitiateMuxSubIndex;
+                                if RxSdoBlockUploadInitiatePst /= x"00" and unsigned(RxSdoBlockUploadInitiatePst) <= 4 then
+                                    TxSdoCs <= CanOpen.SDO_SCS_IUR;
+                                    TxSdoUploadInitiateN <= std_logic_vector(to_unsigned(4 - SdoDescriptor.Length, TxSdoUploadInitiateN'length));
+                                    TxSdoUploadInitiateE <= '1';
+                                    TxSdoUploadInitiateS <= '1';
+                                    TxSdoUploadInitiateD <= SdoObjectValue;
+                                else
+                                    TxSdoCs <= CanOpen.SDO_SCS_BUR;
+                                    TxSdo(4 downto 3) <= (others => '0');
+                                    TxSdoBlockUploadInitiateSc <= '1'; -- Server CRC support
+                                    TxSdoBlockUploadInitiateS <= '1'; -- Size indicator
+                                    TxSdoBlockUploadSs <= CanOpen.SDO_BLOCK_SUBCOMMAND_INITIATE(0);
+                                    TxSdoBlockUploadInitiateSize <= std_logic_vector(to_unsigned(SdoDescriptor.Length, TxSdoBlockUploadInitiateSize'length));
+                                    SegmentedSdoReadBytes := to_unsigned(SdoDescriptor.Length, SegmentedSdoReadBytes'length);
+                                    SdoActive := true;
+                                    SdoBlockSize := unsigned(RxSdoBlockUploadInitiateBlksize(6 downto 0));
+                                    SdoExternal := false;
+                                    SdoSegDataInternal := """ + zero_fill(sdo_segment_bits - 32) + """SdoObjectValue;
+                                    SdoSequenceNumber := (others => '0');
+                                end if;
+                            end if;
+""")
+    else:
+        fp.write("""                            else
                                 case SdoMux is
 """)
-    for mux in objects:
-        obj = objects.get(mux)
-        fp.write("""                                   when x"{:06X}" =>
-""".format(mux))
+    def write_sdo_block_upload_arm(out, mux, obj, sub_index):
+        """Writes the statements of the SdoMux case arm of the block upload of obj, element sub_index if it is in an array"""
         if obj.get("access_type") == "wo":
-            fp.write("""                                    TxSdoCs <= CanOpen.SDO_CS_ABORT;
+            out.write("""                                    TxSdoCs <= CanOpen.SDO_CS_ABORT;
                                         TxSdo(4 downto 0) <= (others => '0');
                                         TxSdoInitiateMuxIndex <= RxSdoInitiateMuxIndex;
                                         TxSdoInitiateMuxSubIndex <= RxSdoInitiateMuxSubIndex;
@@ -1889,9 +3599,11 @@ if 0x120001 in objects:
                                         SdoActive := false;
                                         SdoBlockMode := false;
 """)
-            continue;
-        if obj.get("bit_length") == 0 or obj.get("bit_length") > 32:
-            fp.write("""                                        if SegmentedSdoData(31 downto 0) = x"00000000" then
+            return
+        if obj.get("bit_length") > 32:
+            out.write(indent_lines(segmented_block_upload(mux, obj, sub_index), 40))
+        elif obj.get("bit_length") == 0:
+            out.write("""                                        if SegmentedSdoData(31 downto 0) = x"00000000" then
                                             TxSdoCs <= CanOpen.SDO_CS_ABORT;
                                             TxSdo(4 downto 0) <= (others => '0');
                                             TxSdoInitiateMuxIndex <= RxSdoInitiateMuxIndex;
@@ -1919,16 +3631,8 @@ if 0x120001 in objects:
 """)
         else:
             n = 4 - math.ceil(obj.get("bit_length") / 8)
-            data = ""
-            if not obj.get("data_type").startswith("std_logic"):
-                 data += "std_logic_vector("
-            if mux >= 0x200000 and obj.get("access_type") == "rw":
-                 data += format_signal(obj.get("parameter_name"), suffix="_q\\")
-            else:
-                data += obj.get("name")
-            if not obj.get("data_type").startswith("std_logic"):
-                 data += ")"
-            fp.write("""                                        TxSdoInitiateMuxIndex <= RxSdoInitiateMuxIndex;
+            data = to_vector(obj, sdo_value(mux, obj, sub_index))
+            out.write("""                                        TxSdoInitiateMuxIndex <= RxSdoInitiateMuxIndex;
                                         TxSdoInitiateMuxSubIndex <= RxSdoInitiateMuxSubIndex;
                                         if RxSdoBlockUploadInitiatePst /= x"00" and unsigned(RxSdoBlockUploadInitiatePst) <= 4 then
                                             TxSdoCs <= CanOpen.SDO_SCS_IUR;
@@ -1950,9 +3654,18 @@ if 0x120001 in objects:
                                             SdoSegDataInternal := {3};
                                             SdoSequenceNumber := (others => '0');
                                         end if;
-""".format(n, zero_fill(32 - obj.get("bit_length")) + data, 4 - n, zero_fill(56 - obj.get("bit_length")) + data))
-    fp.write("""                                    when others =>
-                                        TxSdoCs <= CanOpen.SDO_CS_ABORT;
+""".format(n, zero_fill(32 - obj.get("bit_length")) + data, 4 - n, zero_fill(sdo_segment_bits - obj.get("bit_length")) + data))
+
+    for mux in objects if not sdo_slots else []:
+        if mux in array_elements: continue
+        obj = objects.get(mux)
+        fp.write("""                                   when x"{:06X}" =>
+""".format(mux))
+        write_sdo_block_upload_arm(fp, mux, obj, None)
+    if not sdo_slots:
+        fp.write("""                                    when others =>
+""")
+        write_array_arms(fp, write_sdo_block_upload_arm, "SdoMux(23 downto 8)", "SdoMux(7 downto 0)", """                                        TxSdoCs <= CanOpen.SDO_CS_ABORT;
                                         TxSdo(4 downto 0) <= (others => '0');
                                         TxSdoInitiateMuxIndex <= RxSdoInitiateMuxIndex;
                                         TxSdoInitiateMuxSubIndex <= RxSdoInitiateMuxSubIndex;
@@ -1962,9 +3675,11 @@ if 0x120001 in objects:
                                         SdoActive := false;
                                         SdoBlockMode := false;
                                         SdoPending := false;
-                                end case;
+""")
+        fp.write("""                                end case;
                             end if;
-                        end if;
+""")
+    fp.write("""                        end if;
                         SdoInterrupt <= '1';
                     elsif SdoActive then
                         if RxSdoBlockUploadCs = CanOpen.SDO_BLOCK_SUBCOMMAND_START then
@@ -2042,15 +3757,21 @@ if 0x120001 in objects:
                 end if;
             elsif CurrentState = STATE_SDO_TX then
                 SdoInterrupt <= '0';
-            elsif SdoPending then
-                if SdoSegDataValid = '1' then
+""" + ("""            elsif SdoProgramAck and ProgramDataReady = '1' then -- Flow control: the next sub-block fits in the flash writer
+                SdoProgramAck := false;
+                SdoInterrupt <= '1';
+""" if program_download else "") + """            elsif SdoPending then
+""" + ("""                if SdoSegDataValid = '1' and SdoInterrupt = '0' then
+                    SdoPending := false;
+                    SdoStreamFull := false;
+""" if sdo_stream else """                if SdoSegDataValid = '1' then
                     SegmentedSdoReadDataEnable <= '0';
                 elsif SdoInterrupt = '0' then
                     SegmentedSdoReadDataEnable <= '1';
                 end if;
                 if SdoSegDataValid = '1' and SdoInterrupt = '0' then
                     SdoPending := false;
-                    if SdoBlockMode then
+""") + """                    if SdoBlockMode then
                         SdoSequenceNumber := SdoSequenceNumber + 1;
                         if SegmentedSdoReadBytes > 7 then
                             SdoBlockCrc := CanOpen.Crc16(SdoSegData, SdoBlockCrc, 7);
@@ -2085,17 +3806,46 @@ if 0x120001 in objects:
                         end if;
                         TxSdoUploadSegmentSegData <= SdoSegData;
                     end if;
-                    SdoInterrupt <= '1';
+""" + ("""                    SdoSegDataInternal := std_logic_vector(shift_right(unsigned(SdoSegDataInternal), 56)); -- Next segment of an object wider than 32 bits
+""" if sdo_segment_bits > 56 else "") + """                    SdoInterrupt <= '1';
                 end if;
             end if;
-        end if;
+""" + ("""            -- Segment stream: a segment is transferred on each Clock with SegmentedSdoReadDataEnable and SegmentedSdoDataValid high,
+            -- into a one-segment buffer, so the next segment is fetched while the previous one is sent
+            if not SdoExternal then
+                SdoStreamFull := false;
+                SdoStreamStarted := false;
+                SdoStreamBytes := (others => '0');
+            elsif SdoActive and not SdoStreamStarted then -- Size read by the initiate request
+                SdoStreamBytes := SegmentedSdoReadBytes;
+                SdoStreamStarted := true;
+            elsif SegmentedSdoReadDataEnable = '1' and SegmentedSdoDataValid = '1' then
+                SdoStreamData := SegmentedSdoData;
+                SdoStreamFull := true;
+                if SdoStreamBytes > 7 then
+                    SdoStreamBytes := SdoStreamBytes - 7;
+                else
+                    SdoStreamBytes := (others => '0');
+                end if;
+            end if;
+            if SdoStreamStarted and not SdoStreamFull and SdoStreamBytes > 0 then
+                SegmentedSdoReadDataEnable <= '1';
+            else
+                SegmentedSdoReadDataEnable <= '0';
+            end if;
+""" if sdo_stream else "") + """        end if;
         SegmentedSdoMux <= SdoMux;
         if SdoExternal then
             SegmentedSdoReadEnable <= '1';
         else
             SegmentedSdoReadEnable <= '0';
         end if;
-    end process;
+""" + ("""        if SdoProgramActive then
+            ProgramDownloadActive <= '1';
+        else
+            ProgramDownloadActive <= '0';
+        end if;
+""" if program_download else "") + """    end process;
 """)
     if not segmented_sdo:
         fp.write("""    SegmentedSdoData <= (others => '0');
@@ -2142,7 +3892,7 @@ if 0x100500 in objects:
 """)
 else:
     fp.write("    Sync_ob <= '0';\n")
-fp.write("""    CommunicationError <= '1' when CanBus."="(CanStatus.State, CanBus.STATE_BUS_OFF) or CanStatus.Overflow = '1' or HeartbeatConsumerError = '1' else '0';\n""")
+fp.write("""    CommunicationError <= '1' when CanBus."="(CanStatus.State, CanBus.STATE_BUS_OFF) or CanStatus.Overflow = '1' or HeartbeatConsumerError = '1'{}{} else '0';\n""".format(" or RpdoTimeout = '1'" if rpdo_timers else "", "".join(""" or CanBus."="(ChannelStatus({0:d}).State, CanBus.STATE_BUS_OFF) or ChannelStatus({0:d}).Overflow = '1'""".format(i) for i in range(1, args.channels))))
 for mux in objects:
     obj = objects.get(mux)
     if mux >= 0x200000 or obj in port_signals: continue
@@ -2159,6 +3909,7 @@ for mux in objects:
 """.format(objects.get(0x100100).get("name")))
         continue;
     if mux == 0x102100: continue #Store EDS
+    if program_download and mux == 0x1F5001: continue # Program download interface
     if obj.get("access_type") == "const": continue # Constant values assigned in declaration
     if obj.get("access_type") == "rw":
         if obj.get("data_type").startswith("std_logic"):
@@ -2174,20 +3925,39 @@ for mux in objects:
         elsif rising_edge(Clock) then
             if CurrentState = STATE_RESET_COMM then
                 {0} <= {1};
-            elsif CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and TxSdoInitiateMuxIndex = x"{2:04X}" and TxSdoInitiateMuxSubIndex = x"{3:02X}" then
-                {0} <= {4};
+            elsif CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and {2} then
+                {0} <= {3};
             end if;
         end if;
     end process;
-""".format(obj.get("name"), obj.get("default_value"), mux >> 8, mux & 0xFF, assignment))
+""".format(obj.get("name"), obj.get("default_value"), sdo_download_match(mux), assignment))
     else: # obj.access_type == "ro"
         fp.write("    " + obj.get("name") + " <= " + obj.get("default_value") + ";\n")
 
+if program_control:
+    fp.write("""
+    -- Program control, single-clock pulse when written by SDO download, coincident with the new value
+    ProgramControl <= {0};
+    process (Clock, Reset_n)
+    begin
+        if Reset_n = '0' then
+            ProgramControlChanged <= '0';
+        elsif rising_edge(Clock) then
+            if CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and {1} then
+                ProgramControlChanged <= '1';
+            else
+                ProgramControlChanged <= '0';
+            end if;
+        end if;
+    end process;
+""".format(objects.get(0x1F5101).get("name"), sdo_download_match(0x1F5101)))
+
 fp.write("""
     -- Remaining object dictionary assignments
 """)
 for mux in objects:
-    if mux < 0x200000: continue
+    if mux < 0x200000 or mux in application_registers: continue
+    if mux in array_elements and mux & 0xFF > 1: continue
     obj = objects.get(mux)
     if obj.get("access_type") not in ["rw", "wo"]: continue
     if obj.get("data_type").startswith("std_logic"):
@@ -2203,6 +3973,58 @@ for mux in objects:
         limit_check += " and {} >= {}".format(assignment, obj.get("high_limit"))
     if obj.get("default_value") is None:
         raise Exception("DefaultValue is required for mux 0x{:06}".format(mux))
+    if obj.get("bit_length") > 32: # Upload only, as SDO download is expedited
+        if obj.get("access_type") == "rw":
+            fp.write("""    process (Clock, Reset_n)
+    begin
+        if Reset_n = '0' then
+            {0} <= {1};
+        elsif rising_edge(Clock) then
+            if CurrentState = STATE_RESET_APP then
+                {0} <= {1};
+            end if;
+        end if;
+    end process;
+""".format(format_signal(obj.get("parameter_name"), suffix="_q\\"), obj.get("default_value")))
+        else:
+            fp.write("""    {} <= {};
+    {} <= '0';
+""".format(obj.get("name"), obj.get("default_value"), format_signal(obj.get("parameter_name"), suffix="_strb\\")))
+        continue
+    if mux in array_elements:
+        array = arrays.get(array_elements.get(mux))
+        match, sub_index = array_download_match(mux >> 8)
+        if obj.get("access_type") == "rw":
+            fp.write("""    process (Clock, Reset_n)
+    begin
+        if Reset_n = '0' then
+            {0} <= {1};
+        elsif rising_edge(Clock) then
+            if CurrentState = STATE_RESET_APP then
+                {0} <= {1};
+            elsif CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and {2} then
+                {0}({3}) <= {4};
+            end if;
+        end if;
+    end process;
+""".format(array.get("buffer"), array.get("default_value"), match, sub_index, assignment))
+        else:
+            fp.write("""    process (Clock, Reset_n)
+    begin
+        if Reset_n = '0' then
+            {0} <= {1};
+            {2} <= (others => '0');
+        elsif rising_edge(Clock) then
+            {0} <= {1};
+            {2} <= (others => '0');
+            if CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and {3} then
+                {0}({4}) <= {5};
+                {2}({4}) <= '1';
+            end if;
+        end if;
+    end process;
+""".format(array.get("name"), array.get("default_value"), array.get("strobe"), match, sub_index, assignment))
+        continue
     if obj.get("access_type") == "rw":
         fp.write("""    process (Clock, Reset_n)
     begin
@@ -2211,12 +4033,12 @@ for mux in objects:
         elsif rising_edge(Clock) then
             if CurrentState = STATE_RESET_APP then
               {0} <= {1};
-            elsif CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and TxSdoInitiateMuxIndex = x"{2:04X}" and TxSdoInitiateMuxSubIndex = x"{3:02X}" then
-               {0} <= {4};
+            elsif CurrentState = STATE_SDO_TX and TxSdoCs = CanOpen.SDO_SCS_IDR and {2} then
+               {0} <= {3};
             end if;
         end if;
     end process;
-""".format(format_signal(obj.get("parameter_name"), suffix="_q\\"), obj.get("default_value"), mux >> 8, mux & 0xFF, assignment))
+""".format(format_signal(obj.get("parameter_name"), suffix="_q\\"), obj.get("default_value"), sdo_download_match(mux), assignment))
     else: # obj.get("access_type") == "wo"
         fp.write("""    process (Clock, Reset_n)
     begin
@@ -2224,8 +4046,8 @@ for mux in objects:
             {0} <= {1};
             {2} <= '0';
         elsif rising_edge(Clock) then
-            if CurrentState = STATE_SDO_TX and TxSdoCs = Canopen.SDO_SCS_IDR and TxSdoInitiateMuxIndex = x"{3:04X}" and TxSdoInitiateMuxSubIndex = x"{4:02X}" then
-                {0} <= {5};
+            if CurrentState = STATE_SDO_TX and TxSdoCs = Canopen.SDO_SCS_IDR and {3} then
+                {0} <= {4};
                 {2} <= '1';
             else
                 {0} <= {1};
@@ -2233,13 +4055,17 @@ for mux in objects:
             end if;
         end if;
     end process;
-""".format(obj.get("name"), obj.get("default_value"), format_signal(obj.get("parameter_name"), suffix="_strb\\"), mux >> 8, mux & 0xFF, assignment))
+""".format(obj.get("name"), obj.get("default_value"), format_signal(obj.get("parameter_name"), suffix="_strb\\"), sdo_download_match(mux), assignment))
 fp.write("""    -- Output port assignments from buffers)
 """)
 for mux in objects:
-    if mux < 0x200000: continue
+    if mux < 0x200000 or mux in application_registers: continue
     obj = objects.get(mux)
     if obj.get("access_type") != "rw": continue
+    if mux in array_elements:
+        if mux & 0xFF == 1:
+            fp.write("    {} <= {};\n".format(arrays.get(mux >> 8).get("name"), arrays.get(mux >> 8).get("buffer")))
+        continue
     fp.write("    {} <= {};\n".format(obj.get("name"), format_signal(obj.get("parameter_name"), suffix="_q\\")))
 
 fp.write("""
@@ -2247,7 +4073,7 @@ end Behavioral;
 """)
 fp.write("""
 -- Component declaration template
---    """ + "\n--    ".join(template.format("component", entity_name, "" if len(port_signals) == 0 else ";").split("\n")))
+--    """ + "\n--    ".join(template.format("component", entity_name, can_port_type).split("\n")))
 fp.write("\n\n")
 fp.write(f"""-- Component instantiation template
 --    CanOpenController : {entity_name}
@@ -2264,3 +4090,748 @@ fp.write(f"""-- Component instantiation template
 --            ErrorRegister => ErrorRegister, -- Bits 4 and 6 are overwritten
 --""" + ",\n--".join(map(lambda signal: "            {0} => {0}".format(signal.get("name")), port_signals)) + """
 --        );""")
+if application_registers:
+    fp.write("""
+
+-- Application register map (ApplicationRegisterAddress, ApplicationRegisterChangedAddress)
+""")
+    for i, mux in enumerate(application_registers):
+        obj = objects.get(mux)
+        fp.write("--    {:d}: 0x{:06X} {} ({}, {})\n".format(i, mux, obj.get("parameter_name"), obj.get("data_type"), obj.get("access_type")))
+
+# Dead-signal elimination: a signal of the architecture is kept if it is read by a statement driving a port or a kept signal
+
+VHDL_TOKEN = re.compile(r'--[^\n]*|"[^"\n]*"|\\[^\\\n]*\\|[A-Za-z][A-Za-z0-9_]*')
+VHDL_NAME = re.compile(r'--[^\n]*|"[^"\n]*"|([a-z][a-z0-9_]*)')
+VHDL_LITERAL = re.compile(r"'[01]'|\(others => '[01]'\)|[xXbB]?\"[0-9A-Fa-f_]*\"")
+VHDL_SIGNAL_ATTRIBUTE = re.compile(r"_edge\s*\(\s*(\\[^\\\n]*\\|[A-Za-z]\w*)|'(?:event|stable|quiet|transaction|delayed|active|last_event|last_active|last_value|driving)\b", re.I)
+VHDL_COMPOUND = re.compile(r"\b(then|loop|is|begin|generate)\b", re.I)
+VHDL_TARGET = re.compile(r"(\\[^\\\n]*\\|\b[A-Za-z]\w*)(?:\([^;()]*(?:\([^;()]*\)[^;()]*)*\)|\.\w+)*\s*<=")
+VHDL_ASSIGNMENT = re.compile(r"\s*(\\[^\\\n]*\\|[A-Za-z]\w*)(?:\.[A-Za-z]\w*|\([^()]*\))*\s*<=")
+VHDL_IDENTIFIER = re.compile(r"\s*(\\[^\\\n]*\\|[A-Za-z]\w*)")
+VHDL_FIELD = re.compile(r"\.[A-Za-z]\w*")
+VHDL_COMMENT = re.compile(r'("[^"\n]*")|--.*')
+VHDL_KEYWORDS = ["if", "elsif", "else", "end", "when", "case", "for", "while", "wait", "return", "and", "or", "not", "null"]
+
+
+def vhdl_key(name):
+    """Basic identifiers are case-insensitive, extended identifiers are not"""
+    return name if name.startswith("\\") else name.lower()
+
+
+def vhdl_code(line):
+    """Returns line without its comment"""
+    if "--" not in line:
+        return line.rstrip()
+    return VHDL_COMMENT.sub(lambda m: m.group(1) or "", line).rstrip()
+
+
+def vhdl_names(text):
+    """Returns the keys of the identifiers in text, without comments and strings"""
+    if "\\" not in text:
+        return [token for token in VHDL_NAME.findall(text.lower()) if token]
+    return [token if token[0] == "\\" else token.lower() for token in VHDL_TOKEN.findall(text) if token[0] not in '-"']
+
+
+def vhdl_target(code):
+    """Returns the key of the name assigned with <= by a statement starting with code, or None"""
+    if "<=" not in code:
+        return None
+    match = VHDL_ASSIGNMENT.match(code)
+    if match is not None:
+        return None if vhdl_key(match.group(1)) in VHDL_KEYWORDS else vhdl_key(match.group(1))
+    match = VHDL_IDENTIFIER.match(code) # Nested parentheses
+    if match is None or vhdl_key(match.group(1)) in VHDL_KEYWORDS:
+        return None
+    i = match.end()
+    while True: # Record element, index and slice suffixes
+        field = VHDL_FIELD.match(code, i)
+        if field is not None:
+            i = field.end()
+        elif code.startswith("(", i):
+            depth = 0
+            for j in range(i, len(code)):
+                depth += {"(": 1, ")": -1}.get(code[j], 0)
+                if depth == 0:
+                    break
+            if depth != 0:
+                return None
+            i = j + 1
+        else:
+            break
+    return vhdl_key(match.group(1)) if code[i:].lstrip().startswith("<=") else None
+
+
+def vhdl_statement_end(codes, start, stop):
+    """Returns the index of the line ending the statement starting at codes[start]"""
+    for i in range(start, stop):
+        if codes[i].endswith(";"):
+            return i
+    return stop - 1
+
+
+def vhdl_indent(line):
+    return len(line) - len(line.lstrip())
+
+
+def vhdl_signal_attributes(text):
+    """Returns the keys of the signals passed to rising_edge and falling_edge, or with signal attributes, in text, which cannot be constants"""
+    keys = set()
+    for match in VHDL_SIGNAL_ATTRIBUTE.finditer(text):
+        if match.group(1) is not None:
+            keys.add(vhdl_key(match.group(1)))
+        else:
+            keys.update(vhdl_names(text[max(match.start() - 80, 0):match.start()])[-1:])
+    return keys
+
+
+def drop_empty_ifs(codes, first, last, drop):
+    """Adds to drop the if statements of codes[first:last + 1] left without statements"""
+    stack = [] # [first line, empty, in condition]
+    for i in range(first, last + 1):
+        code = codes[i].strip()
+        if i in drop or not code:
+            continue
+        words = code.lower().split()
+        then = re.search(r"\bthen$", code, re.I) is not None
+        if stack and stack[-1][2]: # Condition continued
+            stack[-1][2] = not then
+        elif re.match(r"if\b", code, re.I) and not re.search(r"\bend\s+if\b", code, re.I):
+            stack.append([i, True, not then])
+        elif stack and words[0] == "elsif":
+            stack[-1][2] = not then
+        elif stack and code.lower() == "else":
+            pass
+        elif stack and re.match(r"end\s+if\b", code, re.I):
+            start, empty, _ = stack.pop()
+            if empty:
+                drop.update(range(start, i + 1))
+            elif stack:
+                stack[-1][1] = False
+        elif stack:
+            stack[-1][1] = False
+
+
+def drop_lines(lines, drop):
+    """Returns lines without those in drop, the comment lines introducing them, and the blank lines doubled by dropping them"""
+    for i in sorted(drop):
+        if i - 1 in drop or not lines[i].strip():
+            continue
+        following = i
+        while following in drop:
+            following += 1
+        if following < len(lines) and lines[following].strip() and vhdl_indent(lines[following]) >= vhdl_indent(lines[i]) and not re.match(r"\s*(end|elsif|else|when)\b", lines[following]):
+            continue # The comment may introduce the next statement
+        j = i - 1
+        while j >= 0 and lines[j].strip().startswith("--") and vhdl_indent(lines[j]) == vhdl_indent(lines[i]):
+            drop.add(j)
+            j -= 1
+    kept = []
+    previous = -1 # Index of the last line kept
+    for i, line in enumerate(lines):
+        if i in drop:
+            continue
+        if not line.strip() and previous < i - 1 and kept and (not kept[-1].strip() or re.search(r"(\bthen|\bbegin|\belse|\bloop|=>)$", vhdl_code(kept[-1]), re.I)):
+            continue
+        kept.append(line)
+        previous = i
+    return kept
+
+
+def prune_signals(vhdl):
+    """Removes the signals of the architecture that are never read, with their assignments, the processes driving only them and their
+    sensitivity list entries, and declares constant the signals only driven by a concurrent assignment of a literal
+
+    Returns the pruned VHDL and the names of the signals removed and declared constant.
+    """
+    lines = vhdl.split("\n")
+    codes = [vhdl_code(line) for line in lines]
+    architecture = next(i for i, line in enumerate(lines) if line.startswith("architecture "))
+    begin = lines.index("begin", architecture)
+    end = lines.index("end Behavioral;", begin)
+
+    # Declarations
+    groups = [] # Signal declarations: {"first", "last", "names": [[name, comment]], "type", "comment", "column"}
+    signals = {} # Key: group
+    aliases = {} # Key: {"line", "signals"}
+    kept = set() # Signals read by declarations or named by instantiations and generate statements, neither removed nor constant
+    i = architecture + 1
+    while i < begin:
+        code = codes[i]
+        if code.startswith("    signal "):
+            group = {"first": i, "last": vhdl_statement_end(codes, i, begin), "names": []}
+            for j in range(i, group.get("last") + 1):
+                code = codes[j]
+                comment = lines[j][len(code):].strip()
+                if j == group.get("last"):
+                    group["column"] = code.index(":")
+                    code, data_type = code.split(":", 1)
+                    group["type"] = data_type.strip()[:-1].rstrip()
+                    group["comment"] = comment
+                group["names"] += [[name.strip(), None] for name in code[len("    signal ") if j == i else 0:].split(",") if name.strip()]
+                if j < group.get("last") and comment:
+                    group.get("names")[-1][1] = comment
+            groups.append(group)
+            for name, _ in group.get("names"):
+                signals[vhdl_key(name)] = group
+            i = group.get("last") + 1
+            continue
+        match = re.match(r"    alias\s+(\S+)\s*:.*?\bis\b(.*);$", code)
+        if match:
+            aliases[vhdl_key(match.group(1))] = {"line": i, "signals": set(vhdl_names(match.group(2)))}
+        i += 1
+    for group in groups:
+        kept.update(key for key in vhdl_names(group.get("type")) if key in signals)
+    for alias in aliases.values():
+        alias["signals"] &= set(signals)
+
+    def resolve(key):
+        return aliases.get(key).get("signals") if key in aliases else {key} if key in signals else set()
+
+    # Statements: concurrent assignments, processes with their sequential assignments, and others
+    statements = [] # {"first", "last", "reads", "assignments": [{"first", "last", "target", "reads", "value"}], "sensitivity"}
+    drivers = {} # Signal key: [(statement, assignment)]
+    roots = [] # (statement, assignment) driving ports or kept with everything they name
+    attributed = {signal for key in vhdl_signal_attributes("\n".join(codes[begin + 1:end])) for signal in resolve(key)}
+    i = begin + 1
+    while i < end:
+        code = codes[i]
+        if not code.strip():
+            i += 1
+            continue
+        statement = {"first": i, "reads": [], "assignments": [], "sensitivity": None}
+        if re.match(r"    (\w+\s*:\s*)?process\b", code, re.I):
+            statement["last"] = next(j for j in range(i, end) if codes[j].strip().lower() == "end process;")
+            body = next(j for j in range(i, statement.get("last")) if codes[j].strip().lower() == "begin")
+            j = i
+            if "(" in code:
+                while ")" not in codes[j]:
+                    j += 1
+                statement["sensitivity"] = (i, j)
+                statement["reads"] += vhdl_names(codes[j].split(")", 1)[1])
+            statement["reads"] += vhdl_names("\n".join(codes[j + 1:body]))
+            reads = statement.get("reads")
+            assignments = statement.get("assignments")
+            last = statement.get("last")
+            j = body + 1
+            while j < last:
+                code = codes[j]
+                target = vhdl_target(code)
+                if target is not None:
+                    k = vhdl_statement_end(codes, j, last)
+                    text = code if k == j else "\n".join(codes[j:k + 1])
+                    if text.count(";") == 1 and (k == j or not VHDL_COMPOUND.search(text)):
+                        assignments.append({"first": j, "last": k, "target": target, "reads": vhdl_names(text)[1:]})
+                        j = k + 1
+                        continue
+                reads += vhdl_names(code)
+                if "<=" in code: # In a compound statement, or a relation
+                    assignments += [{"first": None, "target": vhdl_key(match.group(1)), "reads": []} for match in VHDL_TARGET.finditer(code)]
+                j += 1
+        else:
+            statement["last"] = vhdl_statement_end(codes, i, end)
+            if re.match(r"    \w+\s*:\s*(for|if)\b.*\bgenerate\b", code, re.I):
+                statement["last"] = next(j for j in range(i, end) if re.match(r"\s*end\s+generate\b", codes[j], re.I))
+            text = "\n".join(codes[i:statement.get("last") + 1])
+            target = vhdl_target(code)
+            if target is not None and text.count(";") == 1 and not re.search(r"\b(generate|map)\b", text, re.I):
+                statement.get("assignments").append({"first": i, "last": statement.get("last"), "target": target, "reads": vhdl_names(text)[1:], "value": text.split("<=", 1)[1].strip()[:-1].strip()})
+            else: # Instantiation, generate or other statement
+                statement["reads"] = vhdl_names(text)
+                kept.update(key for name in statement.get("reads") for key in resolve(name))
+                roots.append((statement, None))
+        for assignment in statement.get("assignments"):
+            target = assignment.get("target")
+            if target in signals:
+                drivers.setdefault(target, []).append((statement, assignment))
+            elif target in aliases and aliases.get(target).get("signals"):
+                for signal in aliases.get(target).get("signals"):
+                    drivers.setdefault(signal, []).append((statement, assignment))
+            else: # Port, or other object
+                roots.append((statement, assignment))
+        statements.append(statement)
+        i = statement.get("last") + 1
+
+    # Signals read by live statements, from the statements driving ports
+    live = set()
+    seen = set() # Keys read
+    active = set() # Live statements
+    pending = roots + [(None, {"reads": list(kept)})]
+    while pending:
+        statement, assignment = pending.pop()
+        reads = [] if assignment is None else assignment.get("reads")
+        if statement is not None and id(statement) not in active:
+            active.add(id(statement))
+            reads = reads + statement.get("reads")
+        for key in reads:
+            if key in seen:
+                continue
+            seen.add(key)
+            for signal in resolve(key):
+                if signal not in live:
+                    live.add(signal)
+                    pending += drivers.get(signal, [])
+
+    constants = {}
+    for signal in sorted(live - attributed - kept):
+        if len(drivers.get(signal, [])) == 1 and not any(signal in alias.get("signals") for alias in aliases.values()):
+            assignment = drivers.get(signal)[0][1]
+            if assignment.get("value") is not None and assignment.get("target") == signal and VHDL_LITERAL.fullmatch(assignment.get("value")):
+                constants[signal] = assignment.get("value")
+    gone = (set(signals) - live) | set(constants)
+    if not gone:
+        return vhdl, [], []
+
+    drop = set()
+    replace = {}
+
+    # Declarations
+    for group in groups:
+        names = [[name, comment] for name, comment in group.get("names") if vhdl_key(name) not in gone]
+        if len(names) == len(group.get("names")):
+            continue
+        declarations = []
+        for j, (name, comment) in enumerate(names):
+            prefix = "    signal " if j == 0 else " " * len("    signal ")
+            if j < len(names) - 1:
+                declarations.append(prefix + name + "," + (" " + comment if comment else ""))
+            else:
+                comment = group.get("comment") or comment
+                declarations.append(prefix + name.ljust(group.get("column") - len(prefix) - 1) + " : " + group.get("type") + ";" + (" " + comment if comment else ""))
+        for name, _ in group.get("names"):
+            if vhdl_key(name) in constants:
+                declarations.append("    constant " + name.ljust(group.get("column") - len("    constant ") - 1) + " : " + group.get("type") + " := " + constants.get(vhdl_key(name)) + ";")
+        drop.update(range(group.get("first"), group.get("last") + 1))
+        if declarations:
+            drop.remove(group.get("first"))
+            replace[group.get("first")] = "\n".join(declarations)
+    for alias in aliases.values():
+        if alias.get("signals") & gone:
+            drop.add(alias.get("line"))
+
+    # Statements
+    gone_targets = gone | {key for key, alias in aliases.items() if alias.get("signals") and alias.get("signals") <= gone}
+    for statement in statements:
+        if id(statement) not in active:
+            drop.update(range(statement.get("first"), statement.get("last") + 1))
+            continue
+        dropped = False
+        for assignment in statement.get("assignments"):
+            if assignment.get("target") in gone_targets and assignment.get("first") is not None:
+                drop.update(range(assignment.get("first"), assignment.get("last") + 1))
+                dropped = True
+        if dropped and statement.get("sensitivity") is not None:
+            drop_empty_ifs(codes, statement.get("sensitivity")[1] + 1, statement.get("last") - 1, drop)
+        if statement.get("sensitivity") is not None:
+            first, last = statement.get("sensitivity")
+            if first == last:
+                code = codes[first]
+                head, names = code.split("(", 1)
+                names, tail = names.split(")", 1)
+                names = [name.strip() for name in names.split(",") if not resolve(vhdl_names(name)[0]) & gone]
+                if len(names) < len(code.split("(", 1)[1].split(")", 1)[0].split(",")):
+                    replace[first] = head + "(" + ", ".join(names) + ")" + tail + lines[first][len(code):]
+            else:
+                entries = [j for j in range(first + 1, last) if codes[j].strip()]
+                removed = [j for j in entries if resolve(vhdl_names(codes[j])[0]) & gone]
+                if removed:
+                    drop.update(removed)
+                    remaining = [j for j in entries if j not in removed]
+                    code = codes[remaining[-1]]
+                    if code.endswith(","):
+                        replace[remaining[-1]] = code[:-1] + lines[remaining[-1]][len(code):]
+
+    lines = [replace.get(i, line) for i, line in enumerate(lines)]
+    names = [name for group in groups for name, _ in group.get("names")]
+    return "\n".join(drop_lines(lines, drop)), [name for name in names if vhdl_key(name) in gone - set(constants)], [name for name in names if vhdl_key(name) in constants]
+
+
+vhdl = fp.getvalue()
+if not args.keep_unused:
+    vhdl, removed, constants = prune_signals(vhdl)
+    if removed:
+        print("Removed unused signals: " + ", ".join(removed))
+    if constants:
+        print("Declared constant: " + ", ".join(constants))
+with open(entity_name + ".vhd", "w") as fp:
+    fp.write(vhdl)
+
+if args.eds_out:
+    # Constants exposed as in ports are read-only values that may change
+    access_types = {mux: "ro" for mux in args.port if mux in objects and objects.get(mux).get("access_type") == "const"}
+    write_eds(args.eds, args.eds_out, objects, access_types)
+    if args.eds_mem:
+        with open(args.eds_out, "rb") as fp:
+            data = fp.read()
+        write_mem(data, args.eds_mem)
+        print("{} written with {:d} bytes (BYTES generic of SegmentedSdoXpmRom)".format(args.eds_mem, len(data)))
+
+if args.testbench:
+    TESTBENCH_NODE_ID = 1
+
+    def initial_value(data_type):
+        if data_type.startswith("CanOpen.") and "Array(" in data_type:
+            return "(others => (others => '0'))"
+        return "'0'" if data_type == "std_logic" else "(others => '0')"
+
+    def cob_id_constant(obj):
+        if obj.get("node_id_offset") is not None:
+            return 'x"{:08X}" + unsigned(NODE_ID)'.format(obj.get("node_id_offset"))
+        return 'x"{:08X}"'.format(obj.get("default_integer", 0))
+
+    def report_name(mux):
+        return "0x{:06X} {}".format(mux, objects.get(mux).get("parameter_name").replace('"', "'"))
+
+    port_names = [signal.get("name") for signal in port_signals]
+    sdo_server = 0x120001 in objects
+    uploads = []
+    block_uploads = []
+    if sdo_server:
+        for mux in objects:
+            obj = objects.get(mux)
+            if obj.get("access_type") == "wo": continue
+            if obj.get("bit_length") == 0 or obj.get("bit_length") > 32:
+                block_uploads.append(mux)
+            else:
+                uploads.append(mux)
+    sync_period = default_value(objects.get(0x100600), TESTBENCH_NODE_ID) if 0x100600 in objects else 0
+    sync_cob_id = default_value(objects.get(0x100500), TESTBENCH_NODE_ID) if 0x100500 in objects else 0x80
+    sync_overflow = default_value(objects.get(0x101900), TESTBENCH_NODE_ID) if 0x101900 in objects else 0
+    sync_producer = bool(sync_cob_id & (1 << 30))
+    tpdos = [] # (number, transmission type, event port)
+    for i in range(1, 5):
+        cob_id_mux = ((0x1800 + i - 1) << 8) + 0x01
+        if cob_id_mux not in objects: continue
+        if default_value(objects.get(cob_id_mux), TESTBENCH_NODE_ID) & ((1 << 31) | (1 << 29)): continue # Invalid or extended
+        xtype = default_value(objects.get(cob_id_mux + 1), TESTBENCH_NODE_ID) if cob_id_mux + 1 in objects else 0xFF
+        tpdos.append((i, xtype, f"Tpdo{i}Event" in port_names))
+    rpdos = [] # (number, event timer) of RPDOs with deadline monitoring by default
+    for i in rpdo_timers:
+        cob_id_mux = ((0x1400 + i - 1) << 8) + 0x01
+        if default_value(objects.get(cob_id_mux), TESTBENCH_NODE_ID) & ((1 << 31) | (1 << 29)): continue # Invalid or extended
+        event_timer = default_value(objects.get(cob_id_mux + 4), TESTBENCH_NODE_ID)
+        if event_timer:
+            rpdos.append((i, event_timer))
+    emcy = 0x101400 in objects
+
+    tb = open(entity_name + "_tb.vhd", "w")
+    tb.write("-- Generated with " + " ".join(argv) + "\n")
+    tb.write(f"""library ieee;
+    use ieee.std_logic_1164.all;
+    use ieee.numeric_std.all;
+
+use work.CanBus;
+use work.CanOpen;
+
+entity {entity_name}_tb is
+end {entity_name}_tb;
+
+architecture Behavioral of {entity_name}_tb is
+    constant CLOCK_FREQUENCY : positive := {round(args.clock_frequency) if can_generics else 24000000:d};
+    constant CLOCK_PERIOD : time := 1 sec / CLOCK_FREQUENCY;
+    constant NODE_ID : std_logic_vector(6 downto 0) := std_logic_vector(to_unsigned({TESTBENCH_NODE_ID:d}, 7));
+    constant SDO_BLOCK_SIZE : positive range 1 to 127 := 127;
+    constant DOMAIN_SIZE : natural := 256; -- Bytes served for each DOMAIN object
+    constant SYNC_PERIOD : time := {sync_period:d} us; -- Communication cycle period
+    constant SYNC_CYCLES : natural := 8;
+    constant SYNC_COB_ID : unsigned(31 downto 0) := x"{sync_cob_id & 0x3FFFFFFF:08X}";
+""")
+    for i, xtype, event in tpdos:
+        tb.write("    constant TPDO{:d}_COB_ID : unsigned(31 downto 0) := {};\n".format(i, cob_id_constant(objects.get(((0x1800 + i - 1) << 8) + 0x01))))
+    for i, event_timer in rpdos:
+        tb.write("    constant RPDO{:d}_COB_ID : unsigned(31 downto 0) := {};\n".format(i, cob_id_constant(objects.get(((0x1400 + i - 1) << 8) + 0x01))))
+    if emcy:
+        tb.write("    constant EMCY_COB_ID : unsigned(31 downto 0) := {};\n".format(cob_id_constant(objects.get(0x101400))))
+    tb.write("""
+    component CanLite is
+        port (
+            Clock               : in  std_logic;
+            Reset_n             : in  std_logic;
+            CanRx               : in  std_logic;
+            CanTx               : out std_logic;
+            RxFrame             : out CanBus.Frame;
+            RxFifoWriteEnable   : out std_logic;
+            RxFifoFull          : in  std_logic;
+            TxFrame             : in  CanBus.Frame;
+            TxFifoReadEnable    : out std_logic;
+            TxFifoEmpty         : in std_logic;
+            TxAck               : out std_logic;
+            Status              : out CanBus.Status
+        );
+    end component CanLite;
+
+    signal Clock,
+           Reset_n          : std_logic;
+    signal Done             : boolean := false;
+    signal CanRx,
+           CanTx,
+           ClientCanTx      : std_logic;
+    signal NodeId           : std_logic_vector(6 downto 0) := NODE_ID;
+    signal ErrorRegister    : unsigned(7 downto 0) := (others => '0');
+    signal Status           : CanOpen.Status;
+
+    -- SDO client and SYNC producer
+    signal ClientRxFrame,
+           ClientTxFrame    : CanBus.Frame;
+    signal ClientRxFifoWriteEnable,
+           ClientTxFifoReadEnable,
+           ClientTxAck      : std_logic;
+    signal ClientTxFifoEmpty : std_logic := '1';
+    signal SdoDataBytes     : natural;
+    signal SdoData          : std_logic_vector(55 downto 0);
+    signal SdoDataValid     : std_logic;
+    signal SdoAbortCode     : std_logic_vector(31 downto 0);
+    signal SyncTime         : time := 0 ns; -- End of the last SYNC frame on the bus
+""")
+    if args.channels > 1:
+        tb.write(f"""    signal IdleCanRx        : std_logic_vector(1 to {args.channels - 1:d}) := (others => '1'); -- Channels 1 and up are left idle
+    signal IdleCanTx        : std_logic_vector(1 to {args.channels - 1:d});
+""")
+    if emcy:
+        tb.write("""    signal EmcyEec          : std_logic_vector(15 downto 0) := (others => '0'); -- Last emergency error code received
+""")
+    for i, xtype, event in tpdos:
+        tb.write("    signal Tpdo{:d}EventTime : time := 0 ns;\n".format(i))
+    tb.write("\n    -- Profile-specific signals\n")
+    for signal in port_signals:
+        if signal.get("direction") == "in":
+            tb.write("    signal {} : {} := {};\n".format(signal.get("name").ljust(19), signal.get("data_type"), "'1'" if signal.get("name") == "ProgramDataReady" else initial_value(signal.get("data_type"))))
+        else:
+            tb.write("    signal {} : {};\n".format(signal.get("name").ljust(19), signal.get("data_type")))
+    tb.write(f"""begin
+
+    uut : entity work.{entity_name}
+        generic map (
+            CLOCK_FREQUENCY => CLOCK_FREQUENCY
+        )
+        port map (
+            Clock => Clock,
+            Reset_n => Reset_n,
+""" + ("""            CanRx => CanRx,
+            CanTx => CanTx,
+""" if args.channels == 1 else f"""            CanRx(0) => CanRx,
+            CanRx(1 to {args.channels - 1:d}) => IdleCanRx,
+            CanTx(0) => CanTx,
+            CanTx(1 to {args.channels - 1:d}) => IdleCanTx,
+""") + f"""            NodeId => NodeId,
+            ErrorRegister => ErrorRegister,
+            Status => Status""" + "".join(map(lambda signal: ",\n            {0} => {0}".format(signal.get("name")), port_signals)) + """
+        );
+
+    Client : CanLite
+""" + can_generic_map("        ") + """        port map (
+            Clock => Clock,
+            Reset_n => Reset_n,
+            CanRx => CanRx,
+            CanTx => ClientCanTx,
+            RxFrame => ClientRxFrame,
+            RxFifoWriteEnable => ClientRxFifoWriteEnable,
+            RxFifoFull => '0',
+            TxFrame => ClientTxFrame,
+            TxFifoReadEnable => ClientTxFifoReadEnable,
+            TxFifoEmpty => ClientTxFifoEmpty,
+            TxAck => ClientTxAck,
+            Status => open
+        );
+
+    CanRx <= CanTx and ClientCanTx; -- Wired-AND bus
+
+    process
+    begin
+        if Done then
+            wait;
+        end if;
+        Clock <= '0';
+        wait for CLOCK_PERIOD / 2;
+        Clock <= '1';
+        wait for CLOCK_PERIOD / 2;
+    end process;
+""")
+    if segmented_sdo and args.sdo_stream:
+        tb.write("""
+    -- DOMAIN data source: DOMAIN_SIZE bytes of incrementing data, the next segment presented as soon as one is transferred
+    process (Clock)
+        variable Offset : natural;
+        variable Started : boolean; -- Size read
+    begin
+        if rising_edge(Clock) then
+            if SegmentedSdoReadEnable = '0' then
+                Offset := 0;
+                Started := false;
+                SegmentedSdoData <= std_logic_vector(to_unsigned(DOMAIN_SIZE, 56));
+                SegmentedSdoDataValid <= '0';
+            elsif (SegmentedSdoReadDataEnable = '1' or Started) and (SegmentedSdoDataValid = '0' or SegmentedSdoReadDataEnable = '1') then
+                Started := true;
+                for i in 0 to 6 loop
+                    SegmentedSdoData(8 * i + 7 downto 8 * i) <= std_logic_vector(to_unsigned((Offset + i) mod 256, 8));
+                end loop;
+                Offset := Offset + 7;
+                SegmentedSdoDataValid <= '1';
+            end if;
+        end if;
+    end process;
+""")
+    elif segmented_sdo:
+        tb.write("""
+    -- DOMAIN data source: DOMAIN_SIZE bytes of incrementing data
+    process (Clock)
+        variable Offset : natural;
+    begin
+        if rising_edge(Clock) then
+            if SegmentedSdoReadEnable = '0' then
+                Offset := 0;
+                SegmentedSdoData <= std_logic_vector(to_unsigned(DOMAIN_SIZE, 56));
+                SegmentedSdoDataValid <= '0';
+            elsif SegmentedSdoReadDataEnable = '1' and SegmentedSdoDataValid = '0' then
+                for i in 0 to 6 loop
+                    SegmentedSdoData(8 * i + 7 downto 8 * i) <= std_logic_vector(to_unsigned((Offset + i) mod 256, 8));
+                end loop;
+                Offset := Offset + 7;
+                SegmentedSdoDataValid <= '1';
+            elsif SegmentedSdoReadDataEnable = '0' then
+                SegmentedSdoDataValid <= '0';
+            end if;
+        end if;
+    end process;
+""")
+    tb.write("""
+    -- TPDO-to-wire latency, from the TPDO event or the end of the triggering SYNC to the end of the TPDO
+    process (Clock)
+    begin
+        if rising_edge(Clock) and ClientRxFifoWriteEnable = '1' then
+""")
+    if sync_producer:
+        tb.write("""            if CanOpen.is_match(ClientRxFrame, SYNC_COB_ID) then
+                SyncTime <= now;
+            end if;
+""")
+    if emcy:
+        tb.write("""            if CanOpen.is_match(ClientRxFrame, EMCY_COB_ID) then
+                EmcyEec <= ClientRxFrame.Data(1) & ClientRxFrame.Data(0);
+            end if;
+""")
+    for i, xtype, event in tpdos:
+        reference = "Tpdo{:d}EventTime".format(i) if xtype >= 0xFD else "SyncTime"
+        tb.write(f"""            if CanOpen.is_match(ClientRxFrame, TPDO{i}_COB_ID) then
+                report "TPDO{i}: " & integer'image((now - {reference}) / CLOCK_PERIOD) & " cycles after {"event" if xtype >= 0xFD else "SYNC"}";
+            end if;
+""")
+    tb.write("""        end if;
+    end process;
+
+    process
+        variable Start,
+                 Total : time;
+        variable Message : CanBus.Frame;
+        variable SyncCounter : natural range 0 to 240;
+
+        procedure Upload(
+            constant MUX : std_logic_vector(23 downto 0);
+            constant NAME : string;
+            constant BLOCK_TRANSFER : boolean := false
+        ) is
+        begin
+            Start := now;
+            if BLOCK_TRANSFER then
+                CanOpen.SdoBlockUpload(NODE_ID, MUX, SDO_BLOCK_SIZE, Clock, ClientTxFifoReadEnable, ClientTxFifoEmpty, ClientTxFrame, ClientRxFrame, ClientRxFifoWriteEnable, SdoDataBytes, SdoData, SdoDataValid, SdoAbortCode);
+            else
+                CanOpen.SdoUpload(NODE_ID, MUX, Clock, ClientTxFifoReadEnable, ClientTxFifoEmpty, ClientTxFrame, ClientRxFrame, ClientRxFifoWriteEnable, SdoDataBytes, SdoData, SdoDataValid, SdoAbortCode);
+            end if;
+            wait until rising_edge(Clock);
+            Total := Total + now - Start;
+            report NAME & ": " & integer'image((now - Start) / CLOCK_PERIOD) & " cycles";
+            assert SdoAbortCode = x"00000000" report NAME & ": SDO upload aborted" severity error;
+        end procedure Upload;
+    begin
+        Reset_n <= '0';
+        wait for 1 us;
+        Reset_n <= '1';
+        CanOpen.ReceiveMessage(Clock, ClientRxFrame, ClientRxFifoWriteEnable, Message, CanOpen.FUNCTION_CODE_NMT_ERROR_CONTROL & NODE_ID, (others => '1'));
+        report "Boot-up: " & integer'image(now / CLOCK_PERIOD) & " cycles after reset";
+        CanOpen.TransmitMessage(CanOpen.NmtNodeControlMessage(CanOpen.NMT_NODE_CONTROL_OPERATIONAL, NODE_ID), Clock, ClientTxFifoReadEnable, ClientTxFifoEmpty, ClientTxFrame);
+        wait until rising_edge(Clock) and ClientTxAck = '1';
+""")
+    if uploads or block_uploads:
+        tb.write("""
+        -- SDO upload of every readable object
+        Total := 0 ns;
+""")
+    for mux in uploads:
+        tb.write(f"""        Upload(x"{mux:06X}", "{report_name(mux)}");\n""")
+    for mux in block_uploads:
+        tb.write(f"""        Upload(x"{mux:06X}", "{report_name(mux)}", true);\n""")
+    if uploads or block_uploads:
+        tb.write(f"""        report "SDO: " & integer'image(Total / CLOCK_PERIOD / {len(uploads) + len(block_uploads):d}) & " cycles per transaction on average";
+""")
+    if rpdos:
+        tb.write("""
+        -- RPDO deadline monitoring: receive each RPDO once, then let the event timers elapse
+""")
+        for i, event_timer in rpdos:
+            tb.write(f"""        CanOpen.TransmitMessage(CanOpen.Message(std_logic_vector(RPDO{i}_COB_ID(10 downto 0)), "0000", (others => x"00")), Clock, ClientTxFifoReadEnable, ClientTxFifoEmpty, ClientTxFrame);
+        wait until rising_edge(Clock) and ClientTxAck = '1';
+""")
+        tb.write(f"""        Start := now;
+        if Status.EventTimerError = '0' then
+            wait until Status.EventTimerError = '1' for {max(event_timer for i, event_timer in rpdos) + 2:d} ms;
+        end if;
+        assert Status.EventTimerError = '1' report "RPDO deadline monitoring: no event timer error" severity error;
+        report "RPDO deadline monitoring: event timer error " & integer'image((now - Start) / CLOCK_PERIOD) & " cycles after the last RPDO";
+""")
+        if emcy:
+            tb.write("""        wait for 1 ms;
+        assert EmcyEec = CanOpen.EMCY_EEC_RPDO_TIMEOUT report "RPDO deadline monitoring: no RPDO timeout EMCY" severity error;
+""")
+    event_tpdos = [i for i, xtype, event in tpdos if event and xtype >= 0xFE]
+    if event_tpdos:
+        tb.write("""
+        -- Event-driven TPDOs
+""")
+    for i in event_tpdos:
+        tb.write(f"""        wait until rising_edge(Clock);
+        Tpdo{i}Event <= '1';
+        Tpdo{i}EventTime <= now;
+        wait until rising_edge(Clock);
+        Tpdo{i}Event <= '0';
+        CanOpen.ReceiveMessage(Clock, ClientRxFrame, ClientRxFifoWriteEnable, Message, std_logic_vector(TPDO{i}_COB_ID(10 downto 0)), (others => '1'));
+""")
+    if sync_period > 0:
+        tb.write("""
+        -- SYNC at the communication cycle period
+""")
+        if sync_producer:
+            tb.write("""        wait for SYNC_CYCLES * SYNC_PERIOD;
+""")
+        else:
+            tb.write("""        SyncCounter := 0;
+        for i in 1 to SYNC_CYCLES loop
+""")
+            for i, xtype, event in tpdos:
+                if xtype == 0 and event:
+                    tb.write(f"""            wait until rising_edge(Clock);
+            Tpdo{i}Event <= '1';
+            wait until rising_edge(Clock);
+            Tpdo{i}Event <= '0';
+""")
+            if 2 <= sync_overflow <= 240:
+                tb.write(f"""            SyncCounter := (SyncCounter mod {sync_overflow:d}) + 1;
+            Message := CanOpen.Message(std_logic_vector(SYNC_COB_ID(10 downto 0)), "0001", (0 => std_logic_vector(to_unsigned(SyncCounter, 8)), others => x"00"));
+""")
+            else:
+                tb.write("""            Message := CanOpen.Message(std_logic_vector(SYNC_COB_ID(10 downto 0)), "0000", (others => x"00"));
+""")
+            tb.write("""            Start := now;
+            CanOpen.TransmitMessage(Message, Clock, ClientTxFifoReadEnable, ClientTxFifoEmpty, ClientTxFrame);
+            wait until rising_edge(Clock) and ClientTxAck = '1';
+            SyncTime <= now;
+            wait for SYNC_PERIOD - (now - Start);
+        end loop;
+""")
+    tb.write("""
+        report "Done";
+        Done <= true;
+        wait;
+    end process;
+end Behavioral;
+""")
+    tb.close()
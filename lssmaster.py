@@ -0,0 +1,178 @@
+#!/usr/bin/python
+"""LSS master for the LSS slave generated by eds2vhdl.py --lss
+
+Supports the services implemented by the slave: switch state global and
+selective, configure node-ID, store configuration, inquire identity and
+node-ID, identify non-configured slaves, and Fastscan, which finds the
+identity (0x1018) of one unconfigured slave at a time by bit search.  Frames
+are sent and received through a sdoclient transport.
+
+Run lssmaster.py -h for usage
+"""
+import argparse
+import random
+import time
+
+from canopenmodel import Frame
+from sdoclient import LoopbackTransport, SocketCanTransport
+
+LSS_MASTER_COB_ID = 0x7E5
+LSS_SLAVE_COB_ID = 0x7E4
+
+LSS_CS_SWITCH_STATE_GLOBAL = 0x04
+LSS_CS_CONFIGURE_NODE_ID = 0x11
+LSS_CS_STORE_CONFIGURATION = 0x17
+LSS_CS_SWITCH_STATE_SELECTIVE_VENDOR = 0x40
+LSS_CS_SWITCH_STATE_SELECTIVE = 0x44
+LSS_CS_IDENTIFY_NON_CONFIGURED = 0x4C
+LSS_CS_IDENTIFY_SLAVE = 0x4F
+LSS_CS_IDENTIFY_NON_CONFIGURED_SLAVE = 0x50
+LSS_CS_FASTSCAN = 0x51
+LSS_CS_INQUIRE_VENDOR = 0x5A
+LSS_CS_INQUIRE_NODE_ID = 0x5E
+
+LSS_MODE_WAITING = 0
+LSS_MODE_CONFIGURATION = 1
+
+
+class LssError(Exception):
+    pass
+
+
+class LssMaster:
+    """LSS master of all slaves on the bus; a slave not responding within timeout is absent"""
+
+    def __init__(self, transport, timeout=0.005):
+        self.transport = transport
+        self.timeout = timeout
+        self.requests = 0
+
+    def _send(self, data):
+        self.transport.send(Frame(LSS_MASTER_COB_ID, bytes(data).ljust(8, b"\x00")))
+        self.requests += 1
+
+    def _drain(self):
+        """Discards frames received before a request, such as duplicate responses"""
+        while self.transport.recv(0) is not None:
+            pass
+
+    def _request(self, data, cs):
+        """Returns the data of the first response with command specifier cs, or None"""
+        self._drain()
+        self._send(data)
+        deadline = self.transport.monotonic() + self.timeout
+        while True:
+            frame = self.transport.recv(max(deadline - self.transport.monotonic(), 0))
+            if frame is None:
+                return None
+            if frame.id == LSS_SLAVE_COB_ID and not frame.ide and not frame.rtr and frame.dlc == 8 and frame.data[0] == cs:
+                return frame.data
+
+    def _confirm(self, data, service):
+        response = self._request(data, data[0])
+        if response is None:
+            raise LssError("No response to {}".format(service))
+        if response[1] != 0:
+            raise LssError("{} failed with error code {:d}".format(service, response[1]))
+
+    def switch_state_global(self, mode):
+        self._drain()
+        self._send([LSS_CS_SWITCH_STATE_GLOBAL, mode])
+
+    def switch_state_selective(self, vendor, product, revision, serial):
+        """Returns True if the slave with this identity switched to configuration state"""
+        for i, id_number in enumerate([vendor, product, revision]):
+            self._send(bytes([LSS_CS_SWITCH_STATE_SELECTIVE_VENDOR + i]) + id_number.to_bytes(4, "little"))
+        return self._request(bytes([LSS_CS_SWITCH_STATE_SELECTIVE_VENDOR + 3]) + serial.to_bytes(4, "little"), LSS_CS_SWITCH_STATE_SELECTIVE) is not None
+
+    def configure_node_id(self, node_id):
+        """Configures the pending node-ID of the slave in configuration state, 0xFF for unconfigured"""
+        self._confirm(bytes([LSS_CS_CONFIGURE_NODE_ID, node_id]), "configure node-ID")
+
+    def store_configuration(self):
+        self._confirm(bytes([LSS_CS_STORE_CONFIGURATION]), "store configuration")
+
+    def inquire(self, sub):
+        """Returns entry sub (1 to 4) of the identity object of the slave in configuration state, or its node-ID for sub 0"""
+        cs = LSS_CS_INQUIRE_NODE_ID if sub == 0 else LSS_CS_INQUIRE_VENDOR + sub - 1
+        response = self._request([cs], cs)
+        if response is None:
+            raise LssError("No response to inquire")
+        return response[1] if sub == 0 else int.from_bytes(response[1:5], "little")
+
+    def identify_non_configured(self):
+        """Returns True if any slave has no node-ID"""
+        return self._request([LSS_CS_IDENTIFY_NON_CONFIGURED], LSS_CS_IDENTIFY_NON_CONFIGURED_SLAVE) is not None
+
+    def _fastscan(self, id_number, bit_checked, lss_sub, lss_next):
+        return self._request(bytes([LSS_CS_FASTSCAN]) + id_number.to_bytes(4, "little") + bytes([bit_checked, lss_sub, lss_next]), LSS_CS_IDENTIFY_SLAVE) is not None
+
+    def fastscan(self, vendor=None, product=None, revision=None):
+        """Returns the identity of an unconfigured slave, switched to configuration state, or None if there is none
+
+        Entries given are confirmed with one request instead of being searched bit by bit.
+        """
+        if not self._fastscan(0, 0x80, 0, 0):
+            return None
+        identity = []
+        for sub, known in enumerate([vendor, product, revision, None]):
+            id_number = 0
+            if known is not None:
+                id_number = known
+            else:
+                for bit in range(31, -1, -1): # Slaves respond if bits 31 to bit match, so the bit is 0
+                    if not self._fastscan(id_number, bit, sub, sub):
+                        id_number |= 1 << bit
+            if not self._fastscan(id_number, 0, sub, (sub + 1) % 4):
+                raise LssError("Fastscan of identity object entry {:d} was not confirmed".format(sub + 1))
+            identity.append(id_number)
+        return identity
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--channel", type=str, default="can0", help="SocketCAN interface (default: can0)")
+    parser.add_argument("--loopback", type=str, help="Commissions canopenmodel.Node models of this EDS, generated with --lss, instead of SocketCAN")
+    parser.add_argument("--nodes", type=int, default=100, help="With --loopback, number of unconfigured nodes, with random serial numbers (default: 100)")
+    parser.add_argument("--first-node-id", type=int, default=1, help="Node-ID of the first slave found (default: 1)")
+    parser.add_argument("--count", type=int, default=127, help="Maximum number of slaves configured (default: 127)")
+    parser.add_argument("--vendor", type=lambda x: int(x, 0), help="Vendor-ID of all slaves, confirmed instead of searched")
+    parser.add_argument("--product", type=lambda x: int(x, 0), help="Product code of all slaves, confirmed instead of searched")
+    parser.add_argument("--revision", type=lambda x: int(x, 0), help="Revision number of all slaves, confirmed instead of searched")
+    parser.add_argument("--store", nargs="?", const=True, default=False, type=bool, help="Stores the configuration of each slave")
+    parser.add_argument("--timeout", type=float, default=0.005, help="Response timeout in seconds (default: 0.005)")
+    args = parser.parse_args()
+
+    if args.loopback:
+        from canopenmodel import Bus, load
+        nodes = []
+        for serial in random.sample(range(1 << 32), args.nodes):
+            node = load(args.loopback, 0, lss=True)
+            if node.objects.get(0x101804, {}).get("access_type") != "ro":
+                parser.error("--loopback requires a ro serial number (0x101804), an in port set to a random serial number for each node, e.g. test/LssNode.eds")
+            node.set(0x101804, serial)
+            nodes.append(node)
+        bus = Bus(nodes, 500000)
+        transport = LoopbackTransport(bus)
+    else:
+        transport = SocketCanTransport(args.channel, [LSS_SLAVE_COB_ID])
+    master = LssMaster(transport, args.timeout)
+    start = time.monotonic()
+    master.switch_state_global(LSS_MODE_WAITING)
+    node_id = args.first_node_id
+    while node_id < args.first_node_id + args.count:
+        identity = master.fastscan(args.vendor, args.product, args.revision)
+        if identity is None:
+            break
+        master.configure_node_id(node_id)
+        if args.store:
+            master.store_configuration()
+        master.switch_state_global(LSS_MODE_WAITING) # The slave boots with its node-ID
+        print("{:3d} {}".format(node_id, " ".join("{:08X}".format(id_number) for id_number in identity)))
+        node_id += 1
+    transport.close()
+    configured = node_id - args.first_node_id
+    print("{:d} slaves configured with {:d} requests in {:.3f} s".format(configured, master.requests, time.monotonic() - start))
+    if args.loopback and configured > 0:
+        frames = sum(1 for start, end, frame, sender in bus.log if frame.id in [LSS_MASTER_COB_ID, LSS_SLAVE_COB_ID])
+        print("{:d} LSS frames, {:.1f} per slave, in {:.3f} s of bus time".format(frames, frames / configured, bus.tick / bus.clock_frequency))
@@ -0,0 +1,338 @@
+"""Parses a CiA306-1 compliant EDS file into the object model used by eds2vhdl.py
+
+read_eds() loads the EDS, make_od() nests it by index, and make_objects() flattens
+it into VHDL-friendly object dicts keyed by multiplexer (index << 8 | sub-index).
+write_eds() writes the subset of an EDS implementing a set of objects.
+"""
+import os
+import re
+import struct
+
+def format_constant(name, **kwargs):
+    name = name.upper()
+    name = name.replace(" ", "_")
+    name = re.sub(r"\b-\b", "_", name) # Replace hyphenated words with underscore
+    name = re.sub(r"[^\w]", "", name) # Remove illegal characters
+    name = re.sub(r"_{1,}", "_", name) # Remove multiple underscores
+    if re.match(r"[\d_]", name) is not None:
+        raise ValueException("Invalid object name '" + name + "'. Must start with a letter.")
+    if "prefix" in kwargs:
+        prefix = kwargs["prefix"]
+    else:
+        prefix = "\\"
+    if "suffix" in kwargs:
+        suffix = kwargs["suffix"]
+    else:
+        suffix = "\\"
+    return prefix + name + suffix
+
+
+def make_object_from_data_type(odi):
+    odi = int(odi, 0)
+    o = {}
+    if odi == 0x0001: # BOOLEAN
+        o["bit_length"] = 1
+        o["data_type"] = "std_logic"
+    elif odi in [
+        0x0002, # INTEGER8
+        0x0003, # INTEGER16
+        0x0004, # INTEGER32
+        ]:
+        o["bit_length"] = 2 ** (odi + 1)
+        o["data_type"] = "signed({:d} downto 0)".format(o.get("bit_length") - 1)
+    elif odi in [
+        0x0005, # UNSIGNED8
+        0x0006, # UNSIGNED16
+        0x0007  # UNSIGNED32
+        ]:
+        o["bit_length"] = 2 ** (odi - 2)
+        o["data_type"] = "unsigned({:d} downto 0)".format(o.get("bit_length") - 1)
+    elif odi in [
+        0x0010, # INTEGER24
+        0x0012, # INTEGER40
+        0x0013, # INTEGER48
+        0x0014, # INTEGER56
+        0x0015  # INTEGER64
+        ]:
+        o["bit_length"] = 24 if odi == 0x0010 else (odi - 0x000D) * 8
+        o["data_type"] = "signed({:d} downto 0)".format(o.get("bit_length") - 1)
+    elif odi in [
+        0x0016, # UNSIGNED24
+        0x0018, # UNSIGNED40
+        0x0019, # UNSIGNED48
+        0x001A, # UNSIGNED56
+        0x001B  # UNSIGNED64
+        ]:
+        o["bit_length"] = 24 if odi == 0x0016 else (odi - 0x0013) * 8
+        o["data_type"] = "unsigned({:d} downto 0)".format(o.get("bit_length") - 1)
+    elif odi in [
+        0x0008, # REAL32
+        0x0011  # REAL64
+        ]:
+        o["bit_length"] = 32 if odi == 0x0008 else 64 # IEEE 754 binary32/binary64
+        o["data_type"] = "std_logic_vector({:d} downto 0)".format(o.get("bit_length") - 1)
+    elif odi in [
+        0x0009, # VISIBLE_STRING
+        0x000A  # OCTET_STRING
+        ]:
+        o["bit_length"] = 0 # variable, unless given by DefaultValue (see make_object)
+        o["data_type"] = "std_logic_vector(31 downto 0)" # placeholder
+    elif odi in [
+        0x000C, # TIME_OF_DAY
+        0x000D  # TIME_DIFFERENCE
+        ]:
+        o["bit_length"] = 48
+        o["data_type"] = "CanOpen.TimeOfDay"
+    elif odi == 0x000F: # DOMAIN
+        o["bit_length"] = 0 # variable, per CiA 301 section 7.4.7.1
+        o["data_type"] = "unsigned(31 downto 0)" # placeholder
+    else:
+        raise TypeError("Unsupported data type with index 0x{:04X}".format(odi))
+    return o
+
+
+def format_signal(name, **kwargs):
+    name = format_constant(name, **{"prefix": "", "suffix": ""})
+    if "prefix" in kwargs:
+        prefix = kwargs["prefix"]
+    else:
+        prefix = "\\"
+    if "suffix" in kwargs:
+        suffix = kwargs["suffix"]
+    else:
+        suffix = "\\"
+    name = "".join(map(str.capitalize, name.split("_")))
+    return prefix + name + suffix
+
+
+def format_value(value, bit_length):
+    s = ""
+    x = bit_length // 4
+    b = bit_length - (x * 4)
+    if b > 0:
+        s += ('b"{:0' + "{}".format(b) + 'b}"').format(value >> (x * 4)) # Will not truncate if value >= 2**bit_length
+        if x > 0:
+            s += " & "
+    if x > 0:
+        s += ('x"{:0' + "{}".format(x) + 'X}"').format(value & (2**(x * 4) - 1))
+    return s
+
+
+def parse_value(s, odi):
+    """Returns the integer value of an EDS value of data type odi
+
+    REAL32/REAL64 values are returned as their IEEE 754 bits, unless given in hexadecimal.
+    """
+    odi = int(odi, 0)
+    if odi in [0x0008, 0x0011] and not s.lower().startswith("0x"):
+        return int.from_bytes(struct.pack("<f" if odi == 0x0008 else "<d", float(s)), "little")
+    return int(s, 0)
+
+
+def parse_limit(s, obj):
+    """Returns the integer value of a LowLimit or HighLimit of obj, a signed value if obj is signed
+
+    Limits of signed objects may be given as two's complement (0xF0 for -16 as INTEGER8, e.g.).
+    """
+    limit = int(s, 0)
+    bit_length = obj.get("bit_length")
+    if obj.get("data_type").startswith("signed") and limit >> (bit_length - 1) == 1:
+        limit -= 1 << bit_length
+    return limit
+
+
+def parse_string(s, odi):
+    """Returns the bytes of a VISIBLE_STRING (characters) or OCTET_STRING (hex digit pairs) EDS value"""
+    if int(odi, 0) == 0x000A:
+        return bytes.fromhex(s)
+    return s.encode("ascii")
+
+
+def make_object(o):
+    obj = make_object_from_data_type(o.get("datatype"))
+    obj["parameter_name"] = o.get("parametername")
+    obj["access_type"] = o.get("accesstype")
+    name = obj.get("parameter_name")
+    default_value = o.get("defaultvalue")
+    if int(o.get("datatype"), 0) in [0x0009, 0x000A] and not default_value and o.get("accesstype") == "const":
+        raise ValueError("A const VISIBLE_STRING or OCTET_STRING needs a DefaultValue of at least one character; use ro for a string of undefined length")
+    if int(o.get("datatype"), 0) in [0x0009, 0x000A] and default_value: # Fixed length string, first character in the lowest byte
+        string = parse_string(default_value, o.get("datatype"))
+        obj["bit_length"] = len(string) * 8
+        obj["data_type"] = "std_logic_vector({:d} downto 0)".format(obj.get("bit_length") - 1)
+        default_value = "0x" + string[::-1].hex()
+    bit_length = obj.get("bit_length")
+    if obj.get("access_type") =="const":
+        obj["name"] = format_constant(name)
+        default_value = parse_value(default_value, o.get("datatype"))
+        obj["default_value"] = format_value(default_value, bit_length)
+        obj["default_integer"] = default_value
+    elif default_value is not None:
+        obj["name"] = format_signal(name)
+        if default_value.startswith("$NODEID"):
+            obj["default_value"] = "NodeId_q"
+            if len(default_value) > 7:
+                if default_value[7] != "+":
+                    raise Exception(f"Invalid value syntax: {default_value}")
+                default_value = int(default_value[8:], 0)
+                if default_value < 0:
+                    raise Exception(f"Negative $NODEID offsets are not allowed")
+            else:
+                default_value = 0
+            obj["default_value"] = f"{obj.get("data_type")[:obj.get("data_type").index("(")]}(resize(unsigned(NodeId_q), {bit_length}) + to_unsigned({default_value}, {bit_length}))"
+            obj["node_id_offset"] = default_value
+        else:
+            default_value = parse_value(default_value, o.get("datatype"))
+            obj["default_value"] = format_value(default_value, bit_length)
+            obj["default_integer"] = default_value
+    else:
+        obj["name"] = format_signal(name)
+    obj["pdo_mapping"] = o.get("pdomapping", "0") == "1"
+    obj["direction"] = "in" if obj.get("access_type") == "ro" else "out"
+    if obj.get("access_type") in ["rw", "wo"]:
+        if (o.get("lowlimit") is not None or o.get("highlimit") is not None) and obj.get("data_type").startswith("std_logic_vector"):
+            raise ValueError("LowLimit and HighLimit are not supported for REAL and string data types")
+        for key in ["low", "high"]:
+            if o.get(key + "limit") is not None:
+                limit = parse_limit(o.get(key + "limit"), obj)
+                obj[key + "_limit"] = format_value(limit & ((1 << bit_length) - 1), bit_length)
+                obj[key + "_limit_value"] = limit
+    return obj
+
+
+def parse_cob_id(s):
+    if s.startswith("$NODEID+"):
+         s = s[8:]
+    return int(s, 0)
+
+
+def read_eds(filename, lower=True):
+    """Returns the sections of an EDS file by name, each a dict of values by key
+
+    Keys are lowercase unless lower is False.  A plain line reader: EDS files are
+    flat, and large dictionaries take seconds with ConfigParser.
+    """
+    eds = {}
+    section = None
+    with open(filename) as fp:
+        for n, line in enumerate(fp, 1):
+            line = line.strip()
+            if line == "" or line[0] in "#;":
+                continue
+            if line[0] == "[" and line[-1] == "]":
+                if line[1:-1] in eds:
+                    raise ValueError("Duplicate section [{}] on line {:d} of {}".format(line[1:-1], n, filename))
+                section = eds[line[1:-1]] = {}
+                continue
+            key, sep, value = line.partition("=")
+            if sep == "" or section is None:
+                raise ValueError("Invalid line {:d} of {}: {}".format(n, filename, line))
+            key = key.strip().lower() if lower else key.strip()
+            if key in section:
+                raise ValueError("Duplicate key {} on line {:d} of {}".format(key, n, filename))
+            section[key] = value.strip()
+    return eds
+
+
+def make_entity_name(eds):
+    #entity_name = "".join(map(str.capitalize, map(str.lower, eds["DeviceInfo"]["ProductName"].split(" ")))) + "CanOpen"
+    entity_name = format_signal(eds["DeviceInfo"]["productname"], prefix="", suffix="") + "CanOpen"
+    assert entity_name != ""
+    return entity_name
+
+
+def make_od(eds):
+    # Create pseudo-ObjectDictionary as a nested dict
+    indices = []
+    for section in ["MandatoryObjects", "OptionalObjects", "ManufacturerObjects"]:
+        if section not in eds: continue
+        n = int(eds[section]["supportedobjects"], 0)
+        for i in range(1, n + 1):
+            indices.append(int(eds[section][str(i)], 0))
+    od = {}
+    for i in indices:
+        oc = eds["{:04X}".format(i)]
+        o = dict(oc)
+        sub_number = oc.get("subnumber")
+        if sub_number is not None:
+            sub_number = int(sub_number, 0)
+            subs = {}
+            si = 0
+            while len(subs) <= sub_number and si <= 0xFF:
+                section = "{:04X}sub{:X}".format(i, si)
+                if section in eds:
+                     subs.update({si: eds[section]})
+                si += 1
+            o['subs'] = subs
+        od.update({i: o})
+    return od
+
+
+def make_objects(od):
+    # Create a flat, VHDL-friendly version of the object dictionary
+    objects = {}
+    for odi in od:
+        obj = od.get(odi)
+        if "subs" in obj:
+            subs = obj.get("subs")
+            for odsi in subs:
+                so = subs.get(odsi)
+                if odsi == 0:
+                    so["parametername"] = obj.get("parametername") + " Length"
+                objects.update({(odi << 8) + odsi: make_object(so)})
+        else:
+            try:
+                o = make_object(obj)
+            except Exception as e:
+                raise Exception("Error processing object 0x{:04X}".format(odi)) from e
+            objects.update({odi << 8: o})
+    return objects
+
+
+def default_value(obj, node_id):
+    """Returns the integer default value of an object dict, or None if it has none"""
+    if obj.get("node_id_offset") is not None:
+        return node_id + obj.get("node_id_offset")
+    return obj.get("default_integer")
+
+
+def write_eds(source, filename, objects, access_types=None):
+    """Writes the sections of the source EDS file implementing objects to a new EDS file
+
+    Object lists and SubNumber keys are rewritten to match the entries written,
+    access_types overrides the AccessType of objects by mux, and keys keep their case.
+    """
+    if access_types is None:
+        access_types = {}
+    eds = read_eds(source, lower=False)
+    indices = {mux >> 8 for mux in objects}
+    out = {}
+    for section in eds:
+        if section in ["MandatoryObjects", "OptionalObjects", "ManufacturerObjects"]:
+            kept = [value for key, value in eds[section].items() if key.lower() != "supportedobjects" and int(value, 0) in indices]
+            out[section] = {"SupportedObjects": str(len(kept))}
+            for i, value in enumerate(kept):
+                out[section][str(i + 1)] = value
+            continue
+        m = re.fullmatch(r"([0-9A-Fa-f]{4})(sub([0-9A-Fa-f]{1,2})|ObjectLinks)?", section)
+        if m is None:
+            out[section] = eds[section]
+            continue
+        index = int(m.group(1), 16)
+        mux = (index << 8) + (int(m.group(3), 16) if m.group(3) is not None else 0)
+        if index not in indices or (m.group(3) is not None and mux not in objects): continue
+        out[section] = eds[section]
+        if m.group(2) is not None and m.group(3) is None: continue # ObjectLinks
+        if "SubNumber" in out[section]:
+            sub_number = len([sub for sub in objects if sub >> 8 == index])
+            out[section]["SubNumber"] = ("0x{:X}" if out[section]["SubNumber"].lower().startswith("0x") else "{:d}").format(sub_number)
+        elif mux in access_types:
+            out[section]["AccessType"] = access_types.get(mux)
+    if "FileInfo" in out and "FileName" in out["FileInfo"]:
+        out["FileInfo"]["FileName"] = os.path.basename(filename)
+    with open(filename, "w") as fp:
+        for section in out:
+            fp.write("[{}]\n".format(section))
+            for key, value in out[section].items():
+                fp.write("{}={}\n".format(key, value))
+            fp.write("\n")
@@ -0,0 +1,309 @@
+#!/usr/bin/python
+"""SDO client for the SDO server generated by eds2vhdl.py
+
+Supports the protocol subset implemented by the server: expedited download,
+expedited and segmented upload, block upload (with CRC), and block download
+(with CRC) of program data (0x1F50) to a flash writer.  Frames are sent
+and received through a transport: SocketCanTransport for Linux SocketCAN
+(including vcan), or LoopbackTransport for a canopenmodel.Bus.
+
+Run sdoclient.py -h for usage
+"""
+import argparse
+import socket
+import struct
+import time
+
+from canopenmodel import Frame
+from crc16 import crc16
+
+SDO_ABORT_TIMEOUT = 0x05040000
+SDO_ABORT_CS = 0x05040001
+SDO_ABORT_BLKSIZE = 0x05040002
+SDO_ABORT_SEQNO = 0x05040003
+SDO_ABORT_CRC = 0x05040004
+SDO_ABORT_GENERAL = 0x08000000
+
+
+class SdoError(Exception):
+    pass
+
+
+class SdoAbortedError(SdoError):
+    """Transfer was aborted by the server or the client"""
+
+    def __init__(self, code):
+        super().__init__("SDO aborted with code 0x{:08X}".format(code))
+        self.code = code
+
+
+class SocketCanTransport:
+    """Linux SocketCAN raw socket"""
+
+    CAN_EFF_FLAG = 0x80000000
+    CAN_RTR_FLAG = 0x40000000
+    FORMAT = "=IB3x8s"
+
+    def __init__(self, channel, filters=None):
+        self.socket = socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+        if filters is not None:
+            self.socket.setsockopt(socket.SOL_CAN_RAW, socket.CAN_RAW_FILTER, b"".join(struct.pack("=II", cob_id, 0x7FF) for cob_id in filters))
+        self.socket.bind((channel,))
+
+    def send(self, frame):
+        can_id = frame.id | (self.CAN_EFF_FLAG if frame.ide else 0) | (self.CAN_RTR_FLAG if frame.rtr else 0)
+        self.socket.send(struct.pack(self.FORMAT, can_id, frame.dlc, frame.data.ljust(8, b"\x00")))
+
+    def recv(self, timeout):
+        self.socket.settimeout(timeout)
+        try:
+            can_id, dlc, data = struct.unpack(self.FORMAT, self.socket.recv(16))
+        except (socket.timeout, BlockingIOError): # BlockingIOError for a timeout of 0
+            return None
+        return Frame(can_id & 0x1FFFFFFF, data[:dlc], rtr=bool(can_id & self.CAN_RTR_FLAG), ide=bool(can_id & self.CAN_EFF_FLAG), dlc=dlc)
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def close(self):
+        self.socket.close()
+
+
+class LoopbackTransport:
+    """External client of a canopenmodel.Bus; timeouts are in simulated seconds"""
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.received = len(bus.log)
+
+    def send(self, frame):
+        self.bus.send(frame)
+
+    def recv(self, timeout):
+        until = self.bus.tick + round(timeout * self.bus.clock_frequency)
+        while True:
+            while self.received < len(self.bus.log):
+                start, end, frame, sender = self.bus.log[self.received]
+                self.received += 1
+                if sender is not None:
+                    return frame
+            if self.bus.tick >= until:
+                return None
+            self.bus.run(min(until, self.bus.tick + self.bus.ticks(160)))
+
+    def monotonic(self):
+        """Simulated seconds"""
+        return self.bus.tick / self.bus.clock_frequency
+
+    def close(self):
+        pass
+
+
+class SdoClient:
+    """SDO client of one server, using the default SDO COB-IDs unless given"""
+
+    def __init__(self, transport, node_id, timeout=1.0, rx_cob_id=None, tx_cob_id=None):
+        self.transport = transport
+        self.timeout = timeout
+        self.rx_cob_id = 0x600 + node_id if rx_cob_id is None else rx_cob_id # Client to server
+        self.tx_cob_id = 0x580 + node_id if tx_cob_id is None else tx_cob_id # Server to client
+
+    def _send(self, data):
+        self.transport.send(Frame(self.rx_cob_id, bytes(data).ljust(8, b"\x00")))
+
+    def _recv(self, index, subindex):
+        deadline = self.transport.monotonic() + self.timeout
+        while True:
+            remaining = deadline - self.transport.monotonic()
+            frame = self.transport.recv(max(remaining, 0))
+            if frame is None:
+                self.abort(index, subindex, SDO_ABORT_TIMEOUT)
+                raise SdoAbortedError(SDO_ABORT_TIMEOUT)
+            if frame.id == self.tx_cob_id and not frame.ide and not frame.rtr and frame.dlc == 8:
+                return frame.data
+
+    def _response(self, index, subindex):
+        data = self._recv(index, subindex)
+        if data[0] >> 5 == 0b100:
+            raise SdoAbortedError(int.from_bytes(data[4:8], "little"))
+        return data
+
+    def _fail(self, index, subindex, code):
+        self.abort(index, subindex, code)
+        raise SdoAbortedError(code)
+
+    def abort(self, index, subindex, code):
+        self._send(bytes([0x80]) + index.to_bytes(2, "little") + bytes([subindex]) + code.to_bytes(4, "little"))
+
+    def download(self, index, subindex, data):
+        """Expedited download of up to 4 bytes"""
+        data = bytes(data)
+        if not 0 < len(data) <= 4:
+            raise ValueError("Only expedited SDO download (1 to 4 bytes) is supported")
+        mux = index.to_bytes(2, "little") + bytes([subindex])
+        self._send(bytes([0x23 | ((4 - len(data)) << 2)]) + mux + data)
+        response = self._response(index, subindex)
+        if response[0] >> 5 != 0b011 or response[1:4] != mux:
+            self._fail(index, subindex, SDO_ABORT_CS)
+
+    def upload(self, index, subindex):
+        """Expedited or segmented upload"""
+        mux = index.to_bytes(2, "little") + bytes([subindex])
+        self._send(bytes([0x40]) + mux)
+        response = self._response(index, subindex)
+        if response[0] >> 5 != 0b010 or response[1:4] != mux:
+            self._fail(index, subindex, SDO_ABORT_CS)
+        if response[0] & 0x02: # Expedited
+            if response[0] & 0x01:
+                return response[4:8 - ((response[0] >> 2) & 0x3)]
+            return response[4:8]
+        size = int.from_bytes(response[4:8], "little") if response[0] & 0x01 else None
+        data = bytearray()
+        toggle = 0
+        while True:
+            self._send(bytes([0x60 | (toggle << 4)]))
+            response = self._response(index, subindex)
+            if response[0] >> 5 != 0b000:
+                self._fail(index, subindex, SDO_ABORT_CS)
+            if (response[0] >> 4) & 0x1 != toggle:
+                self._fail(index, subindex, 0x05030000)
+            data += response[1:8 - ((response[0] >> 1) & 0x7)]
+            if response[0] & 0x01:
+                break
+            toggle ^= 1
+        if size is not None and len(data) != size:
+            raise SdoError("Uploaded {:d} bytes, server indicated {:d}".format(len(data), size))
+        return bytes(data)
+
+    def block_upload(self, index, subindex, block_size=127, pst=0):
+        """Block upload; each sub-block is acknowledged as soon as its last segment is received, before its data is processed
+
+        Segments after one out of sequence are discarded, and the sub-block is
+        acknowledged with the last sequence number in order, so that the
+        server repeats the rest in the next sub-block (CiA 301).
+        """
+        if not 0 < block_size < 128:
+            raise ValueError("Block size must be in the range 1 to 127")
+        mux = index.to_bytes(2, "little") + bytes([subindex])
+        self._send(bytes([0xA4]) + mux + bytes([block_size, pst])) # Client CRC support
+        response = self._response(index, subindex)
+        if response[0] >> 5 == 0b010 and pst > 0: # Switched to expedited upload by the server
+            if response[1:4] != mux or not response[0] & 0x02:
+                self._fail(index, subindex, SDO_ABORT_CS)
+            return response[4:8 - ((response[0] >> 2) & 0x3)] if response[0] & 0x01 else response[4:8]
+        if response[0] >> 5 != 0b110 or response[0] & 0x01 != 0 or response[1:4] != mux:
+            self._fail(index, subindex, SDO_ABORT_CS)
+        crc_supported = bool(response[0] & 0x04)
+        size = int.from_bytes(response[4:8], "little") if response[0] & 0x02 else None
+        self._send(bytes([0xA3]))
+        segments = []
+        while True:
+            block = []
+            sequence_number = 0
+            complete = False
+            while True:
+                response = self._recv(index, subindex)
+                if response[0] == 0x80: # Abort, as sequence numbers start at 1
+                    raise SdoAbortedError(int.from_bytes(response[4:8], "little"))
+                if response[0] & 0x7F == sequence_number + 1:
+                    sequence_number += 1
+                    block.append(response)
+                    complete = bool(response[0] & 0x80)
+                if response[0] & 0x80 or response[0] & 0x7F == block_size: # Last segment sent by the server in this sub-block
+                    break
+            self._send(bytes([0xA2, sequence_number, block_size]))
+            segments += block
+            if complete:
+                break
+        response = self._response(index, subindex)
+        if response[0] >> 5 != 0b110 or response[0] & 0x03 != 0x01:
+            self._fail(index, subindex, SDO_ABORT_CS)
+        data = b"".join(segment[1:8] for segment in segments)
+        data = data[:len(data) - ((response[0] >> 2) & 0x7)]
+        if crc_supported and crc16(data) != int.from_bytes(response[1:3], "little"):
+            self._fail(index, subindex, SDO_ABORT_CRC)
+        self._send(bytes([0xA1]))
+        if size is not None and len(data) != size:
+            raise SdoError("Uploaded {:d} bytes, server indicated {:d}".format(len(data), size))
+        return data
+
+    def block_download(self, index, subindex, data):
+        """Block download with CRC; the server sets the block size, and holds each sub-block response until it can take the next sub-block"""
+        data = bytes(data)
+        mux = index.to_bytes(2, "little") + bytes([subindex])
+        self._send(bytes([0xC6]) + mux + len(data).to_bytes(4, "little")) # Client CRC support, size indicated
+        response = self._response(index, subindex)
+        if response[0] & 0xE3 != 0xA0 or response[1:4] != mux:
+            self._fail(index, subindex, SDO_ABORT_CS)
+        crc_supported = bool(response[0] & 0x04)
+        block_size = response[4]
+        if not 0 < block_size < 128:
+            self._fail(index, subindex, SDO_ABORT_BLKSIZE)
+        offset = 0
+        while True:
+            sequence_number = 0
+            while sequence_number < block_size:
+                sequence_number += 1
+                segment = data[offset + 7 * (sequence_number - 1):offset + 7 * sequence_number]
+                complete = offset + 7 * sequence_number >= len(data)
+                self._send(bytes([(0x80 if complete else 0x00) | sequence_number]) + segment)
+                if complete:
+                    break
+            response = self._response(index, subindex)
+            if response[0] & 0xE3 != 0xA2 or response[1] > sequence_number:
+                self._fail(index, subindex, SDO_ABORT_CS)
+            offset += 7 * response[1] # Segments after the last one acknowledged are repeated
+            if offset >= len(data) and response[1] == sequence_number:
+                break
+            block_size = response[2]
+            if not 0 < block_size < 128:
+                self._fail(index, subindex, SDO_ABORT_BLKSIZE)
+        n = (7 - len(data) % 7) % 7 if len(data) > 0 else 7
+        self._send(bytes([0xC1 | (n << 2)]) + (crc16(data) if crc_supported else 0).to_bytes(2, "little"))
+        response = self._response(index, subindex)
+        if response[0] & 0xE3 != 0xA1:
+            self._fail(index, subindex, SDO_ABORT_CS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mux", type=lambda x: int(x, 0), help="Object dictionary multiplexer to upload, or download (0x102100, e.g.)")
+    parser.add_argument("--node-id", type=lambda x: int(x, 0), default=1, help="Node-ID of the server (default: 1)")
+    parser.add_argument("--channel", type=str, default="can0", help="SocketCAN interface (default: can0)")
+    parser.add_argument("--loopback", type=str, help="Uploads from a canopenmodel.Node of this EDS instead of SocketCAN")
+    parser.add_argument("--domain", type=str, help="With --loopback, file served as the content of the DOMAIN object")
+    parser.add_argument("--block", nargs="?", const=True, default=False, type=bool, help="Uses block upload")
+    parser.add_argument("--output", type=str, help="Writes the data to this file instead of printing it")
+    parser.add_argument("--download", type=str, help="Block downloads this file instead, as program data (0x1F5001, e.g.)")
+    args = parser.parse_args()
+
+    if args.loopback:
+        from canopenmodel import Bus, load
+        node = load(args.loopback, args.node_id)
+        if args.domain:
+            with open(args.domain, "rb") as fp:
+                node.domains[args.mux] = fp.read()
+        transport = LoopbackTransport(Bus([node], 500000))
+    else:
+        transport = SocketCanTransport(args.channel, [0x580 + args.node_id])
+    client = SdoClient(transport, args.node_id)
+    start = transport.monotonic()
+    if args.download:
+        with open(args.download, "rb") as fp:
+            data = fp.read()
+        client.block_download(args.mux >> 8, args.mux & 0xFF, data)
+        transport.close()
+        print("{} downloaded with {:d} bytes in {:.3f} s".format(args.download, len(data), transport.monotonic() - start))
+        raise SystemExit
+    if args.block:
+        data = client.block_upload(args.mux >> 8, args.mux & 0xFF)
+    else:
+        data = client.upload(args.mux >> 8, args.mux & 0xFF)
+    elapsed = transport.monotonic() - start
+    transport.close()
+    if args.output:
+        with open(args.output, "wb") as fp:
+            fp.write(data)
+        print("{} written with {:d} bytes in {:.3f} s".format(args.output, len(data), elapsed))
+    else:
+        print(data.hex(" ").upper())
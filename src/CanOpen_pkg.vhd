@@ -10,6 +10,14 @@ package CanOpen is
     ------------------------------------------------------------
     type NodeIdArray is array (integer range <>) of std_logic_vector(6 downto 0);
 
+    -- ARRAY objects, indexed by sub-index (eds2vhdl.py --arrays)
+    type Signed8Array is array (integer range <>) of signed(7 downto 0);
+    type Signed16Array is array (integer range <>) of signed(15 downto 0);
+    type Signed32Array is array (integer range <>) of signed(31 downto 0);
+    type Unsigned8Array is array (integer range <>) of unsigned(7 downto 0);
+    type Unsigned16Array is array (integer range <>) of unsigned(15 downto 0);
+    type Unsigned32Array is array (integer range <>) of unsigned(31 downto 0);
+
     type TimeOfDay is record
         Milliseconds    : unsigned(27 downto 0);
         Days            : unsigned(15 downto 0);
@@ -74,6 +82,10 @@ package CanOpen is
     function to_std_logic_vector(constant TIMESTAMP : TimeofDay) return std_logic_vector;
 
     function to_TimeOfDay(constant DATA_BYTES : CanBus.DataBytes) return TimeOfDay;
+
+    -- CAN FD data length codes per ISO 11898-1, for PDOs and USDO segments of CiA 1301
+    function to_FdDlc(constant BYTES : natural range 0 to 64) return std_logic_vector; -- Smallest DLC holding BYTES
+    function to_FdDataLength(constant DLC : std_logic_vector(3 downto 0)) return natural; -- Data bytes of DLC
         
     -- CRC-16-CCITT/XMODEM algorithm for SDO block upload
     function Crc16 (
@@ -167,6 +179,31 @@ package CanOpen is
     constant SDO_ABORT_GENERAL          : std_logic_vector(31 downto 0); -- General error
     constant SDO_ABORT_NO_DATA          : std_logic_vector(31 downto 0); -- No data available
     
+    -- CANopen LSS COB-IDs per CiA 305
+    constant LSS_MASTER_COB_ID                      : std_logic_vector(10 downto 0); -- Master to slaves
+    constant LSS_SLAVE_COB_ID                       : std_logic_vector(10 downto 0); -- Slaves to master
+    
+    -- CANopen LSS command specifiers per CiA 305
+    constant LSS_CS_SWITCH_STATE_GLOBAL             : std_logic_vector(7 downto 0); -- Switch state global
+    constant LSS_CS_CONFIGURE_NODE_ID               : std_logic_vector(7 downto 0); -- Configure node-ID
+    constant LSS_CS_CONFIGURE_BIT_TIMING            : std_logic_vector(7 downto 0); -- Configure bit timing parameters
+    constant LSS_CS_ACTIVATE_BIT_TIMING             : std_logic_vector(7 downto 0); -- Activate bit timing parameters
+    constant LSS_CS_STORE_CONFIGURATION             : std_logic_vector(7 downto 0); -- Store configuration
+    constant LSS_CS_SWITCH_STATE_SELECTIVE_VENDOR   : std_logic_vector(7 downto 0); -- Switch state selective, vendor-ID
+    constant LSS_CS_SWITCH_STATE_SELECTIVE_PRODUCT  : std_logic_vector(7 downto 0); -- Switch state selective, product-code
+    constant LSS_CS_SWITCH_STATE_SELECTIVE_REVISION : std_logic_vector(7 downto 0); -- Switch state selective, revision-number
+    constant LSS_CS_SWITCH_STATE_SELECTIVE_SERIAL   : std_logic_vector(7 downto 0); -- Switch state selective, serial-number
+    constant LSS_CS_SWITCH_STATE_SELECTIVE          : std_logic_vector(7 downto 0); -- Switch state selective response
+    constant LSS_CS_IDENTIFY_NON_CONFIGURED         : std_logic_vector(7 downto 0); -- Identify non-configured remote slave
+    constant LSS_CS_IDENTIFY_SLAVE                  : std_logic_vector(7 downto 0); -- Identify slave response, for Fastscan
+    constant LSS_CS_IDENTIFY_NON_CONFIGURED_SLAVE   : std_logic_vector(7 downto 0); -- Identify non-configured slave response
+    constant LSS_CS_FASTSCAN                        : std_logic_vector(7 downto 0); -- Fastscan
+    constant LSS_CS_INQUIRE_VENDOR                  : std_logic_vector(7 downto 0); -- Inquire identity vendor-ID
+    constant LSS_CS_INQUIRE_PRODUCT                 : std_logic_vector(7 downto 0); -- Inquire identity product-code
+    constant LSS_CS_INQUIRE_REVISION                : std_logic_vector(7 downto 0); -- Inquire identity revision-number
+    constant LSS_CS_INQUIRE_SERIAL                  : std_logic_vector(7 downto 0); -- Inquire identity serial-number
+    constant LSS_CS_INQUIRE_NODE_ID                 : std_logic_vector(7 downto 0); -- Inquire node-ID
+    
     -- CANopen Object Dictionary (OD)
     -- Mandatory indices per CiA 301
     constant ODI_DEVICE_TYPE            : std_logic_vector(23 downto 0);
@@ -432,6 +469,35 @@ package body CanOpen is
             Days => unsigned(SLV(47 downto 32))
         );
     end function to_TimeOfDay;
+
+    function to_FdDlc(constant BYTES : natural range 0 to 64) return std_logic_vector is
+    begin
+        if BYTES <= 8 then
+            return std_logic_vector(to_unsigned(BYTES, 4));
+        elsif BYTES <= 24 then
+            return std_logic_vector(to_unsigned((BYTES + 3) / 4 + 6, 4)); -- 12, 16, 20 and 24 bytes
+        elsif BYTES <= 32 then
+            return x"D";
+        elsif BYTES <= 48 then
+            return x"E";
+        else
+            return x"F";
+        end if;
+    end function to_FdDlc;
+
+    function to_FdDataLength(constant DLC : std_logic_vector(3 downto 0)) return natural is
+    begin
+        case DLC is
+            when x"9" => return 12;
+            when x"A" => return 16;
+            when x"B" => return 20;
+            when x"C" => return 24;
+            when x"D" => return 32;
+            when x"E" => return 48;
+            when x"F" => return 64;
+            when others => return to_integer(unsigned(DLC));
+        end case;
+    end function to_FdDataLength;
     
     -- CRC-16-CCITT/XMODEM algorithm for SDO block upload
     function Crc16 (
@@ -662,6 +728,31 @@ package body CanOpen is
     constant SDO_ABORT_GENERAL          : std_logic_vector(31 downto 0) := x"08000000"; -- General error
     constant SDO_ABORT_NO_DATA          : std_logic_vector(31 downto 0) := x"08000024"; -- No data available
     
+    -- CANopen LSS COB-IDs per CiA 305
+    constant LSS_MASTER_COB_ID                      : std_logic_vector(10 downto 0) := b"11111100101"; -- Master to slaves
+    constant LSS_SLAVE_COB_ID                       : std_logic_vector(10 downto 0) := b"11111100100"; -- Slaves to master
+    
+    -- CANopen LSS command specifiers per CiA 305
+    constant LSS_CS_SWITCH_STATE_GLOBAL             : std_logic_vector(7 downto 0) := x"04"; -- Switch state global
+    constant LSS_CS_CONFIGURE_NODE_ID               : std_logic_vector(7 downto 0) := x"11"; -- Configure node-ID
+    constant LSS_CS_CONFIGURE_BIT_TIMING            : std_logic_vector(7 downto 0) := x"13"; -- Configure bit timing parameters
+    constant LSS_CS_ACTIVATE_BIT_TIMING             : std_logic_vector(7 downto 0) := x"15"; -- Activate bit timing parameters
+    constant LSS_CS_STORE_CONFIGURATION             : std_logic_vector(7 downto 0) := x"17"; -- Store configuration
+    constant LSS_CS_SWITCH_STATE_SELECTIVE_VENDOR   : std_logic_vector(7 downto 0) := x"40"; -- Switch state selective, vendor-ID
+    constant LSS_CS_SWITCH_STATE_SELECTIVE_PRODUCT  : std_logic_vector(7 downto 0) := x"41"; -- Switch state selective, product-code
+    constant LSS_CS_SWITCH_STATE_SELECTIVE_REVISION : std_logic_vector(7 downto 0) := x"42"; -- Switch state selective, revision-number
+    constant LSS_CS_SWITCH_STATE_SELECTIVE_SERIAL   : std_logic_vector(7 downto 0) := x"43"; -- Switch state selective, serial-number
+    constant LSS_CS_SWITCH_STATE_SELECTIVE          : std_logic_vector(7 downto 0) := x"44"; -- Switch state selective response
+    constant LSS_CS_IDENTIFY_NON_CONFIGURED         : std_logic_vector(7 downto 0) := x"4C"; -- Identify non-configured remote slave
+    constant LSS_CS_IDENTIFY_SLAVE                  : std_logic_vector(7 downto 0) := x"4F"; -- Identify slave response, for Fastscan
+    constant LSS_CS_IDENTIFY_NON_CONFIGURED_SLAVE   : std_logic_vector(7 downto 0) := x"50"; -- Identify non-configured slave response
+    constant LSS_CS_FASTSCAN                        : std_logic_vector(7 downto 0) := x"51"; -- Fastscan
+    constant LSS_CS_INQUIRE_VENDOR                  : std_logic_vector(7 downto 0) := x"5A"; -- Inquire identity vendor-ID
+    constant LSS_CS_INQUIRE_PRODUCT                 : std_logic_vector(7 downto 0) := x"5B"; -- Inquire identity product-code
+    constant LSS_CS_INQUIRE_REVISION                : std_logic_vector(7 downto 0) := x"5C"; -- Inquire identity revision-number
+    constant LSS_CS_INQUIRE_SERIAL                  : std_logic_vector(7 downto 0) := x"5D"; -- Inquire identity serial-number
+    constant LSS_CS_INQUIRE_NODE_ID                 : std_logic_vector(7 downto 0) := x"5E"; -- Inquire node-ID
+    
     -- CANopen Object Dictionary indices (ODIs) 
     -- Mandatory indices per CiA 301
     constant ODI_DEVICE_TYPE            : std_logic_vector(23 downto 0) := x"100000";
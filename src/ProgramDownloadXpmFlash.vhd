@@ -0,0 +1,270 @@
+-- Program download interface adapter for page-erased flash, double buffered in XPM Simple Dual Port RAM
+-- Program data (0x1F50) is written to one of two page buffers, a byte per Clock, while the page in the other buffer is
+-- erased and programmed by the flash controller, so receiving page N + 1 overlaps erasing and programming page N.
+-- ProgramDataReady is high while a whole sub-block of BLOCK_SIZE segments fits in the buffers, so the SDO server
+-- holds its sub-block response, and the client its next sub-block, only while both buffers are full.
+
+library ieee;
+    use ieee.std_logic_1164.all;
+    use ieee.numeric_std.all;
+    use ieee.math_real.ceil;
+    use ieee.math_real.log2;
+
+library xpm;
+    use xpm.vcomponents.all;
+
+entity ProgramDownloadXpmFlash is
+    generic (
+        PAGE_SIZE       : positive; -- Bytes erased and programmed at once, a power of 2 and at least 7 * BLOCK_SIZE / 2
+        BLOCK_SIZE      : positive := 127; -- Segments per sub-block, at least eds2vhdl.py --program-block-size
+        FLASH_ADDRESS   : natural := 0; -- Of the first page programmed
+        FLASH_SIZE      : positive -- Bytes from FLASH_ADDRESS that may be programmed
+    );
+    port (
+        Clock               : in std_logic;
+        Reset_n             : in std_logic;
+        -- Program download interface of the generated entity
+        ProgramStart        : in std_logic;
+        ProgramData         : in std_logic_vector(55 downto 0); -- First byte in 7 downto 0
+        ProgramDataBytes    : in unsigned(2 downto 0);
+        ProgramDataValid    : in std_logic; -- At most every 8 Clocks
+        ProgramEnd          : in std_logic;
+        ProgramAbort        : in std_logic;
+        ProgramDataReady    : out std_logic;
+        FlashStatus         : out unsigned(31 downto 0); -- For 0x1F57 Flash status identification
+        -- Flash controller
+        FlashAddress        : out unsigned(31 downto 0); -- Of the page erased or programmed
+        FlashLength         : out natural range 0 to PAGE_SIZE; -- Bytes programmed from FlashAddress
+        FlashErase          : out std_logic; -- Single-clock request to erase the page at FlashAddress
+        FlashProgram        : out std_logic; -- Single-clock request to program FlashLength bytes at FlashAddress
+        FlashBusy           : in std_logic; -- High from the Clock after a request until it is done
+        FlashError          : in std_logic; -- Sampled when FlashBusy falls
+        FlashReadAddress    : in natural range 0 to PAGE_SIZE - 1; -- Offset in the page programmed
+        FlashReadData       : out std_logic_vector(7 downto 0) -- One Clock after FlashReadAddress
+    );
+end entity ProgramDownloadXpmFlash;
+
+architecture Behavioral of ProgramDownloadXpmFlash is
+
+    constant PAGE_WIDTH     : natural := integer(ceil(log2(real(PAGE_SIZE))));
+    constant BLOCK_BYTES    : natural := 7 * BLOCK_SIZE;
+
+    -- CiA 302-3 flash status, bits 7 downto 1 of 0x1F57
+    constant STATUS_OK              : natural := 0;
+    constant STATUS_WRITE_ERROR     : natural := 5; -- Flash write error
+    constant STATUS_ADDRESS_ERROR   : natural := 6; -- General address error
+    constant STATUS_UNSPECIFIED     : natural := 63; -- Unspecified error, as for aborted downloads
+
+    type FlashState is (
+        FLASH_IDLE,
+        FLASH_ERASE_WAIT,
+        FLASH_PROGRAM_WAIT
+    );
+    type PageLengthArray is array (0 to 1) of natural range 0 to PAGE_SIZE;
+
+    signal Reset            : std_logic;
+    signal State            : FlashState;
+    signal Segment          : std_logic_vector(55 downto 0); -- Bytes left to write, next byte in 7 downto 0
+    signal SegmentBytes     : natural range 0 to 7;
+    signal WriteBank        : natural range 0 to 1;
+    signal WriteOffset      : natural range 0 to PAGE_SIZE - 1;
+    signal ProgramBank      : natural range 0 to 1; -- Page buffer erased and programmed next
+    signal RamWriteEnable   : std_logic;
+    signal RamWriteLocation,
+           RamReadLocation  : std_logic_vector(PAGE_WIDTH downto 0); -- Bank & offset
+    signal BufferBytes      : natural range 0 to 2 * PAGE_SIZE; -- Bytes written, or to be written, and not yet programmed
+    signal Discarding       : boolean; -- Buffers were reset during a flash operation, which is completed first
+    signal InProgress       : std_logic;
+    signal StatusCode       : natural range 0 to 127;
+
+begin
+
+    assert BLOCK_BYTES <= 2 * PAGE_SIZE and 2 ** PAGE_WIDTH = PAGE_SIZE report "PAGE_SIZE must be a power of 2 of at least 7 * BLOCK_SIZE / 2 bytes" severity failure;
+
+    Reset <= not Reset_n;
+    RamWriteEnable <= '1' when SegmentBytes > 0 else '0';
+    RamWriteLocation <= std_logic_vector(to_unsigned(WriteBank * PAGE_SIZE + WriteOffset, PAGE_WIDTH + 1));
+    RamReadLocation <= std_logic_vector(to_unsigned(ProgramBank * PAGE_SIZE + FlashReadAddress, PAGE_WIDTH + 1));
+    ProgramDataReady <= '1' when 2 * PAGE_SIZE - BufferBytes >= BLOCK_BYTES and ProgramDataValid = '0' and ProgramStart = '0' and not Discarding else '0';
+    FlashStatus <= to_unsigned(StatusCode * 2, 31) & InProgress;
+
+    xpm_memory_sdpram_inst : xpm_memory_sdpram
+        generic map (
+            ADDR_WIDTH_A => PAGE_WIDTH + 1,
+            ADDR_WIDTH_B => PAGE_WIDTH + 1,
+            BYTE_WRITE_WIDTH_A => 8,
+            MEMORY_SIZE => 8 * 2 * PAGE_SIZE,
+            READ_DATA_WIDTH_B => 8,
+            READ_LATENCY_B => 1,
+            SIM_ASSERT_CHK => 1,
+            WRITE_DATA_WIDTH_A => 8
+        )
+        port map (
+            addra => RamWriteLocation,
+            addrb => RamReadLocation,
+            clka => Clock,
+            clkb => Clock,
+            dbiterrb => open,
+            dina => Segment(7 downto 0),
+            doutb => FlashReadData,
+            ena => RamWriteEnable,
+            enb => '1',
+            injectdbiterra => '0',
+            injectsbiterra => '0',
+            regceb => '1',
+            rstb => Reset,
+            sbiterrb => open,
+            sleep => '0',
+            wea => b"1"
+        );
+
+    process (Clock, Reset_n)
+        variable Bytes          : natural range 0 to 2 * PAGE_SIZE + 7;
+        variable PageLength     : PageLengthArray; -- Bytes of each closed page buffer, 0 while filling or empty
+        variable PageOffset     : natural; -- Of the page programmed next, from FLASH_ADDRESS
+        variable Ending         : boolean; -- ProgramEnd received, the last page buffer is closed once the bytes left are written
+        variable Failed         : boolean; -- Program data is discarded until the next ProgramStart
+        variable Requested      : boolean; -- Request in the previous Clock, FlashBusy is not valid yet
+        variable Restart        : boolean;
+    begin
+        if Reset_n = '0' then
+            Bytes := 0;
+            PageLength := (others => 0);
+            PageOffset := 0;
+            Ending := false;
+            Failed := false;
+            Requested := false;
+            Restart := false;
+            State <= FLASH_IDLE;
+            Segment <= (others => '0');
+            SegmentBytes <= 0;
+            WriteBank <= 0;
+            WriteOffset <= 0;
+            ProgramBank <= 0;
+            BufferBytes <= 0;
+            Discarding <= false;
+            InProgress <= '0';
+            StatusCode <= STATUS_OK;
+            FlashAddress <= (others => '0');
+            FlashLength <= 0;
+            FlashErase <= '0';
+            FlashProgram <= '0';
+        elsif rising_edge(Clock) then
+            FlashErase <= '0';
+            FlashProgram <= '0';
+            Bytes := BufferBytes;
+            Restart := false;
+            -- Flash operations, a page buffer at a time
+            case State is
+                when FLASH_IDLE =>
+                    Discarding <= false;
+                    if not Discarding and PageLength(ProgramBank) > 0 then
+                        if PageOffset + PAGE_SIZE > FLASH_SIZE then
+                            StatusCode <= STATUS_ADDRESS_ERROR;
+                            Failed := true;
+                            Restart := true;
+                        else
+                            FlashAddress <= to_unsigned(FLASH_ADDRESS, 32) + PageOffset;
+                            FlashLength <= PageLength(ProgramBank);
+                            FlashErase <= '1';
+                            Requested := true;
+                            State <= FLASH_ERASE_WAIT;
+                        end if;
+                    end if;
+                when FLASH_ERASE_WAIT =>
+                    if Requested then
+                        Requested := false;
+                    elsif FlashBusy = '0' then
+                        if Discarding then
+                            State <= FLASH_IDLE;
+                        elsif FlashError = '1' then
+                            StatusCode <= STATUS_WRITE_ERROR;
+                            Failed := true;
+                            Restart := true;
+                            State <= FLASH_IDLE;
+                        else
+                            FlashProgram <= '1';
+                            Requested := true;
+                            State <= FLASH_PROGRAM_WAIT;
+                        end if;
+                    end if;
+                when FLASH_PROGRAM_WAIT =>
+                    if Requested then
+                        Requested := false;
+                    elsif FlashBusy = '0' then
+                        if Discarding then
+                            null;
+                        elsif FlashError = '1' then
+                            StatusCode <= STATUS_WRITE_ERROR;
+                            Failed := true;
+                            Restart := true;
+                        else -- Page buffer free
+                            Bytes := Bytes - PageLength(ProgramBank);
+                            PageLength(ProgramBank) := 0;
+                            PageOffset := PageOffset + PAGE_SIZE;
+                            ProgramBank <= 1 - ProgramBank;
+                        end if;
+                        State <= FLASH_IDLE;
+                    end if;
+            end case;
+            -- Page buffers, a byte per Clock
+            if SegmentBytes > 0 then
+                Segment <= x"00" & Segment(55 downto 8);
+                SegmentBytes <= SegmentBytes - 1;
+                if WriteOffset = PAGE_SIZE - 1 then -- Page buffer full
+                    PageLength(WriteBank) := PAGE_SIZE;
+                    WriteBank <= 1 - WriteBank;
+                    WriteOffset <= 0;
+                else
+                    WriteOffset <= WriteOffset + 1;
+                end if;
+            elsif Ending then -- Last page buffer, closed if any byte was written to it
+                if WriteOffset > 0 then
+                    PageLength(WriteBank) := WriteOffset;
+                    WriteBank <= 1 - WriteBank;
+                    WriteOffset <= 0;
+                end if;
+                Ending := false;
+            end if;
+            if ProgramDataValid = '1' and not Failed then
+                Segment <= ProgramData;
+                SegmentBytes <= to_integer(ProgramDataBytes);
+                Bytes := Bytes + to_integer(ProgramDataBytes);
+            end if;
+            if ProgramEnd = '1' and not Failed then
+                Ending := true;
+            end if;
+            if InProgress = '1' and not Ending and SegmentBytes = 0 and Bytes = 0 then -- All pages programmed
+                InProgress <= '0';
+            end if;
+            if ProgramAbort = '1' and InProgress = '1' then
+                StatusCode <= STATUS_UNSPECIFIED;
+                Failed := true;
+                Restart := true;
+            end if;
+            if ProgramStart = '1' then
+                StatusCode <= STATUS_OK;
+                Failed := false;
+                Restart := true;
+                InProgress <= '1';
+            elsif Failed then
+                InProgress <= '0';
+            end if;
+            if Restart then -- Discard the page buffers, the flash operation in progress is completed first
+                Bytes := 0;
+                PageLength := (others => 0);
+                PageOffset := 0;
+                Ending := false;
+                Segment <= (others => '0');
+                SegmentBytes <= 0;
+                WriteBank <= 0;
+                WriteOffset <= 0;
+                ProgramBank <= 0;
+                if State /= FLASH_IDLE then
+                    Discarding <= true;
+                end if;
+            end if;
+            BufferBytes <= Bytes;
+        end if;
+    end process;
+end architecture Behavioral;
@@ -0,0 +1,203 @@
+-- Segmented SDO interface adapter for XPM Simple Dual Port RAM, double buffered
+-- Words are written to one bank, a word per Clock, while the other bank is read, so writing never stalls.
+-- The banks are swapped when ReadEnable rises: the bank written until then is read as a snapshot, oldest word first,
+-- and writing continues from the start of the other bank. A bank keeps its last WRITE_DEPTH words.
+
+library ieee;
+    use ieee.std_logic_1164.all;
+    use ieee.numeric_std.all;
+    use ieee.math_real.ceil;
+    use ieee.math_real.log2;
+
+library xpm;
+    use xpm.vcomponents.all;
+
+entity SegmentedSdoXpmPingPongRam is
+    generic (
+        WRITE_WIDTH : natural; -- in bits
+        WRITE_DEPTH   : natural; -- of each bank
+        STREAM      : boolean := false -- For eds2vhdl.py --sdo-stream: ReadData holds the next segment until transferred
+    );
+    port (
+        Clock           : in std_logic;
+        Reset_n         : in std_logic;
+        WriteData       : in std_logic_vector(WRITE_WIDTH - 1 downto 0);
+        WriteEnable     : in std_logic; -- A word is written each Clock this is high
+        ReadEnable      : in std_logic; -- Rising edge swaps the banks
+        ReadDataEnable  : in std_logic; -- Hold high until ReadValid goes high
+        ReadData        : out std_logic_vector(55 downto 0);
+        ReadValid       : out std_logic
+    );
+end entity SegmentedSdoXpmPingPongRam;
+
+architecture Behavioral of SegmentedSdoXpmPingPongRam is
+
+    constant WRITE_BYTES    : natural := integer(ceil(real(WRITE_WIDTH) / 8.0));
+    constant MEMORY_SIZE    : natural := WRITE_BYTES * 8 * 2 * WRITE_DEPTH;
+    constant ADDR_WIDTH     : natural := integer(ceil(log2(real(WRITE_DEPTH))));
+
+    type ByteArray is array (natural range <>) of std_logic_vector(7 downto 0);
+
+    signal Reset            : std_logic;
+    signal ReadEnable_q     : std_logic;
+    signal Swap             : std_logic; -- ReadEnable rising
+    signal ReadBank,
+           WriteBank,
+           RamWriteBank     : std_logic;
+    signal ReadAddress      : natural range 0 to WRITE_DEPTH - 1;
+    signal WriteAddress,
+           RamWriteAddress  : natural range 0 to WRITE_DEPTH - 1;
+    signal RamReadLocation,
+           RamWriteLocation : std_logic_vector(ADDR_WIDTH downto 0); -- Bank & address
+    signal ReadWord,
+           WriteWord        : std_logic_vector(WRITE_BYTES * 8 - 1 downto 0);
+    signal WriteWordCount   : natural range 0 to WRITE_DEPTH; -- Words held by the bank written
+
+begin
+
+    Reset <= not Reset_n;
+    WriteWord <= std_logic_vector(resize(unsigned(WriteData), WriteWord'length));
+    Swap <= ReadEnable and not ReadEnable_q;
+    RamWriteBank <= not WriteBank when Swap = '1' else WriteBank; -- A word written while swapping goes to the new bank
+    RamWriteAddress <= 0 when Swap = '1' else WriteAddress;
+    RamWriteLocation <= RamWriteBank & std_logic_vector(to_unsigned(RamWriteAddress, ADDR_WIDTH));
+    RamReadLocation <= ReadBank & std_logic_vector(to_unsigned(ReadAddress, ADDR_WIDTH));
+
+    xpm_memory_sdpram_inst : xpm_memory_sdpram
+        generic map (
+            ADDR_WIDTH_A => ADDR_WIDTH + 1,
+            ADDR_WIDTH_B => ADDR_WIDTH + 1,
+            BYTE_WRITE_WIDTH_A => WRITE_BYTES * 8,
+            MEMORY_SIZE => MEMORY_SIZE,
+            READ_DATA_WIDTH_B => WRITE_BYTES * 8,
+            READ_LATENCY_B => 1,
+            SIM_ASSERT_CHK => 1,
+            WRITE_DATA_WIDTH_A => WRITE_BYTES * 8
+        )
+        port map (
+            addra => RamWriteLocation,
+            addrb => RamReadLocation,
+            clka => Clock,
+            clkb => Clock,
+            dbiterrb => open,
+            dina => WriteWord,
+            doutb => ReadWord,
+            ena => WriteEnable,
+            enb => ReadEnable,
+            injectdbiterra => '0',
+            injectsbiterra => '0',
+            regceb => '1',
+            rstb => Reset,
+            sbiterrb => open,
+            sleep => '0',
+            wea => b"1"
+        );
+
+    process (Clock, Reset_n)
+        variable WriteWords     : natural range 0 to WRITE_DEPTH;
+        variable Lanes          : ByteArray(0 to WRITE_BYTES + 5); -- Bytes read but not yet in a segment, first byte in lane 0
+        variable LaneCount      : natural range 0 to WRITE_BYTES + 6;
+        variable ReadPending    : boolean; -- ReadWord holds the word addressed in the previous Clock
+        variable ReadWordCount  : natural range 0 to WRITE_DEPTH; -- Words left to address
+        variable SegmentBytes   : natural range 0 to 7;
+        variable ReadValid_ob   : std_logic;
+        variable Started        : boolean; -- Size read
+    begin
+        if Reset_n = '0' then
+            WriteWords := 0;
+            Lanes := (others => (others => '0'));
+            LaneCount := 0;
+            ReadPending := false;
+            ReadWordCount := 0;
+            SegmentBytes := 0;
+            ReadValid_ob := '0';
+            Started := false;
+            ReadEnable_q <= '0';
+            ReadBank <= '1';
+            WriteBank <= '0';
+            ReadAddress <= 0;
+            WriteAddress <= 0;
+            WriteWordCount <= 0;
+            ReadData <= (others => '0');
+            ReadValid <= '0';
+        elsif rising_edge(Clock) then
+            ReadEnable_q <= ReadEnable;
+            -- Writing
+            WriteWords := WriteWordCount;
+            if Swap = '1' then
+                ReadBank <= WriteBank;
+                WriteBank <= not WriteBank;
+                ReadWordCount := WriteWordCount; -- Size read by the SDO server, excluding the word written while swapping
+                if WriteAddress >= WriteWordCount then -- Start at the oldest word kept
+                    ReadAddress <= WriteAddress - WriteWordCount;
+                else
+                    ReadAddress <= WriteAddress + WRITE_DEPTH - WriteWordCount;
+                end if;
+                WriteWords := 0;
+            end if;
+            if WriteEnable = '1' then
+                if RamWriteAddress = WRITE_DEPTH - 1 then
+                    WriteAddress <= 0;
+                else
+                    WriteAddress <= RamWriteAddress + 1;
+                end if;
+                if WriteWords < WRITE_DEPTH then
+                    WriteWords := WriteWords + 1;
+                end if;
+            elsif Swap = '1' then
+                WriteAddress <= 0;
+            end if;
+            WriteWordCount <= WriteWords;
+            -- Reading
+            if ReadEnable = '0' then
+                LaneCount := 0;
+                ReadPending := false;
+                ReadValid_ob := '0';
+                Started := false;
+                ReadData <= std_logic_vector(to_unsigned(WriteWords * WRITE_BYTES, ReadData'length));
+            elsif Swap = '0' then
+                -- Pack the word read in the previous Clock behind the bytes held
+                if ReadPending then
+                    for i in 0 to WRITE_BYTES - 1 loop
+                        Lanes(LaneCount + i) := ReadWord(8 * i + 7 downto 8 * i);
+                    end loop;
+                    LaneCount := LaneCount + WRITE_BYTES;
+                end if;
+                -- Read the next word while less than a segment is held
+                ReadPending := LaneCount < 7 and ReadWordCount > 0;
+                if ReadPending then
+                    ReadWordCount := ReadWordCount - 1;
+                    if ReadAddress = WRITE_DEPTH - 1 then
+                        ReadAddress <= 0;
+                    else
+                        ReadAddress <= ReadAddress + 1;
+                    end if;
+                end if;
+                if ReadDataEnable = '1' then
+                    Started := true;
+                end if;
+                if STREAM and ReadValid_ob = '1' and ReadDataEnable = '1' then -- Transferred
+                    ReadValid_ob := '0';
+                elsif ReadDataEnable = '0' and not STREAM then
+                    ReadValid_ob := '0';
+                end if;
+                if Started and (STREAM or ReadDataEnable = '1') and ReadValid_ob = '0' and (LaneCount >= 7 or (not ReadPending and (LaneCount > 0 or not STREAM))) then -- Segment complete, or last one
+                    if LaneCount >= 7 then
+                        SegmentBytes := 7;
+                    else
+                        SegmentBytes := LaneCount;
+                    end if;
+                    for i in 0 to 6 loop
+                        ReadData(8 * i + 7 downto 8 * i) <= Lanes(i);
+                    end loop;
+                    for i in 0 to WRITE_BYTES - 2 loop
+                        Lanes(i) := Lanes(i + 7);
+                    end loop;
+                    LaneCount := LaneCount - SegmentBytes;
+                    ReadValid_ob := '1';
+                end if;
+            end if;
+            ReadValid <= ReadValid_ob;
+        end if;
+    end process;
+end architecture Behavioral;
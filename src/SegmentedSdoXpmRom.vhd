@@ -12,27 +12,29 @@ library xpm;
 entity SegmentedSdoXpmRom is
     generic (
         MEM_FILE        : string;
-        BYTES           : natural
+        BYTES           : natural;
+        WORD_BYTES      : positive := 7; -- eds2mem.py --word: 7 for SDO segments, up to 64 for CAN FD USDO segments
+        STREAM          : boolean := false -- For eds2vhdl.py --sdo-stream: ReadData holds the next word until transferred
     );
     port (
         Clock           : in    std_logic;
         Reset_n         : in    std_logic;
         ReadEnable      : in    std_logic;
         ReadDataEnable  : in    std_logic;
-        ReadData        : out   std_logic_vector(55 downto 0);
+        ReadData        : out   std_logic_vector(8 * WORD_BYTES - 1 downto 0);
         ReadValid       : out   std_logic
     );
 end entity SegmentedSdoXpmRom;
 
 architecture Behavioral of SegmentedSdoXpmRom is
 
-    constant SEGMENTS       : integer := integer(ceil(real(BYTES) / 7.0));
-    constant MEMORY_SIZE    : integer := SEGMENTS * 56;
+    constant SEGMENTS       : integer := integer(ceil(real(BYTES) / real(WORD_BYTES)));
+    constant MEMORY_SIZE    : integer := SEGMENTS * 8 * WORD_BYTES;
     constant ADDR_WIDTH     : integer := integer(ceil(log2(real(SEGMENTS - 1))));
     
     signal Address      : unsigned(ADDR_WIDTH - 1 downto 0);
     signal Reset        : std_logic;
-    signal ReadData_d       : std_logic_vector(55 downto 0);
+    signal ReadData_d       : std_logic_vector(8 * WORD_BYTES - 1 downto 0);
 begin
 
     Reset <= not Reset_n;
@@ -41,8 +43,8 @@ begin
         generic map (
             ADDR_WIDTH_A => ADDR_WIDTH,
             MEMORY_INIT_FILE => MEM_FILE,
-            MEMORY_SIZE => SEGMENTS * 56,
-            READ_DATA_WIDTH_A => 56,
+            MEMORY_SIZE => MEMORY_SIZE,
+            READ_DATA_WIDTH_A => 8 * WORD_BYTES,
             READ_LATENCY_A => 1
         )
         port map (
@@ -62,6 +64,8 @@ begin
     process (Clock, Reset_n)
         variable ReadValid_ob   : std_logic;
         variable EndOfMemory    : boolean;
+        variable Started        : boolean; -- Size read
+        variable Settled        : boolean; -- ReadData_d holds the word at Address
     begin
         if Reset_n = '0' then
             Address <= (others => '0');
@@ -69,12 +73,35 @@ begin
             ReadValid <= '0';
             ReadValid_ob := '0';
             EndOfMemory := false;
+            Started := false;
+            Settled := false;
         elsif rising_edge(Clock) then
             if ReadEnable = '0' then
                 Address <= (others => '0');
                 ReadData <= std_logic_vector(to_unsigned(BYTES, ReadData'length));
                 ReadValid_ob := '0';
                 EndOfMemory := false;
+                Started := false;
+                Settled := false;
+            elsif STREAM then
+                if ReadValid_ob = '1' and ReadDataEnable = '1' then -- Transferred
+                    ReadValid_ob := '0';
+                end if;
+                if ReadDataEnable = '1' then
+                    Started := true;
+                end if;
+                if Started and ReadValid_ob = '0' and Settled and not EndOfMemory then -- Prefetch the next word
+                    if Address = SEGMENTS - 1 then
+                        EndOfMemory := true;
+                    else
+                        Address <= Address + 1;
+                    end if;
+                    ReadData <= ReadData_d;
+                    ReadValid_ob := '1';
+                    Settled := false;
+                else
+                    Settled := true;
+                end if;
             elsif ReadDataEnable = '1' and ReadValid_ob = '0' and not EndOfMemory then
                 if Address = SEGMENTS - 1 then
                     EndOfMemory := true;
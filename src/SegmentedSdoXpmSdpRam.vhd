@@ -12,7 +12,8 @@ library xpm;
 entity SegmentedSdoXpmSdpRam is
     generic (
         WRITE_WIDTH : natural; -- in bits
-        WRITE_DEPTH   : natural
+        WRITE_DEPTH   : natural;
+        WORD_BYTES    : positive := 7 -- Bytes per ReadData word: 7 for SDO segments, up to 64 for CAN FD USDO segments
     );
     port (
         Clock           : in std_logic;
@@ -21,7 +22,7 @@ entity SegmentedSdoXpmSdpRam is
         WriteEnable     : in std_logic;
         ReadEnable      : in std_logic; -- Prevents writing
         ReadDataEnable  : in std_logic; -- Hold high until ReadValid goes high
-        ReadData        : out std_logic_vector(55 downto 0);
+        ReadData        : out std_logic_vector(8 * WORD_BYTES - 1 downto 0);
         ReadValid       : out std_logic;
         WriteBusy       : out std_logic
     );
@@ -43,7 +44,7 @@ architecture Behavioral of SegmentedSdoXpmSdpRam is
     signal WriteEnable_q    : std_logic;
     signal ReadByteCount,
            WriteByteCount   : unsigned(31 downto 0);
-    signal ReadData_d       : std_logic_vector(55 downto 0);
+    signal ReadData_d       : std_logic_vector(8 * WORD_BYTES - 1 downto 0);
 
 begin
 
@@ -81,7 +82,7 @@ begin
         );
         
     process (Clock, Reset_n)
-        variable ReadCounter    : natural range 0 to 8;
+        variable ReadCounter    : natural range 0 to WORD_BYTES + 1;
         variable ReadAddressCounter : natural range 0 to WRITE_BYTES;
         variable ReadValid_ob   : std_logic;
         variable WriteCounter   : natural range 0 to WRITE_BYTES;
@@ -129,7 +130,7 @@ begin
                 WriteEnable_q <= '0';
             end if;
             if ReadDataEnable = '1' then
-                if ReadCounter < 8 then
+                if ReadCounter < WORD_BYTES + 1 then
                     ReadCounter := ReadCounter + 1;
                 end if;
             else
@@ -139,12 +140,12 @@ begin
                 ReadAddressCounter := 0;
                 ReadByteCount <= (others => '0');
                 ReadAddress <= WriteAddress - WRITE_BYTES; -- Start at LSB
-                ReadData_d <= x"000000" & std_logic_vector(WriteByteCount);
+                ReadData_d <= std_logic_vector(resize(WriteByteCount, ReadData_d'length));
                 ReadValid_ob := '0';
             elsif ReadDataEnable = '1' then
                 if ReadValid_ob = '0' then
-                    ReadData_d <= ReadDataByte & ReadData_d(55 downto 8);
-                    if ReadCounter < 8 then
+                    ReadData_d <= ReadDataByte & ReadData_d(ReadData_d'high downto 8);
+                    if ReadCounter < WORD_BYTES + 1 then
                         ReadByteCount <= ReadByteCount + 1;
                         ReadAddressCounter := ReadAddressCounter + 1;
                         if ReadAddressCounter = WRITE_BYTES then
@@ -155,13 +156,13 @@ begin
                         end if;
                     end if;
                 end if;
-                if ReadCounter = 8 then
+                if ReadCounter = WORD_BYTES + 1 then
                     ReadValid_ob := '1';
                 else
                     ReadValid_ob := '0';
                 end if;
             else
-                ReadData_d <= x"000000" & std_logic_vector(WriteByteCount);
+                ReadData_d <= std_logic_vector(resize(WriteByteCount, ReadData_d'length));
                 ReadValid_ob := '0';
             end if;
             ReadValid <= ReadValid_ob;
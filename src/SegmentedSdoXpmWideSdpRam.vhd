@@ -0,0 +1,188 @@
+-- Segmented SDO interface adapter for XPM Simple Dual Port RAM, with WRITE_WIDTH-wide ports
+-- Same interface as SegmentedSdoXpmSdpRam, but a word is written per Clock, and a word is read
+-- per Clock into a byte-lane packer, so a segment is ready after about ceil(7 / WRITE_BYTES) + 1 Clocks
+
+library ieee;
+    use ieee.std_logic_1164.all;
+    use ieee.numeric_std.all;
+    use ieee.math_real.ceil;
+    use ieee.math_real.log2;
+
+library xpm;
+    use xpm.vcomponents.all;
+
+entity SegmentedSdoXpmWideSdpRam is
+    generic (
+        WRITE_WIDTH : natural; -- in bits
+        WRITE_DEPTH   : natural;
+        STREAM      : boolean := false -- For eds2vhdl.py --sdo-stream: ReadData holds the next segment until transferred
+    );
+    port (
+        Clock           : in std_logic;
+        Reset_n         : in std_logic;
+        WriteData       : in std_logic_vector(WRITE_WIDTH - 1 downto 0);
+        WriteEnable     : in std_logic; -- A word is written each Clock this is high
+        ReadEnable      : in std_logic; -- Prevents writing
+        ReadDataEnable  : in std_logic; -- Hold high until ReadValid goes high
+        ReadData        : out std_logic_vector(55 downto 0);
+        ReadValid       : out std_logic;
+        WriteBusy       : out std_logic -- Writes are ignored
+    );
+end entity SegmentedSdoXpmWideSdpRam;
+
+architecture Behavioral of SegmentedSdoXpmWideSdpRam is
+
+    constant WRITE_BYTES    : natural := integer(ceil(real(WRITE_WIDTH) / 8.0));
+    constant MEMORY_SIZE    : natural := WRITE_BYTES * 8 * WRITE_DEPTH;
+    constant ADDR_WIDTH     : natural := integer(ceil(log2(real(WRITE_DEPTH))));
+
+    type ByteArray is array (natural range <>) of std_logic_vector(7 downto 0);
+
+    signal Reset            : std_logic;
+    signal ReadAddress      : natural range 0 to WRITE_DEPTH - 1;
+    signal WriteAddress     : natural range 0 to WRITE_DEPTH - 1;
+    signal RamReadAddress,
+           RamWriteAddress  : std_logic_vector(ADDR_WIDTH - 1 downto 0);
+    signal ReadWord,
+           WriteWord        : std_logic_vector(WRITE_BYTES * 8 - 1 downto 0);
+    signal RamWriteEnable   : std_logic;
+    signal WriteWordCount   : natural range 0 to WRITE_DEPTH; -- Words held
+    signal ReadByteCount    : unsigned(31 downto 0);
+
+begin
+
+    Reset <= not Reset_n;
+    WriteWord <= std_logic_vector(resize(unsigned(WriteData), WriteWord'length));
+    RamWriteEnable <= WriteEnable and not ReadEnable;
+    WriteBusy <= ReadEnable;
+    RamReadAddress <= std_logic_vector(to_unsigned(ReadAddress, ADDR_WIDTH));
+    RamWriteAddress <= std_logic_vector(to_unsigned(WriteAddress, ADDR_WIDTH));
+
+    xpm_memory_sdpram_inst : xpm_memory_sdpram
+        generic map (
+            ADDR_WIDTH_A => ADDR_WIDTH,
+            ADDR_WIDTH_B => ADDR_WIDTH,
+            BYTE_WRITE_WIDTH_A => WRITE_BYTES * 8,
+            MEMORY_SIZE => MEMORY_SIZE,
+            READ_DATA_WIDTH_B => WRITE_BYTES * 8,
+            READ_LATENCY_B => 1,
+            SIM_ASSERT_CHK => 1,
+            WRITE_DATA_WIDTH_A => WRITE_BYTES * 8
+        )
+        port map (
+            addra => RamWriteAddress,
+            addrb => RamReadAddress,
+            clka => Clock,
+            clkb => Clock,
+            dbiterrb => open,
+            dina => WriteWord,
+            doutb => ReadWord,
+            ena => RamWriteEnable,
+            enb => ReadEnable,
+            injectdbiterra => '0',
+            injectsbiterra => '0',
+            regceb => '1',
+            rstb => Reset,
+            sbiterrb => open,
+            sleep => '0',
+            wea => b"1"
+        );
+
+    process (Clock, Reset_n)
+        variable Lanes          : ByteArray(0 to WRITE_BYTES + 5); -- Bytes read but not yet in a segment, first byte in lane 0
+        variable LaneCount      : natural range 0 to WRITE_BYTES + 6;
+        variable ReadPending    : boolean; -- ReadWord holds the word addressed in the previous Clock
+        variable ReadWordCount  : natural range 0 to WRITE_DEPTH; -- Words left to address
+        variable SegmentBytes   : natural range 0 to 7;
+        variable ReadValid_ob   : std_logic;
+        variable Started        : boolean; -- Size read
+    begin
+        if Reset_n = '0' then
+            Lanes := (others => (others => '0'));
+            LaneCount := 0;
+            ReadPending := false;
+            ReadWordCount := 0;
+            SegmentBytes := 0;
+            ReadValid_ob := '0';
+            Started := false;
+            ReadAddress <= 0;
+            WriteAddress <= 0;
+            WriteWordCount <= 0;
+            ReadByteCount <= (others => '0');
+            ReadData <= (others => '0');
+            ReadValid <= '0';
+        elsif rising_edge(Clock) then
+            if RamWriteEnable = '1' then
+                if WriteAddress = WRITE_DEPTH - 1 then
+                    WriteAddress <= 0;
+                else
+                    WriteAddress <= WriteAddress + 1;
+                end if;
+                if WriteWordCount < WRITE_DEPTH then
+                    WriteWordCount <= WriteWordCount + 1;
+                end if;
+            elsif ReadEnable = '1' and ReadByteCount = to_unsigned(WriteWordCount * WRITE_BYTES, 32) then -- Successful reading
+                WriteWordCount <= 0;
+            end if;
+            if ReadEnable = '0' then
+                LaneCount := 0;
+                ReadPending := false;
+                ReadWordCount := WriteWordCount;
+                if WriteAddress = 0 then -- Start at the last word written
+                    ReadAddress <= WRITE_DEPTH - 1;
+                else
+                    ReadAddress <= WriteAddress - 1;
+                end if;
+                ReadByteCount <= (others => '0');
+                ReadData <= std_logic_vector(to_unsigned(WriteWordCount * WRITE_BYTES, ReadData'length));
+                ReadValid_ob := '0';
+                Started := false;
+            else
+                -- Pack the word read in the previous Clock behind the bytes held
+                if ReadPending then
+                    for i in 0 to WRITE_BYTES - 1 loop
+                        Lanes(LaneCount + i) := ReadWord(8 * i + 7 downto 8 * i);
+                    end loop;
+                    LaneCount := LaneCount + WRITE_BYTES;
+                end if;
+                -- Read the previous word while less than a segment is held
+                ReadPending := LaneCount < 7 and ReadWordCount > 0;
+                if ReadPending then
+                    ReadWordCount := ReadWordCount - 1;
+                end if;
+                if ReadDataEnable = '1' then
+                    Started := true;
+                end if;
+                if STREAM and ReadValid_ob = '1' and ReadDataEnable = '1' then -- Transferred
+                    ReadValid_ob := '0';
+                elsif ReadDataEnable = '0' and not STREAM then
+                    ReadValid_ob := '0';
+                end if;
+                if Started and (STREAM or ReadDataEnable = '1') and ReadValid_ob = '0' and (LaneCount >= 7 or (not ReadPending and (LaneCount > 0 or not STREAM))) then -- Segment complete, or last one
+                    if LaneCount >= 7 then
+                        SegmentBytes := 7;
+                    else
+                        SegmentBytes := LaneCount;
+                    end if;
+                    for i in 0 to 6 loop
+                        ReadData(8 * i + 7 downto 8 * i) <= Lanes(i);
+                    end loop;
+                    for i in 0 to WRITE_BYTES - 2 loop
+                        Lanes(i) := Lanes(i + 7);
+                    end loop;
+                    LaneCount := LaneCount - SegmentBytes;
+                    ReadByteCount <= ReadByteCount + SegmentBytes;
+                    ReadValid_ob := '1';
+                end if;
+            end if;
+            if ReadPending and ReadEnable = '1' then
+                if ReadAddress = 0 then
+                    ReadAddress <= WRITE_DEPTH - 1;
+                else
+                    ReadAddress <= ReadAddress - 1;
+                end if;
+            end if;
+            ReadValid <= ReadValid_ob;
+        end if;
+    end process;
+end architecture Behavioral;
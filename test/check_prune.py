@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+"""Checks the removal of unused signals by eds2vhdl.py
+
+Generates every EDS in test/ with each of the main option sets, with and
+without --keep-unused, and checks, for the signals reported removed:
+* They are neither declared nor referenced in the pruned entity
+* They are never read in the entity generated with --keep-unused, but by
+  the assignments of removed signals and the processes driving only them
+and, for the signals reported declared constant, that they are declared
+constant and never assigned in the pruned entity.
+
+No simulator is needed.
+
+Run test/check_prune.py -h for usage
+"""
+import argparse
+import glob
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from objectdictionary import make_entity_name, read_eds
+
+OPTION_SETS = [
+    [],
+    ["--sdo-table"],
+    ["--register-file"],
+    ["--timer-service"],
+    ["--heartbeat-engine"],
+    ["--lss"],
+    ["--arrays"],
+    ["--sdo-stream"],
+    ["--channels", "2"],
+    ["--sync", "--gfc", "--timestamp"],
+]
+
+
+def generate(eds_file, options, directory):
+    """Generates eds_file in directory, and returns the VHDL and the lines written to stdout"""
+    result = subprocess.run([sys.executable, os.path.join(ROOT, "eds2vhdl.py"), eds_file] + options, cwd=directory, check=True, stdout=subprocess.PIPE, text=True)
+    with open(os.path.join(directory, make_entity_name(read_eds(eds_file)) + ".vhd")) as fp:
+        return fp.read(), result.stdout.splitlines()
+
+
+def reported(output, prefix):
+    """Returns the signal names of the output line starting with prefix"""
+    for line in output:
+        if line.startswith(prefix):
+            return line[len(prefix):].split(", ")
+    return []
+
+
+def code_lines(vhdl):
+    """Returns the lines of the architecture, without comments"""
+    lines = vhdl.split("\n")
+    architecture = next(i for i, line in enumerate(lines) if line.startswith("architecture "))
+    return [line.split("--", 1)[0] for line in lines[architecture:]]
+
+
+def name_pattern(name):
+    if name.startswith("\\"):
+        return re.escape(name)
+    return r"(?<![\w\\.])" + re.escape(name) + r"\b"
+
+
+def target(line):
+    """Returns the signal assigned by line, or None"""
+    m = re.match(r"^\s*(\\[^\\]+\\|\w+)(\s*\([^;]*?\)|\.\w+)*\s*<=", line)
+    return None if m is None else m.group(1)
+
+
+def statements(vhdl):
+    """Returns the statements of the architecture body, as lists of lines, a process being one statement"""
+    lines = code_lines(vhdl)
+    lines = lines[lines.index("begin") + 1:]
+    result = []
+    statement = []
+    process = False
+    for line in lines:
+        if not line.strip():
+            continue
+        if re.match(r"^\s*(\w+\s*:\s*)?process\b", line):
+            process = True
+        statement.append(line)
+        if re.match(r"^\s*end process\b", line) or (not process and line.rstrip().endswith(";")):
+            result.append(statement)
+            statement = []
+            process = False
+    return result
+
+
+def reads(vhdl, removed):
+    """Returns the lines reading a removed signal outside of the statements driving only removed signals"""
+    patterns = {name: re.compile(name_pattern(name)) for name in removed}
+    found = []
+    for statement in statements(vhdl):
+        process = re.match(r"^\s*(\w+\s*:\s*)?process\b", statement[0]) is not None
+        if process: # Skip the sensitivity list
+            body = statement[next(i for i, line in enumerate(statement) if line.strip() == "begin") + 1:]
+            targets = {target(line) for line in body} - {None}
+            if targets and targets <= set(removed):
+                continue
+        else:
+            body = statement
+        for line in body:
+            assigned = target(line)
+            rhs = line if assigned is None else line[line.index("<=") + 2:]
+            if not process and assigned is None:
+                assigned = target(statement[0])
+            for name, pattern in patterns.items():
+                if pattern.search(rhs) is not None and assigned not in removed:
+                    found.append((name, line.strip()))
+    return found
+
+
+def check(eds_file, options, directory):
+    """Returns the list of failed checks of eds_file generated with options"""
+    kept, _ = generate(eds_file, options + ["--keep-unused"], directory)
+    pruned, output = generate(eds_file, options, directory)
+    removed = reported(output, "Removed unused signals: ")
+    constants = reported(output, "Declared constant: ")
+    code = "\n".join(code_lines(pruned))
+    failed = []
+    for name in removed:
+        if re.search(name_pattern(name), code) is not None:
+            failed.append("{} removed but still referenced".format(name))
+    for name, line in reads(kept, removed):
+        failed.append("{} removed but read: {}".format(name, line))
+    for name in constants:
+        if re.search(r"constant\s+" + name_pattern(name) + r"\s*:", code) is None:
+            failed.append("{} not declared constant".format(name))
+        if re.search(r"(?m)^\s*" + name_pattern(name) + r"(\s*\([^;]*?\)|\.\w+)*\s*<=", code) is not None:
+            failed.append("{} declared constant but assigned".format(name))
+    print("{} {}: {:d} removed, {:d} constant, {}".format(os.path.basename(eds_file), " ".join(options) or "(default)", len(removed), len(constants), "{:d} failed".format(len(failed)) if failed else "passed"))
+    for name in failed:
+        print("  failed: " + name)
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("eds", type=str, nargs="*", default=sorted(glob.glob(os.path.join(ROOT, "test", "*.eds"))), help="EDS files (default: test/*.eds)")
+    args = parser.parse_args()
+
+    failed = []
+    with tempfile.TemporaryDirectory() as directory:
+        for eds_file in args.eds:
+            for options in OPTION_SETS:
+                failed += check(os.path.abspath(eds_file), options, directory)
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+"""Checks the RPDO deadline monitoring generated by eds2vhdl.py
+
+Generates the entity and testbench of test/RpdoNode.eds (64 RPDOs), and of
+a node derived from it with more RPDOs (200 by default), with --rpdo-timeouts,
+and checks, against the EDS:
+* The depth of the RpdoStates RAM and the range of its index
+* The RPDO, COB-ID, event timer and timeout bit of each RAM address
+* The timeout bits driving each sub-index of the --rpdo-timeouts object
+* The wiring of the timeouts to Status.EventTimerError, error register bit 4
+  and the EMCY with EEC 0x8250, and the testbench assertion of the error
+
+No simulator is needed.
+
+Run test/check_rpdo.py -h for usage
+"""
+import argparse
+import math
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from objectdictionary import make_entity_name, make_objects, make_od, read_eds
+
+TIMEOUTS_INDEX = 0x2100
+
+
+def write_large_eds(source, filename, rpdos):
+    """Writes the EDS of source with rpdos RPDOs, copies of RPDO1, and enough RPDO timeouts sub-indices"""
+    eds = read_eds(source, lower=False)
+    subs = math.ceil(rpdos / 32)
+    out = {}
+    for section in eds:
+        if section == "OptionalObjects":
+            indices = [int(value, 0) for key, value in eds[section].items() if key != "SupportedObjects"]
+            indices = [index for index in indices if not 0x1400 <= index < 0x1600] + [0x1400 + i for i in range(rpdos)]
+            out[section] = {"SupportedObjects": str(len(indices))}
+            out[section].update({str(i + 1): "0x{:04X}".format(index) for i, index in enumerate(sorted(indices))})
+        elif section == "1400":
+            for i in range(rpdos):
+                for sub in ["", "sub0", "sub1", "sub2", "sub5"]:
+                    out["{:04X}{}".format(0x1400 + i, sub)] = {key: value.replace("RPDO1 ", "RPDO{:d} ".format(i + 1)) for key, value in eds["1400" + sub].items()}
+        elif re.fullmatch(r"14[0-9A-F]{2}(sub[0-9A-F]+)?", section):
+            continue
+        elif section == "{:04X}".format(TIMEOUTS_INDEX):
+            out[section] = dict(eds[section], SubNumber=str(subs + 1))
+            out[section + "sub0"] = dict(eds[section + "sub0"], DefaultValue=str(subs))
+            for i in range(subs):
+                out["{}sub{:X}".format(section, i + 1)] = dict(eds[section + "sub1"], ParameterName="RPDO timeouts {:d}".format(i + 1))
+        elif section.startswith("{:04X}sub".format(TIMEOUTS_INDEX)):
+            continue
+        else:
+            out[section] = eds[section]
+    out["DeviceInfo"]["ProductName"] = "Rpdo Node Large"
+    with open(filename, "w") as fp:
+        for section in out:
+            fp.write("[{}]\n".format(section))
+            for key, value in out[section].items():
+                fp.write("{}={}\n".format(key, value))
+
+
+def check(eds_file, directory):
+    """Generates eds_file in directory, and returns the list of failed checks"""
+    subprocess.run([sys.executable, os.path.join(ROOT, "eds2vhdl.py"), eds_file, "--rpdo-timeouts", "0x{:04X}".format(TIMEOUTS_INDEX), "--testbench"], cwd=directory, check=True, stdout=subprocess.DEVNULL)
+    eds = read_eds(eds_file)
+    objects = make_objects(make_od(eds))
+    entity_name = make_entity_name(eds)
+    with open(os.path.join(directory, entity_name + ".vhd")) as fp:
+        vhdl = fp.read()
+    with open(os.path.join(directory, entity_name + "_tb.vhd")) as fp:
+        testbench = fp.read()
+    with open(os.path.join(ROOT, "src", "CanOpen_pkg.vhd")) as fp:
+        package = fp.read()
+
+    rpdos = [i for i in range(1, 0x201) if (((0x1400 + i - 1) << 8) + 0x01) in objects and (((0x1400 + i - 1) << 8) + 0x05) in objects]
+    timeouts = sorted(mux for mux in objects if mux >> 8 == TIMEOUTS_INDEX and mux & 0xFF > 0)
+    n = len(rpdos)
+    bits = max(sum(objects.get(mux).get("bit_length") for mux in timeouts), rpdos[-1])
+    checks = [
+        ("RpdoStates depth", r"type RpdoStateArray is array \(0 to {:d}\) of std_logic_vector\(17 downto 0\);".format(n - 1)),
+        ("RpdoIndex range", r"variable RpdoIndex\s+: natural range 0 to {:d};".format(n)),
+        ("RpdoWriteIndex range", r"variable RpdoWriteIndex\s+: natural range 0 to {:d};".format(n - 1)),
+        ("Sweep end", r"elsif RpdoIndex = {:d} then -- End of sweep".format(n)),
+        ("RpdoTimeoutBits width", r"signal RpdoTimeoutBits\s+: std_logic_vector\({:d} downto 0\);".format(bits - 1)),
+        ("RpdoBit range", r"variable RpdoBit\s+: natural range 0 to {:d};".format(bits - 1)),
+        ("EventTimerError", r"EventTimerError => RpdoTimeout,"),
+        ("EMCY EEC", r"elsif RpdoTimeout = '1' then\s+EmcyEec <= CanOpen\.EMCY_EEC_RPDO_TIMEOUT;"),
+        ("Error register bit 4", r"CommunicationError <= '1' when [^\n]* or RpdoTimeout = '1'"),
+        ("Testbench EventTimerError", r"assert Status\.EventTimerError = '1' report \"RPDO deadline monitoring: no event timer error\""),
+    ]
+    for address, i in enumerate(rpdos):
+        mux = (0x1400 + i - 1) << 8
+        checks.append(("RPDO{:d} state".format(i), r"when {:d} =>\s+RpdoCobId := {};\s+RpdoEventTimer := {};\s+RpdoBit := {:d};".format(address, re.escape(objects.get(mux + 0x01).get("name")), re.escape(objects.get(mux + 0x05).get("name")), i - 1)))
+    offset = 0
+    for mux in timeouts:
+        obj = objects.get(mux)
+        checks.append(("0x{:06X} timeout bits".format(mux), r"{} <= unsigned\(RpdoTimeoutBits\({:d} downto {:d}\)\);".format(re.escape(obj.get("name")), offset + obj.get("bit_length") - 1, offset)))
+        offset += obj.get("bit_length")
+
+    failed = [name for name, pattern in checks if re.search(pattern, testbench if name.startswith("Testbench") else vhdl) is None]
+    if re.search(r"constant EMCY_EEC_RPDO_TIMEOUT\s+: std_logic_vector\(15 downto 0\) := x\"8250\";", package) is None:
+        failed.append("EMCY_EEC_RPDO_TIMEOUT = 0x8250")
+    print("{}: {:d} RPDOs, {:d} checks, {}".format(os.path.basename(eds_file), n, len(checks) + 1, "{:d} failed".format(len(failed)) if failed else "passed"))
+    for name in failed:
+        print("  failed: " + name)
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--eds", type=str, default=os.path.join(ROOT, "test", "RpdoNode.eds"), help="EDS with RPDOs and RPDO timeouts at 0x2100 (default: test/RpdoNode.eds)")
+    parser.add_argument("--rpdos", type=int, default=200, help="Number of RPDOs of the larger node derived from the EDS (default: 200)")
+    args = parser.parse_args()
+    if not 128 <= args.rpdos <= 512:
+        parser.error("--rpdos must be in the range 128 to 512")
+
+    failed = []
+    with tempfile.TemporaryDirectory() as directory:
+        failed += check(os.path.abspath(args.eds), directory)
+        large = os.path.join(directory, "RpdoNodeLarge.eds")
+        write_large_eds(args.eds, large, args.rpdos)
+        failed += check(large, directory)
+    if failed:
+        sys.exit(1)